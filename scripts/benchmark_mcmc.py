@@ -0,0 +1,125 @@
+"""Benchmark the time taken by each MCMC kernel to reach a target effective sample size
+
+Builds the `run_MCMC` inputs for the example models in `tests/data` directly from their csv files, without rendering the model (so graphviz is not required), then calibrates each model with each kernel in `mcmc.MCMC_METHODS` using a convergence based stopping rule and a fixed seed.
+
+Usage:
+    python scripts/benchmark_mcmc.py [--target-ess 1000] [--seed 1] [--repeats 1] [--adaptive-warmup 0] [model ...]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from polychron import mcmc
+from polychron.models.InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
+
+DATA_DIRECTORY = pathlib.Path(__file__).parent.parent / "tests" / "data"
+
+MODELS = {
+    "thesis": [
+        "thesis/thesis-b1-strat.csv",
+        "thesis/thesis-b2-radiocarbon.csv",
+        "thesis/thesis-b3-context-grouping.csv",
+        "thesis/thesis-b4-group-ordering.csv",
+    ],
+    "many-groups": [
+        "many-groups/1-strat.csv",
+        "many-groups/2-dates.csv",
+        "many-groups/3-context-grouping.csv",
+        "many-groups/4-group-ordering.csv",
+    ],
+}
+
+
+def build_inputs(name):
+    """Build the run_MCMC inputs for a model from its csv files, for a single linear sequence of groups"""
+    strat, dates, grouping, ordering = [pd.read_csv(DATA_DIRECTORY / f, dtype=str) for f in MODELS[name]]
+    if "relationship" not in ordering:
+        ordering["relationship"] = "abutting"
+    # Order groups from oldest to youngest, with the relationship between each group and the previous
+    older = dict(zip(ordering["above"], zip(ordering["below"], ordering["relationship"].fillna("abutting"))))
+    phi_ref = list(set(ordering["below"]) - set(ordering["above"]))
+    prev_phase = ["start"]
+    younger = {below: (above, rel) for above, (below, rel) in older.items()}
+    while phi_ref[-1] in younger:
+        group, relationship = younger[phi_ref[-1]]
+        phi_ref.append(group)
+        prev_phase.append(relationship)
+    post_phase = prev_phase[1:] + ["end"]
+
+    strat_dag = nx.DiGraph()
+    strat_dag.add_nodes_from(dates["context"])
+    strat_dag.add_edges_from((a, b) for a, b in zip(strat["above"], strat["below"]) if isinstance(b, str))
+    groups = dict(zip(grouping["context"], grouping["Group"]))
+    # Contexts in a younger group are above all contexts in the previous group, unless the groups overlap
+    chrono_dag = strat_dag.copy()
+    for i in range(1, len(phi_ref)):
+        if prev_phase[i] != "overlap":
+            chrono_dag.add_edges_from(
+                (c1, c2) for c1 in groups for c2 in groups if (groups[c1], groups[c2]) == (phi_ref[i], phi_ref[i - 1])
+            )
+    context_no = [c for c in reversed(list(nx.topological_sort(chrono_dag))) if c in groups]
+    estimates = dict(zip(dates["context"], dates["date"]))
+    errors = dict(zip(dates["context"], dates["error"]))
+    return {
+        "STRAT_VEC": [[list(strat_dag.predecessors(c)), list(strat_dag.successors(c))] for c in context_no],
+        "RCD_EST": [int(estimates[c]) for c in context_no],
+        "RCD_ERR": [int(errors[c]) for c in context_no],
+        "KEY_REF": [groups[c] for c in context_no],
+        "CONTEXT_NO": context_no,
+        "PHI_REF": phi_ref,
+        "PREV_PHASE": prev_phase,
+        "POST_PHASE": post_phase,
+        "TOPO_SORT": context_no,
+        "CONT_TYPE": ["normal"] * len(context_no),
+    }
+
+
+def min_ess(samples):
+    """The smallest effective sample size across parameters, after removing burn-in"""
+    return min(float(np.nan_to_num(mcmc.effective_sample_size(s[mcmc.ACCEPT_BURN_IN :]))) for s in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("models", nargs="*", default=list(MODELS), help=f"Models to benchmark, from {list(MODELS)}")
+    parser.add_argument("--target-ess", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--adaptive-warmup", type=int, default=0, help="Iterations of proposal width adaptation")
+    args = parser.parse_args()
+
+    calibration = InterpolatedRCDCalibrationCurve("intcal20_interpolated").df
+    stopping = mcmc.StoppingRule(convergence=True, target_ess=args.target_ess)
+    devnull = open(os.devnull, "w")
+    print(f"{'model':<12} {'method':<8} {'seconds':>8} {'samples':>8} {'min ess':>8} {'ess/s':>8}")
+    for name in args.models:
+        inputs = build_inputs(name)
+        for method in mcmc.MCMC_METHODS:
+            for repeat in range(args.repeats):
+                start = time.perf_counter()
+                results = mcmc.run_MCMC(
+                    calibration,
+                    **inputs,
+                    PROGRESS_IO=devnull,
+                    SEED=args.seed + repeat,
+                    STOPPING=stopping,
+                    METHOD=method,
+                    TUNING=mcmc.ProposalTuning(warmup=args.adaptive_warmup),
+                )
+                elapsed = time.perf_counter() - start
+                accept, phi_accept = results[1], results[2]
+                ess = min_ess(list(accept) + list(phi_accept))
+                samples = min(len(a) for a in accept)
+                print(f"{name:<12} {method:<8} {elapsed:>8.2f} {samples:>8} {ess:>8.0f} {ess / elapsed:>8.0f}")
+                sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,48 @@ class Config:
     geometry: str = "1920x1080"
     """The initial window geometry"""
 
+    mcmc_chains: int = 2
+    """The number of independent MCMC chains to run for each calibration, which are merged and used to report convergence diagnostics"""
+
+    mcmc_workers: int = 0
+    """The maximum number of worker processes used to run MCMC chains in parallel. 0 uses one per additional chain, limited by the number of CPUs"""
+
+    mcmc_convergence: bool = False
+    """If MCMC chains should stop once the effective sample size and R-hat targets are met, rather than only at mcmc_max_samples"""
+
+    mcmc_target_ess: int = 1000
+    """The effective sample size each parameter must reach for convergence based stopping"""
+
+    mcmc_target_rhat: float = 1.01
+    """The maximum split R-hat for each parameter for convergence based stopping"""
+
+    mcmc_max_samples: int = 60000
+    """The number of accepted samples per context at which each MCMC chain stops"""
+
+    mcmc_check_interval: int = 3335
+    """The number of MCMC iterations between checks of the stopping rule"""
+
+    mcmc_sample_dtype: str = "float64"
+    """The NumPy dtype MCMC samples are stored as during calibration, "float64" or "float32" to halve memory use"""
+
+    mcmc_stream_samples: bool = False
+    """If MCMC samples should be streamed to memory-mapped files in the model's working directory during calibration, rather than held in memory. Chains are checkpointed alongside their samples, so the calibration can be resumed"""
+
+    mcmc_seed: int = -1
+    """Seed for the random number generators used by MCMC calibration, for reproducible results. A negative value uses a new seed for each calibration, which is recorded with the results"""
+
+    mcmc_method: str = "squeeze"
+    """The MCMC kernel used for calibration, "squeeze" for the Metropolis-Hastings squeeze sampler or "gibbs" for the Gibbs sampler"""
+
+    mcmc_adaptive_warmup: int = 0
+    """The number of iterations at the start of each MCMC chain during which the width of the squeeze sampler's shift proposal is adapted. Samples drawn during warm-up are discarded. 0 disables adaptation"""
+
+    mcmc_target_acceptance: float = 0.234
+    """The acceptance rate the shift proposal is adapted towards during warm-up"""
+
+    model_cache_size: int = 0
+    """The maximum number of models kept loaded in memory per project. Once exceeded, the least recently used models are saved if they have unsaved changes and unloaded, to be reloaded from disk when next used. 0 keeps every loaded model in memory"""
+
     def __post_init__(self) -> None:
         """Fixup member variables post initialisation
 
@@ -143,3 +185,15 @@ def get_config() -> Config:
     if __config_instance is None:
         __config_instance = Config.from_default_filepath()
     return __config_instance
+
+
+def set_config(config: Config) -> None:
+    """Replace the single 'global' Configuration object instance.
+
+    Used to share the calling process' configuration with worker processes, which would otherwise load it from disk without any changes made at runtime (e.g. by `--verbose`).
+
+    Parameters:
+        config: The configuration object to be returned by `get_config`
+    """
+    global __config_instance
+    __config_instance = config
@@ -1,6 +1,8 @@
 #! /usr/bin/env python3
 
 if __name__ == "__main__":
+    import sys
+
     from .entrypoint import main
 
-    main()
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Headless subcommands for calibrating models and exporting their results from the command line, without launching the GUI.
+
+This module must not import tkinter, ttkthemes or any views or presenters (directly or indirectly), so that calibration can be run on machines without a display, such as in batch scripts or SLURM jobs on compute nodes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+from typing import Optional, TextIO
+
+import pandas as pd
+
+from .Config import get_config
+from .mcmc import ALL_SAMPLES_BURN_IN, ChainProgress
+from .models.BatchCalibration import BatchCalibration
+from .models.Model import Model
+from .models.ProjectSelection import ProjectSelection
+
+EXPORT_FORMATS = ("csv", "json")
+"""Formats which calibration results can be exported as"""
+
+
+def add_subcommands(parser: argparse.ArgumentParser) -> None:
+    """Add the headless subcommands to the polychron argument parser
+
+    Parameters:
+        parser: The top level argument parser, see `entrypoint.parse_cli`
+    """
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    calibrate = subparsers.add_parser("calibrate", help="Calibrate a model without launching the GUI")
+    calibrate.add_argument("project", help="The project containing the model")
+    calibrate.add_argument("model", help="The model to calibrate, which must have a chronological graph")
+    add_calibration_arguments(calibrate)
+    add_export_arguments(calibrate, "Also export the calibration results to this file, or - for stdout")
+
+    calibrate_project = subparsers.add_parser(
+        "calibrate-project", help="Calibrate several models within a project in parallel, without launching the GUI"
+    )
+    calibrate_project.add_argument("project", help="The project containing the models")
+    calibrate_project.add_argument(
+        "models", nargs="*", help="The models to calibrate. Defaults to every model with a chronological graph"
+    )
+    add_calibration_arguments(calibrate_project)
+
+    export_results = subparsers.add_parser("export-results", help="Export the calibration results of a model")
+    export_results.add_argument("project", help="The project containing the model")
+    export_results.add_argument("model", help="The calibrated model")
+    add_export_arguments(export_results, "The file to export the results to. Defaults to stdout")
+
+
+def add_calibration_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add options for MCMC calibration to a subcommand's parser, which default to the configuration options"""
+    parser.add_argument("--chains", type=int, help="The number of MCMC chains to run (default: mcmc_chains)")
+    parser.add_argument("--workers", type=int, help="The maximum number of worker processes (default: mcmc_workers)")
+    parser.add_argument(
+        "--seed", type=int, help="Seed for the MCMC chains, for reproducible results (default: mcmc_seed)"
+    )
+    parser.add_argument("--progress", action="store_true", help="Report calibration progress to stderr")
+
+
+def add_export_arguments(parser: argparse.ArgumentParser, output_help: str) -> None:
+    """Add options for exporting calibration results to a subcommand's parser"""
+    parser.add_argument("-o", "--output", type=str, help=output_help)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="The format to export results in")
+
+
+def open_project_selection() -> ProjectSelection:
+    """Get a ProjectSelection for the configured projects directory, with its projects lazily loaded"""
+    selection = ProjectSelection(get_config().projects_directory)
+    selection.projects_directory.lazy_load()
+    return selection
+
+
+def load_model(selection: ProjectSelection, project_name: str, model_name: str) -> Model:
+    """Switch to an existing model, without creating it if it does not exist
+
+    Raises:
+        RuntimeError: If the project or model does not exist, or the model could not be loaded
+    """
+    if not selection.projects_directory.has_project(project_name):
+        raise RuntimeError(f"Project '{project_name}' does not exist in '{selection.projects_directory.path}'")
+    selection.switch_to(project_name, model_name, load_ok=True, create_ok=False)
+    return selection.current_model
+
+
+def calibrate_model(
+    model: Model,
+    chains: Optional[int] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    progress: Optional[TextIO] = None,
+) -> None:
+    """Calibrate a model, topping up its chains until enough samples were accepted, then save the results and model to disk
+
+    Parameters:
+        model: The model to calibrate
+        chains: See `Model.create_mcmc_session`
+        workers: See `Model.create_mcmc_session`
+        seed: See `Model.create_mcmc_session`
+        progress: Stream to report progress to, with one line per progress update of the first chain, or None for no progress
+
+    Raises:
+        RuntimeError: If the model is not ready for calibration
+    """
+    if not model.load_check or not model.is_ready_for_mcmc():
+        raise RuntimeError(f"Model '{model.name}' is not ready for calibration, it requires a chronological graph")
+
+    def report(update: ChainProgress) -> None:
+        print(f"{model.name}: {update.percent}% {update.describe()}".rstrip(), file=progress, flush=True)
+
+    model.calibrate(chains, workers, seed, progress_callback=report if progress is not None else None)
+    # Save the mcmc data and model to disk
+    model.mcmc_data.save(model.get_working_directory(), model.group_df, get_config().verbose)
+    model.save()
+
+
+def export_results(model: Model, output: TextIO, export_format: str = "csv") -> None:
+    """Export the posterior samples for each context and group boundary of a calibrated model, after burn-in
+
+    The samples are those saved as `full_results_df` when the model is calibrated, with one column per parameter for csv, or one list per parameter for json.
+
+    Parameters:
+        model: The calibrated model
+        output: Stream to write the results to
+        export_format: The format to export, from `EXPORT_FORMATS`
+
+    Raises:
+        RuntimeError: If the model has not been calibrated
+        ValueError: If the format is not supported
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+    if not model.mcmc_check:
+        raise RuntimeError(f"Model '{model.name}' has not been calibrated")
+    samples = {k: v[ALL_SAMPLES_BURN_IN:] for k, v in model.mcmc_data.all_group_limits.items()}
+    if export_format == "csv":
+        pd.DataFrame(samples).to_csv(output, index=False)
+    else:
+        json.dump({k: [float(x) for x in v] for k, v in samples.items()}, output)
+        output.write("\n")
+
+
+def write_export(model: Model, path: Optional[str], export_format: str) -> None:
+    """Export the results of a model to a file path, or to stdout if path is None or -"""
+    if path is None or path == "-":
+        export_results(model, sys.stdout, export_format)
+    else:
+        with open(pathlib.Path(path), "w", newline="") as f:
+            export_results(model, f, export_format)
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """Run a headless subcommand from parsed command line arguments
+
+    Errors for individual models are reported to stderr. For calibrate-project, models are calibrated in parallel by `BatchCalibration`, and remaining models are still calibrated after a model fails.
+
+    Parameters:
+        args: Parsed arguments from `entrypoint.parse_cli`, with a command set
+
+    Returns:
+        The exit status, 0 on success and 1 if any model failed
+    """
+    selection = open_project_selection()
+    progress = sys.stderr if getattr(args, "progress", False) else None
+    if args.command == "calibrate-project":
+        project = selection.projects_directory.get_project(args.project)
+        if project is None:
+            print(f"Error: Project '{args.project}' does not exist", file=sys.stderr)
+            return 1
+        calibrated, failed = [], []
+
+        def report(model_name: str, update: ChainProgress) -> None:
+            print(f"{model_name}: {update.percent}% {update.describe()}".rstrip(), file=progress, flush=True)
+
+        def finished(model_name: str, model: Optional[Model], error: Optional[Exception]) -> None:
+            if error is None:
+                calibrated.append(model_name)
+                print(f"Calibrated '{args.project}/{model_name}'", file=sys.stderr)
+            else:
+                failed.append(model_name)
+                print(f"Error: Unable to calibrate '{args.project}/{model_name}': {error}", file=sys.stderr)
+
+        model_names = args.models
+        if len(model_names) == 0:
+            # Without a list of models, every model in the project with a chronological graph is calibrated
+            metadata = project.load_metadata(load_missing=True)
+            model_names = [model_name for model_name in sorted(metadata) if metadata[model_name].load_check]
+        # Calibrate the models in parallel, saving each as it finishes
+        BatchCalibration(project, model_names, args.chains, args.workers, args.seed).run(
+            report if progress is not None else None, finished
+        )
+        if len(failed) > 0:
+            print(
+                f"{len(failed)} of {len(calibrated) + len(failed)} models failed: {', '.join(failed)}", file=sys.stderr
+            )
+            return 1
+        return 0
+
+    try:
+        model = load_model(selection, args.project, args.model)
+        if args.command == "calibrate":
+            calibrate_model(model, args.chains, args.workers, args.seed, progress)
+            print(f"Calibrated '{args.project}/{args.model}'", file=sys.stderr)
+            if args.output is not None:
+                write_export(model, args.output, args.format)
+        else:
+            write_export(model, args.output, args.format)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
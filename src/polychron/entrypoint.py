@@ -6,6 +6,7 @@ import argparse
 from typing import Sequence
 
 from . import __version__
+from .cli import add_subcommands, run_command
 from .Config import Config, get_config
 
 
@@ -31,9 +32,14 @@ def parse_cli(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser.add_argument(
         "-m", "--model", type=str, help="Specify the model to create or load, within -p/--project PROJECT"
     )
+    add_subcommands(parser)
 
     args = parser.parse_args(argv)
 
+    # Subcommands run without the GUI, and specify their own project and model
+    if args.command is not None:
+        return args
+
     # If a model is provided, but a project is not provided then we should raise an argument parsing error (and exit by default), as a model without a project is meaningless.
     if args.project is None and args.model is not None:
         parser.error("-m/--model requires a -p/--project to also be specified")
@@ -50,8 +56,12 @@ def print_version() -> None:
     print(f"PolyChron {__version__}")
 
 
-def main() -> None:
-    """Main method as the entry point for launching the GUI"""
+def main() -> int:
+    """Main method as the entry point for launching the GUI, or running a headless subcommand
+
+    Returns:
+        The exit status
+    """
     args = parse_cli()
 
     # if the verbose flag was set, ensure it is reflected in the config object
@@ -63,9 +73,13 @@ def main() -> None:
     # If version requested on the command line, provide it and return.
     if args.version:
         print_version()
-        return
+        return 0
+    elif args.command is not None:
+        # Run headless subcommands without importing the GUI
+        return run_command(args)
     else:
         # Import and launch the GUI via an instance of the GUIApp class
         from .GUIApp import GUIApp
 
         GUIApp().launch(project_name=args.project, model_name=args.model)
+        return 0
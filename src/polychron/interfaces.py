@@ -45,3 +45,10 @@ class Writable(Protocol):
     A protocol for objects which implement write(str)"""
 
     def write(self, s: str) -> Any: ...
+
+
+class StopFlag(Protocol):
+    """
+    A protocol for objects which implement is_set(), such as `threading.Event` or `multiprocessing.Event`, which are set to request that a long-running operation stops early"""
+
+    def is_set(self) -> bool: ...
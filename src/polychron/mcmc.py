@@ -6,15 +6,72 @@ Module for performing MCMC algorithm needed to obtain calibrated age estimates f
 
 from __future__ import annotations
 
+import graphlib
+import json
 import math
-import random
+import multiprocessing
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
 from statistics import mean
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
-from .interfaces import Writable
+from .interfaces import StopFlag, Writable
+from .models.SampleBuffer import SampleBuffer
+from .util import write_json_atomic
+
+if TYPE_CHECKING:
+    from .models.LikelihoodCache import LikelihoodCache
+
+# Number of accepted samples per parameter treated as burn-in when summarising results
+ACCEPT_BURN_IN = 1000
+
+# Number of samples per parameter (including rejected proposals) treated as burn-in when summarising results
+ALL_SAMPLES_BURN_IN = 10000
+
+# Names of the sample buffers for a chain of the squeeze sampler, in the order they are returned by squeeze_model
+SAMPLE_BUFFERS = ("phi_accept", "accept", "post_s", "all_samps_cont", "all_samps_phi")
+
+# Largest number of posterior terms which SamplerState.log_posterior_terms evaluates one at a time rather than with array operations, which have a fixed cost per call
+SCALAR_TERMS = 16
+
+# Names of the moves of the squeeze sampler, in the order they are applied by squeeze_iteration
+MOVES = ("context", "boundary", "shift", "scale")
+
+# Context for worker processes running chains. Workers are spawned rather than forked, as chains are often run from a background thread, and forking a multi-threaded process can deadlock the child. Queues and events shared with workers, such as a flag to stop chains early, must be created from this context
+WORKER_CONTEXT = multiprocessing.get_context("spawn")
+
+# Name of the file a chain's state is checkpointed to, within the directory its samples are streamed to
+CHECKPOINT_FILENAME = "checkpoint.json"
+
+# Names of the SamplerState arrays which change as a chain runs, and so are saved in its checkpoint
+CHECKPOINT_ARRAYS = (
+    "thetas",
+    "phis",
+    "trace_thetas",
+    "trace_phis",
+    "log_likelihoods",
+    "log_densities",
+    "cached_grid",
+    "cached_phis",
+    "cached_log_densities",
+    "cached_log_likelihoods",
+    "group_oldest",
+    "group_youngest",
+    "move_proposed",
+    "move_accepted",
+    "tuned_proposed",
+    "tuned_accepted",
+)
+
+# Names of the SamplerState members built from the inputs to the sampler, which are not pickled with it, see `SamplerState.restore_inputs`
+INPUT_MEMBERS = ("result_vec", "calibration", "prob_table", "sum_table")
 
 
 def HPD_interval(x_temp, lim=0.95, probs=[]):
@@ -26,18 +83,11 @@ def HPD_interval(x_temp, lim=0.95, probs=[]):
     else:
         x_vals = x_temp
         probs = probs[1:]
-    df = pd.DataFrame({"Theta": x_vals[1:], "Posterior": probs})
-    hpd_vec = []
-    theta_vec = []
-    y = df.sort_values(by=["Posterior"], ascending=False)
-    posterior_x = np.array(y["Posterior"])
-    posterior_theta = np.array(y["Theta"])
-    i = 0
-    while sum(hpd_vec) <= lim:
-        hpd_vec.append(posterior_x[i])
-        theta_vec.append(posterior_theta[i])
-        i = i + 1
-    theta_vec.sort()
+    # Take bins in order of decreasing density (ties in calendar order) until their total exceeds lim
+    probs = np.asarray(probs)
+    order = np.argsort(-probs, kind="stable")
+    n_selected = min(np.count_nonzero(np.cumsum(probs[order]) <= lim) + 1, len(order))
+    theta_vec = np.sort(np.asarray(x_vals[1:])[order[:n_selected]])
     rangevec = []
     rangevec.append(int(min(theta_vec)))
     for i in range(len(theta_vec) - 1):
@@ -47,79 +97,141 @@ def HPD_interval(x_temp, lim=0.95, probs=[]):
     return rangevec
 
 
+def uniform(RNG: np.random.Generator, low: float, high: float) -> float:
+    """Draw a sample from the uniform distribution between low and high using RNG
+
+    Unlike `numpy.random.Generator.uniform`, high may be less than low, as permitted by `numpy.random.uniform` which the sampler was written against.
+    """
+    return low + (high - low) * RNG.random()
+
+
 def theta_samp_func(
-    GIBBS_THETAS, GIBBS_PHIS, KEY_REF, PHI_REF, RESULT_VEC, STRAT_VEC, CONTEXT_NO, TOPO_SORT, iter_num, GIBBS_DICT_1
+    GIBBS_THETAS,
+    GIBBS_PHIS,
+    KEY_REF,
+    PHI_REF,
+    RESULT_VEC,
+    STRAT_VEC,
+    CONTEXT_NO,
+    TOPO_SORT,
+    iter_num,
+    GIBBS_DICT_1,
+    RNG: np.random.Generator | None = None,
 ):  # , PREV_IT):
-    """Gives a list of initial theta values for MCMC"""
+    """Gives a list of initial theta values for MCMC
+
+    Contexts are drawn group by group, in batches of contexts within a group which do not depend on each other, see `truncated_samples` and `topological_layers`.
+    """
+    RNG = np.random.default_rng() if RNG is None else RNG
     out_vec = [0] * len(KEY_REF)
     for date in range(0, len(PHI_REF)):
         ref_vec = np.where(np.array(KEY_REF) == PHI_REF[date])[0].tolist()
         phase_lab = PHI_REF[date]
         phase = [CONTEXT_NO[i] for i in ref_vec]
-        phase_topo = [i for i in TOPO_SORT if i in phase]
+        phase_topo = [CONTEXT_NO.index(i) for i in TOPO_SORT if i in phase]
         phase_upp_lim = GIBBS_DICT_1[phase_lab]["boundaries"][1]  # needs to be less than this
         phase_low_lim = GIBBS_DICT_1[phase_lab]["boundaries"][0]  # needs to be more than this
-        for i in phase_topo:
-            a = np.where(np.array(CONTEXT_NO) == i)[0][0].item()
-            below = STRAT_VEC[a][0]  # should be less than this
-            above = STRAT_VEC[a][1]  # should be greater than this
-            if len(above) == 0:
-                if len(below) == 0:
-                    dates = RESULT_VEC[a][0]
-                    ind = (dates < phase_upp_lim) & (dates > phase_low_lim)
-                    SAMPLE_VEC, SAMPLE_VEC_PROB = dates[ind], RESULT_VEC[a][1][ind]
-                    w = SAMPLE_VEC_PROB / np.sum(SAMPLE_VEC_PROB)
-                    out_vec[a] = SAMPLE_VEC[np.searchsorted(w.cumsum(), random.random())]
-                else:
-                    maxstrat = max(
-                        [GIBBS_THETAS[np.where(np.array(CONTEXT_NO) == j)[0][0].item()][iter_num] for j in below]
-                    )
-                    max_tot = max([maxstrat, phase_low_lim])
-                    SAMPLE_VEC = RESULT_VEC[a][0][(RESULT_VEC[a][0] < phase_upp_lim) & (RESULT_VEC[a][0] > max_tot)]
-                    SAMPLE_VEC_PROB = RESULT_VEC[a][1][
-                        (RESULT_VEC[a][0] < phase_upp_lim) & (RESULT_VEC[a][0] > max_tot)
-                    ]
-                    out_vec[a] = random.choices(SAMPLE_VEC, weights=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))[0]
-            elif len(below) == 0:
-                minstrat = min([out_vec[np.where(np.array(CONTEXT_NO) == j)[0][0].item()] for j in above])
-                min_tot = min([minstrat, phase_upp_lim])
-                SAMPLE_VEC = RESULT_VEC[a][0][(RESULT_VEC[a][0] < min_tot) & (RESULT_VEC[a][0] > phase_low_lim)]
-                SAMPLE_VEC_PROB = RESULT_VEC[a][1][(RESULT_VEC[a][0] < min_tot) & (RESULT_VEC[a][0] > phase_low_lim)]
-                out_vec[a] = random.choices(SAMPLE_VEC, weights=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))[0]
-            else:
-                maxstrat = max(
-                    [GIBBS_THETAS[np.where(np.array(CONTEXT_NO) == j)[0][0].item()][iter_num] for j in below]
-                )
-                max_tot = max([maxstrat, phase_low_lim])
-                minstrat = min([out_vec[np.where(np.array(CONTEXT_NO) == j)[0][0].item()] for j in above])
-                min_tot = min([minstrat, phase_upp_lim])
-                SAMPLE_VEC = RESULT_VEC[a][0][(RESULT_VEC[a][0] < min_tot) & (RESULT_VEC[a][0] > max_tot)]
-                SAMPLE_VEC_PROB = RESULT_VEC[a][1][(RESULT_VEC[a][0] < min_tot) & (RESULT_VEC[a][0] > max_tot)]
-                out_vec[a] = random.choices(SAMPLE_VEC, weights=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))[0]
+        below = {a: [CONTEXT_NO.index(j) for j in STRAT_VEC[a][0]] for a in phase_topo}  # should be less than this
+        above = {a: [CONTEXT_NO.index(j) for j in STRAT_VEC[a][1]] for a in phase_topo}  # should be greater than this
+        for layer in topological_layers(phase_topo, above):
+            max_tot = [max([GIBBS_THETAS[j][iter_num] for j in below[a]] + [phase_low_lim]) for a in layer]
+            min_tot = [min([out_vec[j] for j in above[a]] + [phase_upp_lim]) for a in layer]
+            values = truncated_samples(RNG, RESULT_VEC, layer, max_tot, min_tot)
+            if np.isnan(values).any():
+                raise ValueError("A context has no likelihood within its limits")
+            for a, value in zip(layer, values):
+                out_vec[a] = value
     return out_vec
 
 
-def GR_conv_check(chain1, chain2):
-    N = int(len(chain1) / 2)
-    W = (chain1[-N:].std() ** 2 + chain2[-N:].std() ** 2) / 2
-    mean1 = chain1[-N:].mean()
-    mean2 = chain2[-N:].mean()
-    mean = (mean1 + mean2) / 2
-    B = N * ((mean1 - mean) ** 2 + (mean2 - mean) ** 2)
-    var_theta = (1 - 1 / N) * W + 1 / N * B
-    # print("Gelmen-Rubin Diagnostic: ", np.sqrt(var_theta/W))
-    return np.sqrt(var_theta / W)
+def potential_scale_reduction(chains: np.ndarray) -> float:
+    """Gelman-Rubin potential scale reduction factor for equal length chains of samples for a single parameter
 
+    Parameters:
+        chains: An array of shape (number of chains, samples per chain)
 
-def phase_samp_func(key_reff, phi_reff, theta_vals, prev_phases, A, P, iter_num):
+    Returns:
+        R-hat, which approaches 1 as the chains converge, or nan if it is undefined
+    """
+    N = chains.shape[1]
+    W = chains.var(axis=1).mean()
+    means = chains.mean(axis=1)
+    B = N * ((means - means.mean()) ** 2).sum() / (len(chains) - 1)
+    var_theta = (1 - 1 / N) * W + 1 / N * B
+    # print("Gelmen-Rubin Diagnostic: ", np.sqrt(var_theta/W))
+    if W == 0:
+        return float("nan")
+    return np.sqrt(var_theta / W).item()
+
+
+def GR_conv_check(*chains):
+    """Gelman-Rubin convergence diagnostic (R-hat) for a single parameter, using the second half of each chain
+
+    Parameters:
+        chains: Two or more chains of samples for the same parameter. If chains differ in length, the shortest determines how many samples are used from each.
+
+    Returns:
+        The potential scale reduction factor, which approaches 1 as the chains converge, or nan if there are too few samples
+    """
+    N = int(min(len(chain) for chain in chains) / 2)
+    if len(chains) < 2 or N < 2:
+        return float("nan")
+    return potential_scale_reduction(np.array([np.asarray(chain, dtype=np.float64)[-N:] for chain in chains]))
+
+
+def split_rhat(samples) -> float:
+    """R-hat for a single chain, comparing the first and second halves of the samples
+
+    Returns:
+        The potential scale reduction factor between the two halves, or nan if there are too few samples
+    """
+    N = int(len(samples) / 2)
+    if N < 2:
+        return float("nan")
+    samples = np.asarray(samples, dtype=np.float64)
+    return potential_scale_reduction(np.stack([samples[:N], samples[-N:]]))
+
+
+def effective_sample_size(samples) -> float:
+    """Effective sample size of a chain of samples for a single parameter
+
+    Estimated from the autocorrelation of the chain, truncated using Geyer's initial monotone sequence.
+
+    Returns:
+        The effective sample size, or nan if there are too few samples or they do not vary
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    n = len(samples)
+    if n < 4:
+        return float("nan")
+    centred = samples - samples.mean()
+    # Autocovariance via the FFT, padded to avoid circular correlation
+    f = np.fft.rfft(centred, 2 * n)
+    acov = np.fft.irfft(f * np.conj(f))[:n]
+    if acov[0] <= 0:
+        return float("nan")
+    rho = acov / acov[0]
+    # Sums of adjacent pairs of autocorrelations are positive and decreasing for a reversible chain
+    pairs = rho[: n - n % 2].reshape(-1, 2).sum(axis=1)
+    negative = np.flatnonzero(pairs <= 0)
+    pairs = np.minimum.accumulate(pairs[: negative[0] if len(negative) > 0 else len(pairs)])
+    tau = max(-1 + 2 * pairs.sum(), 1 / math.log10(n))
+    return (n / tau).item()
+
+
+def phase_samp_func(
+    key_reff, phi_reff, theta_vals, prev_phases, A, P, iter_num, RNG: np.random.Generator | None = None
+):
     """Gives a list of initial phase boundary values for mcmc"""
+    RNG = np.random.default_rng() if RNG is None else RNG
     PHASE_INITS = []
     KEY_REF_1 = np.array(key_reff)
     PHASE_INITS.append(
-        np.random.uniform(max([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[0])[0].tolist()]), P)
+        uniform(RNG, max([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[0])[0].tolist()]), P)
     )
     for j in range(1, len(phi_reff)):
-        a_temp = np.random.uniform(
+        a_temp = uniform(
+            RNG,
             max([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[j])[0].tolist()]),
             min([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[j - 1])[0].tolist()]),
         )
@@ -127,7 +239,8 @@ def phase_samp_func(key_reff, phi_reff, theta_vals, prev_phases, A, P, iter_num)
             a_temp = [
                 a_temp,
                 (
-                    np.random.uniform(
+                    uniform(
+                        RNG,
                         max([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[j])[0].tolist()]),
                         min([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[j - 1])[0].tolist()]),
                     )
@@ -138,9 +251,7 @@ def phase_samp_func(key_reff, phi_reff, theta_vals, prev_phases, A, P, iter_num)
             a_temp = [a_temp]
         [PHASE_INITS.append(ref_ind) for ref_ind in a_temp]
     PHASE_INITS.append(
-        np.random.uniform(
-            min([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[-1])[0].tolist()]), A
-        )
+        uniform(RNG, min([theta_vals[i][iter_num + 1] for i in np.where(KEY_REF_1 == phi_reff[-1])[0].tolist()]), A)
     )
     PHASE_INITS1 = sorted(PHASE_INITS, reverse=True)
     return PHASE_INITS1
@@ -223,20 +334,195 @@ def likeli(x_val, s_err, theta, CALIBRATION_DATA):
     return value_theta
 
 
+def likelihood_grids(RCD_EST, RCD_ERR, a_val, p_val, CALIBRATION) -> Tuple[np.ndarray, np.ndarray]:
+    """Likelihoods for a set of radiocarbon determinations over a range of calendar years, computed together
+
+    Likelihoods are evaluated for each calendar year as per `likeli`, then linearly interpolated onto a 0.1 year grid and normalised.
+
+    Parameters:
+        RCD_EST: Radiocarbon determinations
+        RCD_ERR: Errors for each radiocarbon determination
+        a_val: The first calendar year of the range
+        p_val: The calendar year at the end of the range
+        CALIBRATION: The calibration curve, indexed by calendar year
+
+    Returns:
+        The 0.1 year grid of calendar years, and an array of normalised likelihoods with a row per determination
+    """
+    CALIBRATION = pd.DataFrame(CALIBRATION)
+    theta = np.arange(a_val, p_val)
+    carbon_year = CALIBRATION["Carbon_year"].loc[theta].to_numpy(dtype=np.float64)
+    carbon_error = CALIBRATION["Carbon_error"].loc[theta].to_numpy(dtype=np.float64)
+    x_val = np.asarray(RCD_EST, dtype=np.float64)[:, np.newaxis]
+    s_err = np.asarray(RCD_ERR, dtype=np.float64)[:, np.newaxis]
+    likelihoods = np.exp(-((x_val - carbon_year) ** 2) / (2 * (s_err**2 + carbon_error**2)))
+    # Linear interpolation onto the finer grid, holding the final year's value beyond the end of the range
+    intep_theta = np.linspace(a_val, p_val, ((p_val - a_val) * 10) + 1)
+    left = np.clip(np.searchsorted(theta, intep_theta, side="right") - 1, 0, max(len(theta) - 2, 0))
+    right = np.minimum(left + 1, len(theta) - 1)
+    weight = np.clip(intep_theta - theta[left], 0, 1)
+    interp_prob = likelihoods[:, left] * (1 - weight) + likelihoods[:, right] * weight
+    prob = interp_prob / interp_prob.sum(axis=1, keepdims=True)
+    return intep_theta, prob
+
+
 def likelihood_func(x_val, s_err, a_val, p_val, CALIBRATION_DATA):
     """Likelihood over a range"""
-    likelihood_vec = []
-    for theta in range(a_val, p_val):
-        value = likeli(x_val, s_err, theta, CALIBRATION_DATA)
-        likelihood_vec.append(value)
-    theta = np.array(range(a_val, p_val))
-    intep_theta = np.linspace(a_val, p_val, ((p_val - a_val) * 10) + 1)
-    interp_prob = np.interp(intep_theta, theta, likelihood_vec)
-    prob = interp_prob / sum(interp_prob)
-    lhood_df = [intep_theta, prob]
+    intep_theta, prob = likelihood_grids([x_val], [s_err], a_val, p_val, CALIBRATION_DATA)
+    lhood_df = [intep_theta, prob[0], cumulative_likelihood(prob[0])]
     return lhood_df
 
 
+def cumulative_likelihood(prob: np.ndarray) -> np.ndarray:
+    """Prefix sums of a likelihood grid, allowing the sum over any window of the grid to be found in constant time
+
+    Forward sums are held in the first row, `sums[0, i] == prob[:i].sum()`, and suffix sums in the second, `sums[1, i] == prob[i:].sum()`. Both are kept so that windows in either tail of the likelihood can be summed without cancellation against the mass in the rest of the grid.
+
+    Parameters:
+        prob: The likelihood grid for a single determination, or an array of grids with a row per determination
+
+    Returns:
+        An array of shape (2, len(prob) + 1), or (2, rows, columns + 1) for several grids
+    """
+    prob = np.asarray(prob)
+    sums = np.zeros((2,) + prob.shape[:-1] + (prob.shape[-1] + 1,), dtype=np.float64)
+    np.cumsum(prob, axis=-1, out=sums[0, ..., 1:])
+    sums[1, ..., :-1] = np.cumsum(prob[..., ::-1], axis=-1)[..., ::-1]
+    return sums
+
+
+def stack_likelihoods(RESULT_VEC) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the likelihood grids and prefix sums for every context as two arrays, for vectorised evaluation
+
+    `initialise` returns entries which are views of a single array of likelihoods and a single array of prefix sums, which are returned without copying. Otherwise (e.g. after RESULT_VEC has been sent to a worker process), the entries are copied into new arrays.
+
+    Returns:
+        The likelihoods with shape (K, n), and the prefix sums with shape (2, K, n + 1)
+    """
+
+    def stacked(rows: List[np.ndarray], axis: int) -> np.ndarray:
+        base = rows[0].base if len(rows) > 0 else None
+        index = (slice(None),) * axis
+        if (
+            isinstance(base, np.ndarray)
+            and base.ndim == rows[0].ndim + 1
+            and base.shape[axis] == len(rows)
+            and all(
+                row.base is base and row.__array_interface__ == base[index + (k,)].__array_interface__
+                for k, row in enumerate(rows)
+            )
+        ):
+            return base
+        return np.stack(rows, axis=axis)
+
+    return stacked([entry[1] for entry in RESULT_VEC], 0), stacked([entry[2] for entry in RESULT_VEC], 1)
+
+
+def window_sum(sums: np.ndarray, low: int, up: int) -> float | None:
+    """Sum of a window of a likelihood grid, from prefix sums produced by `cumulative_likelihood`
+
+    Equivalent to `prob[low:up].sum()`, including python slicing semantics for out of range or negative indices.
+
+    Returns:
+        The sum of the window, or None if the window is empty
+    """
+    start, stop, _ = slice(low, up).indices(sums.shape[1] - 1)
+    if stop <= start:
+        return None
+    # Use whichever of the forward or suffix sums has the smaller magnitude, to limit rounding error
+    if sums[0, stop] <= sums[1, start]:
+        total = sums[0, stop] - sums[0, start]
+    else:
+        total = sums[1, start] - sums[1, stop]
+    return max(total.item(), 0.0)
+
+
+def truncated_quantile(RESULT, low: float, up: float, u: float) -> float | None:
+    """Invert the CDF of a likelihood grid, truncated to the open interval (low, up)
+
+    Uses the prefix sums from `cumulative_likelihood`, so only three binary searches are needed and nothing is allocated. As in `window_sum`, the suffix sums are used for windows in the upper tail of the likelihood, to limit rounding error.
+
+    Parameters:
+        RESULT: The likelihood grid, its likelihoods and their prefix sums for a single determination, as in `RESULT_VEC`
+        low: The exclusive lower limit
+        up: The exclusive upper limit
+        u: A quantile in [0, 1)
+
+    Returns:
+        The value from the grid at quantile u, or None if the window is empty or has no likelihood
+    """
+    grid, _, sums = RESULT
+    lo = np.searchsorted(grid, low, side="right")
+    hi = np.searchsorted(grid, up, side="left")
+    if hi <= lo:
+        return None
+    forward, suffix = sums
+    if forward[hi] <= suffix[lo]:
+        total = forward[hi] - forward[lo]
+        if not total > 0:
+            return None
+        i = np.searchsorted(forward, forward[lo] + u * total, side="right") - 1
+    else:
+        total = suffix[lo] - suffix[hi]
+        if not total > 0:
+            return None
+        # The suffix sums are decreasing, so search them in reverse
+        i = len(grid) - np.searchsorted(suffix[::-1], suffix[lo] - u * total, side="left")
+    return grid[min(max(i, lo), hi - 1)]
+
+
+def truncated_samples(RNG: np.random.Generator, RESULT_VEC, INDICES, LOW, UP) -> np.ndarray:
+    """Draw calendar years for several contexts from their likelihood, each truncated to an open interval
+
+    Equivalent to choosing from the grid values strictly between each pair of limits, weighted by their likelihood, but by inverse CDF sampling with `truncated_quantile` rather than copying each window. A single batch of uniform variates is drawn from RNG, one per context.
+
+    Parameters:
+        RNG: The random number generator
+        RESULT_VEC: Per-context likelihood grids and their prefix sums, as returned by `initialise`
+        INDICES: Indices into RESULT_VEC of the contexts to draw
+        LOW: Exclusive lower limit per context, or a single limit for all contexts
+        UP: Exclusive upper limit per context, or a single limit for all contexts
+
+    Returns:
+        An array with the value drawn for each context, which is NaN where the window is empty or has no likelihood
+    """
+    INDICES = np.asarray(INDICES, dtype=np.intp)
+    LOW = np.broadcast_to(np.asarray(LOW, dtype=np.float64), INDICES.shape)
+    UP = np.broadcast_to(np.asarray(UP, dtype=np.float64), INDICES.shape)
+    out = np.full(INDICES.shape, np.nan)
+    for j, (k, u) in enumerate(zip(INDICES, RNG.random(len(INDICES)))):
+        value = truncated_quantile(RESULT_VEC[k], LOW[j], UP[j], u)
+        if value is not None:
+            out[j] = value
+    return out
+
+
+def topological_layers(ORDER, DEPENDENCIES) -> List[List[int]]:
+    """Group items into layers, where each item only depends on items in earlier layers
+
+    Items within a layer do not depend on each other, so they can be sampled together.
+
+    Parameters:
+        ORDER: The items, in a topological order
+        DEPENDENCIES: A mapping from each item to the items it depends on. Dependencies not in ORDER are ignored
+
+    Returns:
+        A list of layers, with the items in each layer in the same order as ORDER
+
+    Raises:
+        graphlib.CycleError: If the dependencies are cyclic
+    """
+    position = {k: i for i, k in enumerate(ORDER)}
+    sorter = graphlib.TopologicalSorter({k: [d for d in DEPENDENCIES[k] if d in position] for k in ORDER})
+    sorter.prepare()
+    layers = []
+    while sorter.is_active():
+        layer = sorted(sorter.get_ready(), key=position.get)
+        sorter.done(*layer)
+        layers.append(layer)
+    return layers
+
+
 def strat_rel(site_dict, key, i_index, THETAS, CONTEXT_NO):
     """Gives nodes above and below a date"""
     upstrat = site_dict[key]["dates"][i_index][3][0]
@@ -294,77 +580,6 @@ def dict_seek_ordered_new(A, P, i_seek, key, site_dict, THETAS, CONTEXT_NO, RCD_
     return x_temp, x_len
 
 
-def dict_seek_ordered(A, P, i_seek, key, site_dict, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION):
-    """Calc probability in a dictionary"""
-    llhood = site_dict[key]["dates"][i_seek][1]  # array of likelihood data for the context
-    # phase_len = site_dict[key]["boundaries"][1] - site_dict[key]["boundaries"][0] #phase length
-    like1 = llhood[0:][0]  # array of thetas
-    like2 = llhood[1:][0]  # likehood for each theta
-    cont = site_dict[key]["dates"][i_seek][2]  # context number
-    alpha = site_dict[key]["boundaries"][1]  # alpha for the phase this context is in
-    beta = site_dict[key]["boundaries"][0]  # beta for the phase that this context is in
-    # get dates of contexts that are stratigraphically linked to the context in question
-    strat_up, strat_low = strat_rel(site_dict, key, i_seek, THETAS, CONTEXT_NO)
-    cont_type = site_dict[key]["dates"][i_seek][4]
-    if cont_type == "residual":
-        up = int((alpha - A + 0.05) * 10) + 1  # faster version on np.where
-        low = 0  # as above
-        vec_2_up = int(((min(strat_up, alpha) - A) + 0.05) * 10) + 1  # as in lines with up and low
-        vec_2_low = 0  # see above
-        phase_len = site_dict[key]["boundaries"][1] - like1[low] + 1  # phase length
-    elif cont_type == "intrustive":
-        up = len(like2) - 1  # faster version on np.where
-        low = int((beta - A + 0.05) * 10)  # as above
-        vec_2_up = len(like2) - 1  # as in lines with up and low
-        vec_2_low = int(((max(strat_low, beta) - A) + 0.05) * 10)  # see above
-        phase_len = P - site_dict[key]["boundaries"][0]  # phase length
-    else:
-        up = int((alpha - A + 0.05) * 10) + 1  # faster version on np.where
-        low = int((beta - A + 0.05) * 10)  # as above
-        vec_2_up = int(((min(strat_up, alpha) - A) + 0.05) * 10) + 1  # as in lines with up and low
-        vec_2_low = int(((max(strat_low, beta) - A) + 0.05) * 10)  # see above
-        phase_len = site_dict[key]["boundaries"][1] - site_dict[key]["boundaries"][0]  # phase length
-    temp_vec = like2[low:up]  # two vectors of proablilities that need summing (this and the row below)
-    temp_vec_2 = like2[vec_2_low:vec_2_up]
-    if len(temp_vec_2) == 0:  # checking it's not too small that the likelihood func things it's prob 0
-        ref = CONTEXT_NO.index(cont)
-        temp_vec_2 = np.array(
-            likeli(RCD_EST[ref], RCD_ERR[ref], float(int(site_dict[key]["dates"][i_seek][0])), CALIBRATION)
-        )
-    if len(temp_vec) == 0:  # checking it's not too small that the likelihood func things it's prob 0
-        ref = CONTEXT_NO.index(cont)
-        temp_vec = np.array(
-            likeli(RCD_EST[ref], RCD_ERR[ref], float(int(site_dict[key]["dates"][i_seek][0])), CALIBRATION)
-        )
-    date = site_dict[key]["dates"][i_seek][0]
-    date_ref = int((date - A + 0.05) * 10)
-    if (
-        date_ref >= len(like1) or phase_len == 0 or temp_vec_2.sum() == 0
-    ):  # checking we haven't sampled outside the realms of the likelihood
-        x_temp = 0
-        x_len = 0
-    else:
-        x_temp = like2[date_ref]
-        x_len = (x_temp / phase_len) * (temp_vec.sum() / temp_vec_2.sum())
-    if math.isnan(x_len):
-        x_temp = 0
-        x_len = 0
-
-    return x_temp, x_len
-
-
-def post_h(A, P, site_dict, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION):
-    """Calculates acceptance probability"""
-    h_vec = [
-        dict_seek_ordered(A, P, j[0], i, site_dict, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)
-        for i in site_dict.keys()
-        for j in enumerate(site_dict[i]["dates"])
-    ]
-    hh_1 = [i[0] for i in h_vec]
-    hh_2 = [i[1] for i in h_vec]
-    return hh_1, hh_2
-
-
 def dict_seek_4(i_dict, key, site_dict):
     """Finds probabilities for all paramters in sample"""
     phase_len = site_dict[key]["boundaries"][0] - site_dict[key]["boundaries"][1]
@@ -402,15 +617,15 @@ def dict_update(test_dict_2, post_t, post_p, inter, inter2, POST_PHASE, PHI_REF)
     return test_dict_2
 
 
-def phase_bd_init_func(key_reff, phi_reff, theta_initt, prev_phases, A, P):
+def phase_bd_init_func(key_reff, phi_reff, theta_initt, prev_phases, A, P, RNG: np.random.Generator | None = None):
     """Gives a list of inital phase boundary values for MCMC"""
+    RNG = np.random.default_rng() if RNG is None else RNG
     PHASE_INITS = []
     KEY_REF_1 = np.array(key_reff)
-    PHASE_INITS.append(
-        np.random.uniform(max([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[0])[0].tolist()]), P)
-    )
+    PHASE_INITS.append(uniform(RNG, max([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[0])[0].tolist()]), P))
     for j in range(1, len(phi_reff)):
-        a_temp = np.random.uniform(
+        a_temp = uniform(
+            RNG,
             max([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[j])[0].tolist()]),
             min([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[j - 1])[0].tolist()]),
         )
@@ -418,7 +633,8 @@ def phase_bd_init_func(key_reff, phi_reff, theta_initt, prev_phases, A, P):
             a_temp = [
                 a_temp,
                 (
-                    np.random.uniform(
+                    uniform(
+                        RNG,
                         max([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[j])[0].tolist()]),
                         min([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[j - 1])[0].tolist()]),
                     )
@@ -428,18 +644,17 @@ def phase_bd_init_func(key_reff, phi_reff, theta_initt, prev_phases, A, P):
         else:
             a_temp = [a_temp]
         [PHASE_INITS.append(ref_ind) for ref_ind in a_temp]
-    PHASE_INITS.append(
-        np.random.uniform(min([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[-1])[0].tolist()]), A)
-    )
+    PHASE_INITS.append(uniform(RNG, min([theta_initt[i] for i in np.where(KEY_REF_1 == phi_reff[-1])[0].tolist()]), A))
     PHASE_INITS1 = sorted(PHASE_INITS, reverse=True)
     return PHASE_INITS1
 
 
-def theta_init_func(KEY_REF1, PHI_REF1, RESULT_VEC1):
+def theta_init_func(KEY_REF1, PHI_REF1, RESULT_VEC1, RNG: np.random.Generator | None = None):
     """Gives a list of inital theta values for MCMC"""
+    RNG = np.random.default_rng() if RNG is None else RNG
     out_vec = [0] * len(KEY_REF1)
     uplimref = np.where(np.array(KEY_REF1) == PHI_REF1[0])[0].tolist()
-    up_lim_vec = [np.random.choice(RESULT_VEC1[date][0], p=RESULT_VEC1[date][1]).item() for date in uplimref]
+    up_lim_vec = [RNG.choice(RESULT_VEC1[date][0], p=RESULT_VEC1[date][1]).item() for date in uplimref]
     for i, a in enumerate(uplimref):
         out_vec[a] = up_lim_vec[i]
     prev_min = min(up_lim_vec)
@@ -447,7 +662,7 @@ def theta_init_func(KEY_REF1, PHI_REF1, RESULT_VEC1):
         ref_vec = np.where(np.array(KEY_REF1) == PHI_REF1[date])[0].tolist()
         theta, prob = RESULT_VEC1[date][0], RESULT_VEC1[date][1]
         theta_vals = [
-            np.random.choice(theta[theta < prev_min], p=prob[theta < prev_min] / sum(prob[theta < prev_min]))
+            RNG.choice(theta[theta < prev_min], p=prob[theta < prev_min] / sum(prob[theta < prev_min]))
             for date in ref_vec
         ]
         prev_min = min(theta_vals)
@@ -456,26 +671,28 @@ def theta_init_func(KEY_REF1, PHI_REF1, RESULT_VEC1):
     return out_vec
 
 
-def theta_init_func_n(KEY_REF1, PHI_REF1, RESULT_VEC1, STRAT_VEC, P, CONTEXT_NO, TOPO_SORT):
-    """Gives a list of inital theta values for MCMC"""
+def theta_init_func_n(
+    KEY_REF1, PHI_REF1, RESULT_VEC1, STRAT_VEC, P, CONTEXT_NO, TOPO_SORT, RNG: np.random.Generator | None = None
+):
+    """Gives a list of inital theta values for MCMC
+
+    Contexts are drawn group by group, in batches of contexts within a group which do not depend on each other, see `truncated_samples` and `topological_layers`.
+    """
+    RNG = np.random.default_rng() if RNG is None else RNG
     out_vec = [0] * len(KEY_REF1)
     prev_min = P
     for date in range(0, len(PHI_REF1)):
         ref_vec = np.where(np.array(KEY_REF1) == PHI_REF1[date])[0].tolist()
         phase = [CONTEXT_NO[i] for i in ref_vec]
-        phase_topo = [i for i in TOPO_SORT if i in phase]
-        for i in phase_topo:
-            a = np.where(np.array(CONTEXT_NO) == i)[0][0].item()
-            low = STRAT_VEC[a][1]
-            if len(low) == 0:
-                SAMPLE_VEC = RESULT_VEC1[a][0][RESULT_VEC1[a][0] < prev_min]
-                SAMPLE_VEC_PROB = RESULT_VEC1[a][1][RESULT_VEC1[a][0] < prev_min]
-                out_vec[a] = np.random.choice(SAMPLE_VEC, p=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))
-            else:
-                minstrat = min([out_vec[np.where(np.array(CONTEXT_NO) == j)[0][0].item()] for j in low])
-                SAMPLE_VEC = RESULT_VEC1[a][0][RESULT_VEC1[a][0] < min(minstrat, prev_min)]
-                SAMPLE_VEC_PROB = RESULT_VEC1[a][1][RESULT_VEC1[a][0] < min(minstrat, prev_min)]
-                out_vec[a] = np.random.choice(SAMPLE_VEC, p=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))
+        phase_topo = [CONTEXT_NO.index(i) for i in TOPO_SORT if i in phase]
+        low = {a: [CONTEXT_NO.index(j) for j in STRAT_VEC[a][1]] for a in phase_topo}
+        for layer in topological_layers(phase_topo, low):
+            up = [min([out_vec[j] for j in low[a]] + [prev_min]) for a in layer]
+            values = truncated_samples(RNG, RESULT_VEC1, layer, -np.inf, up)
+            if np.isnan(values).any():
+                raise ValueError("A context has no likelihood within its limits")
+            for a, value in zip(layer, values):
+                out_vec[a] = value
         prev_min = min([d for d in out_vec if d != 0])
     return out_vec
 
@@ -726,21 +943,190 @@ def overlap_samp_2(theta_samp, phis_samp, m, A, P, SAMP_VEC_TRACK, KEY_REF, PHI_
     return limits
 
 
-def initialise(CALIBRATION, RCD_EST, RCD_ERR):
+# Group boundary sampling functions, indexed by the type of boundary, and the relationships with the previous and next groups
+PHI_SAMP_DICT = {
+    "upper": {
+        "start": {
+            "abutting": upp_samp_1,
+            "overlap": upp_samp_2,
+            "gap": upp_samp_1,
+            "end": upp_samp_1,
+        },
+        "abutting": {"abutting": upp_samp_3, "overlap": upp_samp_4, "gap": upp_samp_3, "end": upp_samp_3},
+        "overlap": {"abutting": upp_samp_5, "overlap": upp_samp_5, "gap": upp_samp_5, "end": upp_samp_5},
+        "gap": {"abutting": upp_samp_6, "overlap": upp_samp_7, "gap": upp_samp_6, "end": upp_samp_6},
+    },
+    "lower": {
+        "start": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+        "abutting": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+        "overlap": {"abutting": low_samp_2, "overlap": low_samp_3, "gap": low_samp_5, "end": low_samp_7},
+        "gap": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+    },
+    "combined": {
+        "start": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+        "abutting": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+        "overlap": {"abutting": low_samp_2, "overlap": low_samp_3, "gap": low_samp_5, "end": low_samp_7},
+        "gap": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
+    },
+    "overlap_upper": {
+        "start": {
+            "abutting": overlap_samp_1,
+            "overlap": overlap_samp_1,
+            "gap": overlap_samp_1,
+            "end": overlap_samp_1,
+        },
+        "abutting": {
+            "abutting": overlap_samp_1,
+            "overlap": overlap_samp_1,
+            "gap": overlap_samp_1,
+            "end": overlap_samp_1,
+        },
+        "overlap": {
+            "abutting": overlap_samp_1,
+            "overlap": overlap_samp_1,
+            "gap": overlap_samp_1,
+            "end": overlap_samp_1,
+        },
+        "gap": {
+            "abutting": overlap_samp_1,
+            "overlap": overlap_samp_1,
+            "gap": overlap_samp_1,
+            "end": overlap_samp_1,
+        },
+    },
+    "overlap_beta": {
+        "start": {
+            "abutting": overlap_samp_2,
+            "overlap": overlap_samp_2,
+            "gap": overlap_samp_2,
+            "end": overlap_samp_2,
+        },
+        "abutting": {
+            "abutting": overlap_samp_2,
+            "overlap": overlap_samp_2,
+            "gap": overlap_samp_2,
+            "end": overlap_samp_2,
+        },
+        "overlap": {
+            "abutting": overlap_samp_2,
+            "overlap": overlap_samp_2,
+            "gap": overlap_samp_2,
+            "end": overlap_samp_2,
+        },
+        "gap": {
+            "abutting": overlap_samp_2,
+            "overlap": overlap_samp_2,
+            "gap": overlap_samp_2,
+            "end": overlap_samp_2,
+        },
+    },
+}
+
+
+# The limits imposed by each group boundary sampling function on boundary m, as (lower, upper). Each limit is None for the edge of the calendar range (A or P), or a pair of offsets from m: into SAMP_VEC_TRACK for the group whose normal contexts bound the boundary (None if no group does), and to the neighbouring boundary which bounds it.
+PHI_SAMP_LIMITS = {
+    upp_samp_1: ((0, 1), None),
+    upp_samp_2: ((0, 2), None),
+    upp_samp_3: ((0, 1), (-1, -2)),
+    upp_samp_4: ((-1, 2), (0, -2)),
+    upp_samp_5: ((0, -1), (None, -2)),
+    upp_samp_6: ((0, 1), (None, -1)),
+    upp_samp_7: ((0, 2), (None, -1)),
+    upp_samp_8: ((0, -1), (None, -3)),
+    low_samp_1: ((1, 1), (0, -1)),
+    low_samp_2: ((1, 1), (0, -2)),
+    low_samp_3: ((None, 2), (0, 1)),
+    low_samp_4: ((None, 1), (0, -1)),
+    low_samp_5: ((None, 1), (0, -2)),
+    low_samp_6: (None, (0, -1)),
+    low_samp_7: (None, (0, -2)),
+    overlap_samp_1: ((0, -1), (None, -3)),
+    overlap_samp_2: ((None, 3), (0, 1)),
+}
+
+
+@dataclass
+class BoundaryPlan:
+    """The group boundary sampling functions chosen from `PHI_SAMP_DICT`, compiled into index arrays
+
+    For each group boundary, the lower limit of a proposal is the maximum of the normal contexts in `lower_group` and the boundary `lower_phi`, and the upper limit is the minimum of the normal contexts in `upper_group` and the boundary `upper_phi`. An index of -1 means the limit does not depend on a group or boundary, and a limit which depends on neither is the edge of the calendar range. This gives the same limits as calling the sampling function, without looking it up or scanning every context for each proposal.
+    """
+
+    lower_group: np.ndarray
+    """Index into `PHI_REF` of the group whose oldest normal context bounds each boundary from below, or -1"""
+
+    lower_phi: np.ndarray
+    """Index of the boundary which bounds each boundary from below, or -1"""
+
+    upper_group: np.ndarray
+    """Index into `PHI_REF` of the group whose youngest normal context bounds each boundary from above, or -1"""
+
+    upper_phi: np.ndarray
+    """Index of the boundary which bounds each boundary from above, or -1"""
+
+    @classmethod
+    def from_phases(cls, POST_PHASE, PREV_PHASE, PHI_REF, SAMPLING_FUNCS=None) -> "BoundaryPlan":
+        """Compile the sampling plan for the group boundaries of a model
+
+        Parameters:
+            POST_PHASE: The relationship of each group with the next group
+            PREV_PHASE: The relationship of each group with the previous group
+            PHI_REF: Group labels, in order
+            SAMPLING_FUNCS: The nested dictionary of sampling functions to choose from, defaulting to `PHI_SAMP_DICT`
+
+        Returns:
+            The compiled plan
+
+        Raises:
+            IndexError: If a sampling function refers to a group or boundary which does not exist for this model
+        """
+        if SAMPLING_FUNCS is None:
+            SAMPLING_FUNCS = PHI_SAMP_DICT
+        STEP_1, STEP_2, STEP_3, SAMP_VEC_TRACK = how_to_phase_samp(POST_PHASE, PREV_PHASE)
+        M = len(STEP_1)
+        arrays = np.full((4, M), -1, dtype=np.intp)
+        for m in range(M):
+            limits = PHI_SAMP_LIMITS[SAMPLING_FUNCS[STEP_1[m]][STEP_2[m]][STEP_3[m]]]
+            for side, limit in enumerate(limits):
+                if limit is None:
+                    continue
+                group_offset, phi_offset = limit
+                # Offsets are resolved as list indices, so negative indices wrap as they do in the sampling functions
+                if group_offset is not None:
+                    arrays[2 * side, m] = PHI_REF.index(PHI_REF[SAMP_VEC_TRACK[m + group_offset]])
+                arrays[2 * side + 1, m] = range(M)[m + phi_offset]
+        return cls(*arrays)
+
+
+def initialise(CALIBRATION, RCD_EST, RCD_ERR, LIKELIHOOD_CACHE: LikelihoodCache | None = None):
+    """Find the calendar range considered during MCMC, and the likelihood of each radiocarbon determination over it
+
+    Parameters:
+        CALIBRATION: The calibration curve
+        RCD_EST: Radiocarbon determinations
+        RCD_ERR: Errors for each radiocarbon determination
+        LIKELIHOOD_CACHE: An optional on-disk cache of likelihood grids, used to avoid recomputing likelihoods for unchanged determinations
+
+    Returns:
+        The newer and older limits of the calendar range (cal BP), and a list containing the likelihood grid and its prefix sums for each determination
+    """
     #  method  = 'squeeze'
-    CALIBRATION_DATA = CALIBRATION.to_dict()
-    x_min = min(RCD_EST)
+    carbon_year = CALIBRATION["Carbon_year"].to_numpy()
     s = max(RCD_ERR)
-    x_max = max(RCD_EST)
-    mydict = CALIBRATION_DATA["Carbon_year"]
-    a = list(mydict.values())
-    p = min(range(len(a)), key=lambda i: abs(a[i] - x_min))
-    l = min(range(len(a)), key=lambda i: abs(a[i] - x_max))
+    # The curve is not monotonic, so use the first closest calendar year rather than a binary search
+    p = int(np.argmin(np.abs(carbon_year - min(RCD_EST))))
+    l = int(np.argmin(np.abs(carbon_year - max(RCD_EST))))
     A = max(p - 20 * s, 0)
     P = min(l + 20 * s, 50000)
     # initiating  likelihoods
-    RCD_S = [list(x) for x in zip(RCD_EST, RCD_ERR)]
-    RESULT_VEC = [likelihood_func(date[0], date[1], A, P, CALIBRATION_DATA) for date in RCD_S]
+    if LIKELIHOOD_CACHE is not None:
+        intep_theta, probs = LIKELIHOOD_CACHE.likelihood_grids(RCD_EST, RCD_ERR, A, P, CALIBRATION)
+    else:
+        intep_theta, probs = likelihood_grids(RCD_EST, RCD_ERR, A, P, CALIBRATION)
+    # Entries are views of a single table of likelihoods and of their prefix sums, see stack_likelihoods
+    probs = np.asarray(probs, dtype=np.float64)
+    sums = cumulative_likelihood(probs)
+    RESULT_VEC = [[intep_theta, probs[k], sums[:, k]] for k in range(len(probs))]
     return A, P, RESULT_VEC
 
 
@@ -836,397 +1222,1119 @@ def get_hpd_intervals(CONTEXT_NO, ACCEPT, PHI_ACCEPT):
     hpd_df.to_csv("resid_hpd_intervals_phis_correct", index=False)
 
 
-def gibbs_code(
-    iter_num,
-    RESULT_VEC,
-    A,
-    P,
-    KEY_REF,
-    PHI_REF,
-    STRAT_VEC,
-    CONTEXT_NO,
-    TOPO_SORT,
-    PREV_PHASE,
-    POST_PHASE,
-    PHI_SAMP_DICT,
-    CONT_TYPE,
-    PROGRESS_IO: Writable | None = None,
-):
-    THETA_INITS = theta_init_func_n(KEY_REF, PHI_REF, RESULT_VEC, STRAT_VEC, P, CONTEXT_NO, TOPO_SORT)
-    PHASE_BOUNDARY_INITS = phase_bd_init_func(KEY_REF, PHI_REF, THETA_INITS, PREV_PHASE, A, P)
-    TEST_DICT_1, POST_THETAS, POST_PHIS, SITE_DICT_TEST_1 = dict_form_func(
-        THETA_INITS, RESULT_VEC, CONTEXT_NO, STRAT_VEC, PHASE_BOUNDARY_INITS, POST_PHASE, PHI_REF, PREV_PHASE, CONT_TYPE
-    )
-    STEP_1, STEP_2, STEP_3, SAMP_VEC_TRACK = how_to_phase_samp(POST_PHASE, PREV_PHASE)
-    PHIS_VEC = PHASE_BOUNDARY_INITS
-    THETAS = THETA_INITS.copy()
-    ########################### figures out how to sample based on phase relationships
-    M = len(POST_PHIS)
-    P = 4000
-    POST_THETAS, POST_PHIS, POST_S = set_up_post_arrays(POST_THETAS, POST_PHIS, THETA_INITS, PHASE_BOUNDARY_INITS)
-    POST_S = []
-    for i in range(0, iter_num):
-        for k in range(len(THETA_INITS)):
-            SITE_DICT_TEST_1 = dict_update(SITE_DICT_TEST_1, POST_THETAS, POST_PHIS, i, i, POST_PHASE, PHI_REF)
-            key = KEY_REF[k]
-            a = [CONTEXT_NO[k] in d for d in SITE_DICT_TEST_1[key]["dates"]].index(True)
-            strat_single = strat_rel(SITE_DICT_TEST_1, key, a, THETAS, CONTEXT_NO)
-            low_bound = max(SITE_DICT_TEST_1[key]["boundaries"][0], strat_single[1])
-            up_bound = min(SITE_DICT_TEST_1[key]["boundaries"][1], strat_single[0])
-            SAMPLE_VEC = RESULT_VEC[k][0][(RESULT_VEC[k][0] < up_bound) & (RESULT_VEC[k][0] > low_bound)]
-            SAMPLE_VEC_PROB = RESULT_VEC[k][1][(RESULT_VEC[k][0] < up_bound) & (RESULT_VEC[k][0] > low_bound)]
-            THETAS[k] = random.choices(SAMPLE_VEC, weights=SAMPLE_VEC_PROB / sum(SAMPLE_VEC_PROB))[0]
-            POST_THETAS[k].append(THETAS[k])
-        for j in range(len(PHASE_BOUNDARY_INITS)):
-            k = gibbs_phis_gen(PREV_PHASE, PHI_REF)[j]
-            lims = PHI_SAMP_DICT[STEP_1[j]][STEP_2[j]][STEP_3[j]](
-                THETAS, PHIS_VEC, j, A, P, SAMP_VEC_TRACK, KEY_REF, PHI_REF, CONT_TYPE
+@dataclass
+class SamplerState:
+    """Array-backed state for a single chain of the squeeze sampler.
+
+    Replaces the nested site dictionaries (`SITE_DICT_TEST_*`) and the ever-growing `POST_THETAS` / `POST_PHIS` traces, which were rebuilt by `dict_update` and walked again by `post_h` for every proposal. Parameter values and the model structure are held in NumPy arrays which are updated in place, producing the same chain as the dictionary based implementation for a fixed seed.
+
+    Posterior terms are visited in the order the site dictionary used, i.e. by group in `PHI_REF` order, then by context index within each group.
+    """
+
+    A: int
+    """The newer limit of the calendar range (cal BP) considered during MCMC"""
+
+    P: int
+    """The older limit of the calendar range (cal BP) considered during MCMC"""
+
+    result_vec: List[List[np.ndarray]]
+    """Per-context likelihood grids and their prefix sums, as returned by `initialise`"""
+
+    rcd_est: List[int]
+    """Radiocarbon determination for each context"""
+
+    rcd_err: List[int]
+    """Radiocarbon error for each context"""
+
+    calibration: pd.DataFrame
+    """The calibration curve, used when a likelihood window is empty"""
+
+    cont_type: List[str]
+    """The type of each context, "normal", "residual" or "intrusive"."""
+
+    group: np.ndarray
+    """Index into `PHI_REF` of the group each context belongs to"""
+
+    group_lower: np.ndarray
+    """Index into the boundary vector of the lower (younger) boundary of each group"""
+
+    group_upper: np.ndarray
+    """Index into the boundary vector of the upper (older) boundary of each group"""
+
+    strat_above: List[np.ndarray]
+    """Per-context indices of the contexts stratigraphically above (younger than) each context"""
+
+    strat_below: List[np.ndarray]
+    """Per-context indices of the contexts stratigraphically below (older than) each context"""
+
+    terms: np.ndarray
+    """Context index of each posterior term, in site dictionary order"""
+
+    term_position: np.ndarray
+    """Position in `terms` of each context's posterior term, or -1 if the context does not contribute a term"""
+
+    strat_dependents: List[np.ndarray]
+    """Per-context indices of the contexts whose stratigraphic limits depend on each context, built from `STRAT_VEC`"""
+
+    strat_layers: List[np.ndarray]
+    """Context indices in layers from oldest to youngest, where no two contexts in a layer are stratigraphically related, so they can be drawn together by the Gibbs sampler"""
+
+    strat_above_padded: np.ndarray
+    """`strat_above` as an array with a row per context, padded with K, for vectorised evaluation of the stratigraphic limits"""
+
+    strat_below_padded: np.ndarray
+    """`strat_below` as an array with a row per context, padded with K"""
+
+    residual: np.ndarray
+    """If each context is residual"""
+
+    prob_table: np.ndarray
+    """The likelihood grid of every context, with shape (K, n), see `stack_likelihoods`"""
+
+    sum_table: np.ndarray
+    """The prefix sums of every context's likelihood grid, with shape (2, K, n + 1)"""
+
+    thetas: np.ndarray
+    """Current value of each context parameter"""
+
+    phis: np.ndarray
+    """Current value of each group boundary parameter, ordered from oldest to youngest"""
+
+    trace_thetas: np.ndarray
+    """Most recently recorded context parameters (formerly the last entry of each `POST_THETAS` list).
+
+    This is not always equal to `thetas`, as reverting a rejected shift or scale move is subject to rounding."""
+
+    trace_phis: np.ndarray
+    """Most recently recorded group boundary parameters (formerly the last entry of each `POST_PHIS` list)"""
+
+    log_likelihoods: np.ndarray = field(default=None)
+    """Per-term log posterior contributions for the current state, formerly `PREV_PROB_TEST`"""
+
+    log_densities: np.ndarray = field(default=None)
+    """Per-term log likelihood densities from the most recent boundary or shift move, used by the scale move"""
+
+    cached_grid: np.ndarray = field(default=None)
+    """Grid index and whole year of each context parameter the cached terms were evaluated for"""
+
+    cached_phis: np.ndarray = field(default=None)
+    """Group boundary parameters the cached terms were evaluated for"""
+
+    cached_log_densities: np.ndarray = field(default=None)
+    """Per-term log likelihood densities for `cached_grid` and `cached_phis`"""
+
+    cached_log_likelihoods: np.ndarray = field(default=None)
+    """Per-term log posterior contributions for `cached_grid` and `cached_phis`"""
+
+    accept: SampleBuffer = field(default=None)
+    """Accepted samples for each context, formerly `ACCEPT`"""
+
+    phi_accept: SampleBuffer = field(default=None)
+    """Accepted samples for each group boundary, formerly `PHI_ACCEPT`"""
+
+    all_samps_cont: SampleBuffer = field(default=None)
+    """Context parameters after every accepted move, formerly `ALL_SAMPS_CONT`"""
+
+    all_samps_phi: SampleBuffer = field(default=None)
+    """Group boundary parameters after every accepted move, formerly `ALL_SAMPS_PHI`"""
+
+    post_s: SampleBuffer = field(default=None)
+    """Sampled site spans in a single row, formerly `POST_S`"""
+
+    rng: np.random.Generator = field(default_factory=np.random.default_rng)
+    """The random number generator for this chain, used for every proposal and acceptance test"""
+
+    __term_structure: List[tuple] | None = field(default=None, init=False, repr=False, compare=False)
+    """For each context, the indices of its group boundaries, its stratigraphic neighbours and if it is residual, as python values for `log_posterior_terms`. Built when first required"""
+
+    boundary_plan: BoundaryPlan = field(default=None)
+    """The compiled limits for group boundary proposals"""
+
+    group_normal: List[np.ndarray] = field(default_factory=list)
+    """Per-group indices of the normal contexts in each group, which bound its boundaries"""
+
+    group_oldest: np.ndarray = field(default=None)
+    """Index of the oldest normal context in each group, or -1 if the group has no normal contexts.
+
+    Maintained as context parameters change, so boundary limits do not need to scan each group. Shift and scale moves preserve the order of context parameters, so only single context updates require this to be updated."""
+
+    group_youngest: np.ndarray = field(default=None)
+    """Index of the youngest normal context in each group, or -1 if the group has no normal contexts"""
+
+    iteration: int = 0
+    """The number of iterations performed"""
+
+    move_proposed: np.ndarray = field(default_factory=lambda: np.zeros(len(MOVES), dtype=np.int64))
+    """The number of proposals made by each move, in `MOVES` order"""
+
+    move_accepted: np.ndarray = field(default_factory=lambda: np.zeros(len(MOVES), dtype=np.int64))
+    """The number of proposals accepted for each move, in `MOVES` order"""
+
+    shift_width: float = 1.0
+    """Multiplier for the width of the shift move's proposal, adapted by `ProposalTuning`"""
+
+    tuned_proposed: np.ndarray = field(default_factory=lambda: np.zeros(len(MOVES), dtype=np.int64))
+    """`move_proposed` when the proposal widths were last adapted"""
+
+    tuned_accepted: np.ndarray = field(default_factory=lambda: np.zeros(len(MOVES), dtype=np.int64))
+    """`move_accepted` when the proposal widths were last adapted"""
+
+    @classmethod
+    def from_inputs(
+        cls,
+        THETA_INITS,
+        PHASE_BOUNDARY_INITS,
+        RESULT_VEC,
+        A,
+        P,
+        RCD_ERR,
+        RCD_EST,
+        KEY_REF,
+        STRAT_VEC,
+        CONTEXT_NO,
+        POST_PHASE,
+        PREV_PHASE,
+        PHI_REF,
+        CALIBRATION,
+        CONT_TYPE,
+        SAMPLE_DTYPE="float64",
+        SAMPLE_DIRECTORY: pathlib.Path | None = None,
+        RNG: np.random.Generator | None = None,
+        SAMPLING_FUNCS=None,
+    ) -> "SamplerState":
+        """Build the sampler state from initial parameter values and the inputs to `run_MCMC`
+
+        Parameters:
+            SAMPLING_FUNCS: The group boundary sampling functions to compile into a `BoundaryPlan`, defaulting to `PHI_SAMP_DICT`
+            SAMPLE_DTYPE: The dtype recorded samples are stored as
+            SAMPLE_DIRECTORY: If provided, samples are streamed to memory-mapped files in this directory, see `SampleBuffer`
+            RNG: The random number generator for the chain. If None, a generator is created from fresh entropy
+
+        Returns:
+            A `SamplerState` with the posterior terms evaluated for the initial values
+        """
+        group = np.array([PHI_REF.index(key) if key in PHI_REF else -1 for key in KEY_REF], dtype=np.intp)
+        # Boundary indices per group, following the same walk as phase_limits
+        upper, lower = [], []
+        i_phase = 0
+        for rel in POST_PHASE:
+            upper.append(i_phase)
+            i_phase = i_phase + 1
+            lower.append(i_phase)
+            if rel != "abutting":
+                i_phase = i_phase + 1
+        terms = [k for g in range(len(PHI_REF)) for k in range(len(KEY_REF)) if group[k] == g]
+        term_position = np.full(len(KEY_REF), -1, dtype=np.intp)
+        term_position[terms] = np.arange(len(terms))
+        strat_above = [np.array([CONTEXT_NO.index(c) for c in up], dtype=np.intp) for up, _ in STRAT_VEC]
+        strat_below = [np.array([CONTEXT_NO.index(c) for c in low], dtype=np.intp) for _, low in STRAT_VEC]
+        dependents = [set() for _ in CONTEXT_NO]
+        for j, neighbours in enumerate(zip(strat_above, strat_below)):
+            for k in np.concatenate(neighbours):
+                dependents[k].add(j)
+        # Contexts below each context, and each context above it, are older and so in an earlier layer
+        older = [set(below.tolist()) for below in strat_below]
+        width = max([1] + [len(i) for i in strat_above + strat_below])
+        padded = [
+            np.array(
+                [np.pad(i, (0, width - len(i)), constant_values=len(CONTEXT_NO)) for i in neighbours], dtype=np.intp
             )
-            bounds = SITE_DICT_TEST_1[str(k)]["boundaries"]
-            phi_vals = np.linspace(lims[0] + 0.1, lims[1] - 0.1, num=int((lims[1] - lims[0]) * 20))
-            length = len(SITE_DICT_TEST_1[k]["dates"])
-            if j == 0:
-                phase_samps = np.array([1 / ((i - bounds[0]) ** length) for i in phi_vals])
-            else:
-                phase_samps = np.array([1 / ((bounds[1] - i) ** length) for i in phi_vals])
-            weights = phase_samps / sum(phase_samps)
-            PHIS_VEC[j] = random.choices(phi_vals, weights)[0]
-            POST_PHIS[j].append(PHIS_VEC[j])
-        POST_S.append(PHIS_VEC[0] - PHIS_VEC[M - 1])
-    PHI_ACCEPT, ACCEPT = POST_PHIS, POST_THETAS
-    return PHI_ACCEPT, ACCEPT, POST_S
+            for neighbours in (strat_above, strat_below)
+        ]
+        prob_table, sum_table = stack_likelihoods(RESULT_VEC)
+        for k, above in enumerate(strat_above):
+            for j in above:
+                older[j].add(k)
+        state = cls(
+            A=A,
+            P=P,
+            result_vec=RESULT_VEC,
+            rcd_est=RCD_EST,
+            rcd_err=RCD_ERR,
+            calibration=CALIBRATION,
+            cont_type=list(CONT_TYPE),
+            group=group,
+            group_lower=np.array(lower, dtype=np.intp),
+            group_upper=np.array(upper, dtype=np.intp),
+            strat_above=strat_above,
+            strat_below=strat_below,
+            terms=np.array(terms, dtype=np.intp),
+            term_position=term_position,
+            strat_dependents=[np.array(sorted(d), dtype=np.intp) for d in dependents],
+            strat_layers=[
+                np.array(layer, dtype=np.intp) for layer in topological_layers(range(len(CONTEXT_NO)), older)
+            ],
+            strat_above_padded=padded[0].reshape(len(CONTEXT_NO), width),
+            strat_below_padded=padded[1].reshape(len(CONTEXT_NO), width),
+            residual=np.array([t == "residual" for t in CONT_TYPE], dtype=bool),
+            prob_table=prob_table,
+            sum_table=sum_table,
+            thetas=np.array(THETA_INITS, dtype=np.float64),
+            phis=np.array(PHASE_BOUNDARY_INITS, dtype=np.float64),
+            trace_thetas=np.array(THETA_INITS, dtype=np.float64),
+            trace_phis=np.array(PHASE_BOUNDARY_INITS, dtype=np.float64),
+            rng=np.random.default_rng() if RNG is None else RNG,
+            boundary_plan=BoundaryPlan.from_phases(POST_PHASE, PREV_PHASE, PHI_REF, SAMPLING_FUNCS),
+            group_normal=[
+                np.array([k for k in range(len(KEY_REF)) if group[k] == g and CONT_TYPE[k] == "normal"], dtype=np.intp)
+                for g in range(len(PHI_REF))
+            ],
+            **{
+                name: SampleBuffer(
+                    rows,
+                    SAMPLE_DTYPE,
+                    path=None if SAMPLE_DIRECTORY is None else pathlib.Path(SAMPLE_DIRECTORY) / f"{name}.json",
+                )
+                for name, rows in zip(
+                    SAMPLE_BUFFERS,
+                    (len(PHASE_BOUNDARY_INITS), len(THETA_INITS), 1, len(THETA_INITS), len(PHASE_BOUNDARY_INITS)),
+                )
+            },
+        )
+        state.post_s.append(0, max(PHASE_BOUNDARY_INITS) - min(PHASE_BOUNDARY_INITS) + 50)
+        state.group_oldest = np.full(len(PHI_REF), -1, dtype=np.intp)
+        state.group_youngest = np.full(len(PHI_REF), -1, dtype=np.intp)
+        for g in range(len(PHI_REF)):
+            state.find_group_extremes(g)
+        state.log_densities, state.log_likelihoods = state.log_posterior_terms(state.thetas, state.thetas, state.phis)
+        return state
+
+    @property
+    def K(self) -> int:
+        """The number of context parameters"""
+        return len(self.thetas)
+
+    @property
+    def M(self) -> int:
+        """The number of group boundary parameters"""
+        return len(self.phis)
+
+    def group_limits(self, k: int, phis: np.ndarray) -> Tuple[float, float]:
+        """Get the (lower, upper) boundaries of the group containing context k"""
+        g = self.group[k]
+        return phis[self.group_lower[g]], phis[self.group_upper[g]]
+
+    def find_group_extremes(self, g: int) -> None:
+        """Find the oldest and youngest normal contexts in group g by scanning the group"""
+        members = self.group_normal[g]
+        if len(members) > 0:
+            values = self.thetas[members]
+            self.group_oldest[g] = members[np.argmax(values)]
+            self.group_youngest[g] = members[np.argmin(values)]
+
+    def update_group_extremes(self, k: int, previous: float) -> None:
+        """Update the oldest and youngest normal contexts in the group of context k, after its parameter has changed
+
+        This is constant time unless k was the oldest or youngest context in its group and has moved inwards, in which case the group is scanned.
+
+        Parameters:
+            k: The index of the context
+            previous: The previous value of the context parameter
+        """
+        if self.cont_type[k] != "normal":
+            return
+        g = self.group[k]
+        value = self.thetas[k]
+        if (self.group_oldest[g] == k and value < previous) or (self.group_youngest[g] == k and value > previous):
+            self.find_group_extremes(g)
+            return
+        if value > self.thetas[self.group_oldest[g]]:
+            self.group_oldest[g] = k
+        if value < self.thetas[self.group_youngest[g]]:
+            self.group_youngest[g] = k
+
+    def boundary_limits(self, m: int) -> Tuple[float, float]:
+        """Get the (lower, upper) limits for a proposal for group boundary m, from the `boundary_plan` and current parameters"""
+        plan = self.boundary_plan
+        lower, upper = [], []
+        if plan.lower_group[m] >= 0 and self.group_oldest[plan.lower_group[m]] >= 0:
+            lower.append(self.thetas[self.group_oldest[plan.lower_group[m]]])
+        if plan.lower_phi[m] >= 0:
+            lower.append(self.phis[plan.lower_phi[m]])
+        if plan.upper_group[m] >= 0 and self.group_youngest[plan.upper_group[m]] >= 0:
+            upper.append(self.thetas[self.group_youngest[plan.upper_group[m]]])
+        if plan.upper_phi[m] >= 0:
+            upper.append(self.phis[plan.upper_phi[m]])
+        return max(lower) if len(lower) > 0 else self.A, min(upper) if len(upper) > 0 else self.P
+
+    def strat_limits(self, k: int, thetas: np.ndarray, lower: float, upper: float) -> Tuple[float, float]:
+        """Get the (younger, older) stratigraphic limits for context k, as per `strat_rel`
+
+        The younger limit is the youngest context above k, or the lower group boundary. The older limit is the oldest context below k, or the upper group boundary.
+        """
+        above = self.strat_above[k]
+        below = self.strat_below[k]
+        younger = thetas[above].min() if len(above) > 0 else lower
+        older = thetas[below].max() if len(below) > 0 else upper
+        return younger, older
+
+    def term_probability(self, k: int, date: float, strat_thetas: np.ndarray, phis: np.ndarray) -> Tuple[float, float]:
+        """Calculate the likelihood density and posterior contribution for a single context, as per `dict_seek_ordered`
+
+        Parameters:
+            k: The index of the context
+            date: The value of the context parameter to score
+            strat_thetas: Context parameters used for the stratigraphic limits
+            phis: Group boundary parameters
+
+        Returns:
+            The likelihood density at `date`, and the posterior contribution of the context
+
+        Note:
+            Intrusive contexts are scored using the same window as normal contexts, as they were by `dict_seek_ordered`
+        """
+        A = self.A
+        like1, like2, sums = self.result_vec[k]
+        beta, alpha = self.group_limits(k, phis)
+        strat_low, strat_up = self.strat_limits(k, strat_thetas, beta, alpha)
+        if self.cont_type[k] == "residual":
+            up = int((alpha - A + 0.05) * 10) + 1
+            low = 0
+            vec_2_up = int(((min(strat_up, alpha) - A) + 0.05) * 10) + 1
+            vec_2_low = 0
+            phase_len = alpha - like1[low] + 1
+        else:
+            up = int((alpha - A + 0.05) * 10) + 1
+            low = int((beta - A + 0.05) * 10)
+            vec_2_up = int(((min(strat_up, alpha) - A) + 0.05) * 10) + 1
+            vec_2_low = int(((max(strat_low, beta) - A) + 0.05) * 10)
+            phase_len = alpha - beta
+        group_sum = window_sum(sums, low, up)
+        strat_sum = window_sum(sums, vec_2_low, vec_2_up)
+        # Fall back to the likelihood of the date itself if a window is empty
+        if strat_sum is None:
+            strat_sum = likeli(self.rcd_est[k], self.rcd_err[k], float(int(date)), self.calibration)
+        if group_sum is None:
+            group_sum = likeli(self.rcd_est[k], self.rcd_err[k], float(int(date)), self.calibration)
+        date_ref = int((date - A + 0.05) * 10)
+        if date_ref >= len(like1) or phase_len == 0 or strat_sum == 0:
+            return 0, 0
+        x_temp = like2[date_ref]
+        x_len = (x_temp / phase_len) * (group_sum / strat_sum)
+        if math.isnan(x_len):
+            return 0, 0
+        return x_temp, x_len
+
+    def log_posterior_terms(
+        self, dates: np.ndarray, strat_thetas: np.ndarray, phis: np.ndarray, positions: np.ndarray | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluate posterior terms in log space, replacing `post_h` over a site dictionary
+
+        Equivalent to the log of `term_probability` for each term, but every term is scored together in a single pass of array operations. Terms which `term_probability` scores as 0 are -inf.
+
+        Parameters:
+            dates: Context parameters to score
+            strat_thetas: Context parameters used for the stratigraphic limits
+            phis: Group boundary parameters
+            positions: Positions into `terms` of the terms to evaluate, or None for every term
+
+        Returns:
+            Arrays of the per-term log likelihood densities and log posterior contributions, in term order
+        """
+        k = self.terms if positions is None else self.terms[positions]
+        if len(k) <= SCALAR_TERMS:
+            return self.__scalar_log_posterior_terms(k, dates, strat_thetas, phis)
+        A = self.A
+        n = self.prob_table.shape[1]
+        g = self.group[k]
+        beta, alpha = phis[self.group_lower[g]], phis[self.group_upper[g]]
+        # The youngest context above and the oldest below, or the group boundaries if there are none
+        padded = np.empty(len(strat_thetas) + 1)
+        padded[:-1] = strat_thetas
+        padded[-1] = np.inf
+        younger = padded[self.strat_above_padded[k]].min(axis=1)
+        padded[-1] = -np.inf
+        older = padded[self.strat_below_padded[k]].max(axis=1)
+        younger = np.where(younger == np.inf, beta, younger)
+        older = np.where(older == -np.inf, alpha, older)
+        residual = self.residual[k]
+
+        def grid_index(year: np.ndarray) -> np.ndarray:
+            return np.trunc((year - A + 0.05) * 10).astype(np.int64)
+
+        up = grid_index(alpha) + 1
+        low = np.where(residual, 0, grid_index(beta))
+        vec_2_up = grid_index(np.minimum(older, alpha)) + 1
+        vec_2_low = np.where(residual, 0, grid_index(np.maximum(younger, beta)))
+        phase_len = np.where(residual, alpha - A + 1, alpha - beta)
+
+        def window_sums(low: np.ndarray, up: np.ndarray) -> np.ndarray:
+            # As per window_sum, following python slicing semantics, with NaN for empty windows
+            start = np.minimum(np.maximum(np.where(low < 0, low + n, low), 0), n)
+            stop = np.minimum(np.maximum(np.where(up < 0, up + n, up), 0), n)
+            forward_stop, suffix_start = self.sum_table[0, k, stop], self.sum_table[1, k, start]
+            total = np.where(
+                forward_stop <= suffix_start,
+                forward_stop - self.sum_table[0, k, start],
+                suffix_start - self.sum_table[1, k, stop],
+            )
+            return np.where(stop <= start, np.nan, np.maximum(total, 0.0))
+
+        group_sum = window_sums(low, up)
+        strat_sum = window_sums(vec_2_low, vec_2_up)
+        # Fall back to the likelihood of the date itself if a window is empty, which is rare so is not vectorised
+        for sums in (strat_sum, group_sum):
+            for i in np.flatnonzero(np.isnan(sums)):
+                sums[i] = likeli(self.rcd_est[k[i]], self.rcd_err[k[i]], float(int(dates[k[i]])), self.calibration)
+        date_ref = grid_index(dates[k])
+        in_range = date_ref < n
+        x_temp = self.prob_table[k, np.where(in_range, date_ref, 0)]
+        return log_terms(x_temp, phase_len, group_sum, strat_sum, in_range)
+
+    def __scalar_log_posterior_terms(
+        self, k: np.ndarray, dates: np.ndarray, strat_thetas: np.ndarray, phis: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """`log_posterior_terms` for a few terms, e.g. those affected by a single context parameter, with the window sums for each term computed from python scalars
+
+        For a small number of terms, the fixed cost of each array operation outweighs the work done by it. The values are identical to those from array operations, as the logs are still taken by `log_terms`.
+        """
+        A = self.A
+        n = self.prob_table.shape[1]
+        forward, suffix = self.sum_table[0], self.sum_table[1]
+        if self.__term_structure is None:
+            self.__term_structure = [
+                (int(lower), int(upper), above.tolist(), below.tolist(), bool(residual))
+                for lower, upper, above, below, residual in zip(
+                    self.group_lower[self.group],
+                    self.group_upper[self.group],
+                    self.strat_above,
+                    self.strat_below,
+                    self.residual,
+                )
+            ]
 
+        def window_sum(j: int, low: int, up: int) -> float:
+            # As per window_sum, following python slicing semantics, with NaN for empty windows
+            start = min(max(low + n if low < 0 else low, 0), n)
+            stop = min(max(up + n if up < 0 else up, 0), n)
+            if stop <= start:
+                return math.nan
+            forward_stop, suffix_start = forward[j, stop], suffix[j, start]
+            if forward_stop <= suffix_start:
+                total = forward_stop - forward[j, start]
+            else:
+                total = suffix_start - suffix[j, stop]
+            return max(total, 0.0)
+
+        thetas, boundaries = strat_thetas.tolist(), phis.tolist()
+        x_temp, phase_len, group_sum, strat_sum, in_range = [], [], [], [], []
+        for j in k.tolist():
+            lower, upper, above, below, residual = self.__term_structure[j]
+            beta, alpha = boundaries[lower], boundaries[upper]
+            younger = min([thetas[i] for i in above]) if len(above) > 0 else beta
+            older = max([thetas[i] for i in below]) if len(below) > 0 else alpha
+            up = int((alpha - A + 0.05) * 10) + 1
+            vec_2_up = int((min(older, alpha) - A + 0.05) * 10) + 1
+            if residual:
+                low, vec_2_low, length = 0, 0, alpha - A + 1
+            else:
+                low, vec_2_low, length = (
+                    int((beta - A + 0.05) * 10),
+                    int((max(younger, beta) - A + 0.05) * 10),
+                    alpha - beta,
+                )
+            group, strat = window_sum(j, low, up), window_sum(j, vec_2_low, vec_2_up)
+            # Fall back to the likelihood of the date itself if a window is empty
+            if math.isnan(group) or math.isnan(strat):
+                date_likelihood = likeli(self.rcd_est[j], self.rcd_err[j], float(int(dates[j])), self.calibration)
+                group = date_likelihood if math.isnan(group) else group
+                strat = date_likelihood if math.isnan(strat) else strat
+            date_ref = int((float(dates[j]) - A + 0.05) * 10)
+            x_temp.append(self.prob_table[j, date_ref if date_ref < n else 0])
+            phase_len.append(length)
+            group_sum.append(group)
+            strat_sum.append(strat)
+            in_range.append(date_ref < n)
+        return log_terms(
+            np.array(x_temp, dtype=np.float64),
+            np.array(phase_len, dtype=np.float64),
+            np.array(group_sum, dtype=np.float64),
+            np.array(strat_sum, dtype=np.float64),
+            np.array(in_range, dtype=bool),
+        )
 
-def step_1_squeeze(
-    A,
-    P,
-    i,
-    PREV_PROB_TEST,
-    K,
-    ACCEPT,
-    SITE_DICT_TEST_1,
-    SITE_DICT_TEST_2,
-    THETAS,
-    POST_THETAS,
-    POST_PHIS,
-    KEY_REF,
-    CONTEXT_NO,
-    POST_PHASE,
-    PHI_REF,
-    RCD_ERR,
-    RCD_EST,
-    CALIBRATION,
-    ALL_SAMPS_CONT,
-    ALL_SAMPS_PHI,
-    PHIS_VEC,
-    CONT_TYPE,
-):
-    k = int(random.sample(range(0, K), 1)[0])
+    def affected_terms(self, contexts: np.ndarray, boundaries: np.ndarray) -> np.ndarray:
+        """Get the positions of the posterior terms which depend on any of the given parameters
+
+        The term for context k depends on its own parameter, the parameters of the contexts in its stratigraphic limits, and the boundaries of its group.
+
+        Parameters:
+            contexts: Indices of context parameters
+            boundaries: Indices of group boundary parameters
+
+        Returns:
+            Sorted positions into `terms`
+        """
+        affected = set(contexts.tolist())
+        for k in contexts:
+            affected.update(self.strat_dependents[k].tolist())
+        if len(boundaries) > 0:
+            changed = np.zeros(self.M, dtype=bool)
+            changed[boundaries] = True
+            groups = changed[self.group_lower] | changed[self.group_upper]
+            affected.update(np.flatnonzero(groups[self.group] & (self.group >= 0)).tolist())
+        positions = self.term_position[sorted(affected)]
+        return positions[positions >= 0]
+
+    def grid_positions(self, thetas: np.ndarray) -> np.ndarray:
+        """Get the position on the likelihood grid and the whole calendar year of each context parameter
+
+        A posterior term depends on context parameters only through these values, as per `term_probability`.
+
+        Returns:
+            An array of shape (2, K)
+        """
+        return np.stack([((thetas - self.A + 0.05) * 10).astype(np.int64), thetas.astype(np.int64)])
+
+    def cached_terms(self, thetas: np.ndarray, phis: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluate every posterior term in log space, rescoring only those affected by parameters changed since the previous call
+
+        Equivalent to `log_posterior_terms(thetas, thetas, phis)`, but an update to a single context parameter only rescores the terms of that context and its stratigraphic dependents, rather than every term. Context parameters are compared by their grid position, so rounding from reverted shift and scale moves does not invalidate the cache.
+
+        Parameters:
+            thetas: Context parameters to score, also used for the stratigraphic limits
+            phis: Group boundary parameters
+
+        Returns:
+            Arrays of the per-term log likelihood densities and log posterior contributions, in term order
+        """
+        grid = self.grid_positions(thetas)
+        if self.cached_log_likelihoods is None:
+            log_densities, log_likelihoods = self.log_posterior_terms(thetas, thetas, phis)
+        else:
+            changed_contexts = np.flatnonzero((grid != self.cached_grid).any(axis=0))
+            changed_boundaries = np.flatnonzero(phis != self.cached_phis)
+            log_densities = self.cached_log_densities.copy()
+            log_likelihoods = self.cached_log_likelihoods.copy()
+            positions = self.affected_terms(changed_contexts, changed_boundaries)
+            if len(positions) > 0:
+                log_densities[positions], log_likelihoods[positions] = self.log_posterior_terms(
+                    thetas, thetas, phis, positions
+                )
+        self.cached_grid = grid
+        self.cached_phis = phis.copy()
+        self.cached_log_densities = log_densities
+        self.cached_log_likelihoods = log_likelihoods
+        return log_densities, log_likelihoods
+
+    def sample_buffers(self) -> List[SampleBuffer]:
+        """The buffers of recorded samples, in `SAMPLE_BUFFERS` order"""
+        return [getattr(self, name) for name in SAMPLE_BUFFERS]
+
+    def flush_samples(self) -> None:
+        """Write samples recorded so far to disk, if they are being streamed to memory-mapped files"""
+        for samples in self.sample_buffers():
+            samples.flush()
+
+    def __getstate__(self) -> dict:
+        """Pickle the state without the members in `INPUT_MEMBERS`
+
+        The likelihood grids and calibration curve do not change as the chain runs, and are most of the size of the state, so they are not sent to or from worker processes with it. They must be restored with `restore_inputs` before the chain is continued.
+        """
+        state = self.__dict__.copy()
+        for name in INPUT_MEMBERS:
+            state[name] = None
+        return state
+
+    def restore_inputs(self, RESULT_VEC, CALIBRATION) -> None:
+        """Restore the members in `INPUT_MEMBERS` which are not pickled with the state, from the inputs to `squeeze_model`
+
+        Parameters:
+            RESULT_VEC: Per-context likelihood grids and their prefix sums, as returned by `initialise`
+            CALIBRATION: The calibration curve
+        """
+        self.result_vec = RESULT_VEC
+        self.calibration = CALIBRATION
+        self.prob_table, self.sum_table = stack_likelihoods(RESULT_VEC)
+
+    def results(self) -> tuple:
+        """Get the samples recorded so far, as returned by `squeeze_model`
+
+        Returns:
+            A tuple of PHI_ACCEPT, ACCEPT, POST_S, ALL_SAMPS_CONT and ALL_SAMPS_PHI as NumPy arrays, followed by the move statistics
+        """
+        phi_accept, accept, post_s, all_samps_cont, all_samps_phi = [
+            samples.views() for samples in self.sample_buffers()
+        ]
+        return phi_accept, accept, post_s[0], all_samps_cont, all_samps_phi, self.move_statistics()
+
+    def save_checkpoint(self, directory: pathlib.Path) -> None:
+        """Checkpoint the state of the chain to `CHECKPOINT_FILENAME` in the directory its samples are streamed to
+
+        The checkpoint contains the parameter values and cached posterior terms, the state of the random number generator, the iteration and adaptive proposal width, and the number of samples in each sample buffer, so that `restore_checkpoint` continues the chain exactly as if it had not stopped. Samples should be flushed first. The file is replaced atomically, so a crash leaves the previous checkpoint intact.
+
+        Parameters:
+            directory: The directory the chain's samples are streamed to
+        """
+        checkpoint = {
+            "iteration": self.iteration,
+            "shift_width": self.shift_width,
+            "rng": self.rng.bit_generator.state,
+            "arrays": {
+                name: None
+                if getattr(self, name) is None
+                else {"dtype": getattr(self, name).dtype.str, "values": getattr(self, name).tolist()}
+                for name in CHECKPOINT_ARRAYS
+            },
+            "lengths": {name: samples.lengths.tolist() for name, samples in zip(SAMPLE_BUFFERS, self.sample_buffers())},
+        }
+        write_json_atomic(pathlib.Path(directory) / CHECKPOINT_FILENAME, checkpoint)
+
+    @staticmethod
+    def read_checkpoint(directory: pathlib.Path) -> dict | None:
+        """Read the checkpoint written by `save_checkpoint`, if there is one
+
+        Parameters:
+            directory: The directory the chain's samples were streamed to
+
+        Returns:
+            The checkpoint, or None if the chain has not been checkpointed
+        """
+        path = pathlib.Path(directory) / CHECKPOINT_FILENAME
+        if not path.is_file():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def restore_checkpoint(self, checkpoint: dict, directory: pathlib.Path) -> None:
+        """Restore the state of a chain from a checkpoint, reopening its streamed samples to continue appending to them
+
+        Samples flushed after the checkpoint was written are discarded, so the restored chain is consistent.
+
+        Parameters:
+            checkpoint: The checkpoint, from `read_checkpoint`
+            directory: The directory the chain's samples are streamed to
+        """
+        self.iteration = checkpoint["iteration"]
+        self.shift_width = checkpoint["shift_width"]
+        self.rng.bit_generator.state = checkpoint["rng"]
+        for name, array in checkpoint["arrays"].items():
+            setattr(self, name, None if array is None else np.array(array["values"], dtype=array["dtype"]))
+        for name in SAMPLE_BUFFERS:
+            samples = SampleBuffer.open(pathlib.Path(directory) / f"{name}.json", mode="r+")
+            samples.truncate(checkpoint["lengths"][name])
+            setattr(self, name, samples)
+
+    def record_contexts(self) -> None:
+        """Append the current context parameters to `all_samps_cont`"""
+        self.all_samps_cont.append_all(self.thetas)
+
+    def record_phis(self) -> None:
+        """Append the current group boundary parameters to `all_samps_phi`"""
+        self.all_samps_phi.append_all(self.phis)
+
+    def record_move(self, move: int, accepted: bool) -> None:
+        """Count a proposal by one of the `MOVES`, and if it was accepted"""
+        self.move_proposed[move] += 1
+        self.move_accepted[move] += accepted
+
+    def move_statistics(self) -> dict:
+        """The number of proposals and acceptances for each of the `MOVES`, and the final shift proposal width"""
+        statistics = {
+            move: {"proposed": int(self.move_proposed[i]), "accepted": int(self.move_accepted[i])}
+            for i, move in enumerate(MOVES)
+        }
+        statistics["shift"]["width"] = self.shift_width
+        return statistics
+
+    def discard_samples(self) -> None:
+        """Discard every sample recorded so far, e.g. those drawn while the proposal width was adapting"""
+        for samples in self.sample_buffers():
+            samples.truncate(np.zeros(samples.rows, dtype=np.intp))
+
+    def record_all_accepted(self) -> None:
+        """Record every parameter as accepted, following a successful shift or scale move"""
+        self.phi_accept.append_all(self.phis)
+        self.accept.append_all(self.thetas)
+        self.record_phis()
+        self.record_contexts()
+        self.post_s.append(0, self.phis.max().item() - self.phis.min().item())
+
+
+def log_terms(
+    x_temp: np.ndarray, phase_len: np.ndarray, group_sum: np.ndarray, strat_sum: np.ndarray, in_range: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine the parts of each posterior term in log space, for `SamplerState.log_posterior_terms`
+
+    Parameters:
+        x_temp: The likelihood density of each date
+        phase_len: The length of each term's group, or the calendar range up to the group's upper boundary for residual contexts
+        group_sum: The likelihood mass within each term's group limits
+        strat_sum: The likelihood mass within each term's stratigraphic limits
+        in_range: If each date is within the likelihood grid
+
+    Returns:
+        Arrays of the per-term log likelihood densities and log posterior contributions, which are -inf for terms which `term_probability` scores as 0
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_densities = np.log(x_temp)
+        log_likelihoods = log_densities - np.log(phase_len) + np.log(group_sum) - np.log(strat_sum)
+    invalid = ~in_range | (phase_len == 0) | (strat_sum == 0) | np.isnan(log_likelihoods)
+    log_densities[invalid] = -np.inf
+    log_likelihoods[invalid] = -np.inf
+    return log_densities, log_likelihoods
+
+
+def log_acceptance_ratio(new: np.ndarray, old: np.ndarray) -> float:
+    """Log of the product of the per-term ratios between two sets of log posterior terms
+
+    Summing in log space avoids the product of many small ratios underflowing or overflowing on large models. As when the ratios were multiplied, a term which is 0 (-inf) in either set rejects the proposal, giving -inf.
+    """
+    if (new == -np.inf).any() or (old == -np.inf).any():
+        return -np.inf
+    return float(np.sum(new - old))
+
+
+def log_f_phi(s: float, R: float, M: int) -> float:
+    """Log of the prior density of a site span s, for M group boundaries within a calendar range of length R"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (2 - M) * np.log(s) - np.log(R - s)
+
+
+def accept_proposal(state: SamplerState, log_h: float) -> bool:
+    """Metropolis-Hastings acceptance test for the log acceptance ratio of a proposal, which is rejected if log_h is NaN"""
+    return log_h >= 0 or math.exp(log_h) > state.rng.random()
+
+
+def step_1_squeeze(state: SamplerState) -> None:
+    """Propose a new value for a single context parameter, within its group and stratigraphic limits"""
+    k = int(state.rng.integers(state.K))
+    THETAS = state.thetas
     oldtheta = THETAS[k]
-    cont_type = CONT_TYPE[k]
-    key = KEY_REF[k]
-    a = [CONTEXT_NO[k] in i for i in SITE_DICT_TEST_1[key]["dates"]].index(True)
-    strat_single = strat_rel(SITE_DICT_TEST_1, key, a, THETAS, CONTEXT_NO)
+    cont_type = state.cont_type[k]
+    lower, upper = state.group_limits(k, state.trace_phis)
+    younger, older = state.strat_limits(k, THETAS, lower, upper)
     if cont_type == "normal":
-        THETAS[k] = np.random.uniform(
-            max(SITE_DICT_TEST_1[key]["boundaries"][0], strat_single[1]),
-            min(SITE_DICT_TEST_1[key]["boundaries"][1], strat_single[0]),
-        )
+        THETAS[k] = uniform(state.rng, max(lower, younger), min(upper, older))
     elif cont_type == "intrusive":
-        THETAS[k] = np.random.uniform(A, min(SITE_DICT_TEST_1[key]["boundaries"][1], strat_single[0]))
+        THETAS[k] = uniform(state.rng, state.A, min(upper, older))
     elif cont_type == "residual":
-        THETAS[k] = np.random.uniform(max(SITE_DICT_TEST_1[key]["boundaries"][0], strat_single[1]), P)
-    for g_1 in enumerate(THETAS):
-        POST_THETAS[g_1[0]].append(THETAS[g_1[0]])
-    SITE_DICT_TEST_2 = dict_update(SITE_DICT_TEST_2, POST_THETAS, POST_PHIS, i + 1, i, POST_PHASE, PHI_REF)
-    prob_1_test = post_h(A, P, SITE_DICT_TEST_2, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)[1]
-    c_test = []
-    for j_1, a_1 in enumerate(prob_1_test):
-        if PREV_PROB_TEST[j_1] == 0:
-            c_test.append(0)
-        else:
-            c_test.append(a_1 / PREV_PROB_TEST[j_1])
-    h_1 = np.prod(c_test)
-    if h_1 >= 1:
-        ACCEPT[k].append(THETAS[k])
-        [ALL_SAMPS_CONT[j].append(THETAS[j]) for j in range(len(THETAS))]
-        [ALL_SAMPS_PHI[j].append(PHIS_VEC[j]) for j in range(len(PHIS_VEC))]
+        THETAS[k] = uniform(state.rng, max(lower, younger), state.P)
+    _, log_likelihoods = state.cached_terms(THETAS, state.trace_phis)
+    accepted = accept_proposal(state, log_acceptance_ratio(log_likelihoods, state.log_likelihoods))
+    state.record_move(0, accepted)
+    if accepted:
+        state.update_group_extremes(k, oldtheta)
+        state.accept.append(k, THETAS[k])
+        state.record_contexts()
+        state.record_phis()
+        state.trace_thetas[:] = THETAS
+        state.log_likelihoods = log_likelihoods
     else:
-        u = np.random.uniform(0, 1)
-        if h_1 > u:
-            ACCEPT[k].append(THETAS[k])
-            [ALL_SAMPS_CONT[j].append(THETAS[j]) for j in range(len(THETAS))]
-            [ALL_SAMPS_PHI[j].append(PHIS_VEC[j]) for j in range(len(PHIS_VEC))]
-        else:
-            THETAS[k] = oldtheta
-            for g2 in range(len(THETAS)):
-                POST_THETAS[g2][i + 1] = POST_THETAS[g2][i]
-            prob_1_test = PREV_PROB_TEST
-    return prob_1_test, ACCEPT, SITE_DICT_TEST_1, SITE_DICT_TEST_2, THETAS, POST_THETAS, POST_PHIS, ALL_SAMPS_CONT
+        THETAS[k] = oldtheta
 
 
-def step_2_squeeze(
-    i,
-    prob_1_test,
-    M,
-    PHI_SAMP_DICT,
-    POST_S,
-    R,
-    PHIS_VEC,
-    SITE_DICT_TEST_3,
-    THETAS,
-    POST_THETAS,
-    POST_PHIS,
-    STEP_1,
-    STEP_2,
-    STEP_3,
-    A,
-    P,
-    SAMP_VEC_TRACK,
-    PHI_ACCEPT,
-    KEY_REF,
-    PHI_REF,
-    CONTEXT_NO,
-    RCD_ERR,
-    POST_PHASE,
-    RCD_EST,
-    CALIBRATION,
-    ALL_SAMPS_CONT,
-    ALL_SAMPS_PHI,
-    CONT_TYPE,
-):
-    m = int(random.sample(range(0, M), 1)[0])
-    s1 = max(PHIS_VEC) - min(PHIS_VEC)
-    f_phi1 = (s1 ** (2 - M)) / (R - s1)
+def step_2_squeeze(state: SamplerState) -> None:
+    """Propose a new value for a single group boundary, within limits from the neighbouring boundaries and contexts"""
+    M = state.M
+    R = state.P - state.A
+    PHIS_VEC = state.phis
+    m = int(state.rng.integers(M))
+    log_f_phi1 = log_f_phi(PHIS_VEC.max().item() - PHIS_VEC.min().item(), R, M)
     oldphi = PHIS_VEC[m]
-    lims = PHI_SAMP_DICT[STEP_1[m]][STEP_2[m]][STEP_3[m]](
-        THETAS, PHIS_VEC, m, A, P, SAMP_VEC_TRACK, KEY_REF, PHI_REF, CONT_TYPE
-    )
-    PHIS_VEC[m] = np.random.uniform(lims[0], lims[1])
-    for v1, a_2 in enumerate(PHIS_VEC):
-        POST_PHIS[v1].append(a_2)
-    s2 = max(PHIS_VEC) - min(PHIS_VEC)
-    f_phi2 = (s2 ** (2 - M)) / (R - s2)
-    SITE_DICT_TEST_3 = dict_update(SITE_DICT_TEST_3, POST_THETAS, POST_PHIS, i + 1, i + 1, POST_PHASE, PHI_REF)
-    step_2_prob = post_h(A, P, SITE_DICT_TEST_3, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)
-    prob_2_test = step_2_prob[1]
-    backup_b_test = step_2_prob[0]
-    c_test = []
-    for k_2, b_2 in enumerate(prob_2_test):
-        if prob_1_test[k_2] == 0:
-            c_test.append(0)
-        else:
-            c_test.append(b_2 / prob_1_test[k_2])
-    h_2 = np.prod(c_test) * (f_phi2 / f_phi1)
-    if h_2 >= 1:
-        PHI_ACCEPT[m].append(PHIS_VEC[m])
-        [ALL_SAMPS_PHI[j].append(PHIS_VEC[j]) for j in range(len(PHIS_VEC))]
-        [ALL_SAMPS_CONT[j].append(THETAS[j]) for j in range(len(THETAS))]
+    lims = state.boundary_limits(m)
+    PHIS_VEC[m] = uniform(state.rng, lims[0], lims[1])
+    log_f_phi2 = log_f_phi(PHIS_VEC.max().item() - PHIS_VEC.min().item(), R, M)
+    log_densities, log_likelihoods = state.log_posterior_terms(state.trace_thetas, state.thetas, PHIS_VEC)
+    # The densities are kept for the scale move regardless of whether this proposal is accepted
+    state.log_densities = log_densities
+    log_h_2 = log_acceptance_ratio(log_likelihoods, state.log_likelihoods) + (log_f_phi2 - log_f_phi1)
+    accepted = accept_proposal(state, log_h_2)
+    state.record_move(1, accepted)
+    if accepted:
+        state.phi_accept.append(m, PHIS_VEC[m])
+        state.record_phis()
+        state.record_contexts()
         if m == M - 1:
-            POST_S.append(max(PHIS_VEC) - PHIS_VEC[m])
+            state.post_s.append(0, PHIS_VEC.max().item() - PHIS_VEC[m].item())
         elif m == 0:
-            POST_S.append(PHIS_VEC[m] - min(PHIS_VEC))
+            state.post_s.append(0, PHIS_VEC[m].item() - PHIS_VEC.min().item())
+        state.trace_phis[:] = PHIS_VEC
+        state.log_likelihoods = log_likelihoods
     else:
-        u = np.random.uniform(0, 1)
-        if h_2 > u:
-            PHI_ACCEPT[m].append(PHIS_VEC[m])
-            [ALL_SAMPS_CONT[j].append(THETAS[j]) for j in range(len(THETAS))]
-            [ALL_SAMPS_PHI[j].append(PHIS_VEC[j]) for j in range(len(PHIS_VEC))]
-            if m == M - 1:
-                POST_S.append(max(PHIS_VEC) - PHIS_VEC[m])
-            elif m == 0:
-                POST_S.append(PHIS_VEC[m] - min(PHIS_VEC))
-        else:
-            for v2 in enumerate(PHIS_VEC):
-                POST_PHIS[v2[0]][i + 1] = POST_PHIS[v2[0]][i]
-            PHIS_VEC[m] = oldphi
-            prob_2_test = prob_1_test
-    return (
-        backup_b_test,
-        prob_2_test,
-        POST_S,
-        PHIS_VEC,
-        SITE_DICT_TEST_3,
-        THETAS,
-        POST_THETAS,
-        POST_PHIS,
-        PHI_ACCEPT,
-        ALL_SAMPS_PHI,
-    )
-
-
-def step_3_squeeze(
-    A,
-    P,
-    i,
-    backup_b_test,
-    prob_2_test,
-    S,
-    ACCEPT,
-    POST_S,
-    PHIS_VEC,
-    SITE_DICT_TEST_4,
-    THETAS,
-    POST_THETAS,
-    POST_PHIS,
-    PHI_ACCEPT,
-    POST_PHASE,
-    PHI_REF,
-    CONTEXT_NO,
-    RCD_ERR,
-    RCD_EST,
-    CALIBRATION,
-    ALL_SAMPS_CONT,
-    ALL_SAMPS_PHI,
-):
-    step = np.random.uniform(max(-1 * S, A - min(PHIS_VEC)), 1 * S)
-    THETAS = [x + step for x in THETAS]
-    PHIS_VEC = [x + step for x in PHIS_VEC]
-    for g2, a_3 in enumerate(THETAS):
-        POST_THETAS[g2].append(a_3)
-    for v2, b_3 in enumerate(PHIS_VEC):
-        POST_PHIS[v2].append(b_3)
-    SITE_DICT_TEST_4 = dict_update(SITE_DICT_TEST_4, POST_THETAS, POST_PHIS, i + 2, i + 2, POST_PHASE, PHI_REF)
-    temp = post_h(A, P, SITE_DICT_TEST_4, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)
-    prob_3_test = temp[1]
-    b_test = temp[0]
-    c_test = []
-    for f, c_3 in enumerate(prob_3_test):
-        if prob_2_test[f] == 0:
-            c_test.append(0)
-        else:
-            c_test.append(c_3 / prob_2_test[f])
-    h_3 = np.prod(c_test)
-    if h_3 >= 1:
-        for j_3, d_3 in enumerate(PHIS_VEC):
-            PHI_ACCEPT[j_3].append(d_3)
-            ALL_SAMPS_PHI[j_3].append(d_3)
-        for k_3, e_3 in enumerate(THETAS):
-            ACCEPT[k_3].append(e_3)
-            ALL_SAMPS_CONT[k_3].append(e_3)
-        POST_S.append(max(PHIS_VEC) - min(PHIS_VEC))
+        PHIS_VEC[m] = oldphi
+
+
+def step_3_squeeze(state: SamplerState) -> None:
+    """Propose shifting every parameter by the same amount, of up to the largest radiocarbon error scaled by `SamplerState.shift_width`"""
+    S = max(state.rcd_err) * state.shift_width
+    step = uniform(state.rng, max(-1 * S, state.A - state.phis.min().item()), 1 * S)
+    state.thetas += step
+    state.phis += step
+    log_densities, log_likelihoods = state.log_posterior_terms(state.thetas, state.thetas, state.phis)
+    accepted = accept_proposal(state, log_acceptance_ratio(log_likelihoods, state.log_likelihoods))
+    state.record_move(2, accepted)
+    if accepted:
+        state.record_all_accepted()
+        state.trace_thetas[:] = state.thetas
+        state.trace_phis[:] = state.phis
+        state.log_likelihoods = log_likelihoods
+        state.log_densities = log_densities
     else:
-        u = np.random.uniform(0, 1)
-        if h_3 > u:
-            for j_3, f_3 in enumerate(PHIS_VEC):
-                PHI_ACCEPT[j_3].append(f_3)
-                ALL_SAMPS_PHI[j_3].append(f_3)
-            for k_3, i_3 in enumerate(THETAS):
-                ACCEPT[k_3].append(i_3)
-                ALL_SAMPS_CONT[k_3].append(i_3)
-            POST_S.append(max(PHIS_VEC) - min(PHIS_VEC))
-        else:
-            for g_3 in enumerate(THETAS):
-                POST_THETAS[g_3[0]][i + 2] = POST_THETAS[g_3[0]][i + 1]
-            for v_3 in enumerate(PHIS_VEC):
-                POST_PHIS[v_3[0]][i + 2] = POST_PHIS[v_3[0]][i + 1]
-            THETAS = [x - step for x in THETAS]
-            PHIS_VEC = [x - step for x in PHIS_VEC]
-            prob_3_test = prob_2_test
-            b_test = backup_b_test
-    return (
-        b_test,
-        prob_3_test,
-        ACCEPT,
-        POST_S,
-        PHIS_VEC,
-        SITE_DICT_TEST_4,
-        THETAS,
-        POST_THETAS,
-        POST_PHIS,
-        PHI_ACCEPT,
-        ALL_SAMPS_CONT,
-        ALL_SAMPS_PHI,
-    )
+        state.thetas -= step
+        state.phis -= step
 
 
-def step_4_squeeze(
-    A,
-    P,
-    i,
-    b_test,
-    prob_3_test,
-    ACCEPT,
-    POST_S,
-    R,
-    PHIS_VEC,
-    SITE_DICT_TEST_5,
-    THETAS,
-    POST_THETAS,
-    POST_PHIS,
-    PHI_ACCEPT,
-    POST_PHASE,
-    PHI_REF,
-    CONTEXT_NO,
-    RCD_ERR,
-    RCD_EST,
-    CALIBRATION,
-    ALL_SAMPS_CONT,
-    ALL_SAMPS_PHI,
-):
-    m = mean(np.concatenate([PHIS_VEC, THETAS])).item()
-    scale_limit = m / (m - min(PHIS_VEC))
-    rho = np.random.uniform(2 / 3, scale_limit)
+def step_4_squeeze(state: SamplerState) -> None:
+    """Propose scaling every parameter about their mean"""
+    R = state.P - state.A
+    m = mean(np.concatenate([state.phis, state.thetas])).item()
+    scale_limit = m / (m - state.phis.min().item())
+    rho = uniform(state.rng, 2 / 3, scale_limit)
     constant = (rho - 1) * m
-    THETAS = [x * rho - constant for x in THETAS]
-    PHIS_VEC = [x * rho - constant for x in PHIS_VEC]
-    for s_4, a_4 in enumerate(THETAS):
-        POST_THETAS[s_4].append(a_4)
-    for e_4, b_4 in enumerate(PHIS_VEC):
-        POST_PHIS[e_4].append(b_4)
-    SITE_DICT_TEST_5 = dict_update(SITE_DICT_TEST_5, POST_THETAS, POST_PHIS, i + 3, i + 3, POST_PHASE, PHI_REF)
-    s = max(PHIS_VEC) - min(PHIS_VEC)
-    const = (R - s) / ((R - (rho * s)) * rho)
-    temp_2 = post_h(A, P, SITE_DICT_TEST_5, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)
-    a_test = temp_2[0]
-    PREV_PROB_TEST = temp_2[1]
-    c_test = []
-    for q_4, k_4 in enumerate(a_test):
-        if b_test[q_4] == 0:
-            c_test.append(0)
-        else:
-            c_test.append(k_4 / b_test[q_4])
-    h_temp_test = np.prod(c_test)
-    h_4 = h_temp_test * const
-    if h_4 >= 1:
-        for j_4, c_4 in enumerate(PHIS_VEC):
-            PHI_ACCEPT[j_4].append(c_4)
-            ALL_SAMPS_PHI[j_4].append(c_4)
-        for k_4, f_4 in enumerate(THETAS):
-            ACCEPT[k_4].append(f_4)
-            ALL_SAMPS_CONT[k_4].append(f_4)
-        POST_S.append(max(PHIS_VEC) - min(PHIS_VEC))
+    state.thetas *= rho
+    state.thetas -= constant
+    state.phis *= rho
+    state.phis -= constant
+    s = state.phis.max().item() - state.phis.min().item()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_const = np.log(R - s) - np.log(R - (rho * s)) - np.log(rho)
+    log_densities, log_likelihoods = state.log_posterior_terms(state.thetas, state.thetas, state.phis)
+    accepted = accept_proposal(state, log_acceptance_ratio(log_densities, state.log_densities) + log_const)
+    state.record_move(3, accepted)
+    if accepted:
+        state.record_all_accepted()
+        state.trace_thetas[:] = state.thetas
+        state.trace_phis[:] = state.phis
+        state.log_likelihoods = log_likelihoods
     else:
-        u = np.random.uniform(0, 1)
-        if h_4 > u:
-            for j_4, g_4 in enumerate(PHIS_VEC):
-                PHI_ACCEPT[j_4].append(g_4)
-                ALL_SAMPS_PHI[j_4].append(g_4)
-            for k_4, i_4 in enumerate(THETAS):
-                ACCEPT[k_4].append(i_4)
-                ALL_SAMPS_CONT[k_4].append(i_4)
-            POST_S.append(max(PHIS_VEC) - min(PHIS_VEC))
-        else:
-            for g_4 in range(len(THETAS)):
-                POST_THETAS[g_4][i + 3] = POST_THETAS[g_4][i + 2]
-            for v_4 in range(len(PHIS_VEC)):
-                POST_PHIS[v_4][i + 3] = POST_PHIS[v_4][i + 2]
-            THETAS = [(x + constant) / rho for x in THETAS]
-            PHIS_VEC = [(x + constant) / rho for x in PHIS_VEC]
-            PREV_PROB_TEST = prob_3_test
-    return (
-        PREV_PROB_TEST,
-        ACCEPT,
-        POST_S,
-        PHIS_VEC,
-        SITE_DICT_TEST_5,
-        THETAS,
-        POST_THETAS,
-        POST_PHIS,
-        PHI_ACCEPT,
-        ALL_SAMPS_CONT,
-        ALL_SAMPS_PHI,
-    )
+        state.thetas += constant
+        state.thetas /= rho
+        state.phis += constant
+        state.phis /= rho
+
+
+def squeeze_iteration(state: SamplerState) -> None:
+    """Perform a single iteration of the squeeze sampler, applying each of the 4 moves in turn"""
+    step_1_squeeze(state)
+    step_2_squeeze(state)
+    step_3_squeeze(state)
+    step_4_squeeze(state)
+
+
+def gibbs_boundary_sample(state: SamplerState, m: int) -> float | None:
+    """Draw group boundary m from its full conditional distribution, on a 0.05 year grid within its limits
+
+    Each context contributes a factor of 1 / (alpha - beta) for the span of its group, so the conditional density of a boundary is proportional to the product of span ** -n over the groups it bounds, where n is the number of contexts in the group. The draw is made by inverse CDF sampling of the cumulative weights.
+
+    Returns:
+        The drawn value, or None if the limits leave no room to sample
+    """
+    low, up = state.boundary_limits(m)
+    num = int((up - low) * 20)
+    if up - low <= 0.2 or num < 1:
+        return None
+    phi_vals = np.linspace(low + 0.1, up - 0.1, num=num)
+    counts = np.bincount(state.group[state.group >= 0], minlength=len(state.group_upper))
+    # The span of each group with m as its upper boundary, then as its lower boundary
+    spans = [(g, phi_vals - state.phis[state.group_lower[g]]) for g in np.flatnonzero(state.group_upper == m)]
+    spans += [(g, state.phis[state.group_upper[g]] - phi_vals) for g in np.flatnonzero(state.group_lower == m)]
+    log_weights = np.zeros(num)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for g, span in spans:
+            log_weights = np.where(span > 0, log_weights - counts[g] * np.log(span), -np.inf)
+    if not np.isfinite(log_weights).any():
+        return None
+    weights = np.cumsum(np.exp(log_weights - log_weights.max()))
+    i = np.searchsorted(weights, state.rng.random() * weights[-1], side="right")
+    return phi_vals[min(i, num - 1)]
+
+
+def gibbs_iteration(state: SamplerState) -> None:
+    """Perform a single iteration of the Gibbs sampler, drawing each context and then each group boundary from its conditional distribution
+
+    Contexts are drawn from their likelihood, truncated to the limits used by the squeeze sampler's single context move, using `truncated_samples` for each of `strat_layers` in turn. Boundaries are drawn by `gibbs_boundary_sample`, within the limits from the `boundary_plan`. Every iteration is recorded as accepted.
+    """
+    THETAS = state.thetas
+    for layer in state.strat_layers:
+        lows, ups = np.empty(len(layer)), np.empty(len(layer))
+        for j, k in enumerate(layer):
+            lower, upper = state.group_limits(k, state.phis)
+            younger, older = state.strat_limits(k, THETAS, lower, upper)
+            cont_type = state.cont_type[k]
+            if cont_type == "intrusive":
+                lows[j], ups[j] = state.A, min(upper, older)
+            elif cont_type == "residual":
+                lows[j], ups[j] = max(lower, younger), state.P
+            else:
+                lows[j], ups[j] = max(lower, younger), min(upper, older)
+        values = truncated_samples(state.rng, state.result_vec, layer, lows, ups)
+        for k, value in zip(layer, values):
+            if not np.isnan(value):
+                previous = THETAS[k]
+                THETAS[k] = value
+                state.update_group_extremes(k, previous)
+    for m in range(state.M):
+        value = gibbs_boundary_sample(state, m)
+        if value is not None:
+            state.phis[m] = value
+    state.trace_thetas[:] = THETAS
+    state.trace_phis[:] = state.phis
+    state.record_all_accepted()
+
+
+MCMC_METHODS = {"squeeze": squeeze_iteration, "gibbs": gibbs_iteration}
+"""The MCMC kernels which can be selected for `run_MCMC`, by name"""
+
+
+@dataclass
+class StoppingRule:
+    """When to stop sampling a single chain of the sampler
+
+    Sampling always stops once every context has `max_samples` accepted samples. If `convergence` is enabled, sampling also stops once every context and group boundary has at least `target_ess` effective samples and a split R-hat of at most `target_rhat`, after discarding burn-in. The rule is checked every `check_interval` iterations.
+    """
+
+    convergence: bool = False
+    """If sampling should stop once the convergence targets are met"""
+
+    target_ess: int = 1000
+    """The minimum effective sample size for every parameter"""
+
+    target_rhat: float = 1.01
+    """The maximum split R-hat for every parameter"""
+
+    max_samples: int = 60000
+    """The number of accepted samples per context at which sampling stops regardless of convergence"""
+
+    check_interval: int = 3335
+    """The number of iterations between checks, and progress updates"""
+
+    def progress(self, state: SamplerState) -> Tuple[int, bool]:
+        """Check the rule against the current state of a chain
+
+        Returns:
+            The percentage progress towards stopping, and if sampling should stop
+        """
+        n_samples = state.accept.lengths.min()
+        if n_samples >= self.max_samples:
+            return 100, True
+        samples_percent = int((n_samples / self.max_samples) * 100)
+        # Burn-in must be complete before convergence can be assessed, so that results are not empty once it is removed
+        burnt_in = n_samples > ACCEPT_BURN_IN and len(state.all_samps_cont[0]) > ALL_SAMPLES_BURN_IN
+        if not self.convergence or not burnt_in:
+            return samples_percent, False
+        samples = [i[ACCEPT_BURN_IN:] for i in state.accept.views() + state.phi_accept.views()]
+        ess = min([np.nan_to_num(effective_sample_size(i), nan=0.0) for i in samples])
+        rhat = max([np.nan_to_num(split_rhat(i), nan=np.inf) for i in samples])
+        if ess >= self.target_ess and rhat <= self.target_rhat:
+            return 100, True
+        # Report the least converged parameter's progress towards the ESS target, unless the cap is closer
+        convergence_percent = int(min(ess / self.target_ess, 0.99) * 100)
+        return max(samples_percent, convergence_percent), False
+
+
+@dataclass
+class ProposalTuning:
+    """Adaptive tuning of the shift proposal of the squeeze sampler, during a warm-up period
+
+    Every `interval` iterations during the first `warmup` iterations of a chain, the width of the shift proposal is scaled up or down according to whether its acceptance rate since the previous adaptation was above or below `target_acceptance`. Adaptations shrink as warm-up proceeds, and the width is frozen afterwards, so samples after warm-up are from a fixed Markov chain. Samples recorded during warm-up are discarded by `squeeze_model` when it ends, so the burn-in discarded when results are summarised (`ACCEPT_BURN_IN` and `ALL_SAMPLES_BURN_IN`) follows the warm-up, however long it is.
+
+    The scale proposal is not tuned, as its acceptance probability is only correct for the range of scale factors it is drawn from.
+    """
+
+    warmup: int = 0
+    """The number of iterations during which the proposal width is adapted. 0 disables adaptation"""
+
+    target_acceptance: float = 0.234
+    """The acceptance rate the shift proposal is tuned towards"""
+
+    interval: int = 100
+    """The number of iterations between adaptations"""
+
+    MIN_WIDTH = 1e-3
+    """The smallest width multiplier for the shift proposal"""
+
+    MAX_WIDTH = 10.0
+    """The largest width multiplier for the shift proposal"""
+
+    def adapt(self, state: SamplerState) -> None:
+        """Adapt the proposal width of a chain, if an adaptation is due following its most recent iteration"""
+        if state.iteration > self.warmup or state.iteration % self.interval != 0:
+            return
+        shift = MOVES.index("shift")
+        proposed = state.move_proposed[shift] - state.tuned_proposed[shift]
+        if proposed > 0:
+            rate = (state.move_accepted[shift] - state.tuned_accepted[shift]) / proposed
+            gain = 1 / math.sqrt(state.iteration // self.interval)
+            width = state.shift_width * math.exp(gain * (rate - self.target_acceptance) / self.target_acceptance)
+            state.shift_width = min(max(width, self.MIN_WIDTH), self.MAX_WIDTH)
+        state.tuned_proposed[:] = state.move_proposed
+        state.tuned_accepted[:] = state.move_accepted
+
+
+@dataclass
+class ChainProgress:
+    """A progress update for a chain of the sampler, reported each time its stopping rule is checked"""
+
+    percent: int
+    """The percentage progress towards the stopping rule, see `StoppingRule.progress`"""
+
+    samples: int
+    """The smallest number of accepted samples for any context"""
+
+    elapsed: float
+    """Seconds since sampling started, or was continued"""
+
+    eta: float | None
+    """Estimated seconds until the stopping rule is met, from the rate of progress since sampling started, or None if there has been no progress"""
+
+    acceptance: Dict[str, float]
+    """The acceptance rate of each move which has been proposed, by name from `MOVES`"""
+
+    rhat: float | None
+    """The largest split R-hat of any parameter after burn-in, or None during burn-in"""
+
+    @classmethod
+    def from_state(cls, state: SamplerState, percent: int, initial_percent: int, elapsed: float) -> "ChainProgress":
+        """Summarise the progress of a chain
+
+        Parameters:
+            state: The current state of the chain
+            percent: The current percentage progress towards the stopping rule
+            initial_percent: The percentage progress when sampling started, used to estimate the rate of progress
+            elapsed: Seconds since sampling started
+        """
+        eta = None
+        if percent > initial_percent:
+            eta = elapsed * (100 - percent) / (percent - initial_percent)
+        acceptance = {
+            move: accepted / proposed
+            for move, proposed, accepted in zip(MOVES, state.move_proposed, state.move_accepted)
+            if proposed > 0
+        }
+        rhat = None
+        n_samples = int(state.accept.lengths.min())
+        if n_samples > ACCEPT_BURN_IN:
+            samples = [i[ACCEPT_BURN_IN:] for i in state.accept.views() + state.phi_accept.views()]
+            rhat = float(max([np.nan_to_num(split_rhat(i), nan=np.inf) for i in samples]))
+        return cls(percent, n_samples, elapsed, eta, acceptance, rhat)
+
+    def describe(self) -> str:
+        """Describe the estimated time remaining and diagnostics for display, on a single line"""
+        parts = []
+        if self.eta is not None:
+            minutes, seconds = divmod(int(round(self.eta)), 60)
+            parts.append(f"About {minutes}m {seconds:02d}s remaining")
+        if len(self.acceptance) > 0:
+            rates = ", ".join(f"{move} {rate:.2f}" for move, rate in self.acceptance.items())
+            parts.append(f"Acceptance: {rates}")
+        if self.rhat is not None:
+            parts.append(f"R-hat {self.rhat:.3f}")
+        return " | ".join(parts)
+
+
+def merge_move_statistics(CHAIN_STATISTICS: list) -> dict:
+    """Combine the move statistics from `SamplerState.move_statistics` for several chains
+
+    Returns:
+        A dictionary per move, containing a list of each statistic with one value per chain
+    """
+    merged = {}
+    for statistics in CHAIN_STATISTICS:
+        for move, values in statistics.items():
+            for key, value in values.items():
+                merged.setdefault(move, {}).setdefault(key, []).append(value)
+    return merged
 
 
 def squeeze_model(
@@ -1245,305 +2353,43 @@ def squeeze_model(
     RCD_EST,
     CALIBRATION,
     CONT_TYPE,
+    SAMPLE_DTYPE="float64",
     PROGRESS_IO: Writable | None = None,
+    STOPPING: StoppingRule | None = None,
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    RNG: np.random.Generator | None = None,
+    METHOD: str = "squeeze",
+    TUNING: ProposalTuning | None = None,
+    RESUME: bool = False,
+    STATE: SamplerState | None = None,
+    PROGRESS_CALLBACK: Callable[[ChainProgress], Any] | None = None,
+    STOP: StopFlag | None = None,
 ):
-    acept_prob = 1
-    while acept_prob > 0:
-        THETA_INITS = theta_init_func_n(KEY_REF, PHI_REF, RESULT_VEC, STRAT_VEC, P, CONTEXT_NO, TOPO_SORT)
-        PHASE_BOUNDARY_INITS = phase_bd_init_func(KEY_REF, PHI_REF, THETA_INITS, PREV_PHASE, A, P)
-        SITE_DICT_TEST_1, THETAS, PHIS_VEC, TEST_DICT_1 = dict_form_func(
-            THETA_INITS,
-            RESULT_VEC,
-            CONTEXT_NO,
-            STRAT_VEC,
-            PHASE_BOUNDARY_INITS,
-            POST_PHASE,
-            PHI_REF,
-            PREV_PHASE,
-            KEY_REF,
-            CONT_TYPE,
-        )
-        STEP_1, STEP_2, STEP_3, SAMP_VEC_TRACK = how_to_phase_samp(POST_PHASE, PREV_PHASE)
-        ########################### figures out how to sample based on phase relationships
-        K = len(THETAS)
-        M = len(PHIS_VEC)
-        S = max(RCD_ERR)
-        R = P - A
-        POST_THETAS, POST_PHIS, POST_S = set_up_post_arrays(THETAS, PHIS_VEC, THETA_INITS, PHASE_BOUNDARY_INITS)
-        PREV_PROB_TEST = post_h(A, P, SITE_DICT_TEST_1, THETAS, CONTEXT_NO, RCD_ERR, RCD_EST, CALIBRATION)[1]
-        SITE_DICT_TEST_2 = TEST_DICT_1
-        SITE_DICT_TEST_3 = TEST_DICT_1
-        SITE_DICT_TEST_4 = TEST_DICT_1
-        SITE_DICT_TEST_5 = TEST_DICT_1
-        ACCEPT = [[] for _ in range(len(THETAS))]
-        PHI_ACCEPT = [[] for _ in range(len(PHIS_VEC))]
-        ALL_SAMPS_CONT = [[] for _ in range(len(THETAS))]
-        ALL_SAMPS_PHI = [[] for _ in range(len(PHIS_VEC))]
-        i = 0
-        ###START OF MCMC ALGORITHM###############
-        while min([len(i) for i in ACCEPT]) < 60000:
-            progress_percent = int((min([len(i) for i in ACCEPT]) / 60000) * 100)
-            print(progress_percent, file=PROGRESS_IO)
-            for l in np.linspace(0, 10002, 3335):
-                SITE_DICT_TEST_1 = dict_update(SITE_DICT_TEST_1, POST_THETAS, POST_PHIS, i, i, POST_PHASE, PHI_REF)
-                # step 1
-                (
-                    prob_1_test,
-                    ACCEPT,
-                    SITE_DICT_TEST_1,
-                    SITE_DICT_TEST_2,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    ALL_SAMPS_CONT,
-                ) = step_1_squeeze(
-                    A,
-                    P,
-                    i,
-                    PREV_PROB_TEST,
-                    K,
-                    ACCEPT,
-                    SITE_DICT_TEST_1,
-                    SITE_DICT_TEST_2,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    KEY_REF,
-                    CONTEXT_NO,
-                    POST_PHASE,
-                    PHI_REF,
-                    RCD_ERR,
-                    RCD_EST,
-                    CALIBRATION,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                    PHIS_VEC,
-                    CONT_TYPE,
-                )
-                # step 2
-                (
-                    backup_b_test,
-                    prob_2_test,
-                    POST_S,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_3,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    PHI_ACCEPT,
-                    ALL_SAMPS_PHI,
-                ) = step_2_squeeze(
-                    i,
-                    prob_1_test,
-                    M,
-                    PHI_SAMP_DICT,
-                    POST_S,
-                    R,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_3,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    STEP_1,
-                    STEP_2,
-                    STEP_3,
-                    A,
-                    P,
-                    SAMP_VEC_TRACK,
-                    PHI_ACCEPT,
-                    KEY_REF,
-                    PHI_REF,
-                    CONTEXT_NO,
-                    RCD_ERR,
-                    POST_PHASE,
-                    RCD_EST,
-                    CALIBRATION,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                    CONT_TYPE,
-                )
-                # step3
-                (
-                    b_test,
-                    prob_3_test,
-                    ACCEPT,
-                    POST_S,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_4,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    PHI_ACCEPT,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                ) = step_3_squeeze(
-                    A,
-                    P,
-                    i,
-                    backup_b_test,
-                    prob_2_test,
-                    S,
-                    ACCEPT,
-                    POST_S,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_4,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    PHI_ACCEPT,
-                    POST_PHASE,
-                    PHI_REF,
-                    CONTEXT_NO,
-                    RCD_ERR,
-                    RCD_EST,
-                    CALIBRATION,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                )
-                # step 4
-                (
-                    PREV_PROB_TEST,
-                    ACCEPT,
-                    POST_S,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_5,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    PHI_ACCEPT,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                ) = step_4_squeeze(
-                    A,
-                    P,
-                    i,
-                    b_test,
-                    prob_3_test,
-                    ACCEPT,
-                    POST_S,
-                    R,
-                    PHIS_VEC,
-                    SITE_DICT_TEST_5,
-                    THETAS,
-                    POST_THETAS,
-                    POST_PHIS,
-                    PHI_ACCEPT,
-                    POST_PHASE,
-                    PHI_REF,
-                    CONTEXT_NO,
-                    RCD_ERR,
-                    RCD_EST,
-                    CALIBRATION,
-                    ALL_SAMPS_CONT,
-                    ALL_SAMPS_PHI,
-                )
-                i = i + 3
-                # CHECK_ACCEPT = accept_prob(ACCEPT, PHI_ACCEPT, i)
-                # acept_prob = len(CHECK_ACCEPT[(CHECK_ACCEPT <= 0.01) | (CHECK_ACCEPT >= 0.7)])
-                # if acept_prob > 0:
-                #     break
-        # plot code
-        #  CHECK_ACCEPT = accept_prob(ACCEPT, PHI_ACCEPT, i)
-        return PHI_ACCEPT, ACCEPT, POST_S, ALL_SAMPS_CONT, ALL_SAMPS_PHI
+    """Run a single chain of the sampler until the stopping rule is met
 
+    Each iteration applies the kernel named by METHOD from `MCMC_METHODS`, the squeeze sampler by default. The width of the squeeze sampler's shift proposal is adapted during the warm-up period of TUNING, if any.
 
-def run_MCMC(
-    CALIBRATION,
-    STRAT_VEC,
-    RCD_EST,
-    RCD_ERR,
-    KEY_REF,
-    CONTEXT_NO,
-    PHI_REF,
-    PREV_PHASE,
-    POST_PHASE,
-    TOPO_SORT,
-    CONT_TYPE,
-    PROGRESS_IO: Writable | None = None,
-):
-    """Run the MCMC algorithm for a set of input data from a Model, returning the tuple of results"""
-    #  t0 = time.perf_counter()
-    PHI_SAMP_DICT = {
-        "upper": {
-            "start": {
-                "abutting": upp_samp_1,
-                "overlap": upp_samp_2,
-                "gap": upp_samp_1,
-                "end": upp_samp_1,
-            },
-            "abutting": {"abutting": upp_samp_3, "overlap": upp_samp_4, "gap": upp_samp_3, "end": upp_samp_3},
-            "overlap": {"abutting": upp_samp_5, "overlap": upp_samp_5, "gap": upp_samp_5, "end": upp_samp_5},
-            "gap": {"abutting": upp_samp_6, "overlap": upp_samp_7, "gap": upp_samp_6, "end": upp_samp_6},
-        },
-        "lower": {
-            "start": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-            "abutting": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-            "overlap": {"abutting": low_samp_2, "overlap": low_samp_3, "gap": low_samp_5, "end": low_samp_7},
-            "gap": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-        },
-        "combined": {
-            "start": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-            "abutting": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-            "overlap": {"abutting": low_samp_2, "overlap": low_samp_3, "gap": low_samp_5, "end": low_samp_7},
-            "gap": {"abutting": low_samp_1, "overlap": low_samp_3, "gap": low_samp_4, "end": low_samp_6},
-        },
-        "overlap_upper": {
-            "start": {
-                "abutting": overlap_samp_1,
-                "overlap": overlap_samp_1,
-                "gap": overlap_samp_1,
-                "end": overlap_samp_1,
-            },
-            "abutting": {
-                "abutting": overlap_samp_1,
-                "overlap": overlap_samp_1,
-                "gap": overlap_samp_1,
-                "end": overlap_samp_1,
-            },
-            "overlap": {
-                "abutting": overlap_samp_1,
-                "overlap": overlap_samp_1,
-                "gap": overlap_samp_1,
-                "end": overlap_samp_1,
-            },
-            "gap": {
-                "abutting": overlap_samp_1,
-                "overlap": overlap_samp_1,
-                "gap": overlap_samp_1,
-                "end": overlap_samp_1,
-            },
-        },
-        "overlap_beta": {
-            "start": {
-                "abutting": overlap_samp_2,
-                "overlap": overlap_samp_2,
-                "gap": overlap_samp_2,
-                "end": overlap_samp_2,
-            },
-            "abutting": {
-                "abutting": overlap_samp_2,
-                "overlap": overlap_samp_2,
-                "gap": overlap_samp_2,
-                "end": overlap_samp_2,
-            },
-            "overlap": {
-                "abutting": overlap_samp_2,
-                "overlap": overlap_samp_2,
-                "gap": overlap_samp_2,
-                "end": overlap_samp_2,
-            },
-            "gap": {
-                "abutting": overlap_samp_2,
-                "overlap": overlap_samp_2,
-                "gap": overlap_samp_2,
-                "end": overlap_samp_2,
-            },
-        },
-    }
-    method = "squeeze"
-    A, P, RESULT_VEC = initialise(CALIBRATION, RCD_EST, RCD_ERR)  #  tot_i = 0
-    if method == "squeeze":
-        PHI_ACCEPT, ACCEPT, POST_S, ALL_SAMPS_CONT, ALL_SAMPS_PHI = squeeze_model(
+    If SAMPLE_DIRECTORY is provided, samples are streamed to memory-mapped files in that directory, which are flushed each time the stopping rule is checked. They can be read back using `read_chain`. The state of the chain is also checkpointed to the directory after each flush, see `SamplerState.save_checkpoint`. If RESUME is set, a chain with a checkpoint in SAMPLE_DIRECTORY continues from it, producing the same samples as if it had not been interrupted, until STOPPING is met. Resuming a chain which has already stopped with a larger `StoppingRule.max_samples` extends its samples. Chains without a checkpoint start from the beginning.
+
+    If STATE is provided, the chain it holds is continued in memory until STOPPING is met instead, without drawing new initial values, so it is warmed up and keeps its random number generator. RNG and RESUME are not used. If STATE was pickled, e.g. by a worker process, its likelihood grids and calibration curve are restored from RESULT_VEC and CALIBRATION. See `MCMCSession`.
+
+    All random numbers for the chain, including the initial values, are drawn from RNG, so a chain is reproduced by a generator with the same seed. If RNG is None, a generator is created from fresh entropy.
+
+    Each time the stopping rule is checked, the percentage progress is printed to PROGRESS_IO and a `ChainProgress` is passed to PROGRESS_CALLBACK, if provided. If STOP is set, sampling stops early after the current iteration, keeping the samples drawn so far, which are checkpointed if streamed so the chain can be resumed.
+
+    Returns:
+        A tuple of PHI_ACCEPT, ACCEPT, POST_S, ALL_SAMPS_CONT and ALL_SAMPS_PHI, with the samples for each parameter as a NumPy array, followed by the acceptance statistics for each move from `SamplerState.move_statistics` and the `SamplerState` of the chain, which can be passed as STATE to continue it
+    """
+    if STOPPING is None:
+        STOPPING = StoppingRule()
+    if TUNING is None:
+        TUNING = ProposalTuning()
+    if STATE is not None:
+        state = STATE
+        if state.prob_table is None:
+            state.restore_inputs(RESULT_VEC, CALIBRATION)
+    else:
+        state = start_chain(
             PHI_SAMP_DICT,
             RESULT_VEC,
             A,
@@ -1559,13 +2405,359 @@ def run_MCMC(
             RCD_EST,
             CALIBRATION,
             CONT_TYPE,
-            PROGRESS_IO,
+            SAMPLE_DTYPE,
+            SAMPLE_DIRECTORY,
+            RNG,
+            RESUME,
+        )
+    iteration = MCMC_METHODS[METHOD]
+
+    def stopped() -> bool:
+        return STOP is not None and STOP.is_set()
+
+    ###START OF MCMC ALGORITHM###############
+    start_time = time.perf_counter()
+    progress_percent, done = STOPPING.progress(state)
+    initial_percent = progress_percent
+    while not done and not stopped():
+        print(progress_percent, file=PROGRESS_IO)
+        if PROGRESS_CALLBACK is not None:
+            elapsed = time.perf_counter() - start_time
+            PROGRESS_CALLBACK(ChainProgress.from_state(state, progress_percent, initial_percent, elapsed))
+        for _ in range(STOPPING.check_interval):
+            if stopped():
+                break
+            iteration(state)
+            state.iteration += 1
+            TUNING.adapt(state)
+            if state.iteration == TUNING.warmup:
+                # Samples from before the proposal width was frozen are not from the final chain, so the burn-in removed when results are summarised must follow the warm-up
+                state.discard_samples()
+        progress_percent, done = STOPPING.progress(state)
+        state.flush_samples()
+        if SAMPLE_DIRECTORY is not None:
+            state.save_checkpoint(SAMPLE_DIRECTORY)
+    state.flush_samples()
+    if SAMPLE_DIRECTORY is not None:
+        state.save_checkpoint(SAMPLE_DIRECTORY)
+    return state.results() + (state,)
+
+
+def start_chain(
+    PHI_SAMP_DICT,
+    RESULT_VEC,
+    A,
+    P,
+    RCD_ERR,
+    KEY_REF,
+    STRAT_VEC,
+    CONTEXT_NO,
+    TOPO_SORT,
+    PREV_PHASE,
+    POST_PHASE,
+    PHI_REF,
+    RCD_EST,
+    CALIBRATION,
+    CONT_TYPE,
+    SAMPLE_DTYPE="float64",
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    RNG: np.random.Generator | None = None,
+    RESUME: bool = False,
+) -> SamplerState:
+    """Build the initial state of a chain for `squeeze_model`, drawing initial values from RNG or restoring a checkpoint from SAMPLE_DIRECTORY if RESUME is set
+
+    Returns:
+        The `SamplerState` to start sampling from
+    """
+    if RNG is None:
+        RNG = np.random.default_rng()
+    checkpoint = None
+    if RESUME and SAMPLE_DIRECTORY is not None:
+        checkpoint = SamplerState.read_checkpoint(SAMPLE_DIRECTORY)
+    if checkpoint is None:
+        THETA_INITS = theta_init_func_n(KEY_REF, PHI_REF, RESULT_VEC, STRAT_VEC, P, CONTEXT_NO, TOPO_SORT, RNG)
+        PHASE_BOUNDARY_INITS = phase_bd_init_func(KEY_REF, PHI_REF, THETA_INITS, PREV_PHASE, A, P, RNG)
+    else:
+        THETA_INITS, PHASE_BOUNDARY_INITS = (
+            checkpoint["arrays"]["thetas"]["values"],
+            checkpoint["arrays"]["phis"]["values"],
+        )
+    state = SamplerState.from_inputs(
+        THETA_INITS,
+        PHASE_BOUNDARY_INITS,
+        RESULT_VEC,
+        A,
+        P,
+        RCD_ERR,
+        RCD_EST,
+        KEY_REF,
+        STRAT_VEC,
+        CONTEXT_NO,
+        POST_PHASE,
+        PREV_PHASE,
+        PHI_REF,
+        CALIBRATION,
+        CONT_TYPE,
+        SAMPLE_DTYPE,
+        # Streamed samples are reopened when resuming, rather than replaced
+        SAMPLE_DIRECTORY if checkpoint is None else None,
+        RNG,
+        PHI_SAMP_DICT,
+    )
+    if checkpoint is not None:
+        state.restore_checkpoint(checkpoint, SAMPLE_DIRECTORY)
+    return state
+
+
+def read_chain(SAMPLE_DIRECTORY: pathlib.Path):
+    """Read the samples of a chain which were streamed to disk by `squeeze_model`, as read-only memory-mapped arrays
+
+    Parameters:
+        SAMPLE_DIRECTORY: The directory the samples were streamed to
+
+    Returns:
+        The samples from `squeeze_model`, up to the most recent flush, without the move statistics
+    """
+    phi_accept, accept, post_s, all_samps_cont, all_samps_phi = [
+        SampleBuffer.open(pathlib.Path(SAMPLE_DIRECTORY) / f"{name}.json").views() for name in SAMPLE_BUFFERS
+    ]
+    return phi_accept, accept, post_s[0], all_samps_cont, all_samps_phi
+
+
+def run_chain(
+    SEED: int | np.random.SeedSequence,
+    SQUEEZE_ARGS: tuple,
+    PROGRESS_IO: Writable | None = None,
+    STOPPING: StoppingRule | None = None,
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    METHOD: str = "squeeze",
+    TUNING: ProposalTuning | None = None,
+    RESUME: bool = False,
+    STATE: SamplerState | None = None,
+    PROGRESS_CALLBACK: Callable[[ChainProgress], Any] | None = None,
+    STOP: StopFlag | None = None,
+):
+    """Run a single chain of the sampler from a specific seed
+
+    This is a module level function so that it can be run in a worker process.
+
+    Parameters:
+        SEED: Seed for the chain's `numpy.random.Generator`, either an integer or a `SeedSequence` spawned for this chain
+        SQUEEZE_ARGS: Positional arguments for `squeeze_model`, excluding PROGRESS_IO, STOPPING and SAMPLE_DIRECTORY
+        PROGRESS_IO: Writable for progress updates
+        STOPPING: When to stop sampling
+        SAMPLE_DIRECTORY: Directory to stream samples to, or None to keep them in memory
+        METHOD: The name of the kernel to use, from `MCMC_METHODS`
+        TUNING: Adaptation of proposal widths during warm-up
+        RESUME: If the chain should continue from its checkpoint in SAMPLE_DIRECTORY, if any
+        STATE: The state of a previous run of the chain to continue from, in which case SEED and RESUME are not used
+        PROGRESS_CALLBACK: Callable to pass a `ChainProgress` to each time the stopping rule is checked
+        STOP: Flag which stops sampling early when set
+
+    Returns:
+        The tuple of results from `squeeze_model`
+    """
+    return squeeze_model(
+        *SQUEEZE_ARGS,
+        PROGRESS_IO,
+        STOPPING,
+        SAMPLE_DIRECTORY,
+        np.random.default_rng(SEED),
+        METHOD,
+        TUNING,
+        RESUME,
+        STATE,
+        PROGRESS_CALLBACK,
+        STOP,
+    )
+
+
+def run_quiet_chain(
+    SEED: int | np.random.SeedSequence,
+    SQUEEZE_ARGS: tuple,
+    STOPPING: StoppingRule | None = None,
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    METHOD: str = "squeeze",
+    TUNING: ProposalTuning | None = None,
+    RESUME: bool = False,
+    STATE: SamplerState | None = None,
+) -> SamplerState:
+    """Run a single chain of the sampler from a specific seed, discarding progress output, for use in worker processes
+
+    Returns:
+        The `SamplerState` of the chain, from which the results of `squeeze_model` are available with `SamplerState.results`. Samples streamed to SAMPLE_DIRECTORY are not copied back to the calling process, see `SampleBuffer`
+    """
+    with open(os.devnull, "w") as devnull:
+        results = run_chain(
+            SEED, SQUEEZE_ARGS, devnull, STOPPING, SAMPLE_DIRECTORY, METHOD, TUNING, RESUME, STATE, STOP=_WORKER_STOP
         )
-        _, ACCEPT_test_1, _, _, _ = squeeze_model(
+    return results[-1]
+
+
+_WORKER_STOP: StopFlag | None = None
+"""The flag which stops chains early in a worker process, shared with the calling process by `set_worker_stop`"""
+
+
+def set_worker_stop(STOP: StopFlag | None) -> None:
+    """Initialiser for worker processes, sharing the flag which stops chains early with `run_quiet_chain`
+
+    An event from `WORKER_CONTEXT` must be used to stop chains in other processes, as it can only be shared when worker processes are created.
+    """
+    global _WORKER_STOP
+    _WORKER_STOP = STOP
+
+
+def run_chains(
+    SQUEEZE_ARGS: tuple,
+    CHAINS: int = 1,
+    WORKERS: int | None = None,
+    SEED: int | None = None,
+    PROGRESS_IO: Writable | None = None,
+    STOPPING: StoppingRule | None = None,
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    METHOD: str = "squeeze",
+    TUNING: ProposalTuning | None = None,
+    RESUME: bool = False,
+    STATES: List[SamplerState] | None = None,
+    PROGRESS_CALLBACK: Callable[[ChainProgress], Any] | None = None,
+    STOP: StopFlag | None = None,
+) -> list:
+    """Run several independent chains of the sampler in parallel
+
+    The first chain is run in the calling process, reporting progress to PROGRESS_IO, while the remaining chains are run in a pool of worker processes. Each chain has its own `numpy.random.Generator`, seeded from an independent stream spawned from a single `numpy.random.SeedSequence`, so the chains are not correlated and the results for a given SEED are reproducible.
+
+    Parameters:
+        SQUEEZE_ARGS: Positional arguments for `squeeze_model`, excluding PROGRESS_IO, STOPPING and SAMPLE_DIRECTORY
+        CHAINS: The number of chains to run
+        WORKERS: The maximum number of worker processes. Defaults to one per additional chain, limited by the number of CPUs
+        SEED: Entropy for the seed sequence. If None, fresh entropy is used
+        PROGRESS_IO: Writable for progress of the first chain
+        STOPPING: When to stop sampling each chain
+        SAMPLE_DIRECTORY: If provided, samples for each chain are streamed to memory-mapped files in a `chain_<n>` subdirectory
+        METHOD: The name of the kernel to use, from `MCMC_METHODS`
+        TUNING: Adaptation of proposal widths during warm-up, for each chain
+        RESUME: If each chain should continue from its checkpoint in SAMPLE_DIRECTORY, see `squeeze_model`
+        STATES: The `SamplerState` of each chain from a previous call, to continue the chains from rather than starting them from SEED
+        PROGRESS_CALLBACK: Callable to pass a `ChainProgress` for the first chain to each time its stopping rule is checked
+        STOP: Flag which stops every chain early when set. This must be an event from `WORKER_CONTEXT` to stop chains in worker processes, see `set_worker_stop`
+
+    Returns:
+        A list of results from `squeeze_model`, one per chain
+    """
+    seeds = np.random.SeedSequence(SEED).spawn(CHAINS)
+    directories = [None] * CHAINS
+    if SAMPLE_DIRECTORY is not None:
+        directories = [pathlib.Path(SAMPLE_DIRECTORY) / f"chain_{i}" for i in range(CHAINS)]
+    if STATES is None:
+        STATES = [None] * CHAINS
+    chain_args = [(STOPPING, directory, METHOD, TUNING, RESUME, state) for directory, state in zip(directories, STATES)]
+    if CHAINS == 1:
+        return [run_chain(seeds[0], SQUEEZE_ARGS, PROGRESS_IO, *chain_args[0], PROGRESS_CALLBACK, STOP)]
+    if WORKERS is None or WORKERS < 1:
+        WORKERS = min(CHAINS - 1, os.cpu_count() or 1)
+    initializer = {} if STOP is None else {"initializer": set_worker_stop, "initargs": (STOP,)}
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=WORKER_CONTEXT, **initializer) as executor:
+        futures = [
+            executor.submit(run_quiet_chain, seed, SQUEEZE_ARGS, *args) for seed, args in zip(seeds[1:], chain_args[1:])
+        ]
+        first = run_chain(seeds[0], SQUEEZE_ARGS, PROGRESS_IO, *chain_args[0], PROGRESS_CALLBACK, STOP)
+        rest = [future.result() for future in futures]
+    return [first] + [state.results() + (state,) for state in rest]
+
+
+def merge_chains(CHAIN_RESULTS: list, SAMPLE_DIRECTORY: pathlib.Path | None = None):
+    """Merge the samples from several chains, and compute the Gelman-Rubin diagnostic for each parameter
+
+    The first chain is included in full, so that the burn-in removed when results are summarised still applies to it. Subsequent chains are appended with their burn-in (`ACCEPT_BURN_IN` accepted samples and `ALL_SAMPLES_BURN_IN` samples) already removed. Samples in `ALL_SAMPS_CONT` and `ALL_SAMPS_PHI` remain aligned by iteration across parameters.
+
+    Parameters:
+        CHAIN_RESULTS: A list of results from `squeeze_model`, one per chain
+        SAMPLE_DIRECTORY: If provided, samples merged from several chains are written to memory-mapped files in a `merged` subdirectory, rather than held in memory
+
+    Returns:
+        A tuple of the merged PHI_ACCEPT, ACCEPT, ALL_SAMPS_CONT and ALL_SAMPS_PHI as lists of NumPy arrays, followed by lists of R-hat values for each context and each group boundary, which are empty for a single chain
+    """
+
+    def merge(index: int, burn_in: int) -> List[np.ndarray]:
+        first, rest = CHAIN_RESULTS[0][index], [chain[index] for chain in CHAIN_RESULTS[1:]]
+        if len(rest) == 0:
+            return list(first)
+        if SAMPLE_DIRECTORY is None:
+            return [
+                np.concatenate([samples] + [chain[i][burn_in:] for chain in rest]) for i, samples in enumerate(first)
+            ]
+        capacity = max(len(samples) + sum(len(chain[i][burn_in:]) for chain in rest) for i, samples in enumerate(first))
+        path = pathlib.Path(SAMPLE_DIRECTORY) / "merged" / f"{SAMPLE_BUFFERS[index]}.json"
+        # Remove samples merged before a resumed run rather than overwriting them, as earlier results may map them
+        for previous in path.parent.glob(f"{path.stem}.*.npy"):
+            try:
+                previous.unlink()
+            except OSError:
+                pass
+        merged = SampleBuffer(
+            len(first), first[0].dtype if len(first) > 0 else np.float64, capacity=capacity, path=path
+        )
+        for i, samples in enumerate(first):
+            merged.extend(i, samples)
+            for chain in rest:
+                merged.extend(i, chain[i][burn_in:])
+        merged.flush()
+        return merged.views()
+
+    PHI_ACCEPT = merge(0, ACCEPT_BURN_IN)
+    ACCEPT = merge(1, ACCEPT_BURN_IN)
+    ALL_SAMPS_CONT = merge(3, ALL_SAMPLES_BURN_IN)
+    ALL_SAMPS_PHI = merge(4, ALL_SAMPLES_BURN_IN)
+    RHAT_CONT, RHAT_PHI = [], []
+    if len(CHAIN_RESULTS) > 1:
+        RHAT_CONT = [GR_conv_check(*[chain[1][i] for chain in CHAIN_RESULTS]) for i in range(len(ACCEPT))]
+        RHAT_PHI = [GR_conv_check(*[chain[0][i] for chain in CHAIN_RESULTS]) for i in range(len(PHI_ACCEPT))]
+    return PHI_ACCEPT, ACCEPT, ALL_SAMPS_CONT, ALL_SAMPS_PHI, RHAT_CONT, RHAT_PHI
+
+
+class MCMCSession:
+    """A calibration of a set of input data from a Model, which can be run and then topped up with further samples
+
+    The chains are started by the first call to `run`, and their `SamplerState` is kept between calls. `extend` continues every chain from where it stopped, keeping its warmed-up state, proposal widths and random number generator, until each has a number of further accepted samples. No samples are discarded, and extending a session produces the same samples as a single longer run with the same SEED.
+
+    The parameters are those of `run_MCMC`, which runs a session once.
+
+    Raises:
+        ValueError: If METHOD is not a known kernel
+    """
+
+    def __init__(
+        self,
+        CALIBRATION,
+        STRAT_VEC,
+        RCD_EST,
+        RCD_ERR,
+        KEY_REF,
+        CONTEXT_NO,
+        PHI_REF,
+        PREV_PHASE,
+        POST_PHASE,
+        TOPO_SORT,
+        CONT_TYPE,
+        LIKELIHOOD_CACHE: LikelihoodCache | None = None,
+        CHAINS: int = 1,
+        WORKERS: int | None = None,
+        SEED: int | None = None,
+        STOPPING: StoppingRule | None = None,
+        SAMPLE_DTYPE: str = "float64",
+        SAMPLE_DIRECTORY: pathlib.Path | None = None,
+        METHOD: str = "squeeze",
+        TUNING: ProposalTuning | None = None,
+        RESUME: bool = False,
+    ) -> None:
+        if METHOD not in MCMC_METHODS:
+            raise ValueError(f"Unknown MCMC method '{METHOD}', expected one of {', '.join(MCMC_METHODS)}")
+        self.A, self.P, RESULT_VEC = initialise(CALIBRATION, RCD_EST, RCD_ERR, LIKELIHOOD_CACHE)
+        self.squeeze_args = (
             PHI_SAMP_DICT,
             RESULT_VEC,
-            A,
-            P,
+            self.A,
+            self.P,
             RCD_ERR,
             KEY_REF,
             STRAT_VEC,
@@ -1577,27 +2769,167 @@ def run_MCMC(
             RCD_EST,
             CALIBRATION,
             CONT_TYPE,
-            PROGRESS_IO,
+            SAMPLE_DTYPE,
         )
-        # checks = [GR_conv_check(np.array(j), np.array(ACCEPT_test_1[i])) for i,j in enumerate(ACCEPT)]
-        # print(min(checks))
-        # print(max(checks))
-    elif method == "gibbs":
-        PHI_ACCEPT, ACCEPT, POST_S, ALL_SAMPS_CONT, ALL_SAMPS_PHI = gibbs_code(
-            5000,
-            RESULT_VEC,
-            A,
-            P,
-            KEY_REF,
-            PHI_REF,
-            STRAT_VEC,
-            CONTEXT_NO,
-            TOPO_SORT,
-            PREV_PHASE,
-            POST_PHASE,
-            PHI_SAMP_DICT,
-            CONT_TYPE,
+        self.context_no = CONTEXT_NO
+        self.phi_ref = PHI_REF
+        self.chains = CHAINS
+        self.workers = WORKERS
+        self.seed = SEED
+        self.stopping = STOPPING if STOPPING is not None else StoppingRule()
+        self.sample_directory = SAMPLE_DIRECTORY
+        self.method = METHOD
+        self.tuning = TUNING
+        self.resume = RESUME
+        self.states: List[SamplerState] = []
+        """The state of each chain after the most recent run, or empty if the chains have not been started"""
+
+    def accepted_samples(self) -> int:
+        """Get the smallest number of accepted samples for a context in any chain, including burn-in
+
+        Returns:
+            The number of accepted samples, 0 before the chains have been started
+        """
+        return min((int(state.accept.lengths.min()) for state in self.states), default=0)
+
+    def run(
+        self,
+        PROGRESS_IO: Writable | None = None,
+        STOPPING: StoppingRule | None = None,
+        PROGRESS_CALLBACK: Callable[[ChainProgress], Any] | None = None,
+        STOP: StopFlag | None = None,
+    ):
+        """Run the chains until STOPPING is met, starting them if this is the first run, and merge their samples
+
+        Parameters:
+            PROGRESS_IO: Writable for progress of the first chain
+            STOPPING: When to stop sampling each chain. Defaults to the session's stopping rule
+            PROGRESS_CALLBACK: Callable to pass a `ChainProgress` for the first chain to each time its stopping rule is checked
+            STOP: Flag which stops every chain early when set, keeping the samples drawn so far, see `run_chains`. The session can be run again to continue
+
+        Returns:
+            The tuple of results from `run_MCMC`
+        """
+        CHAIN_RESULTS = run_chains(
+            self.squeeze_args,
+            self.chains,
+            self.workers,
+            self.seed,
             PROGRESS_IO,
+            STOPPING if STOPPING is not None else self.stopping,
+            self.sample_directory,
+            self.method,
+            self.tuning,
+            self.resume,
+            self.states if len(self.states) > 0 else None,
+            PROGRESS_CALLBACK,
+            STOP,
+        )
+        self.states = [chain[6] for chain in CHAIN_RESULTS]
+        PHI_ACCEPT, ACCEPT, ALL_SAMPS_CONT, ALL_SAMPS_PHI, RHAT_CONT, RHAT_PHI = merge_chains(
+            CHAIN_RESULTS, self.sample_directory
         )
+        MOVE_STATISTICS = merge_move_statistics([chain[5] for chain in CHAIN_RESULTS])
+        return (
+            self.context_no,
+            ACCEPT,
+            PHI_ACCEPT,
+            self.phi_ref,
+            self.A,
+            self.P,
+            ALL_SAMPS_CONT,
+            ALL_SAMPS_PHI,
+            RHAT_CONT,
+            RHAT_PHI,
+            MOVE_STATISTICS,
+        )
+
+    def extend(
+        self,
+        SAMPLES: int,
+        PROGRESS_IO: Writable | None = None,
+        PROGRESS_CALLBACK: Callable[[ChainProgress], Any] | None = None,
+        STOP: StopFlag | None = None,
+    ):
+        """Continue every chain until each context has at least SAMPLES more accepted samples than the least sampled context, and merge their samples
+
+        Convergence is not checked, so the requested samples are always drawn. The chains are started first if they have not been run.
 
-    return CONTEXT_NO, ACCEPT, PHI_ACCEPT, PHI_REF, A, P, ALL_SAMPS_CONT, ALL_SAMPS_PHI
+        Parameters:
+            SAMPLES: The number of further accepted samples
+            PROGRESS_IO: Writable for progress of the first chain
+            PROGRESS_CALLBACK: See `run`
+            STOP: See `run`
+
+        Returns:
+            The tuple of results from `run_MCMC`
+        """
+        if len(self.states) == 0:
+            self.run(PROGRESS_IO, None, PROGRESS_CALLBACK, STOP)
+        stopping = replace(self.stopping, convergence=False, max_samples=self.accepted_samples() + SAMPLES)
+        return self.run(PROGRESS_IO, stopping, PROGRESS_CALLBACK, STOP)
+
+
+def run_MCMC(
+    CALIBRATION,
+    STRAT_VEC,
+    RCD_EST,
+    RCD_ERR,
+    KEY_REF,
+    CONTEXT_NO,
+    PHI_REF,
+    PREV_PHASE,
+    POST_PHASE,
+    TOPO_SORT,
+    CONT_TYPE,
+    PROGRESS_IO: Writable | None = None,
+    LIKELIHOOD_CACHE: LikelihoodCache | None = None,
+    CHAINS: int = 1,
+    WORKERS: int | None = None,
+    SEED: int | None = None,
+    STOPPING: StoppingRule | None = None,
+    SAMPLE_DTYPE: str = "float64",
+    SAMPLE_DIRECTORY: pathlib.Path | None = None,
+    METHOD: str = "squeeze",
+    TUNING: ProposalTuning | None = None,
+    RESUME: bool = False,
+):
+    """Run the MCMC algorithm for a set of input data from a Model, returning the tuple of results
+
+    Multiple chains are run in parallel, with their post burn-in samples merged, see `run_chains` and `merge_chains`. Samples are stored in preallocated `SampleBuffer`s as SAMPLE_DTYPE, and returned as one NumPy array per parameter. If SAMPLE_DIRECTORY is provided, samples are streamed to memory-mapped files within it as the chains run, and the returned arrays are read-only memory maps of those files. Results are reproducible for a given SEED and inputs, see `run_chains`.
+
+    METHOD selects the kernel from `MCMC_METHODS`: "squeeze" (the default) for the Metropolis-Hastings squeeze sampler, or "gibbs" to draw each parameter from its conditional distribution in turn, see `gibbs_iteration`. TUNING adapts the width of the squeeze sampler's shift proposal during a warm-up period at the start of each chain, see `ProposalTuning`.
+
+    When samples are streamed to SAMPLE_DIRECTORY each chain is checkpointed as it runs. If RESUME is set, an interrupted calibration continues from those checkpoints, or a completed one is extended to meet a larger `StoppingRule.max_samples`. The same inputs, CHAINS, SEED and METHOD must be used as for the original run.
+
+    To add samples to a calibration after it has run, without restarting its chains, use an `MCMCSession` directly.
+
+    Returns:
+        A tuple of CONTEXT_NO, ACCEPT, PHI_ACCEPT, PHI_REF, A, P, ALL_SAMPS_CONT, ALL_SAMPS_PHI, the Gelman-Rubin R-hat for each context and each group boundary (empty for a single chain), and the acceptance statistics for each move with one value per chain, see `merge_move_statistics`
+
+    Raises:
+        ValueError: If METHOD is not a known kernel
+    """
+    return MCMCSession(
+        CALIBRATION,
+        STRAT_VEC,
+        RCD_EST,
+        RCD_ERR,
+        KEY_REF,
+        CONTEXT_NO,
+        PHI_REF,
+        PREV_PHASE,
+        POST_PHASE,
+        TOPO_SORT,
+        CONT_TYPE,
+        LIKELIHOOD_CACHE,
+        CHAINS,
+        WORKERS,
+        SEED,
+        STOPPING,
+        SAMPLE_DTYPE,
+        SAMPLE_DIRECTORY,
+        METHOD,
+        TUNING,
+        RESUME,
+    ).run(PROGRESS_IO)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pathlib
+import queue
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from ..Config import Config, get_config, set_config
+from ..mcmc import WORKER_CONTEXT, ChainProgress
+from .InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
+from .Model import Model
+from .Project import Project
+
+_WORKER_CURVES: Dict[str, InterpolatedRCDCalibrationCurve] = {}
+"""Calibration curves loaded in a worker process, by curve name, so each curve is read from disk once per worker rather than once per model"""
+
+_WORKER_PROGRESS: Optional[multiprocessing.Queue] = None
+"""Queue for reporting progress from a worker process to the calling process"""
+
+
+def initialise_worker(config: Config, progress: multiprocessing.Queue) -> None:
+    """Initialiser for batch calibration worker processes
+
+    Shares the calling process' configuration and progress queue.
+
+    Parameters:
+        config: The configuration of the calling process
+        progress: Queue to put a tuple of model name and `ChainProgress` on for each progress update
+    """
+    global _WORKER_PROGRESS
+    set_config(config)
+    _WORKER_CURVES.clear()
+    _WORKER_PROGRESS = progress
+
+
+def calibrate_in_worker(
+    model: Union[Model, pathlib.Path], chains: Optional[int], workers: Optional[int], seed: Optional[int]
+) -> Model:
+    """Calibrate a model in a worker process, and save its results and the model to disk
+
+    Parameters:
+        model: The model to calibrate, or the path to a model directory to load it from
+        chains: See `Model.calibrate`
+        workers: See `Model.calibrate`
+        seed: See `Model.calibrate`
+
+    Returns:
+        The calibrated model
+
+    Raises:
+        RuntimeError: If the model is not ready for calibration, or could not be loaded or saved
+    """
+    if isinstance(model, pathlib.Path):
+        try:
+            model = Model.load_from_disk(model)
+        except RuntimeWarning as e:
+            raise RuntimeError(str(e))
+    if not model.load_check or not model.is_ready_for_mcmc():
+        raise RuntimeError(f"Model '{model.name}' is not ready for calibration, it requires a chronological graph")
+    if model.calibration_curve_name not in _WORKER_CURVES:
+        _WORKER_CURVES[model.calibration_curve_name] = InterpolatedRCDCalibrationCurve(model.calibration_curve_name)
+    model.set_calibration_curve(_WORKER_CURVES[model.calibration_curve_name])
+
+    def report(update: ChainProgress) -> None:
+        if _WORKER_PROGRESS is not None:
+            _WORKER_PROGRESS.put((model.name, update))
+
+    model.calibrate(chains, workers, seed, progress_callback=report)
+    model.mcmc_data.save(model.get_working_directory(), model.group_df, get_config().verbose)
+    model.save()
+    return model
+
+
+class BatchCalibration:
+    """Calibrate several models from a project in parallel, in a bounded pool of worker processes
+
+    Each model is calibrated by `Model.calibrate` in its own worker process, with the additional chains for a model run in further processes, so at most `workers` processes run chains at once. Each worker loads a calibration curve once, for all the models it calibrates with that curve. Results are saved to disk by the worker as each model finishes, and the calibrated model is passed back to the caller, to replace the model in the project with `Project.set_model`.
+
+    The models are resolved from the project when the batch is prepared, so the project is not used while the batch runs, e.g. in a background thread. Models which were not loaded are loaded from disk by the worker calibrating them, rather than in the calling process.
+    """
+
+    POLL_INTERVAL: float = 0.1
+    """Seconds between checks for progress from the worker processes"""
+
+    def __init__(
+        self,
+        project: Project,
+        model_names: List[str],
+        chains: Optional[int] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Prepare a batch calibration
+
+        Parameters:
+            project: The project containing the models
+            model_names: The names of the models to calibrate
+            chains: The number of MCMC chains per model. Defaults to the `mcmc_chains` configuration option.
+            workers: The maximum number of processes to run chains in at once. Defaults to the `mcmc_workers` configuration option, or the number of CPUs if that is 0.
+            seed: See `Model.create_mcmc_session`. Each model is calibrated with the same seed.
+        """
+        self.project: Project = project
+        self.model_names: List[str] = model_names
+
+        self.models: Dict[str, Union[Model, pathlib.Path]] = {}
+        """For each model which exists in the project by name, the model if it was loaded when the batch was prepared, otherwise the model directory for the worker to load it from"""
+        for name in model_names:
+            if project.has_model(name):
+                model = project.models[name]
+                self.models[name] = model if model is not None else project.path / name
+
+        self.chains: int = chains if chains is not None else get_config().mcmc_chains
+        self.workers: int = workers if workers is not None else get_config().mcmc_workers
+        if self.workers < 1:
+            self.workers = os.cpu_count() or 1
+        self.seed: Optional[int] = seed
+
+    @property
+    def max_models(self) -> int:
+        """The number of models calibrated at once, so that their chains do not exceed the number of workers"""
+        return max(1, min(len(self.model_names), self.workers // max(1, self.chains)))
+
+    def run(
+        self,
+        progress_callback: Optional[Callable[[str, ChainProgress], Any]] = None,
+        finished_callback: Optional[Callable[[str, Optional[Model], Optional[Exception]], Any]] = None,
+    ) -> Dict[str, Exception]:
+        """Calibrate each model, blocking until all models have finished
+
+        Callbacks are called from the calling thread. A model which fails does not stop the remaining models from being calibrated. The project is not modified.
+
+        Parameters:
+            progress_callback: Callable to pass the model name and a `ChainProgress` for its first chain to, each time its progress is reported
+            finished_callback: Callable to pass the model name, the calibrated model and None to once a model has been calibrated and saved, or the model name, None and the exception if it failed
+
+        Returns:
+            The exception for each model which could not be calibrated, by model name
+        """
+        failures: Dict[str, Exception] = {}
+
+        def finished(name: str, model: Optional[Model], error: Optional[Exception]) -> None:
+            if error is not None:
+                failures[name] = error
+            if finished_callback is not None:
+                finished_callback(name, model, error)
+
+        for name in self.model_names:
+            if name not in self.models:
+                finished(name, None, RuntimeError(f"Model '{name}' does not exist"))
+        if len(self.models) == 0:
+            return failures
+
+        progress = WORKER_CONTEXT.Queue()
+
+        def report_progress() -> None:
+            while True:
+                try:
+                    name, update = progress.get_nowait()
+                except queue.Empty:
+                    return
+                if progress_callback is not None:
+                    progress_callback(name, update)
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_models,
+                mp_context=WORKER_CONTEXT,
+                initializer=initialise_worker,
+                initargs=(get_config(), progress),
+            ) as executor:
+                futures: Dict[Future, str] = {
+                    executor.submit(calibrate_in_worker, model, self.chains, None, self.seed): name
+                    for name, model in self.models.items()
+                }
+                pending = set(futures)
+                while len(pending) > 0:
+                    done, pending = wait(pending, timeout=self.POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    report_progress()
+                    for future in done:
+                        name = futures[future]
+                        try:
+                            model = future.result()
+                        except Exception as e:
+                            finished(name, None, e)
+                            continue
+                        finished(name, model, None)
+            report_progress()
+        finally:
+            progress.close()
+        return failures
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import importlib.resources
 import pathlib
 from dataclasses import dataclass, field
@@ -25,15 +26,30 @@ class InterpolatedRCDCalibrationCurve:
 
     __dataframe: pd.DataFrame | None = field(default=None, init=False)
 
+    __sha256: str | None = field(default=None, init=False)
+
     @property
     def path(self) -> pathlib.Path:
         """Path to the calibration curve CSV based on the selected curve name."""
         return importlib.resources.files(__name__.split(".")[0]).joinpath(f"resources/{self.curve_name}.csv")
 
+    @property
+    def sha256(self) -> str:
+        """SHA-256 hex digest of the calibration curve CSV, identifying the exact curve data (computed on first access)."""
+        if self.__sha256 is None:
+            self.__sha256 = hashlib.sha256(self.path.read_bytes()).hexdigest()
+        return self.__sha256
+
     def load(self) -> None:
         """Load the calibration data from disk into a DataFrame."""
         self.__dataframe = pd.read_csv(self.path, sep=",")
 
+    def __getstate__(self) -> dict:
+        """Pickle the curve without its data, which is loaded again on first access"""
+        state = self.__dict__.copy()
+        state["_InterpolatedRCDCalibrationCurve__dataframe"] = None
+        return state
+
     @property
     def df(self) -> pd.DataFrame:
         """Get the calibration data as a DataFrame (loaded on first access)."""
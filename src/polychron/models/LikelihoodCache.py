@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..mcmc import likelihood_grids
+from ..util import write_file_atomic
+
+
+@dataclass
+class LikelihoodCache:
+    """Persistent on-disk cache of the likelihood grids used by the MCMC, for individual radiocarbon determinations
+
+    Each grid is stored as a `.npy` file, named by a hash of the calibration curve name, the hash of the curve file, the radiocarbon determination and error, the calendar range and the grid step. Entries are loaded memory-mapped, so a cache hit does not need to read or parse the whole grid.
+
+    The total size of the cache is bounded, with the least recently used entries evicted first. File modification times are used to track use, so the cache can be shared between processes without any additional index.
+    """
+
+    path: pathlib.Path
+    """The directory containing the cache entries"""
+
+    curve_name: str
+    """The name of the calibration curve the likelihoods are computed against"""
+
+    curve_sha256: str
+    """Hash of the calibration curve file, so entries are invalidated if the curve data changes"""
+
+    max_bytes: int = 256 * 1024 * 1024
+    """The maximum total size of cache entries on disk, in bytes"""
+
+    GRID_STEP = 0.1
+    """The step between calendar years on the likelihood grid produced by `likelihood_grids`"""
+
+    FORMAT_VERSION = 1
+    """Version of the cache entry format, included in the key so incompatible entries are never loaded"""
+
+    def key(self, rcd_est: float, rcd_err: float, A: int, P: int) -> str:
+        """Get the content-addressed key for a single likelihood grid
+
+        Returns:
+            A hex digest identifying the entry
+        """
+        data = {
+            "format": self.FORMAT_VERSION,
+            "curve_name": self.curve_name,
+            "curve_sha256": self.curve_sha256,
+            "date": float(rcd_est),
+            "error": float(rcd_err),
+            "A": int(A),
+            "P": int(P),
+            "step": self.GRID_STEP,
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key: str) -> pathlib.Path:
+        """Get the path to the file for a cache entry"""
+        return self.path / f"{key}.npy"
+
+    def load(self, key: str, length: int) -> np.ndarray | None:
+        """Load a cache entry as a read-only memory-mapped array, marking it as recently used
+
+        Parameters:
+            key: The key of the entry
+            length: The expected length of the likelihood grid
+
+        Returns:
+            The likelihood grid, or None if the entry does not exist or is invalid
+        """
+        entry = self.entry_path(key)
+        try:
+            prob = np.load(entry, mmap_mode="r")
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        if prob.shape != (length,) or prob.dtype != np.float64:
+            return None
+        return prob
+
+    def store(self, key: str, prob: np.ndarray) -> None:
+        """Write a cache entry, replacing any existing entry atomically
+
+        Parameters:
+            key: The key of the entry
+            prob: The likelihood grid
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_file_atomic(
+            self.entry_path(key), lambda f: np.save(f, np.ascontiguousarray(prob, dtype=np.float64)), binary=True
+        )
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is within `max_bytes`"""
+        if not self.path.is_dir():
+            return
+        entries = []
+        for entry in self.path.glob("*.npy"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                # The entry may be in use (memory-mapped on windows) or already removed by another process
+                continue
+            total -= size
+
+    def likelihood_grids(
+        self, RCD_EST: List[float], RCD_ERR: List[float], A: int, P: int, CALIBRATION: pd.DataFrame
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Get the likelihood grids for a set of radiocarbon determinations, computing and storing any not in the cache
+
+        Equivalent to `mcmc.likelihood_grids`, which is used for any determinations which are not cached. Failing to write to the cache is not an error.
+
+        Returns:
+            The 0.1 year grid of calendar years, and a list of normalised likelihoods per determination
+        """
+        intep_theta = np.linspace(A, P, ((P - A) * 10) + 1)
+        keys = [self.key(est, err, A, P) for est, err in zip(RCD_EST, RCD_ERR)]
+        probs = [self.load(key, len(intep_theta)) for key in keys]
+        missing = [i for i, prob in enumerate(probs) if prob is None]
+        if len(missing) > 0:
+            _, computed = likelihood_grids(
+                [RCD_EST[i] for i in missing], [RCD_ERR[i] for i in missing], A, P, CALIBRATION
+            )
+            for i, prob in zip(missing, computed):
+                probs[i] = prob
+                try:
+                    self.store(keys[i], prob)
+                except OSError:
+                    pass
+            self.evict()
+        return intep_theta, probs
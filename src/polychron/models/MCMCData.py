@@ -1,13 +1,18 @@
 import json
 import pathlib
+import threading
+import uuid
 from dataclasses import dataclass, field
-from typing import Dict, List, get_type_hints
+from typing import Dict, List, Optional, Tuple, get_type_hints
 
+import numpy as np
 import pandas as pd
 from packaging.version import Version
 
 from .. import __version__
-from ..util import MonotonicTimer
+from ..mcmc import ALL_SAMPLES_BURN_IN
+from ..util import MonotonicTimer, write_file_atomic
+from .PosteriorSummary import PosteriorSummary
 
 
 @dataclass
@@ -27,7 +32,7 @@ class MCMCData:
     accept_samples_context: List[List[float]] = field(default_factory=list)
     """A list of accepted samples from the MCMC process.
 
-    The number of accepted samples is important.
+    The number of accepted samples is important. Samples for each context are NumPy arrays following calibration, or lists once loaded from disk.
         
     Formerly `StartPage.ACCEPT`
     """
@@ -78,9 +83,74 @@ class MCMCData:
     Formerly `StartPage.all_results_dict`
     """
 
+    rhat: Dict[str, float] = field(default_factory=dict)
+    """Gelman-Rubin convergence diagnostic (R-hat) for each context and group boundary label, when more than one MCMC chain was run."""
+
+    seed: Optional[int] = None
+    """The seed the MCMC chains were run with, which reproduces these results when used as the `mcmc_seed` configuration option with the same model and options. None if unknown."""
+
+    move_statistics: Dict[str, Dict[str, List[float]]] = field(default_factory=dict)
+    """Acceptance statistics for each move of the MCMC sampler, containing the number of proposals, the number accepted and for the shift move the final proposal width, with one value per chain. Produced by `mcmc.merge_move_statistics`."""
+
     calibration_curve_name: str = "intcal20_interpolated"
     """Name of the calibration curve which was used to generate this `MCMCData`. This enables the correct curve to be displayed on the dating results tab when the curve has been changed, but the model has not been re-calibrated."""
 
+    STORAGE_VERSION = 1
+    """Version of the binary storage format written by `save`, recorded in the manifest"""
+
+    MANIFEST_FILENAME = "polychron_mcmc_data.json"
+    """Name of the json manifest written by `save`, which contained all of the samples prior to the binary storage format"""
+
+    SAMPLES_FILENAME = "polychron_mcmc_data.npz"
+    """Name of the file containing sample arrays written by `save`"""
+
+    SAMPLE_FIELDS = ("accept_samples_context", "accept_samples_phi", "all_samples_context", "all_samples_phi")
+    """Members containing a list of samples per parameter, which are stored in the samples file"""
+
+    GROUP_LIMIT_FIELDS = ("accept_group_limits", "all_group_limits")
+    """Members containing samples per label, which are stored in the samples file unless they refer to one of `SAMPLE_FIELDS`"""
+
+    __load_lock = threading.Lock()
+    """Lock held while deferred samples are loaded, so they are only loaded once if accessed from several threads"""
+
+    def __getattr__(self, name: str):
+        # Only called when an attribute is not found normally, i.e. for samples deferred by load_from_disk(lazy=True)
+        if name in MCMCData.SAMPLE_FIELDS + MCMCData.GROUP_LIMIT_FIELDS and "_MCMCData__pending" in self.__dict__:
+            self.load_samples()
+            return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def samples_loaded(self) -> bool:
+        """If all samples are available, i.e. this instance was not loaded lazily or the deferred samples have since been loaded"""
+        return "_MCMCData__pending" not in self.__dict__
+
+    def load_samples(self) -> None:
+        """Load samples which were deferred by `load_from_disk(lazy=True)`
+
+        This is safe to call from a background thread. Members which have been assigned since the instance was loaded are not replaced.
+
+        Raises:
+            RuntimeError: If the samples file is missing or invalid
+        """
+        with MCMCData.__load_lock:
+            if self.samples_loaded:
+                return
+            manifest, samples_path = self.__dict__["_MCMCData__pending"]
+            values = self.__load_storage(manifest, samples_path)
+            for k, v in values.items():
+                self.__dict__.setdefault(k, v)
+            del self.__dict__["_MCMCData__pending"]
+
+    @classmethod
+    def __load_storage(cls, manifest: dict, samples_path: pathlib.Path) -> Dict[str, object]:
+        """Load the sample members for a storage manifest from its samples file"""
+        if not samples_path.is_file():
+            raise RuntimeError(f"Error loading MCMCData samples, '{samples_path}' is not a file")
+        with np.load(samples_path) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+        return cls.from_storage(manifest, arrays)
+
     def save_results_dataframes(self, path: pathlib.Path, group_df: pd.DataFrame) -> None:
         """Save some MCMC data to disk, separately from the serialised version of this class
 
@@ -97,10 +167,14 @@ class MCMCData:
         # Output the some of all_group_limits
         df = pd.DataFrame()
         for i in self.all_group_limits.keys():
-            df[i] = self.all_group_limits[i][10000:]
+            df[i] = self.all_group_limits[i][ALL_SAMPLES_BURN_IN:]
         full_results_df_path = path / "full_results_df"
         df.to_csv(full_results_df_path, index=False)
 
+        # Output a summary table of the same samples alongside them
+        if len(df) > 0:
+            PosteriorSummary({k: df[k].to_numpy() for k in df.columns}).save(path)
+
         # List containing the the group for each context, in order of topologically sorted contexts.
         key_ref = [list(group_df["Group"])[list(group_df["context"]).index(i)] for i in self.contexts]
         df1 = pd.DataFrame(key_ref)
@@ -121,6 +195,7 @@ class MCMCData:
         """
 
         # Create a dictionary containing a subset of this instance's member variables, converted to formats which can be json serialised.
+        self.load_samples()
         data = {}
 
         for k, v in self.__dict__.items():
@@ -130,11 +205,132 @@ class MCMCData:
                 data[k] = str(v)
 
         indent = 2 if pretty else None
-        return json.dumps({"polychron_version": Version(__version__).public, "mcmc_data": data}, indent=indent)
+        return json.dumps(
+            {"polychron_version": Version(__version__).public, "mcmc_data": data},
+            indent=indent,
+            default=self.__json_default,
+        )
+
+    @staticmethod
+    def __json_default(obj):
+        """Convert the NumPy arrays of samples produced by `run_MCMC` to lists during json serialisation"""
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def to_storage(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """Get the binary storage representation of this object, as a json serialisable manifest and a dictionary of arrays
+
+        Samples for each member in `SAMPLE_FIELDS` are concatenated into a single array, with a second array of offsets to the start of each parameter's samples. Samples in `GROUP_LIMIT_FIELDS` which are the same object as one of the `SAMPLE_FIELDS` rows (as produced by `Model.MCMC_func`) are stored as a reference to that row rather than duplicated.
+
+        The manifest and arrays share a unique `storage_id`, so that a samples file which does not belong to a manifest (e.g. if saving was interrupted between writing the two files) is detected when loaded.
+
+        Returns:
+            A tuple of the manifest, and the arrays to be saved in `SAMPLES_FILENAME`
+        """
+        self.load_samples()
+        data = {}
+        for k, v in self.__dict__.items():
+            if k in self.SAMPLE_FIELDS or k in self.GROUP_LIMIT_FIELDS:
+                continue
+            data[k] = v if v is None or isinstance(v, tuple([str, int, float, list, dict, tuple])) else str(v)
+
+        arrays = {}
+        rows = {}
+        for k in self.SAMPLE_FIELDS:
+            samples = getattr(self, k) or []
+            arrays[k], arrays[f"{k}_offsets"] = self.__pack(samples)
+            rows.update({id(row): [k, i] for i, row in enumerate(samples)})
+        group_limits = {}
+        for k in self.GROUP_LIMIT_FIELDS:
+            references, unique = {}, []
+            for label, samples in (getattr(self, k) or {}).items():
+                if id(samples) in rows:
+                    references[label] = rows[id(samples)]
+                else:
+                    references[label] = [k, len(unique)]
+                    unique.append(samples)
+            arrays[k], arrays[f"{k}_offsets"] = self.__pack(unique)
+            group_limits[k] = references
+
+        storage_id = uuid.uuid4().hex
+        arrays["storage_id"] = np.array(storage_id)
+        manifest = {
+            "polychron_version": Version(__version__).public,
+            "mcmc_data": data,
+            "storage": {
+                "version": self.STORAGE_VERSION,
+                "id": storage_id,
+                "samples": self.SAMPLES_FILENAME,
+                "group_limits": group_limits,
+            },
+        }
+        return manifest, arrays
+
+    @staticmethod
+    def __pack(samples: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Concatenate samples for several parameters, returning the samples and the offset of each parameter's samples"""
+        offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(row) for row in samples])
+        if len(samples) == 0:
+            return np.zeros(0, dtype=np.float64), offsets
+        return np.concatenate([np.asarray(row) for row in samples]), offsets
+
+    @classmethod
+    def from_storage(cls, manifest: dict, arrays: Dict[str, np.ndarray]) -> Dict[str, object]:
+        """Get the sample members of an instance from the binary storage representation produced by `to_storage`
+
+        Parameters:
+            manifest: The storage manifest
+            arrays: Arrays loaded from `SAMPLES_FILENAME`, by name
+
+        Returns:
+            A dictionary of keyword arguments for the `SAMPLE_FIELDS` and `GROUP_LIMIT_FIELDS` members. Samples for each parameter are views of the loaded arrays
+
+        Raises:
+            RuntimeError: If the storage version is not supported, an expected array is missing, or the arrays do not match the manifest
+        """
+        storage = manifest["storage"]
+        if storage.get("version", 0) > cls.STORAGE_VERSION:
+            raise RuntimeError(f"Unsupported MCMCData storage version {storage.get('version')}")
+        if "id" in storage and ("storage_id" not in arrays or str(arrays["storage_id"]) != storage["id"]):
+            raise RuntimeError("MCMCData samples do not belong to the manifest, which may have been partially saved")
+        unpacked = {}
+        for k in cls.SAMPLE_FIELDS + cls.GROUP_LIMIT_FIELDS:
+            if k not in arrays or f"{k}_offsets" not in arrays:
+                raise RuntimeError(f"Required array '{k}' missing from MCMCData samples")
+            samples, offsets = arrays[k], arrays[f"{k}_offsets"]
+            if (
+                offsets.ndim != 1
+                or len(offsets) == 0
+                or offsets[0] != 0
+                or offsets[-1] != len(samples)
+                or np.any(np.diff(offsets) < 0)
+            ):
+                raise RuntimeError(f"Invalid offsets for array '{k}' in MCMCData samples")
+            unpacked[k] = [samples[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        values = {k: unpacked[k] for k in cls.SAMPLE_FIELDS}
+        for k in cls.GROUP_LIMIT_FIELDS:
+            values[k] = {}
+            for label, (name, i) in storage["group_limits"].get(k, {}).items():
+                if name not in unpacked or not isinstance(i, int) or not 0 <= i < len(unpacked[name]):
+                    raise RuntimeError(f"Invalid reference {[name, i]} for '{label}' in MCMCData {k}")
+                values[k][label] = unpacked[name][i]
+        return values
+
+    def __write_storage(self, path: pathlib.Path, manifest: str, arrays: Dict[str, np.ndarray]) -> None:
+        """Write the samples file and manifest into a directory
+
+        The samples are written before the manifest which refers to them, replacing each existing file atomically.
+        """
+        write_file_atomic(path / self.SAMPLES_FILENAME, lambda f: np.savez(f, **arrays), binary=True)
+        write_file_atomic(path / self.MANIFEST_FILENAME, lambda f: f.write(manifest))
 
     def save(self, path: pathlib.Path, group_df: pd.DataFrame, verbose: bool = False) -> None:
         """Save the current state of this file to the specified path
 
+        Samples are saved in a binary `.npz` file, with other members in a small json manifest, see `to_storage`.
+
         Parameters:
             path: The directory in which the files will be saved.
             group_df: A pandas dataframe containing context group information
@@ -150,16 +346,15 @@ class MCMCData:
             try:
                 timer_save = MonotonicTimer().start()
 
-                # Get the json representation of the object
-                timer_to_json = MonotonicTimer().start()
-                json_s = self.to_json(pretty=True)
-                timer_to_json.stop()
+                # Get the manifest and sample arrays for the binary representation of the object
+                timer_to_storage = MonotonicTimer().start()
+                manifest, arrays = self.to_storage()
+                json_s = json.dumps(manifest, indent=2)
+                timer_to_storage.stop()
 
-                timer_json_write = MonotonicTimer().start()
-                json_path = path / "polychron_mcmc_data.json"
-                with open(json_path, "w") as f:
-                    f.write(json_s)
-                timer_json_write.stop()
+                timer_storage_write = MonotonicTimer().start()
+                self.__write_storage(path, json_s, arrays)
+                timer_storage_write.stop()
 
                 timer_files = MonotonicTimer().start()
                 # Also save the individual MCMC ouput files into the working directory
@@ -170,28 +365,31 @@ class MCMCData:
                 timer_save.stop()
                 if verbose:
                     print("Timing - MCMCData.save:")
-                    print(f"  total:      {timer_save.elapsed(): .6f}s")
-                    print(f"  to_json:    {timer_to_json.elapsed(): .6f}s")
-                    print(f"  json_write: {timer_json_write.elapsed(): .6f}s")
-                    print(f"  files:      {timer_files.elapsed(): .6f}s")
+                    print(f"  total:         {timer_save.elapsed(): .6f}s")
+                    print(f"  to_storage:    {timer_to_storage.elapsed(): .6f}s")
+                    print(f"  storage_write: {timer_storage_write.elapsed(): .6f}s")
+                    print(f"  files:         {timer_files.elapsed(): .6f}s")
 
             except Exception as e:
                 raise e
         else:
-            raise RuntimeError(f"'{path}' is not a directory, unable to save \"polychron_mcmc_data.json\"")
+            raise RuntimeError(f"'{path}' is not a directory, unable to save \"{self.MANIFEST_FILENAME}\"")
 
     @classmethod
-    def load_from_disk(cls, json_path: pathlib.Path) -> "MCMCData":
+    def load_from_disk(cls, json_path: pathlib.Path, lazy: bool = False) -> "MCMCData":
         """Get an instance of the MCMCData from serialised json on disk.
 
+        If the json file is a manifest for the binary storage format, samples are loaded from the samples file it refers to. Otherwise samples are loaded from the json file itself, as saved by previous versions of polychron.
+
         Parameters:
             json_path: Path to json file to load it from
+            lazy: If loading samples from the samples file should be deferred until they are first accessed, or `load_samples` is called. Only the manifest is read by this method.
 
         Returns:
             MCMCData instance
 
         Raises:
-            RuntimeError: If the json_path is not an existing file; or the 'polychron_version' key is missing from the json file'; or the 'mcmc_data' key is missing from the json file
+            RuntimeError: If the json_path is not an existing file; or the 'polychron_version' key is missing from the json file'; or the 'mcmc_data' key is missing from the json file; or the samples file for a manifest is missing or invalid
             json.JSONDecodeError: If the json_path does not point to a valid json file
         """
         import sys
@@ -233,8 +431,50 @@ class MCMCData:
             for k in unexpected_keys:
                 del mcmc_data[k]
 
+            # Load samples from the binary samples file, if this is a manifest and loading is not deferred
+            samples_path = None
+            if "storage" in data:
+                samples_path = json_path.with_name(data["storage"].get("samples", cls.SAMPLES_FILENAME))
+                if lazy:
+                    if not samples_path.is_file():
+                        raise RuntimeError(f"Error loading MCMCData samples, '{samples_path}' is not a file")
+                else:
+                    mcmc_data.update(cls.__load_storage(data, samples_path))
+
         # Create an instance of the Model
         obj: MCMCData = cls(**mcmc_data)
 
+        # Remove the default samples from a lazily loaded instance, so they are loaded on first access
+        if lazy and samples_path is not None:
+            for k in cls.SAMPLE_FIELDS + cls.GROUP_LIMIT_FIELDS:
+                del obj.__dict__[k]
+            obj.__dict__["_MCMCData__pending"] = (data, samples_path)
+
         # Return the instance
         return obj
+
+    @classmethod
+    def migrate(cls, path: pathlib.Path) -> bool:
+        """Convert MCMCData saved as json by previous versions of polychron to the binary storage format, in place
+
+        Parameters:
+            path: The directory containing `MANIFEST_FILENAME`
+
+        Returns:
+            True if the data was migrated, or False if it was already in the binary format
+
+        Raises:
+            RuntimeError: If the json file could not be loaded
+            json.JSONDecodeError: If the json file is not valid json
+            OSError: If the binary files could not be written
+        """
+        json_path = path / cls.MANIFEST_FILENAME
+        if not json_path.is_file():
+            raise RuntimeError(f"Error migrating MCMCData, '{json_path}' is not a file")
+        with open(json_path, "r") as f:
+            if "storage" in json.load(f):
+                return False
+        obj = cls.load_from_disk(json_path)
+        manifest, arrays = obj.to_storage()
+        obj.__write_storage(path, json.dumps(manifest, indent=2), arrays)
+        return True
@@ -2,16 +2,21 @@ from __future__ import annotations
 
 import csv
 import filecmp
+import hashlib
 import json
 import os
 import pathlib
 import shutil
 import sys
-from dataclasses import dataclass, field
+import tempfile
+import threading
+import weakref
+from dataclasses import asdict, dataclass, field
 from inspect import signature
-from typing import Dict, List, Literal, Optional, Tuple, get_type_hints
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, get_type_hints
 
 import networkx as nx
+import numpy as np
 import packaging.version
 import pandas as pd
 import pydot
@@ -22,8 +27,8 @@ from PIL import Image, UnidentifiedImageError
 
 from .. import __version__
 from ..Config import get_config
-from ..interfaces import Writable
-from ..mcmc import run_MCMC
+from ..interfaces import StopFlag, Writable
+from ..mcmc import ACCEPT_BURN_IN, ChainProgress, MCMCSession, ProposalTuning, StoppingRule
 from ..models.MCMCData import MCMCData
 from ..util import (
     MonotonicTimer,
@@ -35,6 +40,35 @@ from ..util import (
     trim,
 )
 from .InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
+from .LikelihoodCache import LikelihoodCache
+from .ModelMetadata import ModelMetadata
+from .PosteriorSummary import PosteriorSummary
+
+_active_sample_directories: weakref.WeakValueDictionary[pathlib.Path, MCMCSession] = weakref.WeakValueDictionary()
+"""The sessions which are running or can still be run, by the directory their samples are streamed to, so that directories in use are not removed or resumed by another calibration"""
+
+_active_sample_directories_lock = threading.Lock()
+"""Lock for `_active_sample_directories`, as sessions may be created and run in different threads"""
+
+
+_EPHEMERAL_MEMBERS = [
+    "path",  # Don't include the path, so models can be trivially copied on disk
+    "stratigraphic_image",  # don't include image handles
+    "chronological_image",  # don't include image handles
+    "resid_or_intru_dag",  # no need to save the residual or intrusive dag, it's ephemeral
+    "resid_or_intru_image",  # don't include image handles
+    "intrusive_contexts",  # not needed, ephemeral
+    "intrusive_context_types",  # not needed, ephemeral
+    "residual_contexts",  # not needed, ephemeral
+    "residual_context_types",  # not needed, ephemeral
+    "stratigraphic_node_coords",  # svg coords are ephemeral
+    "chronological_node_coords",  # svg coords are ephemeral
+    "resid_or_intru_node_coords",  # svg coords are ephemeral
+    "mcmc_data",  # don't include the mcmc_data object, which has been saved elsewhere.
+    "_Model__calibration",  # don't save the interpolated calibration curve, it is already on disk. Must use the fully qualified name for __ members?
+    "_Model__unsaved_changes",  # bookkeeping for has_unsaved_changes, not part of the model
+]
+"""Model members which are not saved to `polychron_model.json` by `Model.to_json`"""
 
 
 @dataclass
@@ -273,6 +307,22 @@ class Model:
     __calibration: Optional[InterpolatedRCDCalibrationCurve] = field(default=None, init=False, repr=False)
     """Interpolated RCD calibration curve object, which is stored in a member variable so it is loaded once and only once"""
 
+    __unsaved_changes: bool = field(default=True, init=False, repr=False, compare=False)
+    """If this model may differ from the version saved to disk. Set when a saved member is assigned or `mark_unsaved` is called, and cleared by `save` and `load_from_disk`"""
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute, marking the model as having unsaved changes if it is a member saved by `to_json`"""
+        super().__setattr__(name, value)
+        if name not in _EPHEMERAL_MEMBERS:
+            super().__setattr__("_Model__unsaved_changes", True)
+
+    def mark_unsaved(self) -> None:
+        """Mark this model as having unsaved changes.
+
+        Assigning to a saved member does this automatically, but it must be called after modifying a saved member in place, e.g. adding an edge to the `stratigraphic_dag`.
+        """
+        self.__unsaved_changes = True
+
     def get_working_directory(self) -> pathlib.Path:
         """Get the working directory to be used for dynamically created files
 
@@ -280,6 +330,48 @@ class Model:
         """
         return self.path / "workdir"
 
+    def get_likelihood_cache_directory(self) -> pathlib.Path:
+        """Get the path to the directory used to cache calibrated likelihoods for this model
+
+        Returns:
+            The path to the `likelihood_cache` directory within the working directory for this model
+        """
+        return self.get_working_directory() / "likelihood_cache"
+
+    def get_mcmc_samples_directory(self) -> pathlib.Path:
+        """Get the path to the directory MCMC samples are streamed to during calibration, if enabled
+
+        Returns:
+            The path to the `mcmc_samples` directory within the working directory for this model
+        """
+        return self.get_working_directory() / "mcmc_samples"
+
+    def get_resumable_mcmc_run(self) -> Optional[Tuple[pathlib.Path, dict]]:
+        """Get the most recent calibration of this model whose samples were streamed to disk, which can be resumed or extended
+
+        Returns:
+            The directory samples were streamed to and the options the calibration was run with, or None if there is no such calibration
+        """
+        runs = sorted(self.get_mcmc_samples_directory().glob("run-*/run.json"), key=lambda path: path.stat().st_mtime)
+        if len(runs) == 0:
+            return None
+        with open(runs[-1], "r") as f:
+            return runs[-1].parent, json.load(f)
+
+    def remove_previous_mcmc_runs(self, keep: pathlib.Path) -> None:
+        """Remove the directories samples were streamed to by previous calibrations of this model
+
+        Directories owned by a session which may still be running, i.e. from a calibration which was started while this calibration was running, are not removed.
+
+        Parameters:
+            keep: The directory of the calibration which has just completed, which is not removed
+        """
+        with _active_sample_directories_lock:
+            active = set(_active_sample_directories.keys())
+        for previous in self.get_mcmc_samples_directory().glob("run-*"):
+            if previous != keep and previous.resolve() not in active:
+                shutil.rmtree(previous, ignore_errors=True)
+
     def get_chronological_graph_directory(self) -> pathlib.Path:
         """Get the path to the chronological_graph directory for this model
 
@@ -312,28 +404,35 @@ class Model:
         """
         return self.path / "python_only"
 
+    def get_metadata_path(self) -> pathlib.Path:
+        """Get the path to the metadata sidecar file for this model, see `ModelMetadata`
+
+        Returns:
+            The path to the metadata file, in the `python_only` directory for this model
+        """
+        return self.get_python_only_directory() / ModelMetadata.FILENAME
+
+    def save_metadata(self) -> ModelMetadata:
+        """Save the metadata sidecar for this model, summarising the saved `polychron_model.json`
+
+        Returns:
+            The saved metadata
+
+        Raises:
+            FileNotFoundError: If the model has not been saved
+        """
+        json_path = self.get_python_only_directory() / "polychron_model.json"
+        sha256 = hashlib.sha256(json_path.read_bytes()).hexdigest()
+        metadata = ModelMetadata.from_model(self, json_path.stat().st_mtime, sha256)
+        metadata.save(self.get_metadata_path())
+        return metadata
+
     def to_json(self, pretty: bool = False):
         """Serialise this object to JSON, excluding ephemeral members"""
         # Create a dictionary containing a subset of this instance's member variables, converted to formats which can be json serialised.
         data = {}
-        exclude_keys = [
-            "path",  # Don't include the path, so models can be trivially copied on disk
-            "stratigraphic_image",  # don't include image handles
-            "chronological_image",  # don't include image handles
-            "resid_or_intru_dag",  # no need to save the residual or intrusive dag, it's ephemeral
-            "resid_or_intru_image",  # don't include image handles
-            "intrusive_contexts",  # not needed, ephemeral
-            "intrusive_context_types",  # not needed, ephemeral
-            "residual_contexts",  # not needed, ephemeral
-            "residual_context_types",  # not needed, ephemeral
-            "stratigraphic_node_coords",  # svg coords are ephemeral
-            "chronological_node_coords",  # svg coords are ephemeral
-            "resid_or_intru_node_coords",  # svg coords are ephemeral
-            "mcmc_data",  # don't include the mcmc_data object, which has been saved elsewhere.
-            "_Model__calibration",  # don't save the interpolated calibration curve, it is already on disk. Must use the fully qualified name for __ members?
-        ]
         for k, v in self.__dict__.items():
-            if k not in exclude_keys:
+            if k not in _EPHEMERAL_MEMBERS:
                 if v is None:
                     data[k] = v
                 elif isinstance(v, tuple([str, int, float, list, dict, tuple])):
@@ -356,6 +455,16 @@ class Model:
         indent = 2 if pretty else None
         return json.dumps({"polychron_version": Version(__version__).public, "model": data}, indent=indent)
 
+    def has_unsaved_changes(self) -> bool:
+        """Check if this model may differ from the version saved to disk
+
+        This does not compare against the saved `polychron_model.json`, so in-place modifications of saved members are only detected if `mark_unsaved` was called.
+
+        Returns:
+            True if the model has never been saved, or has been changed since it was saved or loaded
+        """
+        return self.__unsaved_changes
+
     def save(self) -> None:
         """Save the current state of this model to disk at self.path
 
@@ -384,6 +493,9 @@ class Model:
             json_path = self.get_python_only_directory() / "polychron_model.json"
             with open(json_path, "w") as f:
                 f.write(json_s)
+            self.__unsaved_changes = False
+            # Save the metadata sidecar, so the model can be listed without being loaded
+            self.save_metadata()
             timer_json_write.stop()
 
             # Create / Copy other files to the correct location
@@ -407,8 +519,13 @@ class Model:
                     "testdag.png",
                     "deleted_contexts_meta",
                 ],
-                self.get_mcmc_results_directory(): ["full_results_df", "key_ref.csv", "context_no.csv"],
-                self.get_python_only_directory(): ["polychron_mcmc_data.json"],
+                self.get_mcmc_results_directory(): [
+                    "full_results_df",
+                    PosteriorSummary.FILENAME,
+                    "key_ref.csv",
+                    "context_no.csv",
+                ],
+                self.get_python_only_directory(): [MCMCData.MANIFEST_FILENAME, MCMCData.SAMPLES_FILENAME],
             }
             # Iterate the per output directory files, copying files if they exist and copying is required
             for dst_dir, filenames in files_to_copy.items():
@@ -551,13 +668,14 @@ class Model:
 
             timer_process.stop()
 
-            # If mcmc has been ran for this model, and the expected mcmc data file exists, load it.
+            # If mcmc has been ran for this model, and the expected mcmc data file exists, load it. Samples are loaded lazily, on first access.
             timer_mcmc = None
             if model.mcmc_check:
                 timer_mcmc = MonotonicTimer().start()
-                mcmc_data_path = model.get_python_only_directory() / "polychron_mcmc_data.json"
+                mcmc_data_path = model.get_python_only_directory() / MCMCData.MANIFEST_FILENAME
                 if mcmc_data_path.is_file():
-                    model.mcmc_data = MCMCData.load_from_disk(mcmc_data_path)
+                    model.migrate_mcmc_data()
+                    model.mcmc_data = MCMCData.load_from_disk(mcmc_data_path, lazy=True)
                 else:
                     print(f"Failed to load MCMCData from '{mcmc_data_path}'", file=sys.stderr)
                 timer_mcmc.stop()
@@ -572,12 +690,28 @@ class Model:
                 if timer_mcmc is not None:
                     print(f"  timer_mcmc: {timer_mcmc.elapsed(): .6f}s")
 
+            # The model matches the version on disk, including any changes made while loading mcmc data
+            model.__unsaved_changes = False
+
             # Return the Model
             return model
 
         # If this point is reached, an error occurred and should have be propagated
         return None
 
+    def migrate_mcmc_data(self) -> None:
+        """Convert saved and working copies of MCMC data from the json format used by previous versions of polychron to the binary storage format, if required
+
+        This is a one-shot conversion, applied when the model is loaded. Failure to migrate is not an error, as the json format can still be loaded.
+        """
+        for directory in [self.get_python_only_directory(), self.get_working_directory()]:
+            if not (directory / MCMCData.MANIFEST_FILENAME).is_file():
+                continue
+            try:
+                MCMCData.migrate(directory)
+            except (OSError, RuntimeError, json.JSONDecodeError) as e:
+                print(f"Warning: unable to migrate MCMCData in '{directory}': {e}", file=sys.stderr)
+
     def create_dirs(self) -> None:
         """Create the expected directories for this model, including working directories.
 
@@ -979,6 +1113,7 @@ class Model:
             reason: the reason the node was deleted, if provided.
         """
         self.deleted_nodes.append((context, reason))
+        self.mark_unsaved()
 
     def record_deleted_edge(self, context_a: str, context_b: str, reason: Optional[str] = None) -> None:
         """Method to add an edge to the list of deleted edges
@@ -989,6 +1124,7 @@ class Model:
             reason: the reason the node was deleted, if provided.
         """
         self.deleted_edges.append((context_a, context_b, reason))
+        self.mark_unsaved()
 
     def is_ready_for_mcmc(self) -> bool:
         """Indicate if the model is ready for mcmc calibration or not.
@@ -1008,31 +1144,34 @@ class Model:
         """Get the currently selected calibration curve (if any)."""
         return self.__calibration
 
-    def MCMC_func(
-        self, progress_io: Optional[Writable]
-    ) -> Tuple[
-        List[str],
-        List[List[float]],
-        List[List[float]],
-        List[str],
-        int,
-        int,
-        List[List[float]],
-        List[List[float]],
-        Dict[str[List[float]]],
-        Dict[str[List[float]]],
-    ]:
-        """run the mcmc calibration on the current model, returning output values without (significantly) mutating state
+    def create_mcmc_session(
+        self,
+        chains: Optional[int] = None,
+        workers: Optional[int] = None,
+        stopping: Optional[StoppingRule] = None,
+        seed: Optional[int] = None,
+        method: Optional[str] = None,
+        tuning: Optional[ProposalTuning] = None,
+        resume: bool = False,
+    ) -> MCMCSession:
+        """Prepare an MCMC calibration of the current model, which can be run and then extended by `MCMC_func`
 
-        gathers all the inputs for the mcmc module and then runs it and returns resuslts dictionaries
+        Gathers all the inputs for the mcmc module. The session keeps the state of its chains between runs, so further samples can be drawn without repeating completed work.
 
         Parameters:
-            progress_io: An object which implements write(str) for the progress percentage. Could be stdout, MCMCProgressView or similar.
+            chains: The number of independent MCMC chains to run. Defaults to the `mcmc_chains` configuration option.
+            workers: The maximum number of worker processes for running chains in parallel. Defaults to the `mcmc_workers` configuration option.
+            stopping: When each chain should stop sampling. Defaults to a rule built from the `mcmc_*` configuration options.
+            seed: Seed for the MCMC chains. Defaults to the `mcmc_seed` configuration option, with a new seed used if that is negative.
+            method: The MCMC kernel to use, "squeeze" or "gibbs". Defaults to the `mcmc_method` configuration option.
+            tuning: Adaptation of the squeeze sampler's shift proposal width. Defaults to the `mcmc_adaptive_warmup` and `mcmc_target_acceptance` configuration options.
+            resume: Continue the most recent calibration with streamed samples (see `get_resumable_mcmc_run`) from its checkpoints, rather than starting a new calibration. The chains, seed, method and tuning it was started with are used. A calibration which has already stopped is extended until `stopping` is met, e.g. with a larger `max_samples`.
 
         Returns:
-            a tuple of calibration results
+            The `MCMCSession` for the calibration, with the seed used in `MCMCSession.seed`
 
-        Formerly `StartPage.MCMC_func`
+        Raises:
+            RuntimeError: If the model is not ready for calibration, or resume is set and there is no calibration of the current model to resume
         """
 
         if not self.is_ready_for_mcmc():
@@ -1099,9 +1238,72 @@ class Model:
         if not hasattr(self, "_Model__calibration") or self.__calibration is None:
             self.__calibration = InterpolatedRCDCalibrationCurve(self.calibration_curve_name)
 
-        self.__calibration.load()
+        likelihood_cache = LikelihoodCache(
+            self.get_likelihood_cache_directory(), self.__calibration.curve_name, self.__calibration.sha256
+        )
+
+        if chains is None:
+            chains = get_config().mcmc_chains
+        if workers is None:
+            workers = get_config().mcmc_workers
+        if stopping is None:
+            config = get_config()
+            stopping = StoppingRule(
+                convergence=config.mcmc_convergence,
+                target_ess=config.mcmc_target_ess,
+                target_rhat=config.mcmc_target_rhat,
+                max_samples=config.mcmc_max_samples,
+                check_interval=config.mcmc_check_interval,
+            )
+
+        # Use a new seed unless one was provided, so that it can be recorded with the results
+        if seed is None:
+            seed = get_config().mcmc_seed
+        if seed < 0:
+            seed = np.random.SeedSequence().entropy
+        if method is None:
+            method = get_config().mcmc_method
+        if tuning is None:
+            tuning = ProposalTuning(
+                warmup=get_config().mcmc_adaptive_warmup, target_acceptance=get_config().mcmc_target_acceptance
+            )
+
+        sample_dtype = get_config().mcmc_sample_dtype
+        # Fingerprint the calibration inputs, so that a calibration is only resumed for an unchanged model
+        inputs_sha256 = hashlib.sha256(json.dumps([input_1, self.__calibration.sha256]).encode()).hexdigest()
+        sample_directory = None
+        if resume:
+            run = self.get_resumable_mcmc_run()
+            if run is None:
+                raise RuntimeError("There is no calibration of this model to resume")
+            sample_directory, options = run
+            if options["inputs_sha256"] != inputs_sha256:
+                raise RuntimeError("The model has changed since the calibration being resumed was started")
+            chains, seed, method, sample_dtype = (
+                options["chains"],
+                options["seed"],
+                options["method"],
+                options["sample_dtype"],
+            )
+            tuning = ProposalTuning(**options["tuning"])
+        elif get_config().mcmc_stream_samples:
+            # Stream samples to memory-mapped files in a new directory for this run, with the options needed to resume it
+            self.get_mcmc_samples_directory().mkdir(parents=True, exist_ok=True)
+            sample_directory = pathlib.Path(tempfile.mkdtemp(prefix="run-", dir=self.get_mcmc_samples_directory()))
+            with open(sample_directory / "run.json", "w") as f:
+                json.dump(
+                    {
+                        "inputs_sha256": inputs_sha256,
+                        "chains": chains,
+                        "seed": seed,
+                        "method": method,
+                        "sample_dtype": sample_dtype,
+                        "tuning": asdict(tuning),
+                    },
+                    f,
+                )
 
-        context_no, accept, phi_accept, phi_ref, A, P, all_samples_context, all_samples_phi = run_MCMC(
+        session = MCMCSession(
             self.__calibration.df,
             strat_vec,
             rcd_est,
@@ -1113,13 +1315,113 @@ class Model:
             self.post_group,
             topo_sort,
             self.context_types,
-            progress_io,
+            likelihood_cache,
+            chains,
+            workers,
+            seed,
+            stopping,
+            sample_dtype,
+            sample_directory,
+            method,
+            tuning,
+            resume,
         )
+        # Register the session as the owner of its sample directory for as long as it exists
+        if sample_directory is not None:
+            with _active_sample_directories_lock:
+                if sample_directory.resolve() in _active_sample_directories:
+                    raise RuntimeError("The calibration being resumed is already running")
+                _active_sample_directories[sample_directory.resolve()] = session
+        return session
+
+    def MCMC_func(
+        self,
+        progress_io: Optional[Writable],
+        chains: Optional[int] = None,
+        workers: Optional[int] = None,
+        stopping: Optional[StoppingRule] = None,
+        seed: Optional[int] = None,
+        method: Optional[str] = None,
+        tuning: Optional[ProposalTuning] = None,
+        resume: bool = False,
+        session: Optional[MCMCSession] = None,
+        more_samples: Optional[int] = None,
+        progress_callback: Optional[Callable[[ChainProgress], Any]] = None,
+        stop: Optional[StopFlag] = None,
+    ) -> Tuple[
+        List[str],
+        List[List[float]],
+        List[List[float]],
+        List[str],
+        int,
+        int,
+        List[List[float]],
+        List[List[float]],
+        Dict[str[List[float]]],
+        Dict[str[List[float]]],
+        Dict[str, float],
+        int,
+        Dict[str, Dict[str, List[float]]],
+    ]:
+        """run the mcmc calibration on the current model, returning output values without (significantly) mutating state
+
+        runs an MCMC session from `create_mcmc_session` and returns resuslts dictionaries
+
+        Parameters:
+            progress_io: An object which implements write(str) for the progress percentage. Could be stdout, MCMCProgressView or similar.
+            chains: See `create_mcmc_session`
+            workers: See `create_mcmc_session`
+            stopping: See `create_mcmc_session`
+            seed: See `create_mcmc_session`
+            method: See `create_mcmc_session`
+            tuning: See `create_mcmc_session`
+            resume: See `create_mcmc_session`
+            session: A session from a previous call to `create_mcmc_session` to run, in which case the other options are not used. A new session is created if None.
+            more_samples: If set, the session's chains are continued until each context has this many more accepted samples, see `MCMCSession.extend`, rather than until its stopping rule is met
+            progress_callback: Callable to pass a `ChainProgress` to each time the progress of the first chain is reported, in addition to progress_io
+            stop: A flag which stops calibration early when set, keeping the samples drawn so far, see `MCMCSession.run`. An event from `mcmc.WORKER_CONTEXT` is required to stop chains in worker processes.
+
+        Returns:
+            a tuple of calibration results
+
+        Raises:
+            RuntimeError: If the model is not ready for calibration, or resume is set and there is no calibration of the current model to resume
+
+        Formerly `StartPage.MCMC_func`
+        """
+        if session is None:
+            session = self.create_mcmc_session(chains, workers, stopping, seed, method, tuning, resume)
+        if more_samples is None:
+            results = session.run(progress_io, None, progress_callback, stop)
+        else:
+            results = session.extend(more_samples, progress_io, progress_callback, stop)
+        (
+            context_no,
+            accept,
+            phi_accept,
+            phi_ref,
+            A,
+            P,
+            all_samples_context,
+            all_samples_phi,
+            rhat_context,
+            rhat_phi,
+            move_statistics,
+        ) = results
+        sample_directory = session.sample_directory
+        # Remove samples streamed by previous runs, which are kept until now in case a run does not complete
+        if sample_directory is not None:
+            self.remove_previous_mcmc_runs(sample_directory)
         _, accept_group_limits, all_group_limits = phase_labels(phi_ref, self.post_group, phi_accept, all_samples_phi)
         for i, j in enumerate(context_no):
             accept_group_limits[j] = accept[i]
         for k, l in enumerate(context_no):
             all_group_limits[l] = all_samples_context[k]
+        # Label the R-hat for each group boundary and context in the same way as the samples
+        rhat = {}
+        if len(rhat_phi) > 0:
+            _, rhat, _ = phase_labels(phi_ref, self.post_group, rhat_phi, rhat_phi)
+            rhat.update(zip(context_no, rhat_context))
 
         return (
             context_no,
@@ -1132,4 +1434,105 @@ class Model:
             all_samples_phi,
             accept_group_limits,
             all_group_limits,
+            rhat,
+            session.seed,
+            move_statistics,
         )
+
+    def run_calibration(
+        self,
+        session: MCMCSession,
+        progress_io: Optional[Writable] = None,
+        progress_callback: Optional[Callable[[ChainProgress], Any]] = None,
+        stop: Optional[StopFlag] = None,
+    ) -> tuple:
+        """Run a calibration session, topping up its chains until enough samples were accepted, without storing the results
+
+        Unless `mcmc_convergence` is enabled, the chains of the session are extended until every context has at least 50000 accepted samples, rather than restarting them. This does not modify the model, so may be run in a background thread with a session created by `create_mcmc_session`.
+
+        Parameters:
+            session: The session to run, from `create_mcmc_session`
+            progress_io: See `MCMC_func`
+            progress_callback: See `MCMC_func`
+            stop: See `MCMC_func`. The chains are not topped up once stop is set.
+
+        Returns:
+            The tuple of results from `MCMC_func`, for `store_calibration`
+        """
+        min_samples = 1 if get_config().mcmc_convergence else 50000
+        more_samples = None
+        while more_samples is None or more_samples > 0:
+            results = self.MCMC_func(
+                progress_io, session=session, more_samples=more_samples, progress_callback=progress_callback, stop=stop
+            )
+            if stop is not None and stop.is_set():
+                break
+            more_samples = min_samples - min([len(i) for i in results[1]])
+        return results
+
+    def store_calibration(self, results: tuple, stopped: bool = False) -> bool:
+        """Store the results of `run_calibration` in `mcmc_data`, marking the model as calibrated
+
+        The results of a calibration which was stopped early are only stored if every context has samples beyond the burn-in. The model is not saved to disk.
+
+        Parameters:
+            results: The tuple of results from `run_calibration`
+            stopped: If the calibration was stopped before enough samples were accepted
+
+        Returns:
+            If the results were stored
+        """
+        if stopped and min([len(i) for i in results[1]]) <= ACCEPT_BURN_IN:
+            return False
+        (
+            self.mcmc_data.contexts,
+            self.mcmc_data.accept_samples_context,
+            self.mcmc_data.accept_samples_phi,
+            self.phi_ref,
+            self.mcmc_data.A,
+            self.mcmc_data.P,
+            self.mcmc_data.all_samples_context,
+            self.mcmc_data.all_samples_phi,
+            self.mcmc_data.accept_group_limits,
+            self.mcmc_data.all_group_limits,
+            self.mcmc_data.rhat,
+            self.mcmc_data.seed,
+            self.mcmc_data.move_statistics,
+        ) = results
+
+        # Update the model state to show it as having been calibrated, with the calibration curve used
+        self.mcmc_check = True
+        self.mcmc_data.calibration_curve_name = self.calibration_curve_name
+        return True
+
+    def calibrate(
+        self,
+        chains: Optional[int] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        progress_callback: Optional[Callable[[ChainProgress], Any]] = None,
+        stop: Optional[StopFlag] = None,
+        resume: bool = False,
+    ) -> bool:
+        """Calibrate the model, topping up the chains until enough samples were accepted, and store the results in `mcmc_data`
+
+        See `run_calibration` and `store_calibration`. The model is marked as calibrated, but is not saved to disk.
+
+        Parameters:
+            chains: See `create_mcmc_session`
+            workers: See `create_mcmc_session`
+            seed: See `create_mcmc_session`
+            progress_callback: See `MCMC_func`
+            stop: See `MCMC_func`. The chains are not topped up once stop is set.
+            resume: See `create_mcmc_session`
+
+        Returns:
+            If the results were stored, which they are not if calibration was stopped before every context had samples beyond the burn-in
+
+        Raises:
+            RuntimeError: If the model is not ready for calibration, or the calibration to resume could not be resumed
+        """
+        session = self.create_mcmc_session(chains, workers, seed=seed, resume=resume)
+        with open(os.devnull, "w") as devnull:
+            results = self.run_calibration(session, devnull, progress_callback, stop)
+        return self.store_calibration(results, stop is not None and stop.is_set())
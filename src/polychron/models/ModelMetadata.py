@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import pathlib
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Any, Dict
+
+from packaging.version import Version
+
+from .. import __version__
+from ..util import write_json_atomic
+
+if TYPE_CHECKING:
+    from .Model import Model
+
+
+@dataclass
+class ModelMetadata:
+    """Summary of a saved Model, stored in a small sidecar file next to `polychron_model.json`
+
+    This allows lists of models (and their state) to be presented without loading every model from disk, see `Project.load_metadata`.
+    """
+
+    FILENAME = "polychron_model_metadata.json"
+    """The name of the sidecar file, within the model's `python_only` directory"""
+
+    name: str
+    """The name of the model"""
+
+    load_check: bool = False
+    """If the model has a chronological graph, and is ready for calibration"""
+
+    mcmc_check: bool = False
+    """If the model has been calibrated"""
+
+    calibration_curve_name: str = "intcal20_interpolated"
+    """The name of the calibration curve selected for the model"""
+
+    context_count: int = 0
+    """The number of contexts in the stratigraphic graph"""
+
+    modified: float = 0.0
+    """When `polychron_model.json` was last saved, as a POSIX timestamp"""
+
+    sha256: str = ""
+    """SHA-256 hex digest of `polychron_model.json`, identifying the exact saved model"""
+
+    @classmethod
+    def from_model(cls, model: Model, modified: float = 0.0, sha256: str = "") -> "ModelMetadata":
+        """Get the metadata for a Model instance
+
+        Parameters:
+            model: The model to summarise
+            modified: When the model was last saved
+            sha256: The hash of the saved model json
+        """
+        return cls(
+            name=model.name,
+            load_check=bool(model.load_check),
+            mcmc_check=bool(model.mcmc_check),
+            calibration_curve_name=model.calibration_curve_name,
+            context_count=model.stratigraphic_dag.number_of_nodes() if model.stratigraphic_dag is not None else 0,
+            modified=modified,
+            sha256=sha256,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a json-serialisable dictionary of the metadata"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelMetadata":
+        """Get an instance from a dictionary produced by `to_dict`, ignoring unexpected keys
+
+        Raises:
+            RuntimeError: If data is not a dictionary, or the name is missing
+        """
+        if not isinstance(data, dict) or "name" not in data:
+            raise RuntimeError("Invalid model metadata, a dictionary including 'name' is required")
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+    def save(self, path: pathlib.Path) -> None:
+        """Save the metadata to a json file, replacing any existing file atomically
+
+        Parameters:
+            path: The path of the json file
+        """
+        write_json_atomic(
+            path, {"polychron_version": Version(__version__).public, "model_metadata": self.to_dict()}, indent=2
+        )
+
+    @classmethod
+    def load_from_disk(cls, path: pathlib.Path) -> "ModelMetadata":
+        """Get an instance from a json file saved by `save`
+
+        Raises:
+            RuntimeError: If the file does not exist, or is not valid model metadata
+        """
+        if not path.is_file():
+            raise RuntimeError(f"Error loading ModelMetadata from path, '{path}' is not a file")
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Invalid JSON file '{path}': {e}")
+        if not isinstance(data, dict) or "model_metadata" not in data:
+            raise RuntimeError(f"Required key 'model_metadata' missing from '{path}'")
+        return cls.from_dict(data["model_metadata"])
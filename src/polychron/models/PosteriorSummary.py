@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import math
+import pathlib
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..mcmc import ACCEPT_BURN_IN, ALL_SAMPLES_BURN_IN
+
+if TYPE_CHECKING:
+    from .MCMCData import MCMCData
+
+
+class PosteriorSummary:
+    """Summary statistics of the posterior samples for each context and group boundary of a calibrated model
+
+    Parameters with the same number of samples are stacked into a single array, so each statistic is computed for every parameter at once. Highest posterior density (HPD) regions are cached per parameter and level, so repeated requests (e.g. from the dating results page) are not recomputed.
+    """
+
+    FILENAME = "posterior_summary.csv"
+    """Name of the summary table written by `save`, alongside `full_results_df`"""
+
+    DEFAULT_QUANTILES: Tuple[float, ...] = (0.025, 0.25, 0.5, 0.75, 0.975)
+    """Quantiles included in the summary table by default"""
+
+    DEFAULT_LEVELS: Tuple[float, ...] = (0.95,)
+    """HPD levels included in the summary table by default"""
+
+    HPD_GAP = 5
+    """Selected histogram bins more than this many years apart start a new interval of the HPD region, as for `mcmc.HPD_interval`"""
+
+    def __init__(self, samples: Dict[str, Sequence[float]]):
+        """Prepare a summary of posterior samples
+
+        Parameters:
+            samples: Samples (after burn-in) for each parameter, by parameter name. Parameters may have different numbers of samples.
+
+        Raises:
+            ValueError: If any parameter has no samples
+        """
+        self.nodes: List[str] = list(samples.keys())
+        """The name of each summarised parameter, in the order samples were provided"""
+
+        # Stack parameters with the same number of samples into one 2D array per sample count
+        self.__blocks: List[Tuple[List[str], np.ndarray]] = []
+        by_length: Dict[int, List[str]] = {}
+        for node, values in samples.items():
+            if len(values) == 0:
+                raise ValueError(f"No samples to summarise for '{node}'")
+            by_length.setdefault(len(values), []).append(node)
+        for nodes in by_length.values():
+            self.__blocks.append((nodes, np.vstack([np.asarray(samples[node], dtype=np.float64) for node in nodes])))
+
+        self.__hpd: Dict[Tuple[str, float], List[Tuple[int, int]]] = {}
+        """Cached HPD regions by parameter name and level"""
+
+    @classmethod
+    def from_mcmc_data(cls, mcmc_data: MCMCData, accepted: bool = False) -> "PosteriorSummary":
+        """Get the summary of the samples for each context and group boundary in a `MCMCData`
+
+        Parameters:
+            mcmc_data: The results of calibration
+            accepted: If the accepted samples (`accept_group_limits`) should be summarised, rather than all samples (`all_group_limits`), which are the samples in `full_results_df`
+        """
+        if accepted:
+            return cls({k: v[ACCEPT_BURN_IN:] for k, v in mcmc_data.accept_group_limits.items()})
+        return cls({k: v[ALL_SAMPLES_BURN_IN:] for k, v in mcmc_data.all_group_limits.items()})
+
+    def statistics(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> pd.DataFrame:
+        """Get the mean, median, standard deviation and quantiles of each parameter
+
+        Parameters:
+            quantiles: Quantiles to include, each between 0 and 1
+
+        Returns:
+            A dataframe indexed by parameter name, with columns `mean`, `median`, `sd` and a column per quantile named by its percentage, e.g. `q2.5`
+        """
+        quantiles = list(quantiles)
+        if len(self.nodes) == 0:
+            return pd.DataFrame(columns=["mean", "median", "sd"] + [f"q{100 * q:g}" for q in quantiles], dtype=float)
+        frames = []
+        for nodes, block in self.__blocks:
+            # The median is computed alongside the other quantiles, so each row is only partitioned once
+            values = np.quantile(block, [0.5] + quantiles, axis=1)
+            columns = {
+                "mean": block.mean(axis=1),
+                "median": values[0],
+                "sd": block.std(axis=1, ddof=1) if block.shape[1] > 1 else np.zeros(len(nodes)),
+            }
+            for q, q_values in zip(quantiles, values[1:]):
+                columns[f"q{100 * q:g}"] = q_values
+            frames.append(pd.DataFrame(columns, index=nodes))
+        return pd.concat(frames).reindex(self.nodes)
+
+    def hpd(self, level: float = 0.95, nodes: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[int, int]]]:
+        """Get the highest posterior density region of parameters, which may consist of several intervals
+
+        Samples are binned into a histogram with bins of (approximately) one year. Bins are taken in order of decreasing density until their total density exceeds the level, with ties taken in calendar order, and consecutive selected bins more than `HPD_GAP` years apart start a new interval. This matches `mcmc.HPD_interval`, for all uncached parameters at once.
+
+        Parameters:
+            level: The probability mass of the region, between 0 and 1
+            nodes: The parameters to get the region for. Defaults to all parameters
+
+        Returns:
+            The (start, end) of each interval of the region, in increasing order, by parameter name
+
+        Raises:
+            KeyError: If a parameter is not included in the summary
+        """
+        nodes = self.nodes if nodes is None else list(nodes)
+        for node in nodes:
+            if node not in self.nodes:
+                raise KeyError(f"No samples for '{node}'")
+        missing = {node for node in nodes if (node, level) not in self.__hpd}
+        for block_nodes, block in self.__blocks:
+            rows = [i for i, node in enumerate(block_nodes) if node in missing]
+            if len(rows) > 0:
+                rows_block = block if len(rows) == len(block_nodes) else block[rows]
+                for node, intervals in zip([block_nodes[i] for i in rows], self.__hpd_block(rows_block, level)):
+                    self.__hpd[(node, level)] = intervals
+        return {node: self.__hpd[(node, level)] for node in nodes}
+
+    @classmethod
+    def __hpd_block(cls, block: np.ndarray, level: float) -> List[List[Tuple[int, int]]]:
+        """Get the HPD region for each row of a 2D array of samples"""
+        n_rows = block.shape[0]
+        n_bins = [max(1, math.ceil(x)) for x in block.max(axis=1) - block.min(axis=1)]
+
+        # Histogram each row with bins of approximately one year, as for `mcmc.HPD_interval`, padded to the most bins
+        max_bins = max(n_bins)
+        density = np.zeros((n_rows, max_bins))
+        edges = np.full((n_rows, max_bins + 1), np.inf)
+        for i, (values, bins) in enumerate(zip(block, n_bins)):
+            density[i, :bins], edges[i, : bins + 1] = np.histogram(values, bins=bins, density=True)
+        n_bins = np.array(n_bins)
+
+        # Sort bins by decreasing density, and select bins until the cumulative density exceeds the level
+        order = np.argsort(-density, axis=1, kind="stable")
+        cumulative = np.cumsum(np.take_along_axis(density, order, axis=1), axis=1)
+        n_selected = np.minimum((cumulative <= level).sum(axis=1) + 1, n_bins)
+        selected = np.zeros_like(density, dtype=bool)
+        np.put_along_axis(selected, order, np.arange(max_bins)[None, :] < n_selected[:, None], axis=1)
+
+        # Bins are identified by their upper edge, and split into intervals where selected bins are far apart
+        row, column = np.nonzero(selected)
+        theta = edges[row, column + 1]
+        breaks = np.flatnonzero((np.diff(row) != 0) | (np.diff(theta) > cls.HPD_GAP)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(row)])) - 1
+        regions: List[List[Tuple[int, int]]] = [[] for _ in range(n_rows)]
+        for start, end in zip(starts, ends):
+            regions[row[start]].append((int(theta[start]), int(theta[end])))
+        return regions
+
+    def to_dataframe(
+        self, quantiles: Iterable[float] = DEFAULT_QUANTILES, levels: Iterable[float] = DEFAULT_LEVELS
+    ) -> pd.DataFrame:
+        """Get the summary table of `statistics` and HPD regions for each parameter
+
+        HPD regions are included as a column per level named by its percentage, e.g. `hpd95`, with intervals formatted as `start - end` and separated by `; `.
+        """
+        df = self.statistics(quantiles)
+        for level in levels:
+            regions = self.hpd(level)
+            df[f"hpd{100 * level:g}"] = [
+                "; ".join(f"{start} - {end}" for start, end in regions[node]) for node in self.nodes
+            ]
+        df.index.name = "node"
+        return df
+
+    def save(
+        self,
+        path: pathlib.Path,
+        quantiles: Iterable[float] = DEFAULT_QUANTILES,
+        levels: Iterable[float] = DEFAULT_LEVELS,
+    ) -> None:
+        """Save the summary table from `to_dataframe` to disk as csv
+
+        Parameters:
+            path: The directory in which `FILENAME` is created
+            quantiles: See `statistics`
+            levels: See `hpd`
+        """
+        self.to_dataframe(quantiles, levels).to_csv(path / self.FILENAME)
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
 import copy
+import json
 import pathlib
 import shutil
 import sys
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
 
+from packaging.version import Version
+
+from .. import __version__
+from ..Config import get_config
+from ..util import write_json_atomic
 from .Model import Model
+from .ModelMetadata import ModelMetadata
 
 
 @dataclass
@@ -21,7 +30,13 @@ class Project:
     """
 
     models: dict[str, Model | None] = field(default_factory=dict)
-    """A dictionary of models within this project, with their name as the key"""
+    """A dictionary of models within this project, with their name as the key. Models which have not been loaded from disk, or have been unloaded by `evict_models`, are None"""
+
+    __recent: OrderedDict[str, None] = field(default_factory=OrderedDict, init=False, repr=False, compare=False)
+    """Names of loaded models, from least to most recently used, for unloading models beyond the `model_cache_size` configuration option"""
+
+    INDEX_FILENAME = "polychron_project_index.json"
+    """The name of the project index file, within the project directory, which collects the metadata of each model in the project"""
 
     def create_dir(self) -> None:
         """Create the project directory if it does not already exist.
@@ -60,6 +75,7 @@ class Project:
         if name in self.models:
             if self.models[name] is None:
                 self.load_model_from_disk(name)
+            self.__use_model(name)
         return self.models.get(name, None)
 
     def get_or_create_model(self, name: str, other: Model | None = None) -> Model:
@@ -134,6 +150,7 @@ class Project:
 
         # Store and return the new Model instance
         self.models[name] = new_model
+        self.__use_model(name)
         return self.models[name]
 
     def load_model_from_disk(self, name: str) -> None:
@@ -150,13 +167,93 @@ class Project:
             # Try and load the model from disk
             model_path = self.path / name
             model = Model.load_from_disk(model_path)
-            # If loading succeded (no exceptions thrown) store the model
+            # If loading succeded (no exceptions thrown) store the model, unloading others if there are too many
             self.models[model.name] = model
+            self.__use_model(model.name)
+            # Models saved by previous versions of polychron do not have a metadata sidecar, so write one for future listings
+            if (
+                model.get_python_only_directory() / "polychron_model.json"
+            ).is_file() and not model.get_metadata_path().is_file():
+                try:
+                    model.save_metadata()
+                except OSError:
+                    pass
 
         except Exception as e:
             print(f"An exception occurred when attempting to load {name}: {e}", file=sys.stderr)
             raise e
 
+    def set_model(self, name: str, model: Model) -> None:
+        """Replace a model within the project with an instance loaded elsewhere, e.g. calibrated in another process
+
+        The model is marked as the most recently used, and the least recently used models are unloaded if too many are loaded, as when loading it with `get_model`.
+
+        Parameters:
+            name: The name of the model to replace
+            model: The model instance to use for the model
+        """
+        self.models[name] = model
+        self.__use_model(name)
+
+    def __use_model(self, name: str) -> None:
+        """Mark a model as the most recently used, and unload the least recently used models if too many are loaded"""
+        if self.models.get(name) is not None:
+            self.__recent.pop(name, None)
+            self.__recent[name] = None
+            self.evict_models(keep=name)
+
+    def evict_models(self, keep: str | None = None) -> List[str]:
+        """Unload the least recently used models, until no more than `model_cache_size` models are loaded
+
+        Models with unsaved changes are saved before being unloaded, and models which could not be saved remain loaded. Unloaded models are reloaded from disk by `get_model` when next used. Models loaded other than through this project (i.e. added to `models` directly) are considered the least recently used.
+
+        Parameters:
+            keep: The name of a model which must not be unloaded, i.e. the model currently being used
+
+        Returns:
+            The names of the models which were unloaded
+        """
+        capacity = get_config().model_cache_size
+        if capacity < 1:
+            return []
+        loaded = [name for name, model in self.models.items() if model is not None]
+        order = [name for name in loaded if name not in self.__recent] + [
+            name for name in self.__recent if name in loaded
+        ]
+        excess = len(order) - capacity
+        evicted = []
+        for name in order:
+            if excess < 1:
+                break
+            if name != keep and self.unload_model(name):
+                evicted.append(name)
+                excess -= 1
+        return evicted
+
+    def unload_model(self, name: str) -> bool:
+        """Unload a model from memory, saving it first if it has unsaved changes
+
+        The model is reloaded from disk by `get_model` when next used. The instance itself is not modified, so any remaining references to it are still valid, but its samples, images and calibration curve are freed once no references remain.
+
+        Parameters:
+            name: The name of the model to unload
+
+        Returns:
+            If the model was unloaded. False if the model was not loaded, or could not be saved.
+        """
+        model = self.models.get(name)
+        if model is None:
+            return False
+        if model.has_unsaved_changes():
+            try:
+                model.save()
+            except RuntimeError as e:
+                print(f"Unable to unload {name}: {e}", file=sys.stderr)
+                return False
+        self.models[name] = None
+        self.__recent.pop(name, None)
+        return True
+
     def lazy_load(self) -> None:
         """Lazily load all models from disk within this project.
 
@@ -180,3 +277,121 @@ class Project:
             for p in self.path.iterdir():
                 if p.is_dir():
                     self.load_model_from_disk(p.name)
+
+    def get_index_path(self) -> pathlib.Path:
+        """Get the path to the project index file
+
+        Returns:
+            The path to the index file, within the project directory
+        """
+        return self.path / self.INDEX_FILENAME
+
+    def read_index(self) -> Dict[str, Any]:
+        """Read the entries of the project index from disk
+
+        Returns:
+            The index entry for each model by name, with the size and modification time of its metadata sidecar and the metadata it contained. Empty if the index does not exist or is invalid.
+        """
+        try:
+            with open(self.get_index_path(), "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(data, dict) or not isinstance(data.get("models"), dict):
+            return {}
+        return data["models"]
+
+    def models_without_metadata(self) -> List[str]:
+        """Get the names of models which have not been loaded, and were saved by previous versions of polychron without a metadata sidecar
+
+        These models are omitted by `load_metadata`, unless `load_missing` is used. Their sidecars can be written by `write_missing_metadata`, without loading them into the project.
+
+        Returns:
+            The names of the models, in the order of `models`
+        """
+        names = []
+        for name, model in self.models.items():
+            python_only = self.path / name / "python_only"
+            if (
+                model is None
+                and (python_only / "polychron_model.json").is_file()
+                and not (python_only / ModelMetadata.FILENAME).is_file()
+            ):
+                names.append(name)
+        return names
+
+    def write_missing_metadata(self, names: Iterable[str]) -> List[str]:
+        """Write the metadata sidecar for models saved by previous versions of polychron, which do not have one
+
+        Each model is read from disk independently of `models`, which are not modified, so this may be run in a background thread.
+
+        Parameters:
+            names: The names of the models to write sidecars for. Models which already have a sidecar, or could not be read, are skipped.
+
+        Returns:
+            The names of the models whose sidecars were written
+        """
+        written = []
+        for name in names:
+            path = self.path / name
+            if (path / "python_only" / ModelMetadata.FILENAME).is_file():
+                continue
+            try:
+                Model.load_from_disk(path).save_metadata()
+                written.append(name)
+            except Exception:
+                pass
+        return written
+
+    def load_metadata(self, load_missing: bool = False) -> Dict[str, ModelMetadata]:
+        """Get the metadata for each model in the project, without loading the models from disk
+
+        Metadata is read from the project index, and from the metadata sidecar of any model which has been saved since the index was written, in which case the index is updated. For models which have been loaded, metadata reflects the in-memory model, which may have unsaved changes.
+
+        Parameters:
+            load_missing: If models saved by previous versions of polychron, which have no metadata sidecar, should be loaded from disk (writing their sidecar). Otherwise they are omitted.
+
+        Returns:
+            The metadata for models in `models`, by model name
+        """
+        index = self.read_index()
+        entries = {}
+        metadata = {}
+        for name, model in list(self.models.items()):
+            # Use the indexed metadata if the sidecar has not changed since it was indexed, otherwise read the sidecar
+            saved = None
+            sidecar = self.path / name / "python_only" / ModelMetadata.FILENAME
+            try:
+                stat = sidecar.stat()
+                key = [stat.st_mtime_ns, stat.st_size]
+                entry = index.get(name)
+                if isinstance(entry, dict) and entry.get("stat") == key:
+                    saved = ModelMetadata.from_dict(entry.get("metadata"))
+                else:
+                    saved = ModelMetadata.load_from_disk(sidecar)
+                entries[name] = {"stat": key, "metadata": saved.to_dict()}
+            except (OSError, RuntimeError, TypeError):
+                pass
+
+            if model is not None:
+                metadata[name] = ModelMetadata.from_model(model)
+                if saved is not None:
+                    metadata[name].modified, metadata[name].sha256 = saved.modified, saved.sha256
+            elif saved is not None:
+                metadata[name] = saved
+            elif load_missing:
+                try:
+                    if (model := self.get_model(name)) is not None:
+                        metadata[name] = ModelMetadata.from_model(model)
+                except Exception:
+                    pass
+
+        # Update the index if any sidecars have changed, or models are no longer present
+        if entries != index:
+            try:
+                write_json_atomic(
+                    self.get_index_path(), {"polychron_version": Version(__version__).public, "models": entries}
+                )
+            except OSError:
+                pass
+        return metadata
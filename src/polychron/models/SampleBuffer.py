@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import pathlib
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from ..util import write_json_atomic
+
+
+@dataclass(eq=False)
+class SampleBuffer:
+    """Preallocated storage for the MCMC samples of a fixed number of parameters
+
+    Replaces the per-parameter lists of python floats (`ACCEPT`, `ALL_SAMPS_CONT` etc.) which were appended to on every step. Samples are stored in a single 2D array with one row per parameter, and each row may hold a different number of samples. When any row is full, the capacity of every row is doubled, so appending is amortised constant time.
+
+    Indexing the buffer returns a NumPy view of the samples recorded so far for a parameter, which can be handed to `MCMCData` or summarised without copying. Views are invalidated (no longer updated) once the buffer grows, so they should be taken after sampling has finished.
+
+    If a `path` is provided, samples are streamed to a memory-mapped `.npy` file next to it rather than held in memory, so the operating system can page samples out. The data file is named by its capacity, and `path` is a small json manifest naming the current data file and the number of samples per parameter, which is replaced atomically on each `flush`. Samples up to the most recent flush can be read back with `SampleBuffer.open`, including after a crash. A memory-mapped buffer is pickled by reference to its files, so it can be passed to and from worker processes without copying its samples.
+    """
+
+    rows: int
+    """The number of parameters"""
+
+    dtype: npt.DTypeLike = np.float64
+    """The dtype samples are stored as. float32 halves memory use, at the cost of precision in the stored samples"""
+
+    capacity: int = 1024
+    """The initial number of samples per parameter to allocate space for"""
+
+    path: Optional[pathlib.Path] = None
+    """Path to the json manifest for a memory-mapped buffer, or None to store samples in memory"""
+
+    _data: np.ndarray = field(init=False, repr=False)
+    """Sample storage, with shape (rows, capacity)"""
+
+    _lengths: np.ndarray = field(init=False, repr=False)
+    """The number of samples recorded for each parameter"""
+
+    def __post_init__(self) -> None:
+        if self.path is not None:
+            self.path = pathlib.Path(self.path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._data = self.__allocate(int(max(self.capacity, 1)))
+        self._lengths = np.zeros(self.rows, dtype=np.intp)
+
+    def __getstate__(self) -> dict:
+        # A memory-mapped buffer is flushed and reopened from its files when unpickled, rather than copying its samples
+        state = self.__dict__.copy()
+        if self.path is not None:
+            self.flush()
+            del state["_data"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self.path is not None:
+            self._data = SampleBuffer.open(self.path, mode="r+")._data
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        return self._data[row, : self._lengths[row]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return (self[row] for row in range(self.rows))
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """The number of samples recorded for each parameter"""
+        return self._lengths.copy()
+
+    def __data_path(self, capacity: int) -> pathlib.Path:
+        """Get the path to the memory-mapped data file for a given capacity"""
+        return self.path.with_name(f"{self.path.stem}.{capacity}.npy")
+
+    def __allocate(self, capacity: int) -> np.ndarray:
+        """Allocate storage for `capacity` samples per parameter, in memory or memory-mapped"""
+        if self.path is None:
+            return np.empty((self.rows, capacity), dtype=self.dtype)
+        return np.lib.format.open_memmap(
+            self.__data_path(capacity), mode="w+", dtype=self.dtype, shape=(self.rows, capacity)
+        )
+
+    def reserve(self, capacity: int) -> None:
+        """Ensure there is space for at least `capacity` samples per parameter, growing geometrically
+
+        Parameters:
+            capacity: The required number of samples per parameter
+        """
+        current = self._data.shape[1]
+        if capacity <= current:
+            return
+        data = self.__allocate(int(max(capacity, 2 * current)))
+        used = int(self._lengths.max(initial=0))
+        data[:, :used] = self._data[:, :used]
+        self._data = data
+        if self.path is not None:
+            # Point the manifest at the new file before removing the old one, which may still be mapped elsewhere
+            self.flush()
+            try:
+                self.__data_path(current).unlink()
+            except OSError:
+                pass
+
+    def append(self, row: int, value: float) -> None:
+        """Append a single sample for one parameter
+
+        Parameters:
+            row: The index of the parameter
+            value: The sample
+        """
+        length = self._lengths[row]
+        self.reserve(length + 1)
+        self._data[row, length] = value
+        self._lengths[row] = length + 1
+
+    def append_all(self, values: npt.ArrayLike) -> None:
+        """Append one sample for every parameter
+
+        Parameters:
+            values: A sample per parameter
+        """
+        self.reserve(int(self._lengths.max(initial=0)) + 1)
+        self._data[np.arange(self.rows), self._lengths] = values
+        self._lengths += 1
+
+    def extend(self, row: int, values: npt.ArrayLike) -> None:
+        """Append several samples for one parameter
+
+        Parameters:
+            row: The index of the parameter
+            values: The samples, in order
+        """
+        values = np.asarray(values, dtype=self.dtype)
+        length = self._lengths[row]
+        self.reserve(length + len(values))
+        self._data[row, length : length + len(values)] = values
+        self._lengths[row] = length + len(values)
+
+    def truncate(self, lengths: npt.ArrayLike) -> None:
+        """Discard samples recorded after the given number of samples for each parameter
+
+        Parameters:
+            lengths: The number of samples to keep for each parameter, which must not exceed the number recorded
+
+        Raises:
+            ValueError: If more samples would be kept than have been recorded for any parameter
+        """
+        lengths = np.asarray(lengths, dtype=np.intp)
+        if lengths.shape != self._lengths.shape or (lengths > self._lengths).any():
+            raise ValueError(f"Cannot truncate {self._lengths.tolist()} samples to {lengths.tolist()}")
+        self._lengths = lengths.copy()
+
+    def views(self) -> List[np.ndarray]:
+        """Get a view of the recorded samples for each parameter
+
+        Returns:
+            A list containing a 1D array per parameter
+        """
+        return list(self)
+
+    def flush(self) -> None:
+        """Write samples recorded so far to disk, for a memory-mapped buffer"""
+        if self.path is None:
+            return
+        self._data.flush()
+        manifest = {
+            "file": self.__data_path(self._data.shape[1]).name,
+            "dtype": np.dtype(self.dtype).name,
+            "lengths": self._lengths.tolist(),
+        }
+        write_json_atomic(self.path, manifest)
+
+    @classmethod
+    def open(cls, path: pathlib.Path, mode: str = "r") -> "SampleBuffer":
+        """Open the samples of a memory-mapped buffer written by another `SampleBuffer`
+
+        Parameters:
+            path: Path to the json manifest for the buffer
+            mode: "r" to open the samples read-only, or "r+" to continue appending samples to the buffer, for example to resume a chain
+
+        Returns:
+            A `SampleBuffer` backed by a memory map of the data file, containing the samples up to the most recent flush
+
+        Raises:
+            OSError: If the manifest or data file could not be read
+            ValueError: If the manifest or data file is invalid
+        """
+        path = pathlib.Path(path)
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        data = np.load(path.with_name(manifest["file"]), mmap_mode=mode)
+        lengths = np.array(manifest["lengths"], dtype=np.intp)
+        if data.ndim != 2 or data.shape[0] != len(lengths) or lengths.max(initial=0) > data.shape[1]:
+            raise ValueError(f"'{path}' does not match its data file")
+        buffer = cls(len(lengths), data.dtype, capacity=1)
+        buffer.path = path
+        buffer._data = data
+        buffer._lengths = lengths
+        return buffer
@@ -1,5 +1,11 @@
-from ..Config import get_config
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Optional, Tuple
+
 from ..interfaces import Mediator
+from ..models.BatchCalibration import BatchCalibration
 from ..models.ProjectSelection import ProjectSelection
 from ..views.CalibrateModelSelectView import CalibrateModelSelectView
 from .PopupPresenter import PopupPresenter
@@ -9,12 +15,26 @@ class CalibrateModelSelectPresenter(PopupPresenter[CalibrateModelSelectView, Pro
     """Presenter for selecting which models to calibrate, when multiple models are to be calibrated at once.
 
     Formerly `popupWindow8`, used from "tool > Calibrate multiple models from project"
+
+    Selected models are calibrated in parallel by a `BatchCalibration`, run in a background thread so that the GUI remains responsive. The thread posts the progress and outcome of each model to a queue, which is polled from the Tk event loop.
     """
 
+    POLL_INTERVAL: int = 100
+    """Milliseconds between checks for updates from a batch calibration running in the background"""
+
     def __init__(self, mediator: Mediator, view: CalibrateModelSelectView, model: ProjectSelection) -> None:
         # Call the parent class' constructor
         super().__init__(mediator, view, model)
 
+        self.updates: queue.Queue[Tuple[str, Any]] = queue.Queue()
+        """Messages from the calibration thread, as a pair of the kind of message ("progress", "finished", "done" or "error") and its value"""
+
+        self.thread: Optional[threading.Thread] = None
+        """The thread the batch calibration is running in, if started by `start`"""
+
+        self.metadata_thread: Optional[threading.Thread] = None
+        """The thread writing metadata sidecars for models saved by previous versions of polychron, if any were listed by `update_view`"""
+
         # Bind buttons
         self.view.bind_ok_button(self.on_ok_button)
         self.view.bind_select_all_button(self.on_select_all)
@@ -31,14 +51,22 @@ class CalibrateModelSelectPresenter(PopupPresenter[CalibrateModelSelectView, Pro
         if self.model is not None:
             project = self.model.current_project
             if project is not None:
-                # Build a list of just models which are ready for simualtion.
-                # As this will load each model from disk within the project, it may take a while.
-                model_list = [name for name, model in project.models.items() if model is not None and model.load_check]
+                # Build a list of just models which are ready for simualtion, from the project index rather than loading each model from disk.
+                metadata = project.load_metadata()
+                model_list = [name for name in metadata if metadata[name].load_check]
+                # Models saved by previous versions of polychron have no metadata, so are listed by name without loading them. Their metadata is written in the background for future listings.
+                legacy = project.models_without_metadata()
+                model_list = sorted(model_list + legacy)
+                if len(legacy) > 0:
+                    self.metadata_thread = threading.Thread(
+                        target=project.write_missing_metadata, args=(legacy,), daemon=True
+                    )
+                    self.metadata_thread.start()
 
         self.view.update_model_list(model_list)
 
     def on_ok_button(self) -> None:
-        """When the load button is pressed, validate user input, update the model and perform the appropraite action
+        """When the load button is pressed, calibrate the selected models in the background, or close the popup if none were selected
 
         Formerly `popupWindow8.cleanup`
         """
@@ -46,48 +74,75 @@ class CalibrateModelSelectPresenter(PopupPresenter[CalibrateModelSelectView, Pro
         if self.model is not None:
             project = self.model.current_project
             if project is not None:
-                selected_models = self.view.get_selected_models()
-
-                curve_name = None
-                src_model = self.model.current_model
-                if src_model is not None:
-                    try:
-                        curve_obj = src_model.get_calibration_curve()
-                    except Exception:
-                        curve_obj = None
-                    if curve_obj is not None and hasattr(curve_obj, "curve_name"):
-                        curve_name = curve_obj.curve_name
-
-                if not curve_name:
-                    curve_name = "intcal20_interpolated"
-
-                # For each selected model, calibrate and save
-                for model_name in selected_models:
-                    if project.has_model(model_name):
-                        model = project.get_model(model_name)
-                        if model is not None and model.load_check:
-                            (
-                                model.mcmc_data.contexts,
-                                model.mcmc_data.accept_samples_context,
-                                model.mcmc_data.accept_samples_phi,
-                                model.phi_ref,
-                                model.mcmc_data.A,
-                                model.mcmc_data.P,
-                                model.mcmc_data.all_samples_context,
-                                model.mcmc_data.all_samples_phi,
-                                model.mcmc_data.accept_group_limits,
-                                model.mcmc_data.all_group_limits,
-                            ) = model.MCMC_func()
-                            # Update the model state to show it as having been calibrated
-                            model.mcmc_check = True
-                            # Update the calibration curve used for the MCMCdata
-                            model.mcmc_data.calibration_curve_name = model.calibration_curve_name
-                            # Save the mcmc data to disk
-                            model.mcmc_data.save(model.get_working_directory(), model.group_df, get_config().verbose)
-                            model.save()
+                selected_models = [name for name in self.view.get_selected_models() if project.has_model(name)]
+                if len(selected_models) > 0:
+                    self.start(BatchCalibration(project, selected_models))
+                    return
         # Close the popup
         self.close_view()
 
+    def start(self, batch: BatchCalibration) -> None:
+        """Start a batch calibration in a background thread, updating the status of each model in the view as it progresses
+
+        The popup is modal while the batch runs, so models cannot be edited or calibrated from elsewhere until it has finished. Each calibrated model replaces the model in the project as it finishes. The popup is closed once every model has been calibrated and saved, or kept open to show which models failed.
+
+        Parameters:
+            batch: The batch of models to calibrate
+        """
+        self.view.disable_ok_button()
+        for model_name in batch.model_names:
+            self.view.update_model_status(model_name, "Queued")
+        self.view.make_modal()
+        self.thread = threading.Thread(target=self.__calibrate_in_background, args=(batch,), daemon=True)
+        self.thread.start()
+        self.view.after(self.POLL_INTERVAL, self.poll)
+
+    def __calibrate_in_background(self, batch: BatchCalibration) -> None:
+        """Run the batch in the calibration thread, posting progress and the outcome to `updates` rather than updating the view"""
+        try:
+            failures = batch.run(
+                lambda name, progress: self.updates.put(("progress", (name, progress))),
+                lambda name, model, error: self.updates.put(("finished", (name, model, error))),
+            )
+            self.updates.put(("done", failures))
+        except Exception as e:
+            self.updates.put(("error", e))
+
+    def poll(self) -> None:
+        """Handle updates posted by the calibration thread, from the Tk event loop
+
+        Raises:
+            Exception: Any exception raised by the batch, other than by calibration of an individual model, once the popup has been closed
+        """
+        while True:
+            try:
+                kind, value = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                name, progress = value
+                self.view.update_model_status(name, f"{progress.percent}% {progress.describe()}".rstrip())
+            elif kind == "finished":
+                name, model, error = value
+                # Replace the model in the project with the calibrated and saved model, from the Tk thread
+                if model is not None and (project := self.model.current_project) is not None:
+                    project.set_model(name, model)
+                self.view.update_model_status(name, "Calibrated" if error is None else f"Failed: {error}")
+            elif kind == "done":
+                # Keep the popup open if any models failed, so the errors can be seen
+                if len(value) == 0:
+                    self.view.destroy()
+                return
+            else:
+                self.view.destroy()
+                raise value
+        self.view.after(self.POLL_INTERVAL, self.poll)
+
+    def close_view(self, event: Any = None) -> None:
+        """Close the popup, unless a batch calibration is running in the background"""
+        if self.thread is None or not self.thread.is_alive():
+            super().close_view(event)
+
     def on_select_all(self) -> None:
         """When the OK button is pressed, select all rows in the list"""
         self.view.select_all_models()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import threading
 from tkinter import simpledialog
 from typing import Any
 
@@ -10,6 +11,8 @@ from matplotlib.figure import Figure
 
 from ..interfaces import Mediator
 from ..mcmc import HPD_interval
+from ..models.MCMCData import MCMCData
+from ..models.PosteriorSummary import PosteriorSummary
 from ..models.ProjectSelection import ProjectSelection
 from ..util import node_coords_check, phase_length_finder
 from ..views.DatingResultsView import DatingResultsView
@@ -44,6 +47,9 @@ class DatingResultsPresenter(FramePresenter[DatingResultsView, ProjectSelection]
         self.fig = None
         """A handle to a matplotlib figure being presented."""
 
+        self.posterior_summary: tuple[dict[str, list[float]], PosteriorSummary] | None = None
+        """The most recently summarised accepted samples and their summary, which caches HPD intervals between requests"""
+
         # Bind callback functions for switching between the main view tabs
         view.bind_sasd_tab_button(lambda: self.mediator.switch_presenter("Model"))
         view.bind_dr_tab_button(lambda: self.mediator.switch_presenter("DatingResults"))
@@ -91,6 +97,11 @@ class DatingResultsPresenter(FramePresenter[DatingResultsView, ProjectSelection]
         # Ensure content is correct when switching tab
         self.chronograph_render_post()
 
+        # Start loading lazily loaded MCMC samples in the background, so they are likely available before they are needed
+        model_model = self.model.current_model
+        if model_model is not None and model_model.mcmc_check and not model_model.mcmc_data.samples_loaded:
+            threading.Thread(target=model_model.mcmc_data.load_samples, daemon=True).start()
+
         if hasattr(self.view, "set_curve_name"):
             self.view.set_curve_name(self._get_display_curve_name())
 
@@ -274,25 +285,34 @@ class DatingResultsPresenter(FramePresenter[DatingResultsView, ProjectSelection]
             )
 
             if model_model.mcmc_check:
-                # Compute new data to present
+                # Compute new data to present, for every selected node at once
                 lim = np.float64(USER_INP) / 100
+                regions = self.get_posterior_summary(model_model.mcmc_data).hpd(float(lim), self.results_list.keys())
                 intervals = []
-                for i, j in enumerate(self.results_list.keys()):
-                    node = str(j)
-                    interval = list(
-                        HPD_interval(np.array(model_model.mcmc_data.accept_group_limits[j][1000:]), lim=lim)
-                    )
-                    # define headings
-                    hpd_str = ""
-                    refs = [k for k in range(len(interval)) if k % 2]
-                    for i in refs:
-                        hpd_str = hpd_str + f"{np.abs(interval[i - 1])} - {np.abs(interval[i])} Cal BP "
+                for node, region in regions.items():
+                    hpd_str = "".join(f"{abs(start)} - {abs(end)} Cal BP " for start, end in region)
                     # add data to the treeview
-                    intervals.append((node, hpd_str))
+                    intervals.append((str(node), hpd_str))
 
                 # Update the view
                 self.view.update_hpd_interval(USER_INP, intervals)
 
+    def get_posterior_summary(self, mcmc_data: MCMCData) -> PosteriorSummary:
+        """Get the summary of the accepted samples of an MCMCData, reusing the previous summary if the samples have not changed
+
+        Calibration replaces `accept_group_limits`, so the summary is recomputed for new results.
+
+        Parameters:
+            mcmc_data: The calibration results to summarise
+
+        Returns:
+            The summary, with any previously computed HPD intervals cached
+        """
+        samples = mcmc_data.accept_group_limits
+        if self.posterior_summary is None or self.posterior_summary[0] is not samples:
+            self.posterior_summary = (samples, PosteriorSummary.from_mcmc_data(mcmc_data, accepted=True))
+        return self.posterior_summary[1]
+
     def on_testmenu2(self, currentevent: Any) -> None:
         """finds nodes in the chronodag on results page
 
@@ -1,5 +1,13 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from typing import Any, Callable, Optional, Tuple
+
 from ..Config import get_config
-from ..interfaces import Mediator
+from ..interfaces import Mediator, Writable
+from ..mcmc import WORKER_CONTEXT, ChainProgress, MCMCSession
 from ..models.Model import Model
 from ..views.MCMCProgressView import MCMCProgressView
 from .PopupPresenter import PopupPresenter
@@ -8,13 +16,32 @@ from .PopupPresenter import PopupPresenter
 class MCMCProgressPresenter(PopupPresenter[MCMCProgressView, Model]):
     """Presenter for managing the MCMC progress bar popup view.
 
+    Calibration is started with `start`, which runs it in a background thread so that the GUI remains responsive. The thread posts progress updates and its outcome to a queue, which is polled from the Tk event loop. Calibration can be cancelled, stopping the sampler after its current iteration.
+
     When MCMC calibration has completed, and the popup closes, change to the DatingResults tab
     """
 
+    POLL_INTERVAL: int = 100
+    """Milliseconds between checks for updates from a calibration running in the background"""
+
     def __init__(self, mediator: Mediator, view: MCMCProgressView, model: Model) -> None:
         # Call the parent class' constructor
         super().__init__(mediator, view, model)
 
+        self.updates: queue.Queue[Tuple[str, Any]] = queue.Queue()
+        """Messages from the calibration thread, as a pair of the kind of message ("progress", "done" or "error") and its value"""
+
+        self.stop_event = WORKER_CONTEXT.Event()
+        """Set to stop calibration early, shared with chains running in worker processes"""
+
+        self.thread: Optional[threading.Thread] = None
+        """The thread calibration is running in, if started by `start`"""
+
+        self.on_complete: Optional[Callable[[], Any]] = None
+        """Callback for when calibration running in the background has finished and the results have been stored"""
+
+        self.view.bind_cancel_button(lambda: self.on_cancel())
+
         # Update view information to reflect the current state of the model
         self.update_view()
 
@@ -23,34 +50,132 @@ class MCMCProgressPresenter(PopupPresenter[MCMCProgressView, Model]):
     def update_view(self) -> None:
         pass
 
-    def run(self) -> None:
-        """Runs model calibration for the current model"""
+    def calibrate(
+        self,
+        progress_io: Optional[Writable],
+        resume: bool = False,
+        progress_callback: Optional[Callable[[ChainProgress], Any]] = None,
+        session: Optional[MCMCSession] = None,
+    ) -> tuple:
+        """Calibrate the current model, returning the results without storing them in the model
+
+        See `Model.run_calibration`, which stops early if `stop_event` is set.
+
+        Parameters:
+            progress_io: Writable for progress updates
+            resume: If the most recent calibration of the model should be continued from its checkpoints, see `Model.create_mcmc_session`
+            progress_callback: Callable to pass a `ChainProgress` to each time progress is reported
+            session: A session from `Model.create_mcmc_session` to run, in which case resume is not used. A new session is created if None.
+
+        Returns:
+            The tuple of results from `Model.run_calibration`
+        """
+        if session is None:
+            session = self.model.create_mcmc_session(resume=resume)
+        return self.model.run_calibration(session, progress_io, progress_callback, self.stop_event)
+
+    def store_results(self, results: tuple) -> bool:
+        """Store the results of calibration in the model, and save them to disk
+
+        The results of a cancelled calibration are only stored if every context has samples beyond the burn-in, see `Model.store_calibration`.
+
+        Parameters:
+            results: The tuple of results from `calibrate`
+
+        Returns:
+            If the results were stored
+        """
+        if not self.model.store_calibration(results, self.stop_event.is_set()):
+            return False
+        # Save the mcmc data to disk
+        self.model.mcmc_data.save(self.model.get_working_directory(), self.model.group_df, get_config().verbose)
+        return True
+
+    def run(self, resume: bool = False) -> None:
+        """Runs model calibration for the current model, blocking until it has completed
+
+        Parameters:
+            resume: If the most recent calibration of the model should be continued from its checkpoints, see `Model.create_mcmc_session`
+        """
         # Set progress to none
         self.view.update_progress(0)
         # Use the view as the writable object for progress updates
-        progress_io = self.view
-        # Run the MCMC calibration
-        self.model.mcmc_data.accept_samples_context = [[]]
-        while min([len(i) for i in self.model.mcmc_data.accept_samples_context]) < 50000:
-            (
-                self.model.mcmc_data.contexts,
-                self.model.mcmc_data.accept_samples_context,
-                self.model.mcmc_data.accept_samples_phi,
-                self.model.phi_ref,
-                self.model.mcmc_data.A,
-                self.model.mcmc_data.P,
-                self.model.mcmc_data.all_samples_context,
-                self.model.mcmc_data.all_samples_phi,
-                self.model.mcmc_data.accept_group_limits,
-                self.model.mcmc_data.all_group_limits,
-            ) = self.model.MCMC_func(progress_io)
-
-        # Update the model state to show it as having been calibrated
-        self.model.mcmc_check = True
-        # Update the calibration curve used for the MCMCdata
-        self.model.mcmc_data.calibration_curve_name = self.model.calibration_curve_name
-        # Save the mcmc data to disk
-        self.model.mcmc_data.save(self.model.get_working_directory(), self.model.group_df, get_config().verbose)
+        self.store_results(self.calibrate(self.view, resume))
+
+    def start(self, resume: bool = False, on_complete: Optional[Callable[[], Any]] = None) -> None:
+        """Start model calibration for the current model in a background thread, updating the view as it progresses
+
+        The inputs to calibration are gathered from the model before the thread is started, and the popup is modal while calibration runs, so the model cannot be edited or calibrated again until it has finished. The popup is closed when calibration has finished.
+
+        Parameters:
+            resume: If the most recent calibration of the model should be continued from its checkpoints, see `Model.create_mcmc_session`
+            on_complete: Callback for once calibration has finished and its results have been stored, which is not called if it was cancelled before any results could be kept
+
+        Raises:
+            RuntimeError: If calibration could not be started, see `Model.create_mcmc_session`. The popup is closed.
+        """
+        self.view.update_progress(0)
+        self.on_complete = on_complete
+        try:
+            session = self.model.create_mcmc_session(resume=resume)
+        except Exception:
+            self.view.destroy()
+            raise
+        self.view.make_modal()
+        self.thread = threading.Thread(target=self.__calibrate_in_background, args=(session,), daemon=True)
+        self.thread.start()
+        self.view.after(self.POLL_INTERVAL, self.poll)
+
+    def __calibrate_in_background(self, session: MCMCSession) -> None:
+        """Run a calibration session in the calibration thread, posting progress and the outcome to `updates` rather than updating the view"""
+        try:
+            with open(os.devnull, "w") as devnull:
+                results = self.calibrate(
+                    devnull,
+                    progress_callback=lambda progress: self.updates.put(("progress", progress)),
+                    session=session,
+                )
+            self.updates.put(("done", results))
+        except Exception as e:
+            self.updates.put(("error", e))
+
+    def poll(self) -> None:
+        """Handle updates posted by the calibration thread, from the Tk event loop
+
+        Raises:
+            Exception: Any exception raised during calibration, once the popup has been closed
+        """
+        while True:
+            try:
+                kind, value = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self.view.update_progress(value.percent)
+                self.view.update_status(value.describe())
+            elif kind == "done":
+                stored = self.store_results(value)
+                self.view.destroy()
+                if stored and self.on_complete is not None:
+                    self.on_complete()
+                return
+            else:
+                self.view.destroy()
+                raise value
+        self.view.after(self.POLL_INTERVAL, self.poll)
+
+    def on_cancel(self) -> None:
+        """Stop calibration after the current iteration of the sampler, keeping the samples drawn so far"""
+        self.stop_event.set()
+        self.view.disable_cancel_button()
+        self.view.update_status("Cancelling...")
+
+    def close_view(self, event: Any = None) -> None:
+        """Close the popup, cancelling calibration if it is running in the background. The popup is closed once the sampler has stopped"""
+        if self.thread is not None and self.thread.is_alive():
+            self.on_cancel()
+        else:
+            super().close_view(event)
 
     def _get_display_curve_name(self) -> str:
         """Return a user-friendly calibration curve name (no '_interpolated')."""
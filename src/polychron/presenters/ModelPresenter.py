@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, List
+from typing import Any, List, Optional
 
 import networkx as nx
 import pandas as pd
@@ -69,6 +69,9 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
 
         self.display_data_var = "hidden"
 
+        self.calibration: Optional[MCMCProgressPresenter] = None
+        """The presenter for the most recently started calibration, which may still be running in the background"""
+
         # Bind callback functions for switching between the main view tabs
         view.bind_sasd_tab_button(lambda: self.mediator.switch_presenter("Model"))
         view.bind_dr_tab_button(lambda: self.mediator.switch_presenter("DatingResults"))
@@ -101,6 +104,7 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
                 ("Render chronological graph", lambda: self.chronograph_render_wrap()),
                 ("Select calibration curve", lambda: self.open_calibration_curve_selector()),
                 ("Calibrate model", lambda: self.popup_calibrate_model()),
+                ("Resume calibration", lambda: self.popup_calibrate_model(resume=True)),
                 ("Calibrate multiple models from project", lambda: self.popup_calibrate_multiple()),
                 # ("Calibrate node delete variations (alpha)",  lambda: self.calibrate_node_delete_variations()), # see https://github.com/bryonymoody/PolyChron/issues/71
                 # ("Calibrate important variations (alpha)",  lambda: self.calibrate_important_variations()), # see https://github.com/bryonymoody/PolyChron/issues/72
@@ -179,8 +183,11 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
         else:
             return None
 
-    def popup_calibrate_model(self) -> None:
-        """Callback function for when Tools -> Calibrate model is selected
+    def popup_calibrate_model(self, resume: bool = False) -> None:
+        """Callback function for when Tools -> Calibrate model or Tools -> Resume calibration is selected
+
+        Parameters:
+            resume: If the most recent calibration of the model should be resumed from its checkpoints, or extended
 
         Formerly `StartPage.load_mcmc`
         """
@@ -188,6 +195,11 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
         if model_model is None:
             return
 
+        # Only one calibration may run at once, as it must not be changed by another calibration
+        if self.calibration is not None and self.calibration.thread is not None and self.calibration.thread.is_alive():
+            self.view.messagebox_error("Error", "A calibration is already running.\nPlease wait for it to finish")
+            return
+
         # If the model is not ready for calibration present an error popup.
         if not model_model.is_ready_for_mcmc():
             self.view.messagebox_error(
@@ -196,16 +208,25 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
             )
             return
 
+        # Calibrations can only be resumed if they streamed samples to disk
+        if resume and model_model.get_resumable_mcmc_run() is None:
+            self.view.messagebox_error(
+                "Error",
+                "There is no calibration of this model to resume.\nCalibrations can be resumed when the mcmc_stream_samples configuration option is enabled",
+            )
+            return
+
         # Create the popup presenter and view
         popup_presenter = MCMCProgressPresenter(self.mediator, MCMCProgressView(self.view), model_model)
         # Ensure it is visible and on top
         popup_presenter.view.lift()
-        # Run the calibration
-        popup_presenter.run()
-        # Close the popup (formerly .cleanup)
-        popup_presenter.close_view()
-        # Change to the DatingResults tab
-        self.mediator.switch_presenter("DatingResults")
+        # Run the calibration in the background, which closes the popup and changes to the DatingResults tab once complete
+        try:
+            popup_presenter.start(resume=resume, on_complete=lambda: self.mediator.switch_presenter("DatingResults"))
+        except RuntimeError as e:
+            self.view.messagebox_error("Error", f"Unable to start calibration.\n{e}")
+            return
+        self.calibration = popup_presenter
 
     def popup_calibrate_multiple(self) -> None:
         """Callback function for when Tools -> Calibrate multiple models from project is selected
@@ -653,6 +674,7 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
             model_model.stratigraphic_dag.add_node(
                 addContextModel.label, shape="box", fontsize="30.0", fontname="helvetica", penwidth="1.0"
             )
+            model_model.mark_unsaved()
 
     def testmenu_delete_strat_with(self) -> None:
         """Callback function from the testmenu for deleting stratigrahic relationship edges"""
@@ -1096,6 +1118,8 @@ class ModelPresenter(FramePresenter[ModelView, ProjectSelection]):
                 "Redundant relationship",
                 "That stratigraphic relationship is already implied by other relationships in the graph",
             )
+        else:
+            model_model.mark_unsaved()
         model_model.render_strat_graph()
         self.view.update_littlecanvas(model_model.stratigraphic_image)
 
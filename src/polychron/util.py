@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import ast
 import copy
+import json
+import os
 import pathlib
 import platform
 import re
 import sys
+import tempfile
 import time
-from typing import IO, Any, Dict, Iterable, List, Literal, Tuple
+from typing import IO, Any, Callable, Dict, Iterable, List, Literal, Tuple
 
 import networkx as nx
 import numpy as np
@@ -490,7 +493,8 @@ def phase_length_finder(con_1: str, con_2: str, group_limits: dict[str, list[flo
     """
     if con_1 not in group_limits or con_2 not in group_limits:
         return []
-    phase_lengths = [np.abs(a - b) for a, b in zip(group_limits[con_1], group_limits[con_2])]
+    n = min(len(group_limits[con_1]), len(group_limits[con_2]))
+    phase_lengths = np.abs(np.asarray(group_limits[con_1][:n]) - np.asarray(group_limits[con_2][:n])).tolist()
 
     # unused code building a version of phase_lengths with sequential elements of the same value removed
     # un_phase_lens = []
@@ -924,6 +928,39 @@ def remove_invalid_attributes_networkx_lt_3_4(graph: nx.DiGraph) -> nx.DiGraph:
         return graph
 
 
+def write_file_atomic(path: pathlib.Path, write: Callable[[IO], Any], binary: bool = False) -> None:
+    """Write a file via a temporary file in the same directory, replacing any existing file atomically, so readers never see a partially written file
+
+    The temporary file is removed if writing fails, leaving any existing file intact.
+
+    Parameters:
+        path: The path of the file
+        write: Callable which writes the contents of the file to the open file object it is passed
+        binary: If the file should be opened in binary mode rather than text mode
+
+    Raises:
+        OSError: If the file could not be written
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+
+
+def write_json_atomic(path: pathlib.Path, data: Any, indent: int | None = None) -> None:
+    """Write a json file atomically, see `write_file_atomic`
+
+    Parameters:
+        path: The path of the json file
+        data: The json-serialisable data to write
+        indent: Indentation for `json.dump`, or None for the most compact representation
+    """
+    write_file_atomic(path, lambda f: json.dump(data, f, indent=indent))
+
+
 class MonotonicTimer:
     """A monotonic timer, for capturing execution time for sections of code"""
 
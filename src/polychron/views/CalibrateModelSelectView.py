@@ -32,6 +32,9 @@ class CalibrateModelSelectView(PopupView):
         self.list_box = tk.Listbox(self, font="helvetica 12", fg="#2f4858", selectmode="multiple")
         self.list_box.place(relx=0.3, rely=0.2, relheight=0.5, relwidth=0.5)
 
+        self.model_list: List[str] = []
+        """The names of models in the list box, in order"""
+
         # Add an OK button
         self.ok_button = tk.Button(self, text="OK", bg="#2F4858", font=("Helvetica 12 bold"), fg="#eff3f6")
         self.ok_button.place(relx=0.3, rely=0.7)
@@ -54,9 +57,22 @@ class CalibrateModelSelectView(PopupView):
 
     def update_model_list(self, model_list: List[str]) -> None:
         """Update the list box with the names of models from the current project which are ready for calibration."""
+        self.model_list = list(model_list)
         for model_name in model_list:
             self.list_box.insert("end", model_name)
 
+    def update_model_status(self, model_name: str, status: str) -> None:
+        """Show the calibration status of a model next to its name in the list box"""
+        if model_name in self.model_list:
+            index = self.model_list.index(model_name)
+            self.list_box.delete(index)
+            self.list_box.insert(index, f"{model_name}: {status}")
+
+    def disable_ok_button(self) -> None:
+        """Disable the ok and select all buttons, once calibration has started"""
+        self.ok_button.config(state="disabled")
+        self.select_all_button.config(state="disabled")
+
     def select_all_models(self) -> None:
         """select all models within the UI"""
         self.list_box.select_set(0, "end")
@@ -1,6 +1,7 @@
 import re
 import tkinter as tk
 from tkinter import ttk
+from typing import Any, Callable
 
 from .PopupView import PopupView
 
@@ -16,7 +17,7 @@ class MCMCProgressView(PopupView):
         # Call the parent class constructor
         super().__init__(parent)
 
-        self.geometry("700x200")
+        self.geometry("700x260")
         self.title("MCMC in progress")
         self.attributes("-topmost", "true")
 
@@ -35,6 +36,17 @@ class MCMCProgressView(PopupView):
         self.output_label.place(relx=0.4, rely=0.4)
         self.progress_bar = ttk.Progressbar(self.backcanvas, orient=tk.HORIZONTAL, length=400, mode="indeterminate")
         self.progress_bar.place(relx=0.2, rely=0.56)
+        self.status_label = tk.Label(self.backcanvas, font=("helvetica 11"), fg="#2F4858", bg="#AEC7D6")
+        self.status_label.place(relx=0.5, rely=0.7, anchor="n")
+        self.cancel_button = tk.Button(
+            self.backcanvas, text="Cancel", bg="#2F4858", font=("Helvetica 12 bold"), fg="#eff3f6"
+        )
+        self.cancel_button.place(relx=0.5, rely=0.84, anchor="n")
+
+    def bind_cancel_button(self, callback: Callable[[], Any]) -> None:
+        """Bind the callback for when the cancel_button is pressed"""
+        if callback is not None:
+            self.cancel_button.config(command=callback)
 
     def update_progress(self, percent: int) -> None:
         """Update the progress bar and text label with current progress
@@ -48,6 +60,18 @@ class MCMCProgressView(PopupView):
         self.output_label.update_idletasks()
         self.progress_bar.update_idletasks()
 
+    def update_status(self, text: str) -> None:
+        """Update the status text shown below the progress bar, such as the estimated time remaining and sampler diagnostics
+
+        Parameters:
+            text: The status to show
+        """
+        self.status_label["text"] = text
+
+    def disable_cancel_button(self) -> None:
+        """Disable the cancel button, once cancellation has been requested"""
+        self.cancel_button.config(state=tk.DISABLED)
+
     def write(self, text: str) -> None:
         """Ensure that MCMCProgressView duck-types as Writable - i.e. implement write(str) so it can be used as the `file` argument to `print` to update the progress bar (full TextIO is not required)
 
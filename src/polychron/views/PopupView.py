@@ -26,3 +26,10 @@ class PopupView(tk.Toplevel):
         i.e. what happens when the window is closed using the OS decorations"""
         for name, callback in bindings.items():
             self.protocol(name, callback)
+
+    def make_modal(self) -> None:
+        """Keep this popup above its parent window, and direct all input to it until it is destroyed"""
+        self.transient(self.parent.winfo_toplevel())
+        # A window can only grab input once it is viewable
+        self.wait_visibility()
+        self.grab_set()
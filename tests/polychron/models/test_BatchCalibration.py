@@ -0,0 +1,128 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from polychron.Config import get_config
+from polychron.mcmc import ChainProgress
+from polychron.models.BatchCalibration import BatchCalibration, calibrate_in_worker, initialise_worker
+from polychron.models.Model import Model
+from polychron.models.Project import Project
+
+
+class TestBatchCalibration:
+    """Unit Tests for calibrating several models from a project in parallel with `BatchCalibration`"""
+
+    def create_model(self, project: Project, name: str, test_data_path: pathlib.Path) -> Model:
+        """Create and save a model from the demo input files, which is ready for calibration without rendering its graphs (which requires graphviz)"""
+        model = project.create_model(name)
+        model.set_stratigraphic_df(pd.read_csv(test_data_path / "demo" / "1-strat.csv", dtype=str))
+        model.set_radiocarbon_df(pd.read_csv(test_data_path / "demo" / "2-dates.csv", dtype=str))
+        model.set_group_df(pd.read_csv(test_data_path / "demo" / "3-context-grouping.csv", dtype=str))
+        model.set_group_relationship_df(pd.read_csv(test_data_path / "demo" / "4-group-ordering.csv", dtype=str))
+        # The demo groups are abutting, so the stratigraphic graph is a valid chronological graph
+        model.chronological_dag = model.stratigraphic_dag.copy()
+        model.context_no_unordered = list(model.stratigraphic_dag.nodes())
+        model.context_types = ["normal"] * len(model.context_no_unordered)
+        model.phi_ref = ["1", "2"]
+        model.prev_group = ["start", "abutting"]
+        model.post_group = ["abutting", "end"]
+        model.load_check = True
+        model.save()
+        return model
+
+    @pytest.fixture
+    def quick_config(self):
+        """Configure short calibrations which stop early once converged"""
+        config = get_config()
+        config.mcmc_convergence = True
+        config.mcmc_max_samples = 300
+        config.mcmc_check_interval = 100
+
+    def test_init(self, tmp_path: pathlib.Path):
+        """Test the number of models calibrated at once is bounded by the number of workers and chains per model"""
+        project = Project("foo", tmp_path / "foo")
+        batch = BatchCalibration(project, ["a", "b", "c"], chains=2, workers=5, seed=1)
+        assert (batch.chains, batch.workers, batch.seed) == (2, 5, 1)
+        assert batch.max_models == 2
+        assert BatchCalibration(project, ["a", "b", "c"], chains=4, workers=2).max_models == 1
+        assert BatchCalibration(project, ["a"], chains=1, workers=8).max_models == 1
+        # Defaults are from the configuration, using every CPU when mcmc_workers is 0
+        batch = BatchCalibration(project, ["a"])
+        assert batch.chains == get_config().mcmc_chains
+        assert batch.workers >= 1
+
+    def test_init_models(self, tmp_path: pathlib.Path, test_data_path: pathlib.Path):
+        """Test models are resolved when the batch is prepared, without loading models which were not loaded"""
+        project = Project("foo", tmp_path / "foo")
+        loaded = self.create_model(project, "a", test_data_path)
+        self.create_model(project, "b", test_data_path).calibration_curve_name = "other"
+        project.models["b"].save()
+        project.unload_model("b")
+        batch = BatchCalibration(project, ["a", "b", "missing"])
+        assert batch.models == {"a": loaded, "b": project.path / "b"}
+        assert project.models["b"] is None
+
+    def test_calibrate_in_worker(self, tmp_path: pathlib.Path, test_data_path: pathlib.Path, quick_config):
+        """Test calibrating a model as a worker process would, loading each calibration curve once per worker"""
+        project = Project("foo", tmp_path / "foo")
+        model = self.create_model(project, "bar", test_data_path)
+        initialise_worker(get_config(), None)
+        calibrated = calibrate_in_worker(model, 1, None, 3)
+        assert calibrated.mcmc_check
+        assert calibrated.mcmc_data.seed == 3
+        curve = calibrated.get_calibration_curve()
+        assert curve.curve_name == model.calibration_curve_name
+        # The results and model were saved to disk
+        assert Model.load_from_disk(model.path).mcmc_check
+
+        # Models which were not loaded are loaded from disk, reusing the curve loaded by the worker
+        reloaded = calibrate_in_worker(model.path, 1, None, 3)
+        assert reloaded.mcmc_check
+        assert reloaded.get_calibration_curve() is curve
+
+        # Models which are not ready cannot be calibrated
+        with pytest.raises(RuntimeError, match="not ready for calibration"):
+            calibrate_in_worker(project.create_model("baz"), 1, None, 3)
+        with pytest.raises(RuntimeError, match="not a directory"):
+            calibrate_in_worker(project.path / "missing", 1, None, 3)
+        # Reset the worker state of this process
+        initialise_worker(get_config(), None)
+
+    def test_run(self, tmp_path: pathlib.Path, test_data_path: pathlib.Path, quick_config):
+        """Test that several models are calibrated in worker processes, passing back the calibrated models without modifying the project, and that failures are reported per model"""
+        project = Project("foo", tmp_path / "foo")
+        for name in ["a", "b"]:
+            self.create_model(project, name, test_data_path)
+        # Models which are not loaded are loaded by the worker
+        project.unload_model("b")
+        project.create_model("not-ready").save()
+        progress = []
+        finished = {}
+        failures = BatchCalibration(project, ["a", "not-ready", "missing", "b"], chains=1, workers=2, seed=1).run(
+            lambda name, update: progress.append((name, update)),
+            lambda name, model, error: finished.update({name: (model, error)}),
+        )
+        assert sorted(failures) == ["missing", "not-ready"]
+        assert "not ready for calibration" in str(failures["not-ready"])
+        assert finished["missing"] == (None, failures["missing"])
+        assert sorted(finished) == ["a", "b", "missing", "not-ready"]
+        assert {name for name, _ in progress} == {"a", "b"}
+        assert all(isinstance(update, ChainProgress) for _, update in progress)
+        for name in ["a", "b"]:
+            model, error = finished[name]
+            assert error is None
+            assert model.mcmc_check
+            assert model.mcmc_data.seed == 1
+            assert Model.load_from_disk(project.path / name).mcmc_check
+        assert not project.models["a"].mcmc_check
+        assert project.models["b"] is None
+        # Models calibrated with the same seed and inputs have the same samples
+        for a, b in zip(
+            finished["a"][0].mcmc_data.accept_samples_context, finished["b"][0].mcmc_data.accept_samples_context
+        ):
+            assert np.array_equal(a, b)
+
+        # An empty batch does nothing
+        assert BatchCalibration(project, []).run() == {}
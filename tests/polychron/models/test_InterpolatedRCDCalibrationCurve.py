@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import pickle
+
+import pandas as pd
 import pytest
 
 from polychron.models.InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
@@ -62,3 +65,24 @@ class TestInterpolatedRCDCalibrationCurve:
         else:
             with pytest.raises(FileNotFoundError):
                 df = instance.df
+
+    def test_sha256(self):
+        """Test the curve file hash is stable, and differs between curves"""
+        instance = InterpolatedRCDCalibrationCurve("intcal20_interpolated")
+        assert len(instance.sha256) == 64
+        assert instance.sha256 == InterpolatedRCDCalibrationCurve("intcal20_interpolated").sha256
+        assert instance.sha256 != InterpolatedRCDCalibrationCurve("shcal20_interpolated").sha256
+        # Hashing the file does not load the dataframe
+        assert instance._InterpolatedRCDCalibrationCurve__dataframe is None
+
+    def test_pickle(self):
+        """Test that pickling a curve does not include its data, which is loaded again on access"""
+        instance = InterpolatedRCDCalibrationCurve("intcal20_interpolated")
+        instance.load()
+        data = pickle.dumps(instance)
+        assert len(data) < 1000
+        unpickled = pickle.loads(data)
+        assert unpickled._InterpolatedRCDCalibrationCurve__dataframe is None
+        pd.testing.assert_frame_equal(unpickled.df, instance.df)
+        # The original curve is not modified
+        assert instance._InterpolatedRCDCalibrationCurve__dataframe is not None
@@ -0,0 +1,80 @@
+import os
+import pathlib
+
+import numpy as np
+import pytest
+
+from polychron import mcmc
+from polychron.models.InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
+from polychron.models.LikelihoodCache import LikelihoodCache
+
+
+@pytest.fixture(scope="module")
+def curve() -> InterpolatedRCDCalibrationCurve:
+    """The intcal20 calibration curve, shared by tests in this module"""
+    return InterpolatedRCDCalibrationCurve("intcal20_interpolated")
+
+
+class TestLikelihoodCache:
+    """Unit tests for the on-disk cache of likelihood grids"""
+
+    def test_key(self, tmp_path: pathlib.Path):
+        """Test that keys depend on every input which affects the likelihood grid"""
+        cache = LikelihoodCache(tmp_path, "intcal20_interpolated", "abc")
+        key = cache.key(3275, 75, 1000, 5000)
+        assert key == cache.key(3275, 75, 1000, 5000)
+        assert key != cache.key(3276, 75, 1000, 5000)
+        assert key != cache.key(3275, 70, 1000, 5000)
+        assert key != cache.key(3275, 75, 999, 5000)
+        assert key != cache.key(3275, 75, 1000, 5001)
+        assert key != LikelihoodCache(tmp_path, "shcal20_interpolated", "abc").key(3275, 75, 1000, 5000)
+        assert key != LikelihoodCache(tmp_path, "intcal20_interpolated", "def").key(3275, 75, 1000, 5000)
+
+    def test_likelihood_grids(self, tmp_path: pathlib.Path, curve: InterpolatedRCDCalibrationCurve):
+        """Test that grids are computed and stored on a miss, and loaded memory-mapped on a hit"""
+        cache = LikelihoodCache(tmp_path / "cache", curve.curve_name, curve.sha256)
+        RCD_EST, RCD_ERR = [3275, 3420], [75, 65]
+        expected_theta, expected = mcmc.likelihood_grids(RCD_EST, RCD_ERR, 1500, 5200, curve.df)
+
+        theta, probs = cache.likelihood_grids(RCD_EST, RCD_ERR, 1500, 5200, curve.df)
+        np.testing.assert_array_equal(theta, expected_theta)
+        for prob, expected_prob in zip(probs, expected):
+            np.testing.assert_array_equal(prob, expected_prob)
+        assert len(list((tmp_path / "cache").glob("*.npy"))) == 2
+
+        # A second request loads from disk, only computing the new determination
+        theta, probs = cache.likelihood_grids([3420, 3160], [65, 70], 1500, 5200, curve.df)
+        assert isinstance(probs[0], np.memmap)
+        assert not isinstance(probs[1], np.memmap)
+        np.testing.assert_array_equal(probs[0], expected[1])
+        assert len(list((tmp_path / "cache").glob("*.npy"))) == 3
+
+    def test_invalid_entry(self, tmp_path: pathlib.Path, curve: InterpolatedRCDCalibrationCurve):
+        """Test that corrupt or mismatched entries are recomputed rather than loaded"""
+        cache = LikelihoodCache(tmp_path, curve.curve_name, curve.sha256)
+        key = cache.key(3275, 75, 1500, 5200)
+        cache.entry_path(key).write_bytes(b"not a numpy file")
+        assert cache.load(key, 37001) is None
+        cache.store(key, np.zeros(10))
+        assert cache.load(key, 37001) is None
+        _, probs = cache.likelihood_grids([3275], [75], 1500, 5200, curve.df)
+        assert probs[0].sum() == pytest.approx(1.0)
+        assert cache.load(key, 37001) is not None
+
+    def test_evict(self, tmp_path: pathlib.Path):
+        """Test that the least recently used entries are evicted once the cache exceeds its size limit"""
+        cache = LikelihoodCache(tmp_path, "intcal20_interpolated", "abc")
+        for i, key in enumerate(["a", "b", "c", "d"]):
+            cache.store(key, np.full(100, i, dtype=np.float64))
+            # Set modification times explicitly, as filesystem timestamps may be coarse
+            os.utime(cache.entry_path(key), ns=(i * 1_000_000_000, i * 1_000_000_000))
+        # Loading an entry marks it as recently used
+        assert cache.load("a", 100) is not None
+        cache.max_bytes = 3 * cache.entry_path("a").stat().st_size
+        cache.evict()
+        assert sorted(p.stem for p in tmp_path.glob("*.npy")) == ["a", "c", "d"]
+        cache.max_bytes = 0
+        cache.evict()
+        assert list(tmp_path.glob("*.npy")) == []
+        # Evicting from a cache directory which does not exist is not an error
+        LikelihoodCache(tmp_path / "missing", "intcal20_interpolated", "abc").evict()
@@ -1,8 +1,10 @@
+import copy
 import json
 import pathlib
 from importlib.metadata import version
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -234,6 +236,11 @@ class TestMCMCData:
         # Assert the number of rows in the csv
         assert len(df_from_disk) == max([len(x) - 10000 for x in all_group_limits.values()])
 
+        # A summary of the same samples is saved alongside them
+        summary_df = pd.read_csv(tmp_path / "posterior_summary.csv", index_col="node")
+        assert list(summary_df.index) == list(all_group_limits)
+        assert summary_df["mean"]["a_1"] == 10002.0
+
         key_ref_csv_path = tmp_path / "key_ref.csv"
         assert key_ref_csv_path.is_file()
         df_from_disk = pd.read_csv(key_ref_csv_path)
@@ -336,6 +343,13 @@ class TestMCMCData:
         # Ensure there is some json
         assert len(json_str) > 0
 
+        # Samples produced by run_MCMC are NumPy arrays, which are serialised as lists
+        samples = np.array([1.0, 2.0, 3.0])
+        obj = MCMCData(accept_samples_context=[samples], accept_group_limits={"a": samples[1:]})
+        mcmc_data = json.loads(obj.to_json())["mcmc_data"]
+        assert mcmc_data["accept_samples_context"] == [[1.0, 2.0, 3.0]]
+        assert mcmc_data["accept_group_limits"] == {"a": [2.0, 3.0]}
+
     def test_save(self, tmp_path: pathlib.Path, capsys: pytest.CaptureFixture):
         """Test that saving MCMCData instances behaves as intended"""
         # Prepare the MCMCData instance with some data
@@ -386,6 +400,7 @@ class TestMCMCData:
 
         # Check that expected files have been produced. Other tests cover the values included in these files
         assert (tmp_path / "polychron_mcmc_data.json").is_file()
+        assert (tmp_path / "polychron_mcmc_data.npz").is_file()
         assert (tmp_path / "full_results_df").is_file()
         assert (tmp_path / "key_ref.csv").is_file()
         assert (tmp_path / "context_no.csv").is_file()
@@ -467,3 +482,161 @@ class TestMCMCData:
         obj = MCMCData.load_from_disk(tmp_path / "valid_file.json")
         # Assert the cotnexts value matches
         assert obj.contexts == ["a", "b", "c"]
+
+    def test_storage(self, tmp_path: pathlib.Path):
+        """Test saving samples in the binary storage format, and loading them back"""
+        accept = [np.array([1.0, 2.0, 3.0]), np.array([4.0, 5.0])]
+        phi_accept = [np.array([6.0]), np.array([], dtype=np.float64)]
+        obj = MCMCData(
+            contexts=["a", "b"],
+            accept_samples_context=accept,
+            accept_samples_phi=phi_accept,
+            A=100,
+            P=200,
+            all_samples_context=[[1.0, 1.5], [2.0, 2.5]],
+            all_samples_phi=[[3.0], [4.0]],
+            accept_group_limits={"a_1": phi_accept[0], "b_1": phi_accept[1], "a": accept[0], "b": accept[1]},
+            all_group_limits={"a": [7.0, 8.0]},
+            rhat={"a": 1.01},
+            seed=2**100 + 1,
+            move_statistics={"shift": {"proposed": [10, 12], "accepted": [3, 4], "width": [0.5, 0.25]}},
+            calibration_curve_name="shcal20_interpolated",
+        )
+
+        # The manifest contains no samples, and group limits which alias other samples are stored as references
+        manifest, arrays = obj.to_storage()
+        assert manifest["storage"]["version"] == MCMCData.STORAGE_VERSION
+        assert "accept_samples_context" not in manifest["mcmc_data"]
+        assert manifest["mcmc_data"]["contexts"] == ["a", "b"]
+        assert manifest["storage"]["group_limits"]["accept_group_limits"]["a"] == ["accept_samples_context", 0]
+        assert manifest["storage"]["group_limits"]["all_group_limits"]["a"] == ["all_group_limits", 0]
+        assert len(arrays["accept_group_limits"]) == 0
+        np.testing.assert_array_equal(arrays["accept_samples_context"], [1.0, 2.0, 3.0, 4.0, 5.0])
+        np.testing.assert_array_equal(arrays["accept_samples_context_offsets"], [0, 3, 5])
+
+        obj.save(tmp_path, pd.DataFrame({"context": ["a", "b"], "Group": ["1", "1"]}))
+        with open(tmp_path / "polychron_mcmc_data.json") as f:
+            assert "storage" in json.load(f)
+        loaded = MCMCData.load_from_disk(tmp_path / "polychron_mcmc_data.json")
+        assert loaded.contexts == ["a", "b"]
+        assert (loaded.A, loaded.P) == (100, 200)
+        assert loaded.rhat == {"a": 1.01}
+        assert loaded.seed == 2**100 + 1
+        assert loaded.move_statistics == obj.move_statistics
+        assert loaded.calibration_curve_name == "shcal20_interpolated"
+        for name in MCMCData.SAMPLE_FIELDS:
+            assert len(getattr(loaded, name)) == len(getattr(obj, name))
+            for expected, samples in zip(getattr(obj, name), getattr(loaded, name)):
+                np.testing.assert_array_equal(samples, expected)
+        for name in MCMCData.GROUP_LIMIT_FIELDS:
+            assert getattr(loaded, name).keys() == getattr(obj, name).keys()
+            for label, samples in getattr(loaded, name).items():
+                np.testing.assert_array_equal(samples, getattr(obj, name)[label])
+        # Group limits which referred to other samples share memory with them once loaded
+        assert np.shares_memory(loaded.accept_group_limits["b"], loaded.accept_samples_context[1])
+
+        # A manifest whose samples file is missing cannot be loaded
+        (tmp_path / "polychron_mcmc_data.npz").unlink()
+        with pytest.raises(RuntimeError, match="is not a file"):
+            MCMCData.load_from_disk(tmp_path / "polychron_mcmc_data.json")
+
+        # Samples which do not belong to the manifest, or do not match its references, are not loaded
+        _, other_arrays = obj.to_storage()
+        with pytest.raises(RuntimeError, match="do not belong to the manifest"):
+            MCMCData.from_storage(manifest, other_arrays)
+        bad_manifest = copy.deepcopy(manifest)
+        bad_manifest["storage"]["group_limits"]["accept_group_limits"]["a"] = ["accept_samples_context", 2]
+        with pytest.raises(RuntimeError, match="Invalid reference"):
+            MCMCData.from_storage(bad_manifest, arrays)
+        bad_arrays = dict(arrays)
+        bad_arrays["accept_samples_context_offsets"] = np.array([0, 3, 6])
+        with pytest.raises(RuntimeError, match="Invalid offsets"):
+            MCMCData.from_storage(manifest, bad_arrays)
+        # Manifests saved before samples were identified are still loaded
+        del bad_manifest["storage"]["id"], bad_manifest["storage"]["group_limits"]["accept_group_limits"]["a"]
+        assert "a" not in MCMCData.from_storage(bad_manifest, arrays)["accept_group_limits"]
+
+        # Newer storage versions are not supported
+        manifest["storage"]["version"] = MCMCData.STORAGE_VERSION + 1
+        with pytest.raises(RuntimeError, match="Unsupported"):
+            MCMCData.from_storage(manifest, arrays)
+
+    def test_load_from_disk_lazy(self, tmp_path: pathlib.Path):
+        """Test loading only the manifest of saved MCMCData, with samples loaded on first access"""
+        obj = MCMCData(
+            contexts=["a", "b"],
+            accept_samples_context=[np.array([1.0, 2.0]), np.array([3.0])],
+            A=100,
+            P=200,
+            accept_group_limits={"a": np.array([4.0, 5.0])},
+            all_group_limits={"a": [6.0]},
+            calibration_curve_name="intcal20_interpolated",
+        )
+        obj.save(tmp_path, pd.DataFrame({"context": ["a", "b"], "Group": ["1", "1"]}))
+        json_path = tmp_path / "polychron_mcmc_data.json"
+
+        # Manifest members are available without loading samples
+        loaded = MCMCData.load_from_disk(json_path, lazy=True)
+        assert not loaded.samples_loaded
+        assert loaded.contexts == ["a", "b"]
+        assert (loaded.A, loaded.P) == (100, 200)
+        assert loaded.calibration_curve_name == "intcal20_interpolated"
+        assert "accept_group_limits" not in loaded.__dict__
+
+        # Accessing any sample member loads all samples
+        np.testing.assert_array_equal(loaded.accept_group_limits["a"], [4.0, 5.0])
+        assert loaded.samples_loaded
+        np.testing.assert_array_equal(loaded.accept_samples_context[1], [3.0])
+        np.testing.assert_array_equal(loaded.all_group_limits["a"], [6.0])
+        loaded.load_samples()
+
+        # Members assigned before samples are loaded are not replaced
+        loaded = MCMCData.load_from_disk(json_path, lazy=True)
+        loaded.all_group_limits = {"b": [7.0]}
+        loaded.load_samples()
+        assert loaded.all_group_limits == {"b": [7.0]}
+        np.testing.assert_array_equal(loaded.accept_group_limits["a"], [4.0, 5.0])
+
+        # Copies and serialisation of an instance with unloaded samples include the samples
+        loaded = MCMCData.load_from_disk(json_path, lazy=True)
+        copied = copy.deepcopy(loaded)
+        assert not copied.samples_loaded
+        np.testing.assert_array_equal(copied.accept_group_limits["a"], [4.0, 5.0])
+        assert "_MCMCData__pending" not in json.loads(loaded.to_json())["mcmc_data"]
+        assert json.loads(loaded.to_json())["mcmc_data"]["accept_group_limits"] == {"a": [4.0, 5.0]}
+        (tmp_path / "copy").mkdir()
+        MCMCData.load_from_disk(json_path, lazy=True).save(
+            tmp_path / "copy", pd.DataFrame({"context": ["a", "b"], "Group": ["1", "1"]})
+        )
+        np.testing.assert_array_equal(
+            MCMCData.load_from_disk(tmp_path / "copy" / "polychron_mcmc_data.json").accept_samples_context[0],
+            [1.0, 2.0],
+        )
+
+        # Unknown attributes are still an error
+        with pytest.raises(AttributeError):
+            MCMCData.load_from_disk(json_path, lazy=True).missing  # noqa: B018
+
+        # A missing samples file is reported when loading the manifest
+        (tmp_path / "polychron_mcmc_data.npz").unlink()
+        with pytest.raises(RuntimeError, match="is not a file"):
+            MCMCData.load_from_disk(json_path, lazy=True)
+
+    def test_migrate(self, tmp_path: pathlib.Path):
+        """Test migrating json saved by previous versions to the binary storage format"""
+        obj = MCMCData(contexts=["a"], accept_samples_context=[[1.0, 2.0]], accept_group_limits={"a": [1.0, 2.0]})
+        with open(tmp_path / "polychron_mcmc_data.json", "w") as f:
+            f.write(obj.to_json())
+
+        assert MCMCData.migrate(tmp_path)
+        assert (tmp_path / "polychron_mcmc_data.npz").is_file()
+        loaded = MCMCData.load_from_disk(tmp_path / "polychron_mcmc_data.json")
+        assert loaded.contexts == ["a"]
+        np.testing.assert_array_equal(loaded.accept_samples_context[0], [1.0, 2.0])
+        np.testing.assert_array_equal(loaded.accept_group_limits["a"], [1.0, 2.0])
+
+        # Migrating again has no effect
+        assert not MCMCData.migrate(tmp_path)
+
+        with pytest.raises(RuntimeError, match="is not a file"):
+            MCMCData.migrate(tmp_path / "missing")
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import pathlib
+import threading
 from typing import Type
 from unittest.mock import patch
 
@@ -11,8 +13,10 @@ import pandas as pd
 import pytest
 from PIL import Image
 
+from polychron import mcmc
 from polychron.models.MCMCData import MCMCData
 from polychron.models.Model import Model
+from polychron.models.ModelMetadata import ModelMetadata
 
 
 class TestModel:
@@ -72,6 +76,16 @@ class TestModel:
         m = Model("foo", tmp_path / "foo")
         assert m.get_working_directory() == tmp_path / "foo" / "workdir"
 
+    def test_get_likelihood_cache_directory(self, tmp_path: pathlib.Path):
+        """Test the get_likelihood_cache_directory method returns the expected path"""
+        m = Model("foo", tmp_path / "foo")
+        assert m.get_likelihood_cache_directory() == tmp_path / "foo" / "workdir" / "likelihood_cache"
+
+    def test_get_mcmc_samples_directory(self, tmp_path: pathlib.Path):
+        """Test the get_mcmc_samples_directory method returns the expected path"""
+        m = Model("foo", tmp_path / "foo")
+        assert m.get_mcmc_samples_directory() == tmp_path / "foo" / "workdir" / "mcmc_samples"
+
     def test_get_chronological_graph_directory(self, tmp_path: pathlib.Path):
         """Test the get_chronological_graph_directory method returns the expected path"""
         m = Model("foo", tmp_path / "foo")
@@ -82,6 +96,35 @@ class TestModel:
         m = Model("foo", tmp_path / "foo")
         assert m.get_stratigraphic_graph_directory() == tmp_path / "foo" / "stratigraphic_graph"
 
+    def test_get_resumable_mcmc_run(self, tmp_path: pathlib.Path):
+        """Test the most recent calibration with streamed samples is found, if there is one"""
+        m = Model("foo", tmp_path / "foo")
+        assert m.get_resumable_mcmc_run() is None
+        for i, seed in enumerate([1, 2]):
+            (m.get_mcmc_samples_directory() / f"run-{seed}").mkdir(parents=True)
+            (m.get_mcmc_samples_directory() / f"run-{seed}" / "run.json").write_text(json.dumps({"seed": seed}))
+            os.utime(m.get_mcmc_samples_directory() / f"run-{seed}" / "run.json", (i, i))
+        (m.get_mcmc_samples_directory() / "run-3").mkdir()
+        assert m.get_resumable_mcmc_run() == (m.get_mcmc_samples_directory() / "run-2", {"seed": 2})
+
+    def test_remove_previous_mcmc_runs(self, tmp_path: pathlib.Path):
+        """Test that directories of previous calibrations are removed, unless they are owned by a session which may still be running"""
+        m = Model("foo", tmp_path / "foo")
+        for name in ["run-1", "run-2", "run-3"]:
+            (m.get_mcmc_samples_directory() / name).mkdir(parents=True)
+        # Any object which can be weakly referenced can stand in for a session
+        session = type("Session", (), {})()
+        with patch.dict(
+            "polychron.models.Model._active_sample_directories",
+            {(m.get_mcmc_samples_directory() / "run-2").resolve(): session},
+        ):
+            m.remove_previous_mcmc_runs(m.get_mcmc_samples_directory() / "run-3")
+            assert sorted(p.name for p in m.get_mcmc_samples_directory().iterdir()) == ["run-2", "run-3"]
+        # Once the session no longer exists its directory is removed
+        del session
+        m.remove_previous_mcmc_runs(m.get_mcmc_samples_directory() / "run-3")
+        assert sorted(p.name for p in m.get_mcmc_samples_directory().iterdir()) == ["run-3"]
+
     def test_get_mcmc_results_directory(self, tmp_path: pathlib.Path):
         """Test the get_mcmc_results_directory method returns the expected path"""
         m = Model("foo", tmp_path / "foo")
@@ -92,6 +135,11 @@ class TestModel:
         m = Model("foo", tmp_path / "foo")
         assert m.get_python_only_directory() == tmp_path / "foo" / "python_only"
 
+    def test_get_metadata_path(self, tmp_path: pathlib.Path):
+        """Test the get_metadata_path method returns the expected path"""
+        m = Model("foo", tmp_path / "foo")
+        assert m.get_metadata_path() == tmp_path / "foo" / "python_only" / "polychron_model_metadata.json"
+
     def test_to_json(self, tmp_path: pathlib.Path):
         """Test the to_json method behaves as expected for a range of Models
 
@@ -132,12 +180,64 @@ class TestModel:
         assert len(json_str) > 0
         assert len(json_str.splitlines()) >= 4
 
+    def test_has_unsaved_changes(self, tmp_path: pathlib.Path):
+        """Test models are dirty until saved, and after being changed"""
+        m = Model("foo", tmp_path / "foo")
+        assert m.has_unsaved_changes()
+        m.save()
+        assert not m.has_unsaved_changes()
+        # A model loaded from disk matches the saved version
+        loaded = Model.load_from_disk(tmp_path / "foo")
+        assert not loaded.has_unsaved_changes()
+        loaded.load_check = True
+        assert loaded.has_unsaved_changes()
+        # The check does not re-read the saved json
+        loaded.save()
+        (loaded.get_python_only_directory() / "polychron_model.json").unlink()
+        assert not loaded.has_unsaved_changes()
+        # Ephemeral members are not saved, so do not count as changes
+        loaded.residual_contexts = ["a"]
+        assert not loaded.has_unsaved_changes()
+        # In-place changes must be marked explicitly
+        loaded.save()
+        loaded.stratigraphic_dag = nx.DiGraph()
+        loaded.save()
+        loaded.stratigraphic_dag.add_node("a")
+        assert not loaded.has_unsaved_changes()
+        loaded.mark_unsaved()
+        assert loaded.has_unsaved_changes()
+        loaded.save()
+        loaded.record_deleted_node("a", "reason")
+        assert loaded.has_unsaved_changes()
+
     @pytest.mark.skip(reason="test_save not implemented")
     def test_save(self, tmp_path: pathlib.Path):
         """Test the save method behaves as expected for a range of Models"""
         m = Model("foo", tmp_path / "foo")
         m.save()
 
+    def test_save_metadata(self, tmp_path: pathlib.Path):
+        """Test the metadata sidecar is saved with the model, reflects the current state of the model, and requires the model to have been saved"""
+        m = Model("foo", tmp_path / "foo")
+        with pytest.raises(FileNotFoundError):
+            m.save_metadata()
+        m.save()
+
+        # The metadata sidecar should have been saved by save, describing the saved json
+        metadata = ModelMetadata.load_from_disk(m.get_metadata_path())
+        json_path = m.get_python_only_directory() / "polychron_model.json"
+        assert metadata.name == "foo"
+        assert not metadata.load_check
+        assert metadata.sha256 == hashlib.sha256(json_path.read_bytes()).hexdigest()
+        assert metadata.modified == json_path.stat().st_mtime
+
+        m.load_check = True
+        m.set_stratigraphic_df(pd.DataFrame({"above": ["a", "b"], "below": ["b", "c"]}))
+        metadata = m.save_metadata()
+        assert metadata.load_check
+        assert metadata.context_count == 3
+        assert ModelMetadata.load_from_disk(m.get_metadata_path()) == metadata
+
     def test_load_from_disk(self, test_data_path: pathlib.Path, capsys: pytest.CaptureFixture):
         """Test the load_from_disk method behaves as expected for a range of json files
 
@@ -205,6 +305,30 @@ class TestModel:
         with pytest.raises(RuntimeError, match="is not a valid version number"):
             m = Model.load_from_disk(test_json_dir / "invalid-version-string")
 
+    def test_migrate_mcmc_data(self, tmp_path: pathlib.Path, capsys: pytest.CaptureFixture):
+        """Test that MCMCData saved as json by previous versions is migrated to the binary storage format"""
+        m = Model("foo", tmp_path / "foo")
+        # A model without MCMC data is unaffected
+        m.migrate_mcmc_data()
+
+        legacy = MCMCData(contexts=["a"], accept_samples_context=[[1.0, 2.0]])
+        for directory in [m.get_python_only_directory(), m.get_working_directory()]:
+            directory.mkdir(parents=True)
+            with open(directory / "polychron_mcmc_data.json", "w") as f:
+                f.write(legacy.to_json())
+        m.migrate_mcmc_data()
+        for directory in [m.get_python_only_directory(), m.get_working_directory()]:
+            assert (directory / "polychron_mcmc_data.npz").is_file()
+            loaded = MCMCData.load_from_disk(directory / "polychron_mcmc_data.json")
+            assert list(loaded.accept_samples_context[0]) == [1.0, 2.0]
+
+        # Invalid files are reported, but do not raise
+        with open(m.get_working_directory() / "polychron_mcmc_data.json", "w") as f:
+            f.write("{")
+        capsys.readouterr()
+        m.migrate_mcmc_data()
+        assert "unable to migrate" in capsys.readouterr().err
+
     def test_create_dirs(self, tmp_path: pathlib.Path):
         """Test the create_dirs method behaves as expected for a range of Models"""
         model_path = tmp_path / "foo"
@@ -1020,3 +1144,72 @@ class TestModel:
         """Test MCMC_func behaves as expected for a range of inputs / Models"""
         # m = Model("foo", tmp_path / "foo")
         pass
+
+    def test_calibrate(self, tmp_path: pathlib.Path):
+        """Test calibrate tops up a single session until enough samples were accepted, and stores the results without saving the model
+
+        MCMC_func is mocked to avoid requiring a fully populated Model instance"""
+        m = Model("foo", tmp_path / "foo")
+        samples = iter([30000, 50000])
+
+        def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
+            return tuple([["a"], [[0.0] * next(samples)], [], [], 12, 12, [], [], {}, {}, {"a": 1.0}, 7, {}])
+
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session") as mock_create_mcmc_session,
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_mcmc_func,
+            patch("polychron.models.Model.Model.save") as mock_save,
+        ):
+            m.calibrate(2, 3, seed=7, progress_callback=print)
+            mock_create_mcmc_session.assert_called_once_with(2, 3, seed=7, resume=False)
+            assert mock_mcmc_func.call_count == 2
+            session = mock_create_mcmc_session.return_value
+            assert mock_mcmc_func.call_args_list[0].kwargs == {
+                "session": session,
+                "more_samples": None,
+                "progress_callback": print,
+                "stop": None,
+            }
+            assert mock_mcmc_func.call_args_list[1].kwargs["more_samples"] == 20000
+            mock_save.assert_not_called()
+        assert m.mcmc_check
+        assert m.mcmc_data.contexts == ["a"]
+        assert m.mcmc_data.rhat == {"a": 1.0}
+        assert m.mcmc_data.seed == 7
+        assert m.mcmc_data.calibration_curve_name == m.calibration_curve_name
+
+        # Resuming a calibration is passed on to the session, and the result reports that results were stored
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session") as mock_create_mcmc_session,
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func),
+        ):
+            samples = iter([50000])
+            assert m.calibrate(resume=True)
+            mock_create_mcmc_session.assert_called_once_with(None, None, seed=None, resume=True)
+
+    def test_calibrate_stop(self, tmp_path: pathlib.Path):
+        """Test calibration is not topped up once stopped, and too few samples are not stored as results"""
+        m = Model("foo", tmp_path / "foo")
+        stop = threading.Event()
+        n_samples = 500
+
+        def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
+            stop.set()
+            return tuple([["a"], [[0.0] * n_samples], [], [], 12, 12, [], [], {}, {}, {"a": 1.0}, 7, {}])
+
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session"),
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_mcmc_func,
+        ):
+            assert not m.calibrate(stop=stop)
+            mock_mcmc_func.assert_called_once()
+            assert not m.mcmc_check
+            assert m.mcmc_data.contexts == []
+
+            # Once every context has samples beyond the burn-in, the samples so far are kept
+            stop.clear()
+            n_samples = mcmc.ACCEPT_BURN_IN + 1
+            assert m.calibrate(stop=stop)
+            assert mock_mcmc_func.call_count == 2
+        assert m.mcmc_check
+        assert len(m.mcmc_data.accept_samples_context[0]) == mcmc.ACCEPT_BURN_IN + 1
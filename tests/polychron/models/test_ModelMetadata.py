@@ -0,0 +1,64 @@
+import json
+import pathlib
+
+import networkx as nx
+import pytest
+
+from polychron.models.Model import Model
+from polychron.models.ModelMetadata import ModelMetadata
+
+
+class TestModelMetadata:
+    """Unit Tests for the `models.ModelMetadata` class which summarises a saved Model"""
+
+    def test_init(self):
+        """Test `__init__` behaviour for the dataclass including default values"""
+        metadata = ModelMetadata("foo")
+        assert metadata.name == "foo"
+        assert not metadata.load_check
+        assert not metadata.mcmc_check
+        assert metadata.calibration_curve_name == "intcal20_interpolated"
+        assert metadata.context_count == 0
+        assert metadata.modified == 0.0
+        assert metadata.sha256 == ""
+
+    def test_from_model(self, tmp_path: pathlib.Path):
+        """Test metadata is built from the state of a Model"""
+        model = Model("foo", tmp_path / "foo", calibration_curve_name="shcal20_interpolated")
+        assert ModelMetadata.from_model(model) == ModelMetadata("foo", calibration_curve_name="shcal20_interpolated")
+        model.stratigraphic_dag = nx.DiGraph([("a", "b"), ("b", "c")])
+        model.load_check = True
+        model.mcmc_check = True
+        metadata = ModelMetadata.from_model(model, 12.5, "abc")
+        assert metadata == ModelMetadata("foo", True, True, "shcal20_interpolated", 3, 12.5, "abc")
+
+    def test_dict(self):
+        """Test conversion to and from dictionaries, ignoring unexpected keys"""
+        metadata = ModelMetadata("foo", True, False, "intcal20_interpolated", 4, 1.0, "abc")
+        assert ModelMetadata.from_dict(metadata.to_dict()) == metadata
+        assert ModelMetadata.from_dict({"name": "bar", "unexpected": 1}) == ModelMetadata("bar")
+        with pytest.raises(RuntimeError, match="including 'name'"):
+            ModelMetadata.from_dict({"load_check": True})
+        with pytest.raises(RuntimeError, match="including 'name'"):
+            ModelMetadata.from_dict(None)
+
+    def test_save_load(self, tmp_path: pathlib.Path):
+        """Test saving and loading the sidecar file, including invalid files"""
+        path = tmp_path / ModelMetadata.FILENAME
+        with pytest.raises(RuntimeError, match="is not a file"):
+            ModelMetadata.load_from_disk(path)
+        metadata = ModelMetadata("foo", True, True, "marine20_interpolated", 7, 2.0, "abc")
+        metadata.save(path)
+        assert ModelMetadata.load_from_disk(path) == metadata
+        # Saving replaces the file, without leaving temporary files
+        metadata.load_check = False
+        metadata.save(path)
+        assert not ModelMetadata.load_from_disk(path).load_check
+        assert list(tmp_path.iterdir()) == [path]
+
+        path.write_text("{")
+        with pytest.raises(RuntimeError, match="Invalid JSON"):
+            ModelMetadata.load_from_disk(path)
+        path.write_text(json.dumps({"polychron_version": "0.2.0"}))
+        with pytest.raises(RuntimeError, match="'model_metadata' missing"):
+            ModelMetadata.load_from_disk(path)
@@ -0,0 +1,101 @@
+import pathlib
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from polychron import mcmc
+from polychron.models.MCMCData import MCMCData
+from polychron.models.PosteriorSummary import PosteriorSummary
+
+
+@pytest.fixture
+def samples() -> dict[str, np.ndarray]:
+    """Samples for a unimodal, a bimodal and a constant parameter, and a parameter with fewer samples"""
+    rng = np.random.default_rng(12345)
+    return {
+        "a": rng.normal(3000, 40, 4000),
+        "b": np.concatenate([rng.normal(3000, 20, 2000), rng.normal(2700, 20, 2000)]),
+        "c": np.full(4000, 2500.0),
+        "d": rng.normal(-2000, 10, 1500),
+    }
+
+
+class TestPosteriorSummary:
+    """Unit tests for the vectorised summary of posterior samples"""
+
+    def test_init(self, samples: dict[str, np.ndarray]):
+        """Test parameters are summarised in the order provided, and each parameter requires samples"""
+        assert PosteriorSummary(samples).nodes == ["a", "b", "c", "d"]
+        with pytest.raises(ValueError, match="No samples to summarise for 'e'"):
+            PosteriorSummary({"a": [1.0], "e": []})
+
+    def test_from_mcmc_data(self):
+        """Test summaries are of the samples after burn-in, for all samples or accepted samples"""
+        mcmc_data = MCMCData(
+            accept_group_limits={"a": [0.0] * mcmc.ACCEPT_BURN_IN + [1.0, 2.0]},
+            all_group_limits={"a": [0.0] * mcmc.ALL_SAMPLES_BURN_IN + [4.0, 5.0, 6.0]},
+        )
+        assert PosteriorSummary.from_mcmc_data(mcmc_data).statistics([])["mean"]["a"] == 5.0
+        assert PosteriorSummary.from_mcmc_data(mcmc_data, accepted=True).statistics([])["mean"]["a"] == 1.5
+
+    def test_statistics(self, samples: dict[str, np.ndarray]):
+        """Test the statistics for each parameter match those computed one parameter at a time"""
+        df = PosteriorSummary(samples).statistics([0.025, 0.5, 0.975])
+        assert list(df.index) == ["a", "b", "c", "d"]
+        assert list(df.columns) == ["mean", "median", "sd", "q2.5", "q50", "q97.5"]
+        for node, values in samples.items():
+            assert df["mean"][node] == pytest.approx(np.mean(values))
+            assert df["median"][node] == pytest.approx(np.median(values))
+            assert df["sd"][node] == pytest.approx(np.std(values, ddof=1))
+            assert df["q2.5"][node] == pytest.approx(np.quantile(values, 0.025))
+            assert df["q97.5"][node] == pytest.approx(np.quantile(values, 0.975))
+        # A single sample has no spread
+        assert PosteriorSummary({"x": [1.0]}).statistics()["sd"]["x"] == 0.0
+        # Without any parameters, the table is empty
+        assert PosteriorSummary({}).statistics().empty
+
+    @pytest.mark.parametrize("level", [0.5, 0.68, 0.95])
+    def test_hpd(self, samples: dict[str, np.ndarray], level: float):
+        """Test HPD regions match `mcmc.HPD_interval` for each parameter, including multiple intervals"""
+        regions = PosteriorSummary(samples).hpd(level)
+        for node in ["a", "b", "d"]:
+            assert [x for interval in regions[node] for x in interval] == mcmc.HPD_interval(samples[node], lim=level)
+        # The bimodal parameter has separate intervals around each mode
+        assert len(regions["b"]) >= 2
+        assert regions["b"][0][1] < 2800 < regions["b"][-1][0]
+        # A constant parameter has a single bin around its value
+        assert regions["c"] == [(2500, 2500)]
+
+    def test_hpd_cache(self, samples: dict[str, np.ndarray]):
+        """Test HPD regions are cached per parameter and level, and only requested parameters are computed"""
+        summary = PosteriorSummary(samples)
+        with patch.object(
+            PosteriorSummary, "_PosteriorSummary__hpd_block", wraps=summary._PosteriorSummary__hpd_block
+        ) as mock_hpd_block:
+            assert list(summary.hpd(0.95, ["b"])) == ["b"]
+            assert mock_hpd_block.call_count == 1
+            assert mock_hpd_block.call_args.args[0].shape == (1, 4000)
+            # Parameters with different numbers of samples are computed separately
+            summary.hpd(0.95)
+            assert mock_hpd_block.call_count == 3
+            summary.hpd(0.95)
+            summary.hpd(0.95, ["a"])
+            assert mock_hpd_block.call_count == 3
+            summary.hpd(0.68, ["a"])
+            assert mock_hpd_block.call_count == 4
+
+        with pytest.raises(KeyError, match="No samples for 'e'"):
+            summary.hpd(0.95, ["e"])
+
+    def test_save(self, samples: dict[str, np.ndarray], tmp_path: pathlib.Path):
+        """Test the summary table is saved as csv, with a column per quantile and HPD level"""
+        summary = PosteriorSummary(samples)
+        summary.save(tmp_path, quantiles=[0.5], levels=[0.68, 0.95])
+        df = pd.read_csv(tmp_path / PosteriorSummary.FILENAME, index_col="node")
+        assert list(df.index) == ["a", "b", "c", "d"]
+        assert list(df.columns) == ["mean", "median", "sd", "q50", "hpd68", "hpd95"]
+        b_start, b_end = summary.hpd(0.95)["b"][-1]
+        assert df["hpd95"]["b"].endswith(f"; {b_start} - {b_end}")
+        assert df["hpd95"]["c"] == "2500 - 2500"
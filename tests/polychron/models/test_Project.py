@@ -3,7 +3,9 @@ from unittest.mock import patch
 
 import pytest
 
+from polychron.Config import get_config
 from polychron.models.Model import Model
+from polychron.models.ModelMetadata import ModelMetadata
 from polychron.models.Project import Project
 
 
@@ -225,6 +227,132 @@ class TestProject:
         captured = capsys.readouterr()
         assert len(captured.err) > 0
 
+        # A model saved without a metadata sidecar, by a previous version of polychron, has one written when loaded
+        p = Project("foo", self.tmp_projects_dir / "foo", models={"baz": None})
+        model = Model("baz", self.tmp_projects_dir / "foo" / "baz", load_check=True)
+        model.save()
+        model.get_metadata_path().unlink()
+        p.load_model_from_disk("baz")
+        assert ModelMetadata.load_from_disk(model.get_metadata_path()).load_check
+
+    def test_load_metadata(self):
+        """Test `load_metadata` reads model metadata from the project index and sidecars without loading models, updating the index when sidecars change"""
+        p = Project("foo", self.tmp_projects_dir / "foo")
+        p.lazy_load()
+        # Neither model has been saved, so there is no metadata unless the models are loaded
+        assert p.load_metadata() == {}
+        assert not p.get_index_path().exists()
+        assert set(p.load_metadata(load_missing=True)) == {"bar", "baz"}
+        assert isinstance(p.models["bar"], Model)
+
+        # Save a model which is ready for calibration, and list the models with a new Project without loading them
+        Model("bar", self.tmp_projects_dir / "foo" / "bar", load_check=True).save()
+        p = Project("foo", self.tmp_projects_dir / "foo")
+        p.lazy_load()
+        with patch("polychron.models.Model.Model.load_from_disk") as mock_load_from_disk:
+            metadata = p.load_metadata()
+            mock_load_from_disk.assert_not_called()
+        assert list(metadata) == ["bar"]
+        assert metadata["bar"].load_check
+        assert p.models["bar"] is None
+        # The index records the sidecar of each model
+        assert set(p.read_index()) == {"bar"}
+
+        # The index is used rather than the sidecar while the sidecar is unchanged
+        with patch("polychron.models.ModelMetadata.ModelMetadata.load_from_disk") as mock_load_from_disk:
+            assert p.load_metadata() == metadata
+            mock_load_from_disk.assert_not_called()
+
+        # Saving a model updates its sidecar, which is read again
+        Model("bar", self.tmp_projects_dir / "foo" / "bar", load_check=False).save()
+        assert not p.load_metadata()["bar"].load_check
+        assert not p.read_index()["bar"]["metadata"]["load_check"]
+
+        # Loaded models are described by their in-memory state, with the hash of the saved model
+        model = p.get_model("bar")
+        model.load_check = True
+        metadata = p.load_metadata()
+        assert metadata["bar"].load_check
+        assert metadata["bar"].sha256 != ""
+
+        # An invalid index is ignored, and replaced
+        p.get_index_path().write_text("{")
+        assert p.read_index() == {}
+        assert set(p.load_metadata()) == {"bar"}
+        assert set(p.read_index()) == {"bar"}
+
+    def test_write_missing_metadata(self):
+        """Test models saved without a metadata sidecar are listed, and their sidecars written, without loading them into the project"""
+        Model("bar", self.tmp_projects_dir / "foo" / "bar", load_check=True).save()
+        Model("baz", self.tmp_projects_dir / "foo" / "baz").save()
+        (self.tmp_projects_dir / "foo" / "bar" / "python_only" / ModelMetadata.FILENAME).unlink()
+        p = Project("foo", self.tmp_projects_dir / "foo")
+        p.lazy_load()
+        assert p.models_without_metadata() == ["bar"]
+        assert list(p.load_metadata()) == ["baz"]
+        assert p.write_missing_metadata(["bar", "baz", "missing"]) == ["bar"]
+        assert p.models == {"bar": None, "baz": None}
+        assert p.models_without_metadata() == []
+        assert p.load_metadata()["bar"].load_check
+        # Loaded models are described by their in-memory state, so are not listed
+        (self.tmp_projects_dir / "foo" / "bar" / "python_only" / ModelMetadata.FILENAME).unlink()
+        p.get_model("bar")
+        assert p.models_without_metadata() == []
+
+    def test_evict_models(self, capsys: pytest.CaptureFixture):
+        """Test the least recently used models are saved and unloaded once more than `model_cache_size` are loaded, and are reloaded when next used"""
+        for name in ["bar", "baz", "qux"]:
+            Model(name, self.tmp_projects_dir / "foo" / name).save()
+        p = Project("foo", self.tmp_projects_dir / "foo")
+        p.lazy_load()
+
+        # By default every model remains loaded
+        for name in ["bar", "baz", "qux"]:
+            p.get_model(name)
+        assert all(model is not None for model in p.models.values())
+        assert p.evict_models() == []
+
+        # With a cache size of 2, the least recently used model is unloaded
+        get_config().model_cache_size = 2
+        assert p.evict_models() == ["bar"]
+        assert p.models["bar"] is None
+
+        # Changes to a model are saved before it is unloaded, and reloaded from disk when next used
+        p.get_model("baz").load_check = True
+        p.get_model("qux")
+        p.get_model("bar")
+        assert p.models["baz"] is None
+        assert p.get_model("baz").load_check
+        assert p.models["qux"] is None
+        assert p.models["bar"] is not None
+
+        # The model being used is never unloaded, even if it is over the limit
+        get_config().model_cache_size = 1
+        assert p.get_model("bar") is not None
+        assert [name for name, model in p.models.items() if model is not None] == ["bar"]
+
+        # Models which cannot be saved remain loaded
+        p.get_model("baz").load_check = False
+        with patch("polychron.models.Model.Model.save", side_effect=RuntimeError("full")):
+            p.get_model("qux")
+        assert p.models["baz"] is not None
+        assert "Unable to unload baz: full" in capsys.readouterr().err
+        assert not p.unload_model("not_loaded")
+
+    def test_set_model(self):
+        """Test replacing a model with another instance marks it as the most recently used, unloading others if too many are loaded"""
+        for name in ["bar", "baz"]:
+            Model(name, self.tmp_projects_dir / "foo" / name).save()
+        p = Project("foo", self.tmp_projects_dir / "foo")
+        p.lazy_load()
+        p.get_model("bar")
+        get_config().model_cache_size = 1
+        replacement = Model("baz", self.tmp_projects_dir / "foo" / "baz")
+        p.set_model("baz", replacement)
+        assert p.models["baz"] is replacement
+        assert p.models["bar"] is None
+        assert p.get_model("baz") is replacement
+
     def test_lazy_load(self):
         """Test `lazy_load` behaves as intended, populating the models data structure if a model directory exists, but does not check that a saved model is present"""
         # With an empty Projects object pointed at the temporary projects directory, but no Models specified
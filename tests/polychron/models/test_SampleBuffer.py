@@ -0,0 +1,111 @@
+import pathlib
+import pickle
+
+import numpy as np
+import pytest
+
+from polychron.models.SampleBuffer import SampleBuffer
+
+
+class TestSampleBuffer:
+    """Unit tests for the preallocated MCMC sample storage"""
+
+    def test_init(self):
+        """Test a new buffer has no samples for each parameter"""
+        samples = SampleBuffer(3)
+        assert len(samples) == 3
+        np.testing.assert_array_equal(samples.lengths, [0, 0, 0])
+        assert [len(row) for row in samples] == [0, 0, 0]
+        assert samples[0].dtype == np.float64
+        assert SampleBuffer(2, np.float32)[1].dtype == np.float32
+
+    def test_append(self):
+        """Test appending samples to individual parameters, and to every parameter at once"""
+        samples = SampleBuffer(3)
+        samples.append(1, 2.5)
+        samples.append_all([1.0, 2.0, 3.0])
+        samples.extend(2, [4.0, 5.0])
+        np.testing.assert_array_equal(samples.lengths, [1, 2, 3])
+        np.testing.assert_array_equal(samples[0], [1.0])
+        np.testing.assert_array_equal(samples[1], [2.5, 2.0])
+        np.testing.assert_array_equal(samples[2], [3.0, 4.0, 5.0])
+
+    def test_growth(self):
+        """Test that capacity grows geometrically, keeping existing samples"""
+        samples = SampleBuffer(2, capacity=4)
+        for i in range(5):
+            samples.append_all([i, -i])
+        assert samples._data.shape == (2, 8)
+        samples.extend(0, np.arange(5, 20))
+        assert samples._data.shape == (2, 20)
+        np.testing.assert_array_equal(samples[0], np.arange(20))
+        np.testing.assert_array_equal(samples[1], -np.arange(5))
+
+    def test_views(self):
+        """Test that samples are returned as views of the buffer, rather than copies"""
+        samples = SampleBuffer(2)
+        samples.extend(0, [1.0, 2.0])
+        views = samples.views()
+        assert len(views) == 2
+        assert np.shares_memory(views[0], samples._data)
+        np.testing.assert_array_equal(views[0], [1.0, 2.0])
+        assert len(views[1]) == 0
+
+    def test_memory_mapped(self, tmp_path: pathlib.Path):
+        """Test that a buffer with a path streams samples to a memory-mapped file, which can be opened after a flush"""
+        path = tmp_path / "samples" / "accept.json"
+        samples = SampleBuffer(2, capacity=2, path=path)
+        assert isinstance(samples._data, np.memmap)
+        samples.append_all([1.0, 2.0])
+        samples.flush()
+        opened = SampleBuffer.open(path)
+        np.testing.assert_array_equal(opened.lengths, [1, 1])
+        np.testing.assert_array_equal(opened[1], [2.0])
+
+        # Growing replaces the data file, updating the manifest
+        samples.extend(0, [3.0, 4.0, 5.0])
+        assert sorted(p.name for p in path.parent.glob("*.npy")) == ["accept.4.npy"]
+        samples.flush()
+        opened = SampleBuffer.open(path)
+        assert isinstance(opened[0], np.memmap)
+        np.testing.assert_array_equal(opened[0], [1.0, 3.0, 4.0, 5.0])
+        np.testing.assert_array_equal(opened[1], [2.0])
+
+        # A buffer opened for writing continues from the flushed samples, and can discard samples after a checkpoint
+        resumed = SampleBuffer.open(path, mode="r+")
+        resumed.truncate([3, 1])
+        with pytest.raises(ValueError, match="Cannot truncate"):
+            resumed.truncate([4, 1])
+        resumed.append_all([6.0, 7.0])
+        resumed.extend(1, [8.0, 9.0, 10.0])
+        resumed.flush()
+        opened = SampleBuffer.open(path)
+        np.testing.assert_array_equal(opened[0], [1.0, 3.0, 4.0, 6.0])
+        np.testing.assert_array_equal(opened[1], [2.0, 7.0, 8.0, 9.0, 10.0])
+        assert sorted(p.name for p in path.parent.glob("*.npy")) == ["accept.8.npy"]
+
+        # Invalid or missing manifests raise
+        with pytest.raises(FileNotFoundError):
+            SampleBuffer.open(tmp_path / "missing.json")
+        path.write_text('{"file": "accept.8.npy", "dtype": "float64", "lengths": [1, 2, 3]}')
+        with pytest.raises(ValueError, match="does not match"):
+            SampleBuffer.open(path)
+
+    def test_pickle(self, tmp_path: pathlib.Path):
+        """Test that a memory-mapped buffer is pickled by reference to its files, and an in-memory buffer by value"""
+        samples = SampleBuffer(2, capacity=2, path=tmp_path / "accept.json")
+        samples.extend(0, [1.0, 2.0, 3.0])
+        assert "_data" not in samples.__getstate__()
+        unpickled = pickle.loads(pickle.dumps(samples))
+        assert isinstance(unpickled._data, np.memmap)
+        unpickled.append_all([4.0, 5.0])
+        unpickled.flush()
+        opened = SampleBuffer.open(tmp_path / "accept.json")
+        np.testing.assert_array_equal(opened[0], [1.0, 2.0, 3.0, 4.0])
+        np.testing.assert_array_equal(opened[1], [5.0])
+
+        in_memory = SampleBuffer(1)
+        in_memory.append(0, 6.0)
+        unpickled = pickle.loads(pickle.dumps(in_memory))
+        assert not isinstance(unpickled._data, np.memmap)
+        np.testing.assert_array_equal(unpickled[0], [6.0])
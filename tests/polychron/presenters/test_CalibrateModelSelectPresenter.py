@@ -1,10 +1,13 @@
 import pathlib
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 
-from polychron.Config import Config
 from polychron.interfaces import Mediator
+from polychron.mcmc import ChainProgress
+from polychron.models.BatchCalibration import BatchCalibration
+from polychron.models.Model import Model
+from polychron.models.ModelMetadata import ModelMetadata
 from polychron.models.ProjectSelection import ProjectSelection
 from polychron.presenters.CalibrateModelSelectPresenter import CalibrateModelSelectPresenter
 from polychron.views.CalibrateModelSelectView import CalibrateModelSelectView
@@ -99,11 +102,31 @@ class TestCalibrateModelSelectPresenter:
         presenter.update_view()
         mock_view.update_model_list.assert_called_with(["bar", "baz"])
 
-    @patch("polychron.presenters.CalibrateModelSelectPresenter.get_config", return_value=Config())
-    def test_on_ok_button(self, mock_get_config):
-        """Test that the on_ok button callback would call Model.MCMC_func and call save methods, using mocking to avoid requiring a fully populated Model instance, if atleast one model was selected from the dropdown
+        # Models which have been saved but not loaded are listed from their metadata, without loading them
+        model.current_project.get_model("bar").save()
+        model.current_project.get_model("baz").load_check = False
+        model.current_project.get_model("baz").save()
+        selection = ProjectSelection(self.tmp_projects_dir)
+        selection.projects_directory.lazy_load()
+        selection.current_project_name = "foo"
+        presenter = CalibrateModelSelectPresenter(mock_mediator, mock_view, selection)
+        mock_view.update_model_list.assert_called_with(["bar"])
+        assert selection.current_project.models == {"bar": None, "baz": None}
+        assert presenter.metadata_thread is None
+
+        # Models saved by previous versions of polychron are listed by name, with their metadata written in the background without loading them into the project
+        for name in ["bar", "baz"]:
+            (self.tmp_projects_dir / "foo" / name / "python_only" / ModelMetadata.FILENAME).unlink()
+        presenter = CalibrateModelSelectPresenter(mock_mediator, mock_view, selection)
+        mock_view.update_model_list.assert_called_with(["bar", "baz"])
+        presenter.metadata_thread.join()
+        assert selection.current_project.models == {"bar": None, "baz": None}
+        presenter = CalibrateModelSelectPresenter(mock_mediator, mock_view, selection)
+        mock_view.update_model_list.assert_called_with(["bar"])
+        assert presenter.metadata_thread is None
 
-        Patches out get_config to not mutate global state"""
+    def test_on_ok_button(self):
+        """Test that the on_ok button callback starts a BatchCalibration of the selected models, or closes the view if there is nothing to calibrate"""
 
         # Create mocked objects with autospec=True
         mock_mediator = MagicMock(spec=Mediator)
@@ -122,49 +145,96 @@ class TestCalibrateModelSelectPresenter:
             presenter.on_ok_button()
             mock_close_view.assert_called_once()
 
-        # Call on_ok_button with a current project specified. This should just calls close_view
+        # Call on_ok_button with a current project specified, but no models selected. This should just calls close_view
         model.current_project_name = "foo"
+        mock_view.get_selected_models.return_value = []
         with patch(
             "polychron.presenters.CalibrateModelSelectPresenter.CalibrateModelSelectPresenter.close_view"
         ) as mock_close_view:
             presenter.on_ok_button()
             mock_close_view.assert_called_once()
 
-        # Call on_ok_button with a current project and models marked as ready for mcmc (via load_check)
-        # Mocks out model.MCMC_func, which should have been called once per load_check model which was mocked as returned by the method
-        # mcmc_check should now be True
-        # Mocks out MCMCData.save, which should have been called
-        # Mocks out Model.save which should have been called
-        # Mocks out close_view, which should have been called once
-        model.current_project.get_model("bar").load_check = True
-        model.current_project.get_model("baz").load_check = True
-
-        # Ensure that the mocked view returns the loaded models for get_selected_models
-        mock_view.get_selected_models.return_value = ["bar", "baz"]
+        # Call on_ok_button with selected models, which should start a batch calibration of the models which exist, without closing the view
+        mock_view.get_selected_models.return_value = ["bar", "baz", "qux"]
         with (
             patch(
                 "polychron.presenters.CalibrateModelSelectPresenter.CalibrateModelSelectPresenter.close_view"
             ) as mock_close_view,
-            patch("polychron.models.Model.Model.MCMC_func") as mock_model_mcmc_func,
-            patch("polychron.models.Model.Model.save") as mock_model_save,
-            patch("polychron.models.MCMCData.MCMCData.save") as mock_mcmcdata_save,
+            patch(
+                "polychron.presenters.CalibrateModelSelectPresenter.CalibrateModelSelectPresenter.start"
+            ) as mock_start,
+            patch("polychron.presenters.CalibrateModelSelectPresenter.BatchCalibration") as mock_batch_calibration,
         ):
-            # Ensure that the mock Model.MCMC_func method returns a tuple of 10 elements of the correct types
-            mock_model_mcmc_func.return_value = tuple([[], [], [], [], 12, 12, [], [], {}, {}])
-
-            # Call the on_ok_button method
             presenter.on_ok_button()
+            mock_batch_calibration.assert_called_once_with(model.current_project, ["bar", "baz"])
+            mock_start.assert_called_once_with(mock_batch_calibration.return_value)
+            mock_close_view.assert_not_called()
 
-            # Assert that MCMC_func should have been called twice
-            assert mock_model_mcmc_func.call_count == 2
-            # Assert that the mcmc_check property of both models is now True
-            assert model.current_project.get_model("bar").mcmc_check
-            assert model.current_project.get_model("baz").mcmc_check
-            # Assert that the save methods were called
-            assert mock_model_save.call_count == 2
-            assert mock_mcmcdata_save.call_count == 2
-            # Assert that the view should have been closed
-            mock_close_view.assert_called_once()
+    @pytest.mark.parametrize("fail", [False, True])
+    def test_start(self, fail: bool):
+        """Test that start runs the batch in a background thread, updating the status of each model and the project from polled messages
+
+        The view is closed once the batch is complete, unless a model failed"""
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=CalibrateModelSelectView)
+        presenter = CalibrateModelSelectPresenter(mock_mediator, mock_view, self.project_selection)
+        mock_batch = MagicMock(spec=BatchCalibration)
+        mock_batch.model_names = ["bar", "baz"]
+        error = RuntimeError("failed")
+        self.project_selection.current_project_name = "foo"
+        project = self.project_selection.current_project
+        calibrated = {name: Model(name, project.path / name) for name in ["bar", "baz"]}
+
+        def fake_run(progress_callback, finished_callback):
+            # The view cannot be closed while the batch is running
+            presenter.close_view()
+            progress_callback("bar", ChainProgress(40, 2000, 30.0, 45.0, {"context": 0.5}, None))
+            finished_callback("bar", calibrated["bar"], None)
+            if fail:
+                finished_callback("baz", None, error)
+            else:
+                finished_callback("baz", calibrated["baz"], None)
+            return {"baz": error} if fail else {}
+
+        mock_batch.run.side_effect = fake_run
+        presenter.start(mock_batch)
+        presenter.thread.join()
+        mock_view.disable_ok_button.assert_called_once()
+        mock_view.make_modal.assert_called_once()
+        mock_view.after.assert_called_once_with(presenter.POLL_INTERVAL, presenter.poll)
+        # Calibrated models replace the models in the project once polled, from the Tk thread
+        assert project.models["bar"] is not calibrated["bar"]
+        presenter.poll()
+        assert project.models["bar"] is calibrated["bar"]
+        assert (project.models["baz"] is calibrated["baz"]) != fail
+        assert mock_view.update_model_status.call_args_list == [
+            call("bar", "Queued"),
+            call("baz", "Queued"),
+            call("bar", "40% About 0m 45s remaining | Acceptance: context 0.50"),
+            call("bar", "Calibrated"),
+            call("baz", "Failed: failed" if fail else "Calibrated"),
+        ]
+        assert mock_view.destroy.call_count == (0 if fail else 1)
+        # Polling is not rescheduled once the batch has finished
+        mock_view.after.assert_called_once()
+
+        # Once finished, the view can be closed
+        presenter.close_view()
+        assert mock_view.destroy.call_count == (1 if fail else 2)
+
+    def test_start_error(self):
+        """Test that an error from the batch itself is raised once polled, closing the view"""
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=CalibrateModelSelectView)
+        presenter = CalibrateModelSelectPresenter(mock_mediator, mock_view, self.project_selection)
+        mock_batch = MagicMock(spec=BatchCalibration)
+        mock_batch.model_names = ["bar"]
+        mock_batch.run.side_effect = OSError("no processes")
+        presenter.start(mock_batch)
+        presenter.thread.join()
+        with pytest.raises(OSError, match="no processes"):
+            presenter.poll()
+        mock_view.destroy.assert_called_once()
 
     def test_on_select_all(self):
         """Test the on_select_all callback, which should just call a method on the view which is mocked out"""
@@ -3,10 +3,13 @@ import pathlib
 from unittest.mock import MagicMock, patch
 
 import networkx as nx
+import numpy as np
 import pytest
 from networkx.drawing.nx_pydot import write_dot
 
+from polychron import mcmc
 from polychron.interfaces import Mediator
+from polychron.models.MCMCData import MCMCData
 from polychron.models.ProjectSelection import ProjectSelection
 from polychron.presenters.DatingResultsPresenter import DatingResultsPresenter
 from polychron.views.DatingResultsView import DatingResultsView
@@ -467,10 +470,49 @@ class TestDatingResultsPresenter:
         mock_view.clear_littlecanvas3.hide_canvas_plt()
         mock_view.clear_littlecanvas3.clear_tree_phases()
 
-    @pytest.mark.skip(reason="test_get_hpd_interval not implemented, includes tkinter")
     def test_get_hpd_interval(self):
-        """Test get_hpd_interval behaves as expected"""
-        pass
+        """Test get_hpd_interval presents the HPD interval of each node in the results list, at the requested percentage"""
+        # Setup the mock mediator, mock view and fixture-provided ProjectSelection
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=DatingResultsView)
+        model = self.project_selection
+        model.switch_to("foo", "bar")
+
+        # Instantiate the Presenter
+        presenter = DatingResultsPresenter(mock_mediator, mock_view, model)
+
+        # Calibrate the model with a bimodal and a unimodal node, and select both
+        rng = np.random.default_rng(1)
+        model.current_model.mcmc_check = True
+        model.current_model.mcmc_data.accept_group_limits = {
+            "a": list(np.concatenate([rng.normal(-3000, 10, 5000), rng.normal(-2700, 10, 5000)])),
+            "b": list(rng.normal(-2000, 10, 8000)),
+        }
+        presenter.results_list = {"a": None, "b": None}
+        with patch("polychron.presenters.DatingResultsPresenter.simpledialog.askstring", return_value="95"):
+            presenter.get_hpd_interval()
+        mock_view.update_hpd_interval.assert_called_once()
+        user_input, intervals = mock_view.update_hpd_interval.call_args.args
+        assert user_input == "95"
+        assert [node for node, _ in intervals] == ["a", "b"]
+        # Intervals are presented as positive years, one per mode
+        assert intervals[0][1].count("Cal BP") == 2
+        assert intervals[1][1].count("Cal BP") == 1
+        expected = mcmc.HPD_interval(np.array(model.current_model.mcmc_data.accept_group_limits["b"][1000:]))
+        assert intervals[1][1] == f"{abs(expected[0])} - {abs(expected[1])} Cal BP "
+
+    def test_get_posterior_summary(self):
+        """Test the posterior summary is reused until the samples are replaced by a new calibration"""
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=DatingResultsView)
+        presenter = DatingResultsPresenter(mock_mediator, mock_view, self.project_selection)
+
+        mcmc_data = MCMCData(accept_group_limits={"a": [float(x) for x in range(1100)]})
+        summary = presenter.get_posterior_summary(mcmc_data)
+        assert summary.nodes == ["a"]
+        assert presenter.get_posterior_summary(mcmc_data) is summary
+        mcmc_data.accept_group_limits = {"b": [float(x) for x in range(1100)]}
+        assert presenter.get_posterior_summary(mcmc_data).nodes == ["b"]
 
     @pytest.mark.skip(reason="test_on_testmenu2 not implemented, includes tkinter")
     def test_on_testmenu2(self):
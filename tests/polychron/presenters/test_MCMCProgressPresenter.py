@@ -5,6 +5,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from polychron.interfaces import Mediator
+from polychron.mcmc import ChainProgress
 from polychron.models.Model import Model
 from polychron.presenters.MCMCProgressPresenter import MCMCProgressPresenter
 from polychron.views.MCMCProgressView import MCMCProgressView
@@ -85,18 +86,19 @@ class TestMCMCProgressPresenter:
 
         # Patch out Model.MCMC_func & MCMCData.save methods to avoid expensive ops
         with (
+            patch("polychron.models.Model.Model.create_mcmc_session") as mock_create_mcmc_session,
             patch("polychron.models.Model.Model.MCMC_func") as mock_model_mcmc_func,
             patch("polychron.models.MCMCData.MCMCData.save") as mock_mcmcdata_save,
         ):
             # Define a fake mcmc func which prints several times before returning some fake data of the correct type and assign it as the MagicMock side_effect
-            def fake_mcmc_func(writable=None):
+            def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
                 print(12, file=writable)
                 print(50, file=writable)
                 print(100, file=writable)
                 print(12, file=writable)
                 print(50, file=writable)
                 print(100, file=writable)
-                return tuple([[], [[i for i in range(50000)]], [], [], 12, 12, [], [], {}, {}])
+                return tuple([[], [[i for i in range(50000)]], [], [], 12, 12, [], [], {}, {}, {}, 1, {}])
 
             mock_model_mcmc_func.side_effect = fake_mcmc_func
 
@@ -116,3 +118,110 @@ class TestMCMCProgressPresenter:
             captured = capsys.readouterr()
             assert len(captured.out) == 0
             assert len(captured.err) == 0
+            # A new calibration is started unless resuming was requested
+            mock_create_mcmc_session.assert_called_once_with(resume=False)
+            session = mock_create_mcmc_session.return_value
+            expected_kwargs = {"session": session, "progress_callback": None, "stop": presenter.stop_event}
+            assert mock_model_mcmc_func.call_args.kwargs == {**expected_kwargs, "more_samples": None}
+            presenter.run(resume=True)
+            mock_create_mcmc_session.assert_called_with(resume=True)
+
+            # If too few samples were accepted, the same session is topped up with the shortfall rather than restarted
+            mock_create_mcmc_session.reset_mock()
+            mock_model_mcmc_func.reset_mock(side_effect=True)
+            mock_model_mcmc_func.side_effect = [
+                tuple([[], [list(range(n))], [], [], 12, 12, [], [], {}, {}, {}, 1, {}]) for n in (30000, 50000)
+            ]
+            presenter.run()
+            mock_create_mcmc_session.assert_called_once_with(resume=False)
+            assert [c.kwargs for c in mock_model_mcmc_func.call_args_list] == [
+                {**expected_kwargs, "more_samples": None},
+                {**expected_kwargs, "more_samples": 20000},
+            ]
+
+    def test_start(self, test_data_model_demo: Model):
+        """Test that start calibrates in a background thread, updating the view from polled progress messages"""
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=MCMCProgressView)
+        presenter = MCMCProgressPresenter(mock_mediator, mock_view, test_data_model_demo)
+        progress = ChainProgress(40, 2000, 30.0, 45.0, {"context": 0.5, "shift": 0.25}, 1.0123)
+        on_complete = MagicMock()
+
+        def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
+            progress_callback(progress)
+            return tuple([[], [list(range(50000))], [], [], 12, 12, [], [], {}, {}, {}, 1, {}])
+
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session") as mock_create_mcmc_session,
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_model_mcmc_func,
+            patch("polychron.models.MCMCData.MCMCData.save") as mock_mcmcdata_save,
+        ):
+            presenter.start(on_complete=on_complete)
+            presenter.thread.join()
+            # The session is created before the thread is started, and the popup is modal while it runs
+            mock_create_mcmc_session.assert_called_once_with(resume=False)
+            assert mock_model_mcmc_func.call_args.kwargs["session"] is mock_create_mcmc_session.return_value
+            mock_view.make_modal.assert_called_once()
+            # Polling is scheduled on the Tk event loop, and nothing is stored until the results are polled
+            mock_view.after.assert_called_once_with(presenter.POLL_INTERVAL, presenter.poll)
+            assert not presenter.model.mcmc_check
+            presenter.poll()
+        mock_view.update_progress.assert_called_with(40)
+        mock_view.update_status.assert_called_once_with(
+            "About 0m 45s remaining | Acceptance: context 0.50, shift 0.25 | R-hat 1.012"
+        )
+        assert presenter.model.mcmc_check
+        mock_mcmcdata_save.assert_called_once()
+        mock_view.destroy.assert_called_once()
+        on_complete.assert_called_once()
+        # Polling is not rescheduled once calibration has finished
+        mock_view.after.assert_called_once()
+
+    def test_cancel(self, test_data_model_demo: Model):
+        """Test that cancelling sets the stop event, and that too few samples are not stored as results"""
+        mock_mediator = MagicMock(spec=Mediator)
+        mock_view = MagicMock(spec=MCMCProgressView)
+        presenter = MCMCProgressPresenter(mock_mediator, mock_view, test_data_model_demo)
+        mock_view.bind_cancel_button.assert_called_once()
+        on_complete = MagicMock()
+
+        def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
+            # Closing the window while calibration is running cancels it, rather than closing the window immediately
+            presenter.close_view()
+            assert stop.is_set()
+            return tuple([[], [list(range(500))], [], [], 12, 12, [], [], {}, {}, {}, 1, {}])
+
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session"),
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_model_mcmc_func,
+        ):
+            presenter.start(on_complete=on_complete)
+            presenter.thread.join()
+            presenter.poll()
+        # The calibration was not topped up once cancelled
+        mock_model_mcmc_func.assert_called_once()
+        mock_view.disable_cancel_button.assert_called_once()
+        mock_view.update_status.assert_called_with("Cancelling...")
+        assert not presenter.model.mcmc_check
+        mock_view.destroy.assert_called_once()
+        on_complete.assert_not_called()
+
+        # Errors creating the session are raised by start, without starting a thread, once the popup has closed
+        presenter = MCMCProgressPresenter(mock_mediator, mock_view, test_data_model_demo)
+        with patch("polychron.models.Model.Model.create_mcmc_session", side_effect=RuntimeError("not ready")):
+            with pytest.raises(RuntimeError, match="not ready"):
+                presenter.start()
+        assert presenter.thread is None
+        assert mock_view.destroy.call_count == 2
+
+        # Errors during calibration are raised once the popup has closed
+        presenter = MCMCProgressPresenter(mock_mediator, mock_view, test_data_model_demo)
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session"),
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=RuntimeError("failed")),
+        ):
+            presenter.start()
+            presenter.thread.join()
+            with pytest.raises(RuntimeError, match="failed"):
+                presenter.poll()
+        assert mock_view.destroy.call_count == 3
@@ -127,7 +127,7 @@ class TestModelPresenter:
         assert len(mock_view.build_tool_menu.call_args.args) == 1
         menu_items = mock_view.build_tool_menu.call_args.args[0]
         assert isinstance(menu_items, list)
-        assert len(menu_items) == 4
+        assert len(menu_items) == 5
         for entry in menu_items:
             assert entry is None or (isinstance(entry, tuple) and len(entry) == 2 and callable(entry[1]))
 
@@ -293,6 +293,7 @@ class TestModelPresenter:
         MockMCMCProgressView.return_value = mock_child_view_instance
         mock_child_presenter_instance = MagicMock(spec=MCMCProgressPresenter)
         mock_child_presenter_instance.view = mock_child_view_instance
+        mock_child_presenter_instance.thread = None
         MockMCMCProgressPresenter.return_value = mock_child_presenter_instance
 
         # Call the callback function with the additional classes mocked and patched
@@ -319,10 +320,44 @@ class TestModelPresenter:
         MockMCMCProgressPresenter.assert_called_once()
         MockMCMCProgressView.assert_called_once()
         mock_child_presenter_instance.view.lift.assert_called_once()
-        mock_child_presenter_instance.run.assert_called_once()
-        mock_child_presenter_instance.close_view.assert_called_once()
+        # Calibration is started in the background, switching to the DatingResults presenter once complete
+        mock_child_presenter_instance.start.assert_called_once()
+        assert mock_child_presenter_instance.start.call_args.kwargs["resume"] is False
+        mock_mediator.switch_presenter.assert_not_called()
+        mock_child_presenter_instance.start.call_args.kwargs["on_complete"]()
         mock_mediator.switch_presenter.assert_called_with("DatingResults")
 
+        # Resuming without a calibration with streamed samples presents an error message
+        presenter.popup_calibrate_model(resume=True)
+        assert mock_view.messagebox_error.call_count == 2
+        MockMCMCProgressPresenter.assert_called_once()
+
+        # Otherwise the most recent calibration is resumed
+        run_directory = presenter.model.current_model.get_mcmc_samples_directory() / "run-1"
+        run_directory.mkdir(parents=True)
+        (run_directory / "run.json").write_text("{}")
+        presenter.popup_calibrate_model(resume=True)
+        assert MockMCMCProgressPresenter.call_count == 2
+        assert mock_child_presenter_instance.start.call_args.kwargs["resume"] is True
+        assert presenter.calibration is mock_child_presenter_instance
+
+        # Another calibration cannot be started while the previous calibration is running
+        mock_child_presenter_instance.thread = MagicMock()
+        mock_child_presenter_instance.thread.is_alive.return_value = True
+        presenter.popup_calibrate_model()
+        assert mock_view.messagebox_error.call_count == 3
+        assert MockMCMCProgressPresenter.call_count == 2
+        mock_child_presenter_instance.thread.is_alive.return_value = False
+
+        # Calibrations which could not be started present an error message
+        mock_child_presenter_instance.start.side_effect = RuntimeError(
+            "The calibration being resumed is already running"
+        )
+        presenter.popup_calibrate_model(resume=True)
+        assert MockMCMCProgressPresenter.call_count == 3
+        assert mock_view.messagebox_error.call_count == 4
+        assert "already running" in mock_view.messagebox_error.call_args.args[1]
+
     @pytest.mark.skip(reason="test_chronograph_render_wrap not implemented, includes tkinter")
     def test_chronograph_render_wrap(self):
         pass
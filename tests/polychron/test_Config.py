@@ -8,7 +8,7 @@ from unittest.mock import patch
 import pytest
 import yaml
 
-from polychron.Config import Config, get_config
+from polychron.Config import Config, get_config, set_config
 
 
 @pytest.fixture
@@ -30,6 +30,20 @@ class TestConfig:
         assert c.projects_directory == expected_projects_directory
         assert c.verbose is False
         assert c.geometry == "1920x1080"
+        assert c.mcmc_chains == 2
+        assert c.mcmc_workers == 0
+        assert c.mcmc_convergence is False
+        assert c.mcmc_target_ess == 1000
+        assert c.mcmc_target_rhat == 1.01
+        assert c.mcmc_max_samples == 60000
+        assert c.mcmc_check_interval == 3335
+        assert c.mcmc_sample_dtype == "float64"
+        assert c.mcmc_stream_samples is False
+        assert c.mcmc_seed == -1
+        assert c.mcmc_method == "squeeze"
+        assert c.mcmc_adaptive_warmup == 0
+        assert c.mcmc_target_acceptance == 0.234
+        assert c.model_cache_size == 0
 
     def test_load(self, tmp_path: pathlib.Path):
         """Test loading yaml from disk behaves as intended, using a temporary path probided by pathlib"""
@@ -38,6 +52,20 @@ class TestConfig:
             "projects_directory": str(tmp_path / "polychron_projects"),  # store as str
             "verbose": True,
             "geometry": "1280x720",
+            "mcmc_chains": 4,
+            "mcmc_workers": 3,
+            "mcmc_convergence": True,
+            "mcmc_target_ess": 400,
+            "mcmc_target_rhat": 1.05,
+            "mcmc_max_samples": 20000,
+            "mcmc_check_interval": 500,
+            "mcmc_sample_dtype": "float32",
+            "mcmc_stream_samples": True,
+            "mcmc_seed": 1234,
+            "mcmc_method": "gibbs",
+            "mcmc_adaptive_warmup": 5000,
+            "mcmc_target_acceptance": 0.3,
+            "model_cache_size": 4,
         }
         # Write to temporary path on disk.
         tmp_config_path = tmp_path / "config.yml"
@@ -52,6 +80,20 @@ class TestConfig:
         assert c.projects_directory == pathlib.Path(expected["projects_directory"])  # is stored as a Path in-class
         assert c.verbose == expected["verbose"]
         assert c.geometry == expected["geometry"]
+        assert c.mcmc_chains == expected["mcmc_chains"]
+        assert c.mcmc_workers == expected["mcmc_workers"]
+        assert c.mcmc_convergence == expected["mcmc_convergence"]
+        assert c.mcmc_target_ess == expected["mcmc_target_ess"]
+        assert c.mcmc_target_rhat == expected["mcmc_target_rhat"]
+        assert c.mcmc_max_samples == expected["mcmc_max_samples"]
+        assert c.mcmc_check_interval == expected["mcmc_check_interval"]
+        assert c.mcmc_sample_dtype == expected["mcmc_sample_dtype"]
+        assert c.mcmc_stream_samples == expected["mcmc_stream_samples"]
+        assert c.mcmc_seed == expected["mcmc_seed"]
+        assert c.mcmc_method == expected["mcmc_method"]
+        assert c.mcmc_adaptive_warmup == expected["mcmc_adaptive_warmup"]
+        assert c.mcmc_target_acceptance == expected["mcmc_target_acceptance"]
+        assert c.model_cache_size == expected["model_cache_size"]
 
     def test_save(self, tmp_path: pathlib.Path):
         """Ensure that saving a config object on disk behaves as intended"""
@@ -178,3 +220,9 @@ class TestGetConfig:
 
             # Restore the old value, while this is not being fixtured
             c0.projects_directory = old_value
+
+    def test_set_config(self, tmp_path):
+        """Test that set_config replaces the instance returned by get_config"""
+        c0 = Config(projects_directory=tmp_path / "other")
+        set_config(c0)
+        assert id(get_config()) == id(c0)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import io
+import json
+import pathlib
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import networkx as nx
+import pytest
+
+from polychron.cli import calibrate_model, export_results, run_command
+from polychron.Config import get_config
+from polychron.entrypoint import parse_cli
+from polychron.mcmc import ALL_SAMPLES_BURN_IN, ChainProgress
+from polychron.models.Model import Model
+from polychron.models.ProjectSelection import ProjectSelection
+
+
+def fake_mcmc_func(writable=None, session=None, more_samples=None, progress_callback=None, stop=None):
+    """Fake Model.MCMC_func, which reports progress and returns enough samples for every context"""
+    if progress_callback is not None:
+        progress_callback(ChainProgress(50, 100, 1.0, 1.0, {"context": 0.5}, None))
+    return tuple([["a"], [list(range(50000))], [], [], 12, 12, [], [], {}, {}, {}, 1, {}])
+
+
+class TestCLI:
+    """Tests for the headless subcommands in cli.py"""
+
+    def create_model(self, project_name: str, model_name: str, ready: bool) -> Model:
+        """Create and save a model in the (temporary) projects directory, optionally marking it as ready for calibration"""
+        selection = ProjectSelection(get_config().projects_directory)
+        selection.switch_to(project_name, model_name, load_ok=False, create_ok=True)
+        model = selection.current_model
+        if ready:
+            model.stratigraphic_dag = nx.DiGraph()
+            model.chronological_dag = nx.DiGraph()
+            model.load_check = True
+        model.save()
+        return model
+
+    def test_headless_imports(self):
+        """Test that the headless subcommands do not import tkinter, ttkthemes or the presenters"""
+        code = "import sys, polychron.entrypoint, polychron.cli; print(sorted(m for m in sys.modules if m.split('.')[0] in ('tkinter', 'ttkthemes') or m.startswith(('polychron.presenters', 'polychron.views'))))"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]"
+
+    def test_calibrate_model(self, capsys: pytest.CaptureFixture):
+        """Test that a model is calibrated from a new session, saved, and progress is reported when requested"""
+        model = self.create_model("foo", "bar", ready=True)
+        with (
+            patch("polychron.models.Model.Model.create_mcmc_session") as mock_create_mcmc_session,
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_mcmc_func,
+            patch("polychron.models.MCMCData.MCMCData.save") as mock_mcmcdata_save,
+            patch("polychron.models.Model.Model.save") as mock_model_save,
+        ):
+            calibrate_model(model, chains=3, workers=2, seed=7, progress=sys.stderr)
+            mock_create_mcmc_session.assert_called_once_with(3, 2, seed=7, resume=False)
+            assert mock_mcmc_func.call_args.kwargs["session"] == mock_create_mcmc_session.return_value
+            mock_mcmcdata_save.assert_called_once()
+            mock_model_save.assert_called_once()
+        assert model.mcmc_check
+        assert model.mcmc_data.contexts == ["a"]
+        assert capsys.readouterr().err == "bar: 50% About 0m 01s remaining | Acceptance: context 0.50\n"
+
+        # Models without a chronological graph cannot be calibrated
+        with pytest.raises(RuntimeError, match="not ready for calibration"):
+            calibrate_model(self.create_model("foo", "baz", ready=False))
+
+    def test_export_results(self):
+        """Test exporting the samples of a calibrated model after burn-in, as csv or json"""
+        model = self.create_model("foo", "bar", ready=True)
+        with pytest.raises(RuntimeError, match="has not been calibrated"):
+            export_results(model, io.StringIO())
+        model.mcmc_check = True
+        model.mcmc_data.all_group_limits = {
+            "a": [0.0] * ALL_SAMPLES_BURN_IN + [1.5, 2.5],
+            "b": [0.0] * ALL_SAMPLES_BURN_IN + [3.0, 4.0],
+        }
+        output = io.StringIO()
+        export_results(model, output, "csv")
+        assert output.getvalue().splitlines() == ["a,b", "1.5,3.0", "2.5,4.0"]
+        output = io.StringIO()
+        export_results(model, output, "json")
+        assert json.loads(output.getvalue()) == {"a": [1.5, 2.5], "b": [3.0, 4.0]}
+        with pytest.raises(ValueError, match="Unknown export format"):
+            export_results(model, output, "xlsx")
+
+    def test_run_command(self, tmp_path: pathlib.Path, capsys: pytest.CaptureFixture):
+        """Test running each subcommand from parsed arguments, including exit statuses for failures"""
+        self.create_model("foo", "ready", ready=True)
+        self.create_model("foo", "not-ready", ready=False)
+        with (
+            patch("polychron.models.Model.Model.MCMC_func", side_effect=fake_mcmc_func) as mock_mcmc_func,
+            patch("polychron.models.Model.Model.create_mcmc_session"),
+            patch("polychron.models.MCMCData.MCMCData.save"),
+        ):
+            assert run_command(parse_cli(["calibrate", "foo", "ready", "--chains", "1", "--format", "json"])) == 0
+            assert mock_mcmc_func.call_count == 1
+            # Progress is only reported when requested
+            assert capsys.readouterr().err == "Calibrated 'foo/ready'\n"
+
+            # Unknown projects and models, or models which are not ready, fail
+            assert run_command(parse_cli(["calibrate", "missing", "ready"])) == 1
+            assert "Project 'missing' does not exist" in capsys.readouterr().err
+            assert run_command(parse_cli(["calibrate", "foo", "not-ready"])) == 1
+            assert "not ready for calibration" in capsys.readouterr().err
+
+        # Projects are calibrated by a BatchCalibration, which is mocked to fail for all but the ready model
+        with patch("polychron.cli.BatchCalibration") as mock_batch_calibration:
+
+            def fake_run(progress_callback, finished_callback):
+                for name in mock_batch_calibration.call_args.args[1]:
+                    if name == "ready":
+                        finished_callback(name, MagicMock(), None)
+                    else:
+                        finished_callback(name, None, RuntimeError("failed"))
+
+            mock_batch_calibration.return_value.run.side_effect = fake_run
+            # Without a list of models, only models which are ready are calibrated
+            assert run_command(parse_cli(["calibrate-project", "foo", "--workers", "3"])) == 0
+            assert mock_batch_calibration.call_args.args[1:] == (["ready"], None, 3, None)
+            assert capsys.readouterr().err.endswith("Calibrated 'foo/ready'\n")
+            # Explicitly listed models are all attempted, reporting each failure
+            assert run_command(parse_cli(["calibrate-project", "foo", "not-ready", "missing", "ready"])) == 1
+            assert mock_batch_calibration.call_args.args[1] == ["not-ready", "missing", "ready"]
+            assert "2 of 3 models failed: not-ready, missing" in capsys.readouterr().err
+            # Unknown projects fail without calibrating
+            assert run_command(parse_cli(["calibrate-project", "missing"])) == 1
+            assert mock_batch_calibration.call_count == 2
+
+        # Results are exported to a file, or stdout
+        output = tmp_path / "results.csv"
+        assert run_command(parse_cli(["export-results", "foo", "not-ready", "-o", str(output)])) == 1
+        assert "has not been calibrated" in capsys.readouterr().err
+        with patch("polychron.cli.export_results") as mock_export_results:
+            assert run_command(parse_cli(["export-results", "foo", "ready", "-o", str(output)])) == 0
+            assert mock_export_results.call_args.args[2] == "csv"
+            assert run_command(parse_cli(["export-results", "foo", "ready", "--format", "json"])) == 0
+            assert mock_export_results.call_args.args[1:] == (sys.stdout, "json")
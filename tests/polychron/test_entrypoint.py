@@ -82,6 +82,45 @@ class TestEntrypoint:
         with pytest.raises(SystemExit):
             _ = parse_cli(argv=["--made", "--up", "--flags"])
 
+    def test_parse_cli_subcommands(self) -> None:
+        """Test the CLI argument parsing for the headless subcommands"""
+        args = parse_cli([])
+        assert args.command is None
+
+        args = parse_cli(["calibrate", "foo", "bar", "--chains", "4", "--workers", "2", "--seed", "7", "--progress"])
+        assert args.command == "calibrate"
+        assert (args.project, args.model) == ("foo", "bar")
+        assert (args.chains, args.workers, args.seed, args.progress) == (4, 2, 7, True)
+        assert args.output is None
+        assert args.format == "csv"
+
+        args = parse_cli(["calibrate-project", "foo"])
+        assert args.command == "calibrate-project"
+        assert args.models == []
+        assert args.chains is None
+        args = parse_cli(["calibrate-project", "foo", "a", "b"])
+        assert args.models == ["a", "b"]
+
+        args = parse_cli(["export-results", "foo", "bar", "-o", "out.json", "--format", "json"])
+        assert args.command == "export-results"
+        assert (args.output, args.format) == ("out.json", "json")
+
+        # Subcommands require a project and model, and formats are validated
+        with pytest.raises(SystemExit):
+            parse_cli(["calibrate", "foo"])
+        with pytest.raises(SystemExit):
+            parse_cli(["export-results", "foo", "bar", "--format", "xlsx"])
+
+    @patch("polychron.entrypoint.run_command", return_value=1)
+    @patch("polychron.GUIApp.GUIApp")
+    @patch("sys.argv", [__file__, "export-results", "foo", "bar"])
+    def test_main_subcommand(self, MockGUIApp, mock_run_command) -> None:
+        """Test the main() method with a subcommand, which is run without launching the GUI, returning its exit status"""
+        assert main() == 1
+        mock_run_command.assert_called_once()
+        assert mock_run_command.call_args.args[0].command == "export-results"
+        MockGUIApp.assert_not_called()
+
     def test_print_version(self, capsys: pytest.CaptureFixture) -> None:
         """Test the print_version method, capturing stdout via capsys
 
@@ -0,0 +1,691 @@
+import pickle
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from polychron import mcmc
+from polychron.models.InterpolatedRCDCalibrationCurve import InterpolatedRCDCalibrationCurve
+from polychron.models.SampleBuffer import SampleBuffer
+
+
+@pytest.fixture(scope="module")
+def calibration():
+    """The interpolated intcal20 calibration curve dataframe, shared by tests in this module"""
+    return InterpolatedRCDCalibrationCurve("intcal20_interpolated").df
+
+
+@pytest.fixture
+def thesis_inputs():
+    """The run_MCMC inputs for the tests/data/thesis model, without requiring graphviz to build the DAG"""
+    CONTEXT_NO = ["758", "925", "814", "1168", "923", "493", "1235", "358", "813", "1210"]
+    return {
+        "CONTEXT_NO": CONTEXT_NO,
+        "TOPO_SORT": list(CONTEXT_NO),
+        "KEY_REF": ["1"] * 7 + ["2"] * 3,
+        "STRAT_VEC": [
+            [["814"], []],
+            [["923"], []],
+            [["1235"], ["758"]],
+            [["358"], []],
+            [["358"], ["925"]],
+            [["358"], []],
+            [["358"], ["814"]],
+            [["813"], ["1235", "493", "923", "1168"]],
+            [["1210"], ["358"]],
+            [[], ["813"]],
+        ],
+        "RCD_EST": [3275, 3420, 3270, 3160, 3435, 3190, 3400, 3340, 3270, 3200],
+        "RCD_ERR": [75, 65, 80, 70, 60, 75, 75, 85, 75, 70],
+        "PHI_REF": ["1", "2"],
+        "PREV_PHASE": ["start", "abutting"],
+        "POST_PHASE": ["abutting", "end"],
+        "CONT_TYPE": ["normal"] * 10,
+    }
+
+
+def build_state(inputs, calibration, rng):
+    """Build the initial SamplerState for a set of run_MCMC inputs, as squeeze_model does"""
+    A, P, RESULT_VEC = mcmc.initialise(calibration, inputs["RCD_EST"], inputs["RCD_ERR"])
+    THETA_INITS = mcmc.theta_init_func_n(
+        inputs["KEY_REF"],
+        inputs["PHI_REF"],
+        RESULT_VEC,
+        inputs["STRAT_VEC"],
+        P,
+        inputs["CONTEXT_NO"],
+        inputs["TOPO_SORT"],
+        rng,
+    )
+    PHASE_BOUNDARY_INITS = mcmc.phase_bd_init_func(
+        inputs["KEY_REF"], inputs["PHI_REF"], THETA_INITS, inputs["PREV_PHASE"], A, P, rng
+    )
+    return mcmc.SamplerState.from_inputs(
+        THETA_INITS,
+        PHASE_BOUNDARY_INITS,
+        RESULT_VEC,
+        A,
+        P,
+        inputs["RCD_ERR"],
+        inputs["RCD_EST"],
+        inputs["KEY_REF"],
+        inputs["STRAT_VEC"],
+        inputs["CONTEXT_NO"],
+        inputs["POST_PHASE"],
+        inputs["PREV_PHASE"],
+        inputs["PHI_REF"],
+        calibration,
+        inputs["CONT_TYPE"],
+        RNG=rng,
+    )
+
+
+def squeeze_args(inputs, calibration):
+    """The positional arguments to squeeze_model for a set of run_MCMC inputs, as run_MCMC builds them"""
+    A, P, RESULT_VEC = mcmc.initialise(calibration, inputs["RCD_EST"], inputs["RCD_ERR"])
+    return (
+        mcmc.PHI_SAMP_DICT,
+        RESULT_VEC,
+        A,
+        P,
+        inputs["RCD_ERR"],
+        inputs["KEY_REF"],
+        inputs["STRAT_VEC"],
+        inputs["CONTEXT_NO"],
+        inputs["TOPO_SORT"],
+        inputs["PREV_PHASE"],
+        inputs["POST_PHASE"],
+        inputs["PHI_REF"],
+        inputs["RCD_EST"],
+        calibration,
+        inputs["CONT_TYPE"],
+        "float64",
+    )
+
+
+def test_likelihood_grids(calibration):
+    """Test batched likelihood grids match interpolating the likelihood of each calendar year, and initialise's range"""
+    RCD_EST, RCD_ERR = [3275, 3420, 1160], [75, 65, 30]
+    A, P, RESULT_VEC = mcmc.initialise(calibration, RCD_EST, RCD_ERR)
+    assert (A, P) == (0, 5144)
+    assert len(RESULT_VEC) == 3
+    for (x_val, s_err), (theta, prob, sums) in zip(zip(RCD_EST, RCD_ERR), RESULT_VEC):
+        years = np.arange(A, P)
+        expected = np.interp(theta, years, [mcmc.likeli(x_val, s_err, year, calibration) for year in years])
+        np.testing.assert_allclose(prob, expected / expected.sum(), rtol=1e-9, atol=1e-300)
+        assert theta[0] == A
+        assert theta[-1] == P
+        assert len(theta) == (P - A) * 10 + 1
+        assert sums[0, -1] == pytest.approx(1.0)
+
+
+def test_window_sum(calibration):
+    """Test window sums from prefix sums match summing slices of a likelihood grid, including empty and out of range windows"""
+    theta, prob, sums = mcmc.likelihood_func(3275, 75, 3000, 3700, calibration)
+    assert sums.shape == (2, len(prob) + 1)
+    for low, up in [
+        (0, len(prob)),
+        (100, 2500),
+        (2500, 2501),
+        (0, 5),
+        (len(prob) - 5, len(prob) + 20),
+        (-10, len(prob)),
+    ]:
+        assert mcmc.window_sum(sums, low, up) == pytest.approx(prob[low:up].sum(), rel=1e-9, abs=1e-300)
+    assert mcmc.window_sum(sums, 300, 300) is None
+    assert mcmc.window_sum(sums, 300, 200) is None
+    assert mcmc.window_sum(sums, -10, 40) is None
+    assert mcmc.window_sum(sums, len(prob) + 1, len(prob) + 10) is None
+    # Windows in the far tail are summed without cancellation against the mass in the rest of the grid
+    theta, prob, sums = mcmc.likelihood_func(3275, 75, 3000, 4200, calibration)
+    assert mcmc.window_sum(sums, len(prob) - 50, len(prob)) == pytest.approx(prob[-50:].sum(), rel=1e-9)
+
+
+def test_truncated_quantile(calibration):
+    """Test the truncated inverse CDF matches choosing from a copy of the window, including windows in the tail"""
+    RESULT = mcmc.likelihood_func(3275, 75, 3000, 4200, calibration)
+    theta, prob, _ = RESULT
+    for low, up in [(3400, 3600), (4100, 4150), (-np.inf, 3300), (3000.05, 3000.25)]:
+        window = (theta > low) & (theta < up)
+        cdf = np.cumsum(prob[window]) / prob[window].sum()
+        for u in [0.0, 0.1, 0.5, 0.9, 0.999]:
+            expected = theta[window][np.searchsorted(cdf, u, side="right")]
+            assert mcmc.truncated_quantile(RESULT, low, up, u) == pytest.approx(expected, abs=0.11)
+            assert low < mcmc.truncated_quantile(RESULT, low, up, u) < up
+    # Windows containing no grid values, or no likelihood, cannot be sampled
+    assert mcmc.truncated_quantile(RESULT, 3400, 3400.1, 0.5) is None
+    assert mcmc.truncated_quantile(RESULT, 3600, 3400, 0.5) is None
+    empty = (theta, np.zeros_like(prob), mcmc.cumulative_likelihood(np.zeros_like(prob)))
+    assert mcmc.truncated_quantile(empty, 3400, 3600, 0.5) is None
+
+
+def test_truncated_samples(calibration):
+    """Test batched truncated draws stay within each context's window, follow the likelihood, and are NaN if impossible"""
+    A, P, RESULT_VEC = mcmc.initialise(calibration, [3275, 3160], [75, 70])
+    theta, prob, _ = RESULT_VEC[0]
+    rng = np.random.default_rng(1)
+    draws = mcmc.truncated_samples(rng, RESULT_VEC, np.zeros(5000, dtype=int), 3400, 3600)
+    assert draws.min() > 3400
+    assert draws.max() < 3600
+    window = (theta > 3400) & (theta < 3600)
+    assert draws.mean() == pytest.approx((theta[window] * prob[window]).sum() / prob[window].sum(), abs=2)
+
+    draws = mcmc.truncated_samples(rng, RESULT_VEC, [0, 1, 1], [3400, 3300, 3600], [3600, 3500, 3600])
+    assert 3400 < draws[0] < 3600
+    assert 3300 < draws[1] < 3500
+    assert np.isnan(draws[2])
+
+
+def test_topological_layers():
+    """Test items are grouped into layers after everything they depend on, preserving order within each layer"""
+    layers = mcmc.topological_layers([4, 3, 2, 1, 0], {4: [], 3: [4], 2: [], 1: [3, 2, 7], 0: [4]})
+    assert layers == [[4, 2], [3, 0], [1]]
+    assert mcmc.topological_layers([], {}) == []
+
+
+class TestSamplerState:
+    def test_from_inputs(self, thesis_inputs, calibration):
+        """Test the index arrays built for the thesis model are consistent with the list based inputs"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        assert state.K == 10
+        assert state.M == 3
+        assert state.group.tolist() == [0] * 7 + [1] * 3
+        # Boundaries are oldest first, so group "1" lies between boundaries 0 and 1, and group "2" between 1 and 2
+        assert state.group_lower.tolist() == [1, 2]
+        assert state.group_upper.tolist() == [0, 1]
+        # context 1235 (index 6) is above 358 (index 7) and below 814 (index 2)
+        assert state.strat_above[6].tolist() == [7]
+        assert state.strat_below[6].tolist() == [2]
+        assert sorted(state.terms.tolist()) == list(range(10))
+        # The trace values start as the initial values
+        np.testing.assert_array_equal(state.thetas, state.trace_thetas)
+        np.testing.assert_array_equal(state.phis, state.trace_phis)
+        assert len(state.post_s) == 1
+
+        # 814 (index 2) is in the stratigraphic limits of 758 (index 0) and 1235 (index 6)
+        assert state.strat_dependents[2].tolist() == [0, 6]
+
+    def test_cached_terms(self, thesis_inputs, calibration):
+        """Test that incrementally updated posterior terms match evaluating every term"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        thetas = state.thetas.copy()
+        phis = state.phis.copy()
+        state.cached_terms(thetas, phis)
+        for k in [0, 2, 7, 9]:
+            thetas[k] += 15.5
+            densities, likelihoods = state.cached_terms(thetas, phis)
+            expected_densities, expected_likelihoods = state.log_posterior_terms(thetas, thetas, phis)
+            np.testing.assert_array_equal(densities, expected_densities)
+            np.testing.assert_array_equal(likelihoods, expected_likelihoods)
+        # Changing a boundary rescores every context in the groups it bounds
+        assert state.affected_terms(np.array([], dtype=np.intp), np.array([0])).tolist() == list(range(7))
+        phis[1] -= 3.0
+        densities, likelihoods = state.cached_terms(thetas, phis)
+        np.testing.assert_array_equal(likelihoods, state.log_posterior_terms(thetas, thetas, phis)[1])
+
+    @pytest.mark.parametrize(
+        "CONT_TYPE", [["normal"] * 10, ["normal", "residual", "intrusive", "normal", "residual"] * 2]
+    )
+    def test_log_posterior_terms(self, thesis_inputs, calibration, CONT_TYPE, monkeypatch: pytest.MonkeyPatch):
+        """Test the vectorised log posterior matches scoring each term individually, including terms scored as 0, and that a few terms are scored identically with or without array operations"""
+        thesis_inputs["CONT_TYPE"] = CONT_TYPE
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        # The likelihoods from initialise are evaluated without copying them
+        assert state.prob_table.base is None
+        assert state.result_vec[3][1].base is state.prob_table
+        assert state.result_vec[3][2].base is state.sum_table
+        rng = np.random.default_rng(2)
+        for _ in range(20):
+            dates = state.thetas + rng.normal(0, 40, state.K)
+            strat_thetas = state.thetas + rng.normal(0, 40, state.K)
+            phis = state.phis + rng.normal(0, 40, state.M)
+            log_densities, log_likelihoods = state.log_posterior_terms(dates, strat_thetas, phis)
+            expected = np.array([state.term_probability(k, dates[k], strat_thetas, phis) for k in state.terms])
+            with np.errstate(divide="ignore"):
+                np.testing.assert_allclose(log_densities, np.log(expected[:, 0]), rtol=1e-12)
+                np.testing.assert_allclose(log_likelihoods, np.log(expected[:, 1]), rtol=1e-9)
+            with monkeypatch.context() as patch:
+                patch.setattr(mcmc, "SCALAR_TERMS", 0)
+                vectorised = state.log_posterior_terms(dates, strat_thetas, phis)
+            np.testing.assert_array_equal(vectorised[0], log_densities)
+            np.testing.assert_array_equal(vectorised[1], log_likelihoods)
+        # A subset of terms is scored in the same way as every term
+        positions = np.array([1, 4, 8])
+        subset = state.log_posterior_terms(dates, strat_thetas, phis, positions)
+        np.testing.assert_array_equal(subset[1], log_likelihoods[positions])
+
+    def test_log_acceptance_ratio(self):
+        """Test acceptance ratios are summed in log space without underflow, and terms scored as 0 reject"""
+        old = np.full(2000, np.log(1e-200))
+        new = old + 0.001
+        assert mcmc.log_acceptance_ratio(new, old) == pytest.approx(2.0)
+        assert mcmc.log_acceptance_ratio(np.where(np.arange(2000) == 3, -np.inf, new), old) == -np.inf
+        assert mcmc.log_acceptance_ratio(new, np.where(np.arange(2000) == 3, -np.inf, old)) == -np.inf
+
+
+class TestSqueeze:
+    @pytest.mark.parametrize(
+        ("PREV_PHASE", "POST_PHASE"),
+        [
+            (["start", "abutting", "abutting"], ["abutting", "abutting", "end"]),
+            (["start", "gap", "gap"], ["gap", "gap", "end"]),
+            (["start", "overlap", "gap"], ["overlap", "gap", "end"]),
+            (["start", "abutting", "overlap", "overlap"], ["abutting", "overlap", "overlap", "end"]),
+        ],
+    )
+    def test_boundary_plan(self, PREV_PHASE, POST_PHASE):
+        """Test that the compiled boundary plan gives the same limits as the sampling functions in PHI_SAMP_DICT"""
+        rng = np.random.default_rng(1)
+        PHI_REF = [str(g) for g in range(len(PREV_PHASE))]
+        KEY_REF = [PHI_REF[k % len(PHI_REF)] for k in range(4 * len(PHI_REF))]
+        CONT_TYPE = ["normal"] * (len(KEY_REF) - 2) + ["residual", "intrusive"]
+        STEP_1, STEP_2, STEP_3, SAMP_VEC_TRACK = mcmc.how_to_phase_samp(POST_PHASE, PREV_PHASE)
+        plan = mcmc.BoundaryPlan.from_phases(POST_PHASE, PREV_PHASE, PHI_REF)
+        state = SimpleNamespace(
+            A=1000,
+            P=5000,
+            boundary_plan=plan,
+            thetas=rng.uniform(1000, 5000, len(KEY_REF)),
+            phis=np.sort(rng.uniform(1000, 5000, len(STEP_1)))[::-1].copy(),
+            group=np.array([PHI_REF.index(key) for key in KEY_REF]),
+            cont_type=CONT_TYPE,
+            group_normal=[
+                np.array([k for k, key in enumerate(KEY_REF) if key == g and CONT_TYPE[k] == "normal"]) for g in PHI_REF
+            ],
+            group_oldest=np.full(len(PHI_REF), -1),
+            group_youngest=np.full(len(PHI_REF), -1),
+        )
+        state.find_group_extremes = lambda g: mcmc.SamplerState.find_group_extremes(state, g)
+        for g in range(len(PHI_REF)):
+            state.find_group_extremes(g)
+        for k in [0, 1, len(KEY_REF) - 1]:
+            # Move a context, including the oldest or youngest in its group, and update the extremes
+            previous = state.thetas[k]
+            state.thetas[k] = rng.uniform(1000, 5000)
+            mcmc.SamplerState.update_group_extremes(state, k, previous)
+            for m in range(len(STEP_1)):
+                expected = mcmc.PHI_SAMP_DICT[STEP_1[m]][STEP_2[m]][STEP_3[m]](
+                    state.thetas, state.phis, m, 1000, 5000, SAMP_VEC_TRACK, KEY_REF, PHI_REF, CONT_TYPE
+                )
+                assert mcmc.SamplerState.boundary_limits(state, m) == tuple(expected)
+
+    def test_squeeze_iteration(self, thesis_inputs, calibration):
+        """Test that 50 iterations of the squeeze sampler reproduce a fixed chain for a seeded generator"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        for _ in range(50):
+            mcmc.squeeze_iteration(state)
+
+        assert [len(a) for a in state.accept] == [21, 24, 20, 20, 21, 20, 20, 26, 20, 19]
+        assert [len(a) for a in state.phi_accept] == [21, 30, 22]
+        assert len(state.all_samps_cont[0]) == 56
+        assert [a[-1] for a in state.accept] == [
+            3496.128165716985,
+            3716.6056718703753,
+            3474.757309684366,
+            3500.7163453322187,
+            3697.0808368386975,
+            3447.15786016207,
+            3473.4363657382846,
+            3398.5632044423564,
+            3352.222470887324,
+            3276.8927880997144,
+        ]
+        assert [a[-1] for a in state.phi_accept] == [3787.1527180707285, 3408.7678880084163, 3187.572959770943]
+        assert sum(state.all_samps_cont[0]) == 198144.74644299303
+        assert sum(state.all_samps_phi[1]) == 191542.13684167873
+
+    def test_gibbs_iteration(self, thesis_inputs, calibration):
+        """Test the Gibbs sampler records every parameter each iteration, respects the model constraints, and is reproducible"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        for _ in range(50):
+            mcmc.gibbs_iteration(state)
+            log_densities, _ = state.log_posterior_terms(state.thetas, state.thetas, state.phis)
+            assert np.isfinite(log_densities).all()
+            for m in range(state.M):
+                low, up = state.boundary_limits(m)
+                assert low <= state.phis[m] <= up
+        assert [len(a) for a in state.accept] == [50] * 10
+        assert [len(a) for a in state.phi_accept] == [50] * 3
+        assert len(state.all_samps_cont[0]) == 50
+
+        repeat = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        for _ in range(50):
+            mcmc.gibbs_iteration(repeat)
+        np.testing.assert_array_equal(repeat.thetas, state.thetas)
+        np.testing.assert_array_equal(repeat.phis, state.phis)
+
+    def test_proposal_tuning(self, thesis_inputs, calibration):
+        """Test that proposals are counted per move, and that the shift proposal is adapted during warm-up then frozen"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        tuning = mcmc.ProposalTuning(warmup=1000, interval=100, target_acceptance=0.1)
+        widths = []
+        for _ in range(1500):
+            mcmc.squeeze_iteration(state)
+            state.iteration += 1
+            tuning.adapt(state)
+            widths.append(state.shift_width)
+        statistics = state.move_statistics()
+        assert list(statistics) == list(mcmc.MOVES)
+        assert [statistics[move]["proposed"] for move in mcmc.MOVES] == [1500] * 4
+        assert all(0 <= statistics[move]["accepted"] <= 1500 for move in mcmc.MOVES)
+        # More than 10% of shifts are accepted at full width for this model, so the shift proposal widens
+        assert widths[999] > 1.0
+        assert widths[99] != 1.0
+        assert widths[999:] == [widths[999]] * 501
+        assert statistics["shift"]["width"] == widths[-1]
+
+        # Without a warm-up the proposal is unchanged
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        for _ in range(200):
+            mcmc.squeeze_iteration(state)
+            state.iteration += 1
+            mcmc.ProposalTuning().adapt(state)
+        assert state.shift_width == 1.0
+
+    def test_merge_move_statistics(self):
+        """Test that move statistics are merged into one value per chain"""
+        first = {"shift": {"proposed": 10, "accepted": 3, "width": 0.5}}
+        second = {"shift": {"proposed": 12, "accepted": 4, "width": 0.25}}
+        assert mcmc.merge_move_statistics([first, second]) == {
+            "shift": {"proposed": [10, 12], "accepted": [3, 4], "width": [0.5, 0.25]}
+        }
+        assert mcmc.merge_move_statistics([]) == {}
+
+
+class TestChains:
+    def test_GR_conv_check(self):
+        """Test the Gelman-Rubin diagnostic for two chains matches the original formula, and generalises to more chains"""
+        rng = np.random.default_rng(1)
+        chain1, chain2, chain3 = rng.normal(0, 1, 1000), rng.normal(0, 1, 1000), rng.normal(3, 1, 1000)
+        N = 500
+        W = (chain1[-N:].std() ** 2 + chain2[-N:].std() ** 2) / 2
+        mean1, mean2 = chain1[-N:].mean(), chain2[-N:].mean()
+        B = N * ((mean1 - (mean1 + mean2) / 2) ** 2 + (mean2 - (mean1 + mean2) / 2) ** 2)
+        expected = np.sqrt(((1 - 1 / N) * W + 1 / N * B) / W)
+        assert mcmc.GR_conv_check(chain1, chain2) == pytest.approx(expected)
+        # Chains sampling the same distribution are close to 1, a divergent chain is not
+        assert mcmc.GR_conv_check(chain1, chain2, chain1[::-1]) < 1.01
+        assert mcmc.GR_conv_check(chain1, chain2, chain3) > 1.1
+        # Too few samples, or a single chain, cannot be assessed
+        assert np.isnan(mcmc.GR_conv_check(chain1))
+        assert np.isnan(mcmc.GR_conv_check([1.0, 2.0], [1.0, 2.0]))
+
+    def test_merge_chains(self):
+        """Test samples from subsequent chains are appended after removing burn-in, and R-hat is computed per parameter"""
+
+        def chain(offset, n_accept, n_all):
+            phi_accept = [offset + np.arange(n_accept, dtype=np.float64) for _ in range(3)]
+            accept = [offset + np.arange(n_accept, dtype=np.float64) for _ in range(2)]
+            all_samps_cont = [offset + np.arange(n_all, dtype=np.float64) for _ in range(2)]
+            all_samps_phi = [offset + np.arange(n_all, dtype=np.float64) for _ in range(3)]
+            return phi_accept, accept, np.zeros(1), all_samps_cont, all_samps_phi
+
+        # A single chain's samples are returned without copying
+        first = chain(0, 1500, 12000)
+        PHI_ACCEPT, ACCEPT, ALL_SAMPS_CONT, ALL_SAMPS_PHI, RHAT_CONT, RHAT_PHI = mcmc.merge_chains([first])
+        assert all(a is b for a, b in zip(ACCEPT, first[1]))
+        assert ACCEPT is not first[1]
+        assert RHAT_CONT == []
+        assert RHAT_PHI == []
+
+        PHI_ACCEPT, ACCEPT, ALL_SAMPS_CONT, ALL_SAMPS_PHI, RHAT_CONT, RHAT_PHI = mcmc.merge_chains(
+            [first, chain(0.5, 1600, 13000)]
+        )
+        assert [len(a) for a in ACCEPT] == [1500 + 600] * 2
+        assert [len(a) for a in PHI_ACCEPT] == [1500 + 600] * 3
+        assert ACCEPT[0][1500] == 0.5 + mcmc.ACCEPT_BURN_IN
+        assert [len(a) for a in ALL_SAMPS_CONT] == [12000 + 3000] * 2
+        assert [len(a) for a in ALL_SAMPS_PHI] == [12000 + 3000] * 3
+        assert ALL_SAMPS_PHI[2][12000] == 0.5 + mcmc.ALL_SAMPLES_BURN_IN
+        assert len(RHAT_CONT) == 2
+        assert len(RHAT_PHI) == 3
+        assert RHAT_CONT[0] == pytest.approx(mcmc.GR_conv_check(first[1][0], [0.5 + i for i in range(1600)]))
+
+    def test_run_chains(self, monkeypatch: pytest.MonkeyPatch):
+        """Test that a chain run in process is seeded reproducibly from the seed sequence, and receives the progress writable"""
+        calls = []
+
+        def fake_squeeze_model(*args):
+            calls.append(args)
+            return args[5].random(), args[5].uniform()
+
+        monkeypatch.setattr(mcmc, "squeeze_model", fake_squeeze_model)
+        first = mcmc.run_chains(("a", "b"), CHAINS=1, SEED=12)
+        assert first == mcmc.run_chains(("a", "b"), CHAINS=1, SEED=12)
+        assert first != mcmc.run_chains(("a", "b"), CHAINS=1, SEED=13)
+        assert calls[0][:5] == ("a", "b", None, None, None)
+        assert isinstance(calls[0][5], np.random.Generator)
+        assert calls[0][6] == "squeeze"
+        assert calls[0][7] is None
+        mcmc.run_chains(("a", "b"), CHAINS=1, SEED=12, METHOD="gibbs")
+        assert calls[-1][6] == "gibbs"
+        # The first chain's generator is seeded from the first stream spawned from the seed
+        expected = np.random.default_rng(np.random.SeedSequence(12).spawn(1)[0])
+        assert first == [(expected.random(), expected.uniform())]
+
+    def test_run_MCMC_method(self, thesis_inputs, calibration):
+        """Test that an unknown kernel is rejected before any sampling"""
+        with pytest.raises(ValueError, match="Unknown MCMC method"):
+            mcmc.run_MCMC(calibration, **thesis_inputs, METHOD="metropolis")
+
+    def test_stream_samples(self, tmp_path, thesis_inputs, calibration):
+        """Test that samples streamed to disk match samples held in memory, and can be read back"""
+        SQUEEZE_ARGS = squeeze_args(thesis_inputs, calibration)
+        stopping = mcmc.StoppingRule(max_samples=20, check_interval=10)
+        in_memory = mcmc.run_chain(3, SQUEEZE_ARGS, None, stopping)
+        streamed = mcmc.run_chain(3, SQUEEZE_ARGS, None, stopping, tmp_path / "chain")
+        assert (tmp_path / "chain" / "accept.json").is_file()
+        assert streamed[5] == in_memory[5]
+        assert streamed[5]["shift"]["proposed"] > 0
+        for results in (streamed, mcmc.read_chain(tmp_path / "chain")):
+            assert isinstance(results[1][0], np.memmap)
+            for expected, samples in zip(in_memory[:5], results):
+                if isinstance(expected, list):
+                    for expected_row, row in zip(expected, samples):
+                        np.testing.assert_array_equal(row, expected_row)
+                else:
+                    np.testing.assert_array_equal(samples, expected)
+
+        # Merged samples from several chains are also written to disk
+        PHI_ACCEPT, ACCEPT, *_ = mcmc.merge_chains([streamed, streamed], tmp_path)
+        assert isinstance(ACCEPT[0], np.memmap)
+        assert len(ACCEPT[0]) == len(streamed[1][0]) + max(len(streamed[1][0]) - mcmc.ACCEPT_BURN_IN, 0)
+        assert (tmp_path / "merged" / "phi_accept.json").is_file()
+
+    def test_warmup_discarded(self, thesis_inputs, calibration):
+        """Test that samples drawn while the proposal width is adapting are discarded, so the burn-in follows the warm-up"""
+        SQUEEZE_ARGS = squeeze_args(thesis_inputs, calibration)
+        stopping = mcmc.StoppingRule(max_samples=30, check_interval=10)
+        tuning = mcmc.ProposalTuning(warmup=50, interval=5)
+        reports = []
+        results = mcmc.run_chain(
+            3, SQUEEZE_ARGS, None, stopping, None, "squeeze", tuning, PROGRESS_CALLBACK=reports.append
+        )
+        # Progress is reported every 10 iterations, so the 6th report follows the end of the warm-up
+        assert results[6].iteration > tuning.warmup
+        assert reports[4].samples > 0
+        assert reports[5].samples == 0
+        assert min(len(samples) for samples in results[1]) >= 30
+
+    def test_resume(self, tmp_path, thesis_inputs, calibration):
+        """Test that a chain resumed from a checkpoint produces the same samples as one which was not interrupted"""
+        SQUEEZE_ARGS = squeeze_args(thesis_inputs, calibration)
+        tuning = mcmc.ProposalTuning(warmup=40, interval=5)
+
+        def run(directory, max_samples, resume):
+            stopping = mcmc.StoppingRule(max_samples=max_samples, check_interval=10)
+            return mcmc.run_chain(3, SQUEEZE_ARGS, None, stopping, directory, "squeeze", tuning, resume)
+
+        expected = run(tmp_path / "uninterrupted", 60, False)
+        checkpoint = mcmc.SamplerState.read_checkpoint(tmp_path / "uninterrupted")
+        assert checkpoint["iteration"] > 0
+        assert checkpoint["lengths"]["accept"] == [len(samples) for samples in expected[1]]
+        assert mcmc.SamplerState.read_checkpoint(tmp_path) is None
+
+        # Stop early, keeping an old checkpoint to simulate a crash after samples were flushed but before checkpointing
+        run(tmp_path / "resumed", 20, False)
+        old_checkpoint = (tmp_path / "resumed" / mcmc.CHECKPOINT_FILENAME).read_text()
+        run(tmp_path / "resumed", 30, True)
+        (tmp_path / "resumed" / mcmc.CHECKPOINT_FILENAME).write_text(old_checkpoint)
+        resumed = run(tmp_path / "resumed", 60, True)
+        for expected_buffer, buffer in zip(expected[:5], resumed[:5]):
+            for expected_row, row in zip(expected_buffer, buffer):
+                np.testing.assert_array_equal(row, expected_row)
+        assert resumed[5] == expected[5]
+
+        # Resuming a chain which has met its stopping rule does not sample further, but a larger rule extends it
+        again = run(tmp_path / "resumed", 60, True)
+        assert [len(samples) for samples in again[1]] == [len(samples) for samples in expected[1]]
+        extended = run(tmp_path / "resumed", 80, True)
+        assert min(len(samples) for samples in extended[1]) >= 80
+        np.testing.assert_array_equal(extended[1][0][: len(expected[1][0])], expected[1][0])
+
+    def test_pickle_state(self, thesis_inputs, calibration):
+        """Test a pickled chain does not include the inputs to the sampler, and continues as before once they are restored"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(4))
+        for _ in range(20):
+            mcmc.squeeze_iteration(state)
+        copied = pickle.loads(pickle.dumps(state))
+        assert all(getattr(copied, name) is None for name in mcmc.INPUT_MEMBERS)
+        assert len(pickle.dumps(state)) < len(pickle.dumps(state.result_vec)) / 10
+        copied.restore_inputs(state.result_vec, state.calibration)
+        np.testing.assert_array_equal(copied.prob_table, state.prob_table)
+        np.testing.assert_array_equal(copied.sum_table, state.sum_table)
+        for _ in range(20):
+            mcmc.squeeze_iteration(state)
+            mcmc.squeeze_iteration(copied)
+        np.testing.assert_array_equal(copied.thetas, state.thetas)
+        np.testing.assert_array_equal(copied.phis, state.phis)
+
+    def test_session_extend(self, tmp_path, thesis_inputs, calibration):
+        """Test that extending a session continues its chains, producing the same samples as a single longer run"""
+        stopping = mcmc.StoppingRule(max_samples=20, check_interval=10)
+        session = mcmc.MCMCSession(
+            calibration, **thesis_inputs, CHAINS=2, SEED=5, STOPPING=stopping, SAMPLE_DIRECTORY=tmp_path / "session"
+        )
+        assert session.accepted_samples() == 0
+        first = session.run()
+        accepted = session.accepted_samples()
+        assert accepted >= 20
+        extended = session.extend(25)
+        assert session.accepted_samples() >= accepted + 25
+        # Samples from the first run are kept
+        np.testing.assert_array_equal(extended[1][0][: len(first[1][0])], first[1][0])
+        assert extended[10]["shift"]["proposed"][1] > first[10]["shift"]["proposed"][1]
+
+        expected = mcmc.run_MCMC(
+            calibration,
+            **thesis_inputs,
+            CHAINS=2,
+            SEED=5,
+            STOPPING=mcmc.StoppingRule(max_samples=accepted + 25, check_interval=10),
+        )
+        for index in (1, 2, 6, 7):
+            for expected_row, row in zip(expected[index], extended[index]):
+                np.testing.assert_array_equal(row, expected_row)
+        assert extended[10] == expected[10]
+
+    def test_progress_and_stop(self, tmp_path, thesis_inputs, calibration):
+        """Test that progress is reported to a callback, and that setting the stop flag ends sampling after the current iteration"""
+        SQUEEZE_ARGS = squeeze_args(thesis_inputs, calibration)
+        stopping = mcmc.StoppingRule(max_samples=1000, check_interval=10)
+        stop = threading.Event()
+        reports = []
+
+        def callback(progress):
+            reports.append(progress)
+            if len(reports) == 2:
+                stop.set()
+
+        results = mcmc.run_chain(3, SQUEEZE_ARGS, None, stopping, tmp_path, PROGRESS_CALLBACK=callback, STOP=stop)
+        assert len(reports) == 2
+        assert reports[0].percent == 0
+        assert reports[0].eta is None
+        assert reports[0].rhat is None
+        assert set(reports[1].acceptance) <= set(mcmc.MOVES)
+        assert reports[1].samples == min(len(samples) for samples in results[1])
+        # The samples drawn before stopping are kept and checkpointed
+        assert results[6].iteration == 10
+        assert mcmc.SamplerState.read_checkpoint(tmp_path)["iteration"] == 10
+
+        # Chains in worker processes are also stopped
+        stop = mcmc.WORKER_CONTEXT.Event()
+        stop.set()
+        chains = mcmc.run_chains(SQUEEZE_ARGS, CHAINS=2, SEED=1, STOPPING=stopping, STOP=stop)
+        assert [chain[6].iteration for chain in chains] == [0, 0]
+
+    def test_chain_progress(self, thesis_inputs, calibration):
+        """Test the estimated time remaining and diagnostics reported for a chain"""
+        state = build_state(thesis_inputs, calibration, np.random.default_rng(1))
+        progress = mcmc.ChainProgress.from_state(state, 0, 0, 0.0)
+        assert (progress.eta, progress.acceptance, progress.rhat) == (None, {}, None)
+        state.record_move(0, True)
+        state.record_move(0, False)
+        # Record independent noise, which has converged
+        rng = np.random.default_rng(2)
+        thetas, phis = state.thetas.copy(), state.phis.copy()
+        for _ in range(mcmc.ACCEPT_BURN_IN + 1000):
+            state.thetas = thetas + rng.normal(0, 1, len(thetas))
+            state.phis = phis + rng.normal(0, 1, len(phis))
+            state.record_all_accepted()
+        progress = mcmc.ChainProgress.from_state(state, 60, 20, 10.0)
+        assert progress.eta == pytest.approx(10.0)
+        assert progress.acceptance == {"context": 0.5}
+        assert progress.samples == mcmc.ACCEPT_BURN_IN + 1000
+        assert progress.rhat == pytest.approx(1, abs=0.05)
+
+
+class TestStopping:
+    def test_effective_sample_size(self):
+        """Test the effective sample size of independent and autocorrelated samples"""
+        rng = np.random.default_rng(2)
+        independent = rng.normal(0, 1, 20000)
+        assert mcmc.effective_sample_size(independent) == pytest.approx(20000, rel=0.1)
+        # An AR(1) process with coefficient 0.9 has an effective sample size of n * (1 - 0.9) / (1 + 0.9)
+        correlated = np.zeros(20000)
+        for i in range(1, len(correlated)):
+            correlated[i] = 0.9 * correlated[i - 1] + independent[i]
+        assert mcmc.effective_sample_size(correlated) == pytest.approx(20000 * 0.1 / 1.9, rel=0.25)
+        assert np.isnan(mcmc.effective_sample_size([1.0, 2.0]))
+        assert np.isnan(mcmc.effective_sample_size(np.ones(100)))
+
+    def test_split_rhat(self):
+        """Test split R-hat detects a chain which has not converged"""
+        rng = np.random.default_rng(3)
+        assert mcmc.split_rhat(rng.normal(0, 1, 10000)) < 1.01
+        assert mcmc.split_rhat(np.concatenate([rng.normal(0, 1, 5000), rng.normal(2, 1, 5000)])) > 1.1
+        assert np.isnan(mcmc.split_rhat([1.0, 2.0, 3.0]))
+
+    def test_stopping_rule(self):
+        """Test stopping rule progress in sample count and convergence modes"""
+        rng = np.random.default_rng(4)
+
+        def buffer(rows, n_samples, shift=0.0):
+            samples = SampleBuffer(rows)
+            for row in range(rows):
+                samples.extend(row, rng.normal(0, 1, n_samples) + np.linspace(0, shift, n_samples))
+            return samples
+
+        def state(n_samples, shift=0.0):
+            return SimpleNamespace(
+                accept=buffer(2, n_samples, shift),
+                phi_accept=buffer(3, n_samples),
+                all_samps_cont=buffer(2, n_samples * 3),
+            )
+
+        rule = mcmc.StoppingRule(max_samples=10000)
+        assert rule.progress(state(5000)) == (50, False)
+        assert rule.progress(state(10000)) == (100, True)
+
+        # Converged samples stop early, once burn-in has completed
+        rule = mcmc.StoppingRule(convergence=True, target_ess=1000, max_samples=60000)
+        assert rule.progress(state(1000)) == (1, False)
+        assert rule.progress(state(5000)) == (100, True)
+        # Too few effective samples, or a drifting chain, continue with progress towards the ESS target
+        percent, done = mcmc.StoppingRule(convergence=True, target_ess=10000).progress(state(5000))
+        assert not done
+        assert percent == pytest.approx(40, abs=10)
+        percent, done = rule.progress(state(5000, shift=5.0))
+        assert not done
+        assert percent <= 99
@@ -1040,6 +1040,28 @@ class TestUtil:
         # Restore the real nx verison, although this should be implicitly handled by the monkeypatch fixture
         monkeypatch.setattr(nx, "__version__", actual_nx_version)
 
+    def test_write_file_atomic(self, tmp_path: pathlib.Path):
+        """Test files are replaced atomically, leaving the existing file and no temporary files if writing fails"""
+        path = tmp_path / "foo.bin"
+        util.write_file_atomic(path, lambda f: f.write(b"abc"), binary=True)
+        assert path.read_bytes() == b"abc"
+
+        def fail(f):
+            f.write(b"partial")
+            raise OSError("full")
+
+        with pytest.raises(OSError, match="full"):
+            util.write_file_atomic(path, fail, binary=True)
+        assert path.read_bytes() == b"abc"
+        assert [p.name for p in tmp_path.iterdir()] == ["foo.bin"]
+
+    def test_write_json_atomic(self, tmp_path: pathlib.Path):
+        """Test json files are written atomically, with optional indentation"""
+        util.write_json_atomic(tmp_path / "foo.json", {"a": [1, 2]})
+        assert (tmp_path / "foo.json").read_text() == '{"a": [1, 2]}'
+        util.write_json_atomic(tmp_path / "foo.json", {"a": 1}, indent=2)
+        assert (tmp_path / "foo.json").read_text() == '{\n  "a": 1\n}'
+
     class TestMonotonicTimer:
         """Tests for the MonotonicTimer utility class."""
 